@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+大廳限流與准入控制效能測試
+啟動大廳伺服器，一般玩家以固定頻率瀏覽遊戲（list_games / get_game_detail），
+同時有幾位濫用者不停送出 download_game 與 list_games。分別在關閉與開啟限流下執行，
+輸出一般玩家的延遲 p50 / p99，以及濫用者被處理與被拒絕的請求數（JSON）
+
+用法:
+    python3 benchmarks/bench_admission.py --normal 8 --abusers 4 --duration 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_lobby_workers import ROOT, free_port, seed, wait_for_port
+
+BROWSE = [
+    {"type": "list_games"},
+    {"type": "get_game_detail", "game_id": 1},
+]
+
+def seed_files(work_dir, files, size):
+    """建立 download_game 讀取的遊戲檔案（bench-game-0）"""
+    game_dir = os.path.join(work_dir, "uploaded_games", "bench-game-0", "1.0.0")
+    os.makedirs(game_dir)
+    line = "# " + "x" * 77 + "\n"
+    for i in range(files):
+        with open(os.path.join(game_dir, f"module_{i}.py"), "w", encoding="utf-8") as f:
+            f.write(line * (size // len(line)))
+
+class Connection:
+    def __init__(self, port):
+        import socket
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.decoder = json.JSONDecoder()
+
+    def request(self, message):
+        self.sock.sendall(json.dumps(message).encode("utf-8"))
+        buffer = ""
+        while True:
+            data = self.sock.recv(1024 * 1024)
+            if not data:
+                raise ConnectionError("連線中斷")
+            buffer += data.decode("utf-8")
+            try:
+                return self.decoder.raw_decode(buffer)[0]
+            except json.JSONDecodeError:
+                continue
+
+def normal_loop(port, duration, start_at, interval, result_queue):
+    """一般玩家：每 interval 秒瀏覽一次"""
+    conn = Connection(port)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = time.time() + duration
+    latencies = []
+    rejected = 0
+    count = 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        response = conn.request(BROWSE[count % len(BROWSE)])
+        elapsed = time.perf_counter() - started
+        if response.get("success"):
+            latencies.append(elapsed)
+        else:
+            rejected += 1
+        count += 1
+        time.sleep(max(0.0, interval - elapsed))
+    result_queue.put(("normal", latencies, rejected))
+
+def abuser_loop(port, duration, start_at, index, result_queue):
+    """濫用者：登入後不停下載遊戲與列出遊戲"""
+    conn = Connection(port)
+    username = f"abuser{index}"
+    conn.request({"type": "register", "username": username, "password": "bench"})
+    conn.request({"type": "login", "username": username, "password": "bench"})
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = time.time() + duration
+    outcomes = {"served": 0, "rate_limited": 0, "busy": 0}
+    count = 0
+    while time.time() < deadline:
+        message = {"type": "download_game", "game_id": 1} if count % 2 == 0 else {"type": "list_games"}
+        response = conn.request(message)
+        if response.get("success"):
+            outcomes["served"] += 1
+        else:
+            outcomes[response.get("error", "busy")] = outcomes.get(response.get("error", "busy"), 0) + 1
+        count += 1
+    result_queue.put(("abuser", outcomes, None))
+
+def run_once(limits, normal, abusers, duration, interval, games, files, size):
+    work_dir = tempfile.mkdtemp(prefix="gamestore-admission-bench-")
+    port = free_port()
+    seed(work_dir, games)
+    seed_files(work_dir, files, size)
+    env = dict(os.environ, GAMESTORE_RATE_LIMITS="on" if limits else "off")
+    if not limits:
+        # 關閉時同時執行上限也設為不限制
+        env.update(GAMESTORE_MAX_DOWNLOADS="1000000", GAMESTORE_MAX_SPAWNS="1000000")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "server", "lobby_server.py"), "127.0.0.1", str(port)],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError("大廳伺服器未啟動")
+        time.sleep(0.5)
+        queue = multiprocessing.Queue()
+        start_at = time.time() + 1.0
+        procs = [multiprocessing.Process(target=normal_loop, args=(port, duration, start_at, interval, queue))
+                 for _ in range(normal)]
+        procs += [multiprocessing.Process(target=abuser_loop, args=(port, duration, start_at, i, queue))
+                  for i in range(abusers)]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = sorted(l for kind, ls, _ in results if kind == "normal" for l in ls)
+    abuse = {}
+    for kind, outcomes, _ in results:
+        if kind == "abuser":
+            for key, value in outcomes.items():
+                abuse[key] = abuse.get(key, 0) + value
+    return {
+        "limits": limits,
+        "normal_requests": len(latencies),
+        "normal_rejected": sum(rejected for kind, _, rejected in results if kind == "normal"),
+        "normal_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        "normal_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None,
+        "abuser_requests": abuse,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="大廳限流與准入控制效能測試")
+    parser.add_argument("--normal", type=int, default=8, help="一般玩家人數")
+    parser.add_argument("--abusers", type=int, default=4, help="濫用者人數")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.1, help="一般玩家的請求間隔（秒）")
+    parser.add_argument("--games", type=int, default=200, help="list_games 回傳的遊戲數")
+    parser.add_argument("--files", type=int, default=20, help="下載的遊戲檔案數")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="每個遊戲檔案的大小")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for limits in (False, True):
+        result = run_once(limits, args.normal, args.abusers, args.duration, args.interval,
+                          args.games, args.files, args.file_size)
+        print(f"[效能測試] 限流{'開啟' if limits else '關閉'}: 一般玩家 p50 {result['normal_p50_ms']} ms / "
+              f"p99 {result['normal_p99_ms']} ms，濫用者 {result['abuser_requests']}", file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "admission",
+        "normal_clients": args.normal,
+        "abusers": args.abusers,
+        "duration_sec": args.duration,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+遊戲檔案去重儲存效能測試
+模擬一款遊戲連續發布多個版本（每個版本只修改部分檔案），比較（JSON）：
+    - 舊做法：每個版本完整複製一份檔案
+    - server/blob_store.py：依內容雜湊去重，版本目錄以硬連結指向 blob
+輸出兩者實際佔用的磁碟空間（相同 inode 只計算一次）、不重複的 inode 數（分頁快取需要容納的檔案數）、
+每個版本的寫入時間，以及把舊做法的目錄就地轉換（migrate）所需的時間
+
+用法:
+    python3 benchmarks/bench_blob_store.py --releases 20 --files 50 --changed 0.05
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "server"))
+from blob_store import BlobStore
+
+GAME_NAME = "bench-game"
+
+def build_releases(releases, file_count, file_size, changed, seed):
+    """產生每個版本的檔案 [(相對路徑, bytes)]，每個版本修改約 changed 比例的檔案"""
+    rng = random.Random(seed)
+    line = "# " + "x" * 77 + "\n"
+    files = {f"src/module_{i}.py": (line * (file_size // len(line))).encode("utf-8") + f"# {i}\n".encode()
+             for i in range(file_count)}
+    result = []
+    for release in range(releases):
+        if release:
+            for name in rng.sample(sorted(files), max(1, int(file_count * changed))):
+                files[name] += f"# release {release}\n".encode()
+        result.append((f"1.0.{release}", sorted(files.items())))
+    return result
+
+def disk_usage(path):
+    """實際佔用的磁碟空間與不重複的 inode 數（硬連結只計算一次）"""
+    seen = set()
+    total = 0
+    for root, dirs, filenames in os.walk(path):
+        for filename in filenames:
+            stat = os.lstat(os.path.join(root, filename))
+            if stat.st_ino in seen:
+                continue
+            seen.add(stat.st_ino)
+            total += stat.st_blocks * 512
+    return total, len(seen)
+
+def write_copies(root, releases):
+    """舊做法：每個版本寫入完整的檔案"""
+    timings = []
+    for version, files in releases:
+        start = time.perf_counter()
+        game_dir = os.path.join(root, GAME_NAME, version)
+        for name, content in files:
+            path = os.path.join(game_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def write_store(root, releases):
+    store = BlobStore(root)
+    timings = []
+    for version, files in releases:
+        start = time.perf_counter()
+        store.write_version(GAME_NAME, version, files)
+        timings.append(time.perf_counter() - start)
+    return store, timings
+
+def main():
+    parser = argparse.ArgumentParser(description="遊戲檔案去重儲存效能測試")
+    parser.add_argument("--releases", type=int, default=20, help="發布的版本數")
+    parser.add_argument("--files", type=int, default=50, help="每個版本的檔案數")
+    parser.add_argument("--file-size", type=int, default=32 * 1024, help="每個檔案的大小")
+    parser.add_argument("--changed", type=float, default=0.05, help="每個版本修改的檔案比例")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    releases = build_releases(args.releases, args.files, args.file_size, args.changed, args.seed)
+    with tempfile.TemporaryDirectory(prefix="gamestore-blob-bench-") as tmp:
+        copies_root = os.path.join(tmp, "copies", "uploaded_games")
+        copy_times = write_copies(copies_root, releases)
+        copies_bytes, copies_inodes = disk_usage(copies_root)
+
+        store_root = os.path.join(tmp, "store", "uploaded_games")
+        store, store_times = write_store(store_root, releases)
+        store_bytes, store_inodes = disk_usage(store_root)
+        stats = store.stats()
+
+        # 把舊做法的目錄就地轉換
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            migrated = BlobStore(copies_root).migrate()
+            migrate_time = time.perf_counter() - start
+        migrated_bytes, migrated_inodes = disk_usage(copies_root)
+
+    report = {
+        "benchmark": "blob_store",
+        "releases": args.releases,
+        "files": args.files,
+        "file_size": args.file_size,
+        "changed": args.changed,
+        "copies": {
+            "disk_bytes": copies_bytes,
+            "inodes": copies_inodes,
+            "write_ms_per_release": round(sum(copy_times) / len(copy_times) * 1000, 3),
+        },
+        "blob_store": {
+            "disk_bytes": store_bytes,
+            "inodes": store_inodes,
+            "blobs": stats["blobs"],
+            "logical_bytes": stats["logical_bytes"],
+            "write_ms_per_release": round(sum(store_times) / len(store_times) * 1000, 3),
+        },
+        "migrate": {
+            "versions": migrated,
+            "seconds": round(migrate_time, 3),
+            "disk_bytes_after": migrated_bytes,
+            "inodes_after": migrated_inodes,
+        },
+        "disk_ratio": round(store_bytes / copies_bytes, 3),
+    }
+    print(f"[效能測試] {args.releases} 個版本: 完整複製 {copies_bytes} bytes / {copies_inodes} 個 inode，"
+          f"去重儲存 {store_bytes} bytes / {store_inodes} 個 inode ({report['disk_ratio']})，"
+          f"轉換 {migrated} 個版本 {report['migrate']['seconds']} 秒", file=sys.stderr)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+資料庫效能測試
+建立合成資料（預設 10k 遊戲、1M 玩家、10M 下載記錄、5M 評分），
+量測 Database 每個方法的延遲並輸出 JSON 結果，可與先前的結果比較以找出效能退化
+
+用法:
+    python3 benchmarks/bench_database.py --scale 0.01 --output result.json
+    python3 benchmarks/bench_database.py --compare baseline.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from database import Database
+
+BENCH_PASSWORD = "bench-password"
+
+def seed_database(db, games, players, downloads, ratings, developers):
+    """以 SQL 批次產生合成資料"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = OFF")
+    password_hash = db.hash_password(BENCH_PASSWORD)
+
+    def counter(limit):
+        return f"WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c LIMIT {int(limit)})"
+
+    steps = [
+        ("developers", f'''
+            {counter(developers)}
+            INSERT INTO developers (username, password_hash)
+            SELECT 'dev' || x, ? FROM c
+        ''', (password_hash,)),
+        ("players", f'''
+            {counter(players)}
+            INSERT INTO players (username, password_hash)
+            SELECT 'player' || x, ? FROM c
+        ''', (password_hash,)),
+        ("games", f'''
+            {counter(games)}
+            INSERT INTO games (game_name, developer_id, current_version, description,
+                               game_type, min_players, max_players, server_port)
+            SELECT 'game' || x, (x % {int(developers)}) + 1, '1.0.0', '合成測試遊戲 ' || x,
+                   'cli', 2, 2 + (x % 9), 5000 + (x % 1000) FROM c
+        ''', ()),
+        ("game_versions", f'''
+            {counter(games)}
+            INSERT INTO game_versions (game_id, version, file_path)
+            SELECT x, '1.0.0', 'uploaded_games/game' || x || '/1.0.0' FROM c
+        ''', ()),
+        ("game_ratings", f'''
+            {counter(ratings)}
+            INSERT INTO game_ratings (game_id, player_id, rating, comment)
+            SELECT ((x - 1) % {int(games)}) + 1,
+                   (((x - 1) / {int(games)}) % {int(players)}) + 1,
+                   (x % 5) + 1, 'comment ' || x FROM c
+        ''', ()),
+        ("download_records", f'''
+            {counter(downloads)}
+            INSERT INTO download_records (player_id, game_id, version)
+            SELECT ((x - 1) % {int(players)}) + 1,
+                   (((x - 1) * 7) % {int(games)}) + 1, '1.0.0' FROM c
+        ''', ()),
+    ]
+
+    timings = {}
+    for table, sql, params in steps:
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        conn.commit()
+        timings[table] = round(time.perf_counter() - start, 3)
+        print(f"[效能測試] 已建立 {table} ({timings[table]} 秒)", file=sys.stderr)
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bench_meta (key TEXT PRIMARY KEY, value TEXT)
+    ''')
+    cursor.execute(
+        "INSERT OR REPLACE INTO bench_meta (key, value) VALUES ('sizes', ?)",
+        (json.dumps([games, players, downloads, ratings, developers]),))
+    conn.commit()
+    conn.close()
+    return timings
+
+def seeded_sizes(db_path):
+    """讀取既有測試資料庫的資料量（若有）"""
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM bench_meta WHERE key = 'sizes'").fetchone()
+        return json.loads(row[0]) if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+def summarize(samples):
+    """計算延遲統計（毫秒）"""
+    ordered = sorted(samples)
+
+    def pct(p):
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    total = sum(ordered)
+    return {
+        "iterations": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 4),
+        "p50_ms": round(pct(50), 4),
+        "p95_ms": round(pct(95), 4),
+        "p99_ms": round(pct(99), 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "ops_per_sec": round(len(ordered) / total, 1) if total > 0 else None,
+    }
+
+def build_cases(db, sizes, rng, run_id):
+    """建立每個 Database 方法的測試案例：(名稱, 產生參數的函式, 呼叫函式)"""
+    games, players, _, _, developers = sizes
+
+    def random_game():
+        return rng.randint(1, games)
+
+    def random_player():
+        return rng.randint(1, players)
+
+    counters = {"create": 0, "update": 0}
+
+    def create_args():
+        counters["create"] += 1
+        name = f"bench-{run_id}-{counters['create']}"
+        return (name, 1, "1.0.0", "benchmark", "cli", 2, 4, 5000, f"uploaded_games/{name}/1.0.0")
+
+    def update_args():
+        counters["update"] += 1
+        game_id = random_game()
+        # 合成資料的開發者為 (game_id % developers) + 1
+        developer_id = (game_id % developers) + 1
+        version = f"bench-{run_id}-{counters['update']}"
+        return (game_id, developer_id, version, f"uploaded_games/game{game_id}/{version}")
+
+    return [
+        ("login_player", lambda: (f"player{random_player()}", BENCH_PASSWORD), db.login_player),
+        ("get_active_games", lambda: (), db.get_active_games),
+        ("get_game_by_id", lambda: (random_game(),), db.get_game_by_id),
+        ("get_game_ratings", lambda: (random_game(),), db.get_game_ratings),
+        ("get_player_downloads", lambda: (random_player(),), db.get_player_downloads),
+        ("add_rating", lambda: (random_game(), random_player(), rng.randint(1, 5), "bench"), db.add_rating),
+        ("record_download", lambda: (random_player(), random_game(), "1.0.0"), db.record_download),
+        ("create_game", create_args, db.create_game),
+        ("update_game_version", update_args, db.update_game_version),
+    ]
+
+def run_benchmarks(db, sizes, iterations, warmup, seed, only=None):
+    """逐一量測每個方法"""
+    rng = random.Random(seed)
+    run_id = int(time.time())
+    results = {}
+    for name, make_args, func in build_cases(db, sizes, rng, run_id):
+        if only and name not in only:
+            continue
+        # get_active_games 在大資料量下是整表聚合，減少次數以免測試過久
+        count = max(1, iterations // 20) if name == "get_active_games" else iterations
+        for _ in range(min(warmup, count)):
+            func(*make_args())
+        samples = []
+        for _ in range(count):
+            args = make_args()
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+        results[name] = summarize(samples)
+        print(f"[效能測試] {name}: p50 {results[name]['p50_ms']} ms, "
+              f"p99 {results[name]['p99_ms']} ms", file=sys.stderr)
+    return results
+
+def compare_results(current, baseline, threshold):
+    """與基準結果比較 p50 / p99，回傳退化列表"""
+    regressions = []
+    for name, stats in current.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if old.get(key) and stats[key] > old[key] * (1 + threshold):
+                regressions.append({
+                    "method": name,
+                    "metric": key,
+                    "baseline": old[key],
+                    "current": stats[key],
+                    "ratio": round(stats[key] / old[key], 3),
+                })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="server/database.py 效能測試")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=1000000)
+    parser.add_argument("--downloads", type=int, default=10000000)
+    parser.add_argument("--ratings", type=int, default=5000000)
+    parser.add_argument("--developers", type=int, default=100)
+    parser.add_argument("--scale", type=float, default=1.0, help="等比例縮放所有資料量")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="測試資料庫路徑（已存在且資料量相同時會重複使用）")
+    parser.add_argument("--only", nargs="*", help="只量測指定的方法")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    parser.add_argument("--compare", help="與先前輸出的 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允許的退化比例")
+    args = parser.parse_args()
+
+    def scaled(value):
+        return max(1, int(value * args.scale))
+
+    sizes = [scaled(args.games), scaled(args.players), scaled(args.downloads),
+             scaled(args.ratings), scaled(args.developers)]
+    sizes[3] = min(sizes[3], sizes[0] * sizes[1])  # 評分受 (game_id, player_id) 唯一限制
+
+    temp_dir = None
+    db_path = args.db
+    if not db_path:
+        temp_dir = tempfile.mkdtemp(prefix="gamestore-bench-")
+        db_path = os.path.join(temp_dir, "bench.db")
+
+    seed_timings = None
+    existing = seeded_sizes(db_path)
+    if existing and existing != sizes:
+        os.remove(db_path)
+        existing = None
+    # Database 初始化訊息輸出到 stderr，避免混入 JSON 結果
+    with contextlib.redirect_stdout(sys.stderr):
+        db = Database(db_path)
+    if not existing:
+        seed_timings = seed_database(db, *sizes)
+
+    results = run_benchmarks(db, sizes, args.iterations, args.warmup, args.seed, args.only)
+
+    report = {
+        "benchmark": "database",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "sizes": dict(zip(["games", "players", "downloads", "ratings", "developers"], sizes)),
+        "seed_seconds": seed_timings,
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["regressions"] = compare_results(results, baseline, args.threshold)
+        if report["regressions"]:
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if temp_dir:
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
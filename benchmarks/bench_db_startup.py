@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+資料庫初始化與伺服器冷啟動效能測試
+輸出（JSON）：
+    - 建立 Database 與第一次取得連線的時間：全新資料庫（執行遷移）與既有資料庫（只讀取 user_version）
+    - 對照：每次啟動都執行全部 CREATE TABLE IF NOT EXISTS（舊版 init_database 的做法）
+    - 多個行程同時初始化同一個全新資料庫：是否全部成功、遷移執行的次數
+    - 大廳伺服器從啟動行程到開始接受連線的時間
+
+用法:
+    python3 benchmarks/bench_db_startup.py --repeat 50 --processes 8
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_lobby_workers import ROOT, free_port
+from database import MIGRATIONS, SCHEMA_VERSION, Database
+
+def ms(seconds):
+    return round(seconds * 1000, 4)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def open_database(path):
+    """建立 Database 並取得第一個連線，回傳 (建立時間, 第一次連線時間, 輸出)"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        db = Database(path)
+        constructed = time.perf_counter()
+        db.get_connection().close()
+        connected = time.perf_counter()
+    return constructed - start, connected - constructed, output.getvalue()
+
+def legacy_init(path):
+    """舊版做法：每次啟動都執行全部建表語句"""
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    for statements in MIGRATIONS:
+        for statement in statements:
+            cursor.execute(statement)
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+def concurrent_worker(path, barrier, result_queue):
+    barrier.wait()
+    try:
+        _, elapsed, output = open_database(path)
+        result_queue.put((True, elapsed, "已從版本" in output))
+    except Exception as e:
+        result_queue.put((False, 0.0, str(e)))
+
+def run_concurrent(tmp, processes):
+    """多個行程同時初始化同一個全新資料庫"""
+    path = os.path.join(tmp, "concurrent", "gamestore.db")
+    barrier = multiprocessing.Barrier(processes)
+    queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=concurrent_worker, args=(path, barrier, queue))
+             for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    results = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    conn = sqlite3.connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return {
+        "processes": processes,
+        "succeeded": sum(1 for ok, _, _ in results if ok),
+        "migrations_run": sum(1 for ok, _, migrated in results if ok and migrated is True),
+        "errors": [message for ok, _, message in results if not ok],
+        "schema_version": version,
+        "slowest_ms": ms(max(elapsed for _, elapsed, _ in results)),
+    }
+
+def lobby_cold_start(tmp, repeat):
+    """大廳伺服器從啟動到接受連線的時間（第一次為全新資料庫，之後為既有資料庫）"""
+    work_dir = os.path.join(tmp, "lobby")
+    os.makedirs(work_dir)
+    timings = []
+    for _ in range(repeat):
+        port = free_port()
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server", "lobby_server.py"), "127.0.0.1", str(port)],
+            cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                        break
+                except OSError:
+                    if server.poll() is not None or time.perf_counter() - start > 15:
+                        raise RuntimeError("大廳伺服器未啟動")
+                    time.sleep(0.001)
+            timings.append(time.perf_counter() - start)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    # 對照：只啟動 Python 直譯器並匯入 lobby_server 需要的模組
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import sys; sys.path.append(sys.argv[1]); import lobby_server",
+                    os.path.join(ROOT, "server")], cwd=work_dir, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import_time = time.perf_counter() - start
+    return {
+        "fresh_ms": ms(timings[0]),
+        "existing_median_ms": ms(median(timings[1:])) if len(timings) > 1 else None,
+        "interpreter_and_import_ms": ms(import_time),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="資料庫初始化與伺服器冷啟動效能測試")
+    parser.add_argument("--repeat", type=int, default=50, help="每種情況的重複次數")
+    parser.add_argument("--processes", type=int, default=8, help="同時初始化的行程數")
+    parser.add_argument("--lobby-repeat", type=int, default=5, help="大廳伺服器的啟動次數")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gamestore-startup-bench-") as tmp:
+        fresh = [open_database(os.path.join(tmp, f"fresh{i}", "gamestore.db")) for i in range(args.repeat)]
+        existing_path = os.path.join(tmp, "fresh0", "gamestore.db")
+        existing = [open_database(existing_path) for _ in range(args.repeat)]
+        legacy = [legacy_init(existing_path) for _ in range(args.repeat)]
+        concurrent = run_concurrent(tmp, args.processes)
+        lobby = lobby_cold_start(tmp, max(1, args.lobby_repeat))
+
+    report = {
+        "benchmark": "db_startup",
+        "schema_version": SCHEMA_VERSION,
+        "repeat": args.repeat,
+        "construct_ms": ms(median([c for c, _, _ in fresh + existing])),
+        "first_connection_ms": {
+            "fresh_database": ms(median([f for _, f, _ in fresh])),
+            "existing_database": ms(median([f for _, f, _ in existing])),
+            "legacy_create_all": ms(median(legacy)),
+        },
+        "concurrent_init": concurrent,
+        "lobby_cold_start": lobby,
+    }
+    print(f"[效能測試] 第一次連線 全新 {report['first_connection_ms']['fresh_database']} ms / "
+          f"既有 {report['first_connection_ms']['existing_database']} ms"
+          f"（舊版每次建表 {report['first_connection_ms']['legacy_create_all']} ms），"
+          f"{args.processes} 個行程同時初始化 成功 {concurrent['succeeded']} / 遷移 {concurrent['migrations_run']} 次，"
+          f"大廳啟動 {lobby['existing_median_ms']} ms", file=sys.stderr)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+到期回收效能測試
+模擬 --rooms 個房間（每個房間一個 TTL 計時器，另外每秒有 --touch-rate 比例的房間改變狀態而重新排定），
+以模擬時間推進 --duration 秒，比較（JSON）：
+    - 時間輪（server/timer_wheel.py）：排定、取消與每個 tick 推進的時間
+    - 每秒掃描所有房間的到期時間（回收前的做法只能這樣找出過期的房間）
+兩者回收的房間必須相同
+
+用法:
+    python3 benchmarks/bench_expiry.py --rooms 1000 10000 100000 --duration 600
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from timer_wheel import TimerWheel
+
+def simulate(rooms, args, use_wheel):
+    """回傳 (回收的房間, 排定/取消花費的秒數, 推進/掃描花費的秒數)"""
+    rng = random.Random(args.seed)
+    wheel = TimerWheel(tick=1.0, now=0.0)
+    deadlines = {}
+    timers = {}
+    reclaimed = []
+    schedule_time = 0.0
+    advance_time = 0.0
+
+    def arm(room, now):
+        ttl = rng.uniform(args.min_ttl, args.max_ttl)
+        deadlines[room] = now + ttl
+        if use_wheel:
+            if room in timers:
+                wheel.cancel(timers[room])
+            timers[room] = wheel.schedule(ttl, None, room, now=now)
+
+    start = time.perf_counter()
+    for room in range(rooms):
+        arm(room, 0.0)
+    schedule_time += time.perf_counter() - start
+
+    touches = int(rooms * args.touch_rate)
+    for second in range(1, int(args.duration) + 1):
+        now = float(second)
+        live = list(deadlines) if touches else []
+        start = time.perf_counter()
+        for room in rng.sample(live, min(touches, len(live))):
+            arm(room, now)
+        schedule_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        if use_wheel:
+            expired = [timer.args[0] for timer in wheel.advance(now)]
+        else:
+            expired = [room for room, deadline in deadlines.items() if deadline <= now]
+        advance_time += time.perf_counter() - start
+        for room in expired:
+            del deadlines[room]
+            timers.pop(room, None)
+            reclaimed.append((second, room))
+    return sorted(reclaimed), schedule_time, advance_time
+
+def main():
+    parser = argparse.ArgumentParser(description="到期回收效能測試")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--duration", type=float, default=600.0, help="模擬的秒數")
+    parser.add_argument("--min-ttl", type=float, default=60.0)
+    parser.add_argument("--max-ttl", type=float, default=1800.0)
+    parser.add_argument("--touch-rate", type=float, default=0.01, help="每秒重新排定的房間比例")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    results = []
+    for rooms in args.rooms:
+        wheel_reclaimed, wheel_schedule, wheel_advance = simulate(rooms, args, use_wheel=True)
+        scan_reclaimed, scan_schedule, scan_advance = simulate(rooms, args, use_wheel=False)
+        if wheel_reclaimed != scan_reclaimed:
+            raise AssertionError(f"{rooms} 個房間: 時間輪與掃描回收的房間不同")
+        ticks = int(args.duration)
+        scheduled = rooms + ticks * int(rooms * args.touch_rate)
+        result = {
+            "rooms": rooms,
+            "reclaimed": len(wheel_reclaimed),
+            "timers_scheduled": scheduled,
+            "wheel_schedule_us": round(wheel_schedule / scheduled * 1e6, 3),
+            "wheel_tick_us": round(wheel_advance / ticks * 1e6, 3),
+            "scan_tick_us": round(scan_advance / ticks * 1e6, 3),
+            "tick_speedup": round(scan_advance / wheel_advance, 1) if wheel_advance else None,
+        }
+        results.append(result)
+        print(f"[效能測試] {rooms} 個房間: 每個 tick 時間輪 {result['wheel_tick_us']} µs / "
+              f"掃描 {result['scan_tick_us']} µs，排定計時器 {result['wheel_schedule_us']} µs/個，"
+              f"回收 {result['reclaimed']} 個房間", file=sys.stderr)
+
+    report = {
+        "benchmark": "expiry",
+        "duration_sec": args.duration,
+        "ttl_sec": [args.min_ttl, args.max_ttl],
+        "touch_rate": args.touch_rate,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
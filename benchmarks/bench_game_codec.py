@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+遊戲訊息二進位編碼效能測試
+先由 bench_replay 的機器人各打一場內建遊戲並寫下對戰紀錄，取出伺服器實際送出的訊息，
+再比較 JSON 與 game_codec（依各遊戲 game_config.json 的 message_schema）的（JSON）：
+    - 每則訊息的平均位元組數（整體與各訊息類型）
+    - 每則訊息的編碼 / 解碼時間
+並確認每則訊息解碼後與原本的訊息相同；不在 schema 中或不符合 schema 的訊息會改送 JSON（fallback）
+
+用法:
+    python3 benchmarks/bench_game_codec.py --rps-players 10 --repeat 200
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from bench_replay import GAMES, MATCHES, record_matches
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "developer", "template"))
+from game_runtime import read_replay, REPLAY_SEND
+from game_codec import load_codec
+
+def server_messages(path):
+    """對戰紀錄中伺服器送給玩家的訊息（JSON bytes）"""
+    return [payload for _, kind, _, payload in read_replay(path) if kind == REPLAY_SEND]
+
+def per_message_us(func, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return round((time.perf_counter() - start) / (repeat * len(items)) * 1e6, 3)
+
+def measure(game, payloads, repeat):
+    codec = load_codec(os.path.join(GAMES, game))
+    messages = [json.loads(payload) for payload in payloads]
+    encoded = [codec.encode(message) for message in messages]
+    for message, data in zip(messages, encoded):
+        if data is not None and codec.decode(data)[0] != message:
+            raise AssertionError(f"{game} 的 {message['type']} 解碼後不一致")
+    binary = [data for data in encoded if data is not None]
+    # 實際送出的位元組：不符合 schema 的訊息仍以 JSON 送出
+    sent = [data if data is not None else payload for data, payload in zip(encoded, payloads)]
+
+    by_type = defaultdict(lambda: {"count": 0, "json_bytes": 0, "binary_bytes": 0})
+    for message, payload, data in zip(messages, payloads, sent):
+        entry = by_type[message["type"]]
+        entry["count"] += 1
+        entry["json_bytes"] += len(payload)
+        entry["binary_bytes"] += len(data)
+    for entry in by_type.values():
+        entry["json_bytes"] = round(entry["json_bytes"] / entry["count"], 1)
+        entry["binary_bytes"] = round(entry["binary_bytes"] / entry["count"], 1)
+
+    json_bytes = sum(len(payload) for payload in payloads)
+    binary_bytes = sum(len(data) for data in sent)
+    return {
+        "game": game,
+        "schema_id": codec.schema_id,
+        "messages": len(messages),
+        "fallback_messages": len(messages) - len(binary),
+        "json_bytes_per_message": round(json_bytes / len(messages), 1),
+        "binary_bytes_per_message": round(binary_bytes / len(messages), 1),
+        "bytes_ratio": round(binary_bytes / json_bytes, 3),
+        "json_encode_us": per_message_us(lambda m: json.dumps(m).encode("utf-8"), messages, repeat),
+        "binary_encode_us": per_message_us(codec.encode, messages, repeat),
+        "json_decode_us": per_message_us(json.loads, payloads, repeat),
+        "binary_decode_us": per_message_us(codec.decode, binary, repeat) if binary else None,
+        "by_type": dict(sorted(by_type.items())),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="遊戲訊息二進位編碼效能測試")
+    parser.add_argument("--rps-players", type=int, default=10, help="石頭剪刀布的機器人人數")
+    parser.add_argument("--repeat", type=int, default=200, help="計時的重複次數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gamestore-codec-bench-") as replay_dir:
+        with contextlib.redirect_stdout(sys.stderr):
+            paths = record_matches(replay_dir, args.rps_players, args.seed)
+        games = []
+        for (game, *_), path in zip(MATCHES, paths):
+            result = measure(game, server_messages(path), args.repeat)
+            games.append(result)
+            print(f"[效能測試] {game}: {result['json_bytes_per_message']} -> "
+                  f"{result['binary_bytes_per_message']} bytes/訊息，編碼 {result['json_encode_us']} -> "
+                  f"{result['binary_encode_us']} µs，解碼 {result['json_decode_us']} -> "
+                  f"{result['binary_decode_us']} µs", file=sys.stderr)
+
+    report = {
+        "benchmark": "game_codec",
+        "rps_players": args.rps_players,
+        "games": games,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+對戰結果與排行榜效能測試
+以 server/match_results.py 的 MatchResultCollector 在暫存資料庫中記錄大量隨機對戰，輸出（JSON）：
+    - 回報結果（更新記憶體排行榜）的每秒場數
+    - 批次寫入與逐筆交易寫入 match_results 的每秒筆數
+    - 前 10 名與單一玩家名次的查詢時間：彙總 match_results、player_stats 索引查詢、記憶體排行榜
+
+用法:
+    python3 benchmarks/bench_leaderboard.py --players 1000 10000 --matches 20000
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "server"))
+from database import Database
+from match_results import MatchResultCollector
+
+GAME_ID = 1
+QUERY_REPEAT = 200
+
+def timed(func, repeat=QUERY_REPEAT):
+    """平均每次執行的毫秒數"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return round((time.perf_counter() - start) / repeat * 1000, 4)
+
+def seed_players(db, count):
+    conn = db.get_connection()
+    with conn:
+        conn.executemany("INSERT INTO players (username, password_hash) VALUES (?, ?)",
+                         ((f"player{i}", "x") for i in range(count)))
+    conn.close()
+    return [{"id": i + 1, "username": f"player{i}"} for i in range(count)]
+
+def run_once(player_count, match_count, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            db = Database(os.path.join(tmp, "gamestore.db"))
+            players = seed_players(db, player_count)
+            collector = MatchResultCollector(db, batch_size=float("inf"))
+
+        matches = []
+        for room_id in range(match_count):
+            pair = rng.sample(players, 2)
+            winner = rng.choice((0, 1, None))
+            results = ["draw", "draw"] if winner is None else \
+                ["win" if i == winner else "loss" for i in range(2)]
+            matches.append((room_id, pair, [{"player_id": p["id"], "result": r} for p, r in zip(pair, results)]))
+
+        # 回報：驗證權杖並更新記憶體排行榜（資料庫寫入延後）
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            for room_id, pair, reported in matches:
+                token = collector.open_match(room_id, GAME_ID, pair)
+                collector.report(room_id, token, reported, "win")
+        report_time = time.perf_counter() - start
+
+        rows = list(collector.pending_results)
+        start = time.perf_counter()
+        written = collector.flush()
+        batch_time = time.perf_counter() - start
+
+        # 對照：每筆結果各自開連線與交易（與其他資料庫方法相同的寫法）
+        single_rows = rows[:min(len(rows), 2000)]
+        start = time.perf_counter()
+        for row in single_rows:
+            db.save_match_results([row], [])
+        single_time = time.perf_counter() - start
+
+        conn = db.get_connection()
+        aggregate_top = lambda: conn.execute('''
+            SELECT player_id, SUM(result = 'win') * 3 + SUM(result = 'draw') AS points
+            FROM match_results WHERE game_id = ?
+            GROUP BY player_id ORDER BY points DESC LIMIT 10
+        ''', (GAME_ID,)).fetchall()
+        probe = players[player_count // 2]["id"]
+        aggregate_rank = lambda: conn.execute('''
+            SELECT COUNT(*) + 1 FROM (
+                SELECT player_id, SUM(result = 'win') * 3 + SUM(result = 'draw') AS points
+                FROM match_results WHERE game_id = ? GROUP BY player_id
+            ) WHERE points > (
+                SELECT SUM(result = 'win') * 3 + SUM(result = 'draw')
+                FROM match_results WHERE game_id = ? AND player_id = ?
+            )
+        ''', (GAME_ID, GAME_ID, probe)).fetchone()
+        rating = conn.execute("SELECT rating FROM player_stats WHERE game_id = ? AND player_id = ?",
+                              (GAME_ID, probe)).fetchone()[0]
+        stats_top = lambda: conn.execute('''
+            SELECT player_id, rating FROM player_stats WHERE game_id = ?
+            ORDER BY rating DESC LIMIT 10
+        ''', (GAME_ID,)).fetchall()
+        stats_rank = lambda: conn.execute(
+            "SELECT COUNT(*) + 1 FROM player_stats WHERE game_id = ? AND rating > ?",
+            (GAME_ID, rating)).fetchone()
+
+        memory_rank = collector.player_rank(GAME_ID, probe)[0]["rank"]
+        if stats_rank()[0] != memory_rank:
+            raise SystemExit(f"[效能測試] 記憶體排行榜名次 {memory_rank} 與 player_stats 不一致 {stats_rank()[0]}")
+        if [row[0] for row in stats_top()] != [e["player_id"] for e in collector.leaderboard(GAME_ID, 10)[0]]:
+            raise SystemExit("[效能測試] 記憶體排行榜前 10 名與 player_stats 不一致")
+
+        aggregate_repeat = max(1, QUERY_REPEAT // 20)
+        result = {
+            "players": player_count,
+            "matches": match_count,
+            "result_rows": written,
+            "report_matches_per_sec": round(match_count / report_time),
+            "batched_rows_per_sec": round(written / batch_time),
+            "single_rows_per_sec": round(len(single_rows) / single_time),
+            "top10_ms": {
+                "aggregate_match_results": timed(aggregate_top, aggregate_repeat),
+                "player_stats_index": timed(stats_top),
+                "memory": timed(lambda: collector.leaderboard(GAME_ID, 10)),
+            },
+            "rank_ms": {
+                "aggregate_match_results": timed(aggregate_rank, aggregate_repeat),
+                "player_stats_index": timed(stats_rank),
+                "memory": timed(lambda: collector.player_rank(GAME_ID, probe)),
+            },
+        }
+        conn.close()
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="對戰結果與排行榜效能測試")
+    parser.add_argument("--players", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for count in args.players:
+        result = run_once(count, args.matches, args.seed)
+        print(f"[效能測試] {count} 位玩家 / {args.matches} 場: "
+              f"回報 {result['report_matches_per_sec']} 場/秒，"
+              f"批次寫入 {result['batched_rows_per_sec']} 筆/秒（逐筆 {result['single_rows_per_sec']} 筆/秒），"
+              f"名次查詢 彙總 {result['rank_ms']['aggregate_match_results']} ms / "
+              f"記憶體 {result['rank_ms']['memory']} ms", file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "leaderboard",
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+大廳多行程吞吐量測試
+以不同的工作行程數啟動大廳伺服器，由多個客戶端行程持續送出
+list_games / get_game_detail / list_rooms 請求，輸出每秒請求數與擴展效率（JSON）
+
+用法:
+    python3 benchmarks/bench_lobby_workers.py --workers 1 2 4 --clients 16 --duration 5
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "server"))
+from database import Database
+
+REQUESTS = [
+    {"type": "list_games"},
+    {"type": "get_game_detail", "game_id": 1},
+    {"type": "list_rooms"},
+]
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def seed(work_dir, games):
+    """建立測試用的遊戲資料"""
+    with contextlib.redirect_stdout(sys.stderr):
+        db = Database(os.path.join(work_dir, "database", "gamestore.db"))
+    db.register_developer("bench-dev", "bench")
+    developer_id = db.get_developer_auth("bench-dev")[0]
+    for i in range(games):
+        db.create_game(f"bench-game-{i}", developer_id, "1.0.0", "效能測試遊戲", "cli",
+                       2, 4, 5000, f"uploaded_games/bench-game-{i}/1.0.0")
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def client_loop(port, duration, start_at, result_queue):
+    """單一客戶端：在指定時間內不停送出請求"""
+    sock = socket.create_connection(("127.0.0.1", port))
+    decoder = json.JSONDecoder()
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = time.time() + duration
+    count = 0
+    latencies = []
+    while time.time() < deadline:
+        request = REQUESTS[count % len(REQUESTS)]
+        started = time.perf_counter()
+        sock.sendall(json.dumps(request).encode("utf-8"))
+        buffer = ""
+        while True:
+            buffer += sock.recv(65536).decode("utf-8")
+            try:
+                decoder.raw_decode(buffer)
+                break
+            except json.JSONDecodeError:
+                continue
+        latencies.append(time.perf_counter() - started)
+        count += 1
+    sock.close()
+    result_queue.put((count, latencies))
+
+def run_once(workers, clients, duration, games):
+    """以指定工作行程數量測一次"""
+    work_dir = tempfile.mkdtemp(prefix="gamestore-lobby-bench-")
+    port = free_port()
+    seed(work_dir, games)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "server", "lobby_server.py"),
+         "127.0.0.1", str(port), "--workers", str(workers)],
+        cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        # 量測的是吞吐量上限，關閉每條連線的限流
+        env=dict(os.environ, GAMESTORE_RATE_LIMITS="off"))
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError("大廳伺服器未啟動")
+        time.sleep(0.5)
+        queue = multiprocessing.Queue()
+        start_at = time.time() + 0.5
+        procs = [multiprocessing.Process(target=client_loop, args=(port, duration, start_at, queue))
+                 for _ in range(clients)]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(count for count, _ in results)
+    latencies = sorted(l for _, ls in results for l in ls)
+    return {
+        "workers": workers,
+        "requests": total,
+        "requests_per_sec": round(total / duration, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="大廳多行程吞吐量測試")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--games", type=int, default=50, help="list_games 回傳的遊戲數")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for workers in args.workers:
+        result = run_once(workers, args.clients, args.duration, args.games)
+        print(f"[效能測試] {workers} 個工作行程: {result['requests_per_sec']} req/s", file=sys.stderr)
+        runs.append(result)
+
+    base = runs[0]["requests_per_sec"] / runs[0]["workers"] if runs and runs[0]["requests_per_sec"] else None
+    for run in runs:
+        run["scaling_efficiency"] = round(run["requests_per_sec"] / (base * run["workers"]), 3) if base else None
+
+    report = {
+        "benchmark": "lobby_workers",
+        "cpu_count": os.cpu_count(),
+        "clients": args.clients,
+        "duration_sec": args.duration,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+配對佇列模擬測試
+以模擬時鐘產生 Poisson 到達的排隊玩家（技術分常態分布、延遲均勻分布），
+每秒執行一次 tick，輸出不同到達率下的等待時間分布、房間人數與每次 tick 的實際耗時（JSON）
+
+用法:
+    python3 benchmarks/bench_matchmaking.py --rates 0.5 1 2 5 10 50 --duration 600
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "server"))
+from matchmaking import MatchmakingQueue
+
+GAMES = {
+    "TicTacToe": {"id": 1, "name": "TicTacToe", "min_players": 2, "max_players": 2},
+    "RockPaperScissors": {"id": 2, "name": "RockPaperScissors", "min_players": 2, "max_players": 10},
+}
+
+class SimClock:
+    """模擬時鐘"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+def simulate(game_info, rate, duration, tick, seed, skill_sd, fill_wait):
+    """模擬單一到達率，回傳統計"""
+    rng = random.Random(seed)
+    clock = SimClock()
+    queue = MatchmakingQueue(clock=clock, fill_wait=fill_wait)
+
+    waits = []
+    sizes = []
+    tick_times = []
+    next_arrival = rng.expovariate(rate)
+    next_player = 1
+
+    while clock.now < duration:
+        clock.now += tick
+        while next_arrival <= clock.now:
+            queue.enqueue({"id": next_player, "username": f"p{next_player}"}, game_info,
+                          skill=rng.gauss(1000, skill_sd), latency_ms=rng.uniform(10, 200))
+            next_player += 1
+            next_arrival += rng.expovariate(rate)
+
+        started = time.perf_counter()
+        matches = queue.tick()
+        tick_times.append(time.perf_counter() - started)
+        for _, tickets in matches:
+            sizes.append(len(tickets))
+            waits.extend(clock.now - t.enqueued_at for t in tickets)
+
+    waits.sort()
+    tick_times.sort()
+    return {
+        "arrival_rate": rate,
+        "arrivals": next_player - 1,
+        "matched": len(waits),
+        "still_queued": len(queue.tickets),
+        "rooms": len(sizes),
+        "avg_room_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+        "wait_mean_sec": round(sum(waits) / len(waits), 2) if waits else None,
+        "wait_p50_sec": round(percentile(waits, 0.50), 2) if waits else None,
+        "wait_p95_sec": round(percentile(waits, 0.95), 2) if waits else None,
+        "wait_max_sec": round(waits[-1], 2) if waits else None,
+        "tick_p50_ms": round(percentile(tick_times, 0.50) * 1000, 3),
+        "tick_p99_ms": round(percentile(tick_times, 0.99) * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="配對佇列模擬測試")
+    parser.add_argument("--game", choices=sorted(GAMES), default="RockPaperScissors")
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.5, 1, 2, 5, 10, 50],
+                        help="每秒到達的玩家數")
+    parser.add_argument("--duration", type=float, default=600.0, help="模擬時間（秒）")
+    parser.add_argument("--tick", type=float, default=1.0, help="配對間隔（秒）")
+    parser.add_argument("--skill-sd", type=float, default=200.0, help="技術分標準差")
+    parser.add_argument("--fill-wait", type=float, default=5.0, help="未滿房時的開房等待（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for rate in args.rates:
+        result = simulate(GAMES[args.game], rate, args.duration, args.tick,
+                          args.seed, args.skill_sd, args.fill_wait)
+        print(f"[效能測試] 到達率 {rate}/s: 平均等待 {result['wait_mean_sec']} 秒，"
+              f"平均房間人數 {result['avg_room_size']}", file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "matchmaking",
+        "game": args.game,
+        "duration_sec": args.duration,
+        "tick_sec": args.tick,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
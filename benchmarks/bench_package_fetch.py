@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+遊戲套件分段下載效能測試
+啟動大廳伺服器並建立一個大型遊戲，比較（JSON）：
+    - download_game：單一回應下載整個遊戲
+    - 分段下載（player/package_fetch.py）：1/2/4/8 條連線平行下載並驗證片段
+    - 接續下載：下載到一半中斷後重新下載，實際再傳輸的位元組數
+以及分段下載期間，同一個大廳上其他玩家 list_games 的延遲。
+本機測試沒有網路延遲，--rtt-ms 在每個請求前等待一段時間模擬來回延遲（平行連線可以重疊這段等待）
+
+用法:
+    python3 benchmarks/bench_package_fetch.py --files 16 --file-size 1048576 --connections 1 2 4 8 --rtt-ms 20
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_lobby_workers import ROOT, free_port, seed, wait_for_port
+from bench_admission import Connection
+sys.path.append(os.path.join(ROOT, "player"))
+from package_fetch import PackageDownloader, DownloadError
+
+def seed_package(work_dir, files, size, seed_value):
+    """建立 bench-game-0 的檔案（隨機文字，壓縮效果與一般原始碼相近）"""
+    rng = random.Random(seed_value)
+    words = ["def", "return", "self", "game", "player", "玩家", "房間", "import", "if", "else", "\n    "]
+    game_dir = os.path.join(work_dir, "uploaded_games", "bench-game-0", "1.0.0")
+    os.makedirs(game_dir)
+    for i in range(files):
+        text = []
+        length = 0
+        while length < size:
+            word = rng.choice(words) + " "
+            text.append(word)
+            length += len(word.encode("utf-8"))
+        with open(os.path.join(game_dir, f"module_{i}.py"), "w", encoding="utf-8") as f:
+            f.write("".join(text))
+
+def login(port, username):
+    conn = Connection(port)
+    conn.request({"type": "register", "username": username, "password": "bench"})
+    conn.request({"type": "login", "username": username, "password": "bench"})
+    return conn
+
+def probe_latency(port, stop, latencies):
+    """其他玩家在下載期間瀏覽遊戲的延遲"""
+    conn = Connection(port)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.request({"type": "list_games"})
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.01)
+
+def with_probe(port, func):
+    stop = threading.Event()
+    latencies = []
+    thread = threading.Thread(target=probe_latency, args=(port, stop, latencies))
+    thread.start()
+    try:
+        result = func()
+    finally:
+        stop.set()
+        thread.join()
+    latencies.sort()
+    p99 = round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None
+    return result, p99
+
+def fetch_package(port, conn, work_dir, connections, rtt, resume=False, fail_after=None):
+    manifest = conn.request({"type": "get_package_manifest", "game_id": 1, "resume": resume})
+    if not manifest.get("success"):
+        raise RuntimeError(manifest.get("message"))
+    part_path = os.path.join(work_dir, "download.part")
+    downloader = PackageDownloader("127.0.0.1", port, manifest["package"], manifest["token"],
+                                   part_path, connections)
+    fetch_piece = downloader.fetch_piece
+    def delayed(stream, index):
+        time.sleep(rtt)
+        return fetch_piece(stream, index)
+    downloader.fetch_piece = delayed
+    if fail_after is not None:
+        write_piece = downloader.write_piece
+        def interrupted(index, data):
+            if len(downloader.done) >= fail_after:
+                raise DownloadError("模擬中斷")
+            write_piece(index, data)
+        downloader.write_piece = interrupted
+    start = time.perf_counter()
+    try:
+        downloader.download()
+    except DownloadError:
+        return None, downloader
+    elapsed = time.perf_counter() - start
+    target = os.path.join(work_dir, "extracted")
+    shutil.rmtree(target, ignore_errors=True)
+    downloader.extract(target)
+    return elapsed, downloader
+
+def main():
+    parser = argparse.ArgumentParser(description="遊戲套件分段下載效能測試")
+    parser.add_argument("--files", type=int, default=16, help="遊戲檔案數")
+    parser.add_argument("--file-size", type=int, default=1024 * 1024, help="每個檔案的大小")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=1, help="大廳工作行程數")
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="模擬的網路來回延遲（毫秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="gamestore-package-bench-")
+    port = free_port()
+    seed(work_dir, 1)
+    seed_package(work_dir, args.files, args.file_size, args.seed)
+    env = dict(os.environ, GAMESTORE_RATE_LIMITS="off", GAMESTORE_MAX_DOWNLOADS="1000")
+    command = [sys.executable, os.path.join(ROOT, "server", "lobby_server.py"), "127.0.0.1", str(port)]
+    if args.workers > 1:
+        command += ["--workers", str(args.workers)]
+    server = subprocess.Popen(command, cwd=work_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError("大廳伺服器未啟動")
+        conn = login(port, "downloader")
+
+        rtt = args.rtt_ms / 1000
+
+        def legacy():
+            start = time.perf_counter()
+            time.sleep(rtt)
+            response = conn.request({"type": "download_game", "game_id": 1})
+            if not response.get("success"):
+                raise RuntimeError(response.get("message"))
+            return time.perf_counter() - start
+        legacy_time, legacy_p99 = with_probe(port, legacy)
+        size = args.files * args.file_size
+        print(f"[效能測試] download_game: {legacy_time:.3f} 秒", file=sys.stderr)
+
+        ranged = []
+        for connections in args.connections:
+            (elapsed, downloader), p99 = with_probe(
+                port, lambda: fetch_package(port, conn, work_dir, connections, rtt))
+            ranged.append({
+                "connections": connections,
+                "seconds": round(elapsed, 3),
+                "mb_per_sec": round(downloader.package["size"] / elapsed / 1e6, 2),
+                "pieces": len(downloader.package["pieces"]),
+                "browse_p99_ms": p99,
+            })
+            print(f"[效能測試] 分段下載 {connections} 條連線: {elapsed:.3f} 秒", file=sys.stderr)
+
+        # 下載一半後中斷，再接續下載
+        half = len(downloader.package["pieces"]) // 2
+        _, interrupted = fetch_package(port, conn, work_dir, 4, rtt, fail_after=half)
+        resumed_time, resumed = fetch_package(port, conn, work_dir, 4, rtt, resume=True)
+        resume = {
+            "interrupted_after_pieces": len(interrupted.done),
+            "first_attempt_bytes": interrupted.fetched_bytes,
+            "resumed_bytes": resumed.fetched_bytes,
+            "package_bytes": resumed.package["size"],
+            "resumed_seconds": round(resumed_time, 3),
+        }
+        print(f"[效能測試] 接續下載: 再傳輸 {resumed.fetched_bytes} / {resumed.package['size']} bytes",
+              file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "package_fetch",
+        "package_bytes": size,
+        "workers": args.workers,
+        "rtt_ms": args.rtt_ms,
+        "download_game": {
+            "seconds": round(legacy_time, 3),
+            "mb_per_sec": round(size / legacy_time / 1e6, 2),
+            "browse_p99_ms": legacy_p99,
+        },
+        "ranged": ranged,
+        "resume": resume,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+遊戲伺服器重播效能測試
+先由機器人玩家（固定亂數種子）各打一場井字遊戲、猜數字、石頭剪刀布並寫下對戰紀錄，
+再以 developer/replay_match.py 全速重播，輸出每場的重播時間、回應延遲並確認輸出與紀錄一致（JSON）
+
+也可直接重播既有的紀錄檔：
+    python3 benchmarks/bench_replay.py --repeat 5
+    python3 benchmarks/bench_replay.py --logs replays/*.replay
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "developer"))
+from replay_match import free_port, load_server_class, replay
+
+GAMES = os.path.join(ROOT, "developer", "games")
+
+def run_bot(port, name, strategy, join=False):
+    """連線到遊戲伺服器，收到訊息時呼叫 strategy(state, message) 取得要送出的訊息"""
+    sock = socket.create_connection(("127.0.0.1", port))
+    if join:
+        sock.sendall(json.dumps({"type": "join", "name": name}).encode())
+    decoder = json.JSONDecoder()
+    buffer = ""
+    state = {"rng": random.Random(name)}
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        buffer += data.decode()
+        while True:
+            buffer = buffer.lstrip()
+            try:
+                message, index = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            buffer = buffer[index:]
+            for reply in strategy(state, message):
+                sock.sendall(json.dumps(reply).encode())
+    sock.close()
+
+def tictactoe_bot(state, message):
+    if message["type"] == "connected":
+        state["id"] = message["player_id"]
+    elif message["type"] == "board_update" and message["current_player"] == state["id"]:
+        size = message["size"]
+        empty = [i for i, cell in enumerate(message["cells"]) if cell == "."]
+        cell = state["rng"].choice(empty)
+        return [{"type": "move", "row": cell // size, "col": cell % size}]
+    return []
+
+def number_guess_bot(state, message):
+    if message["type"] == "set_number":
+        state["low"], state["high"] = 1, 100
+        return [{"type": "number_set", "number": state["rng"].randint(1, 100)}]
+    if message["type"] == "hint":
+        if message["hint"] == "too_low":
+            state["low"] = state["guess"] + 1
+        else:
+            state["high"] = state["guess"] - 1
+    elif message["type"] == "your_turn":
+        state["guess"] = (state["low"] + state["high"]) // 2
+        return [{"type": "guess", "number": state["guess"]}]
+    return []
+
+def rps_bot(state, message):
+    if message["type"] == "new_round":
+        return [{"type": "choice", "choice": state["rng"].choice(("rock", "paper", "scissors")),
+                 "round": message["round"]}]
+    if message["type"] == "round_result":
+        return [{"type": "ready"}]
+    return []
+
+MATCHES = (
+    ("tictactoe", "TicTacToeServer", tictactoe_bot, 2, False),
+    ("number_guess", "NumberGuessServer", number_guess_bot, 2, False),
+    ("rock_paper_scissors", "RockPaperScissorsServer", rps_bot, 4, True),
+)
+
+def record_matches(replay_dir, players_rps, seed):
+    """以機器人各打一場並寫下對戰紀錄，回傳紀錄檔路徑"""
+    paths = []
+    for game, class_name, strategy, players, join in MATCHES:
+        if join:
+            players = players_rps
+        server = load_server_class(os.path.join(GAMES, game), class_name)(free_port())
+        server.host = "127.0.0.1"
+        server.min_players = server.max_players = players
+        server.start_delay = 0
+        server.replay_dir = replay_dir
+        server.listen()
+        path = server.replay.path
+        server_thread = threading.Thread(target=server.run)
+        server_thread.start()
+        bots = [threading.Thread(target=run_bot, args=(server.port, f"{game}-{seed}-{i}", strategy, join))
+                for i in range(players)]
+        for thread in bots:
+            thread.start()
+        for thread in bots:
+            thread.join()
+        server_thread.join()
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="遊戲伺服器重播效能測試")
+    parser.add_argument("--logs", nargs="+", help="重播既有的紀錄檔（預設由機器人產生）")
+    parser.add_argument("--rps-players", type=int, default=4, help="石頭剪刀布的機器人人數")
+    parser.add_argument("--repeat", type=int, default=3, help="每個紀錄重播次數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as replay_dir:
+        # 遊戲伺服器的輸出導向 stderr，stdout 只輸出 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            paths = args.logs or record_matches(replay_dir, args.rps_players, args.seed)
+        for path in paths:
+            for _ in range(args.repeat):
+                with contextlib.redirect_stdout(sys.stderr):
+                    result = replay(path)
+                latency = result["response_latency_ms"] or {}
+                print(f"[效能測試] {result['server']}: {result['inputs']} 筆輸入，"
+                      f"重播 {result['replay_duration_sec']} 秒，回應延遲平均 {latency.get('mean')} ms，"
+                      f"{'輸出一致' if result['identical'] else '輸出不一致'}", file=sys.stderr)
+                result["log"] = os.path.basename(path)
+                runs.append(result)
+
+    report = {
+        "benchmark": "replay",
+        "repeat": args.repeat,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if not all(run["identical"] for run in runs):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
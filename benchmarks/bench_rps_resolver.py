@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+石頭剪刀布批次結算效能測試
+隨機產生大量回合（每回合 3-10 位玩家），比較舊版逐回合計數的 determine_winners、
+rps_resolver.determine_winners 與 rps_resolver.score_batch 的每秒結算回合數，
+並確認各版本的贏家與分數完全相同（JSON）
+
+用法:
+    python3 benchmarks/bench_rps_resolver.py --rounds 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "developer", "games", "rock_paper_scissors"))
+import rps_resolver
+
+CHOICES = ("rock", "paper", "scissors")
+
+def reference_winners(choices):
+    """舊版做法：三次計數後再以串列推導式找出贏家"""
+    rock_count = sum(1 for c in choices.values() if c == "rock")
+    paper_count = sum(1 for c in choices.values() if c == "paper")
+    scissors_count = sum(1 for c in choices.values() if c == "scissors")
+
+    choices_types = (rock_count > 0) + (paper_count > 0) + (scissors_count > 0)
+    if choices_types != 2:
+        return []
+
+    winners = []
+    if rock_count > 0 and scissors_count > 0 and paper_count == 0:
+        winners = [pid for pid, choice in choices.items() if choice == "rock"]
+    elif paper_count > 0 and rock_count > 0 and scissors_count == 0:
+        winners = [pid for pid, choice in choices.items() if choice == "paper"]
+    elif scissors_count > 0 and paper_count > 0 and rock_count == 0:
+        winners = [pid for pid, choice in choices.items() if choice == "scissors"]
+    return winners
+
+def make_rounds(count, seed, invalid_rate=0.0):
+    """產生 count 個回合；玩家以 (對戰編號, 座位) 表示"""
+    rng = random.Random(seed)
+    rounds = []
+    for match in range(count):
+        players = rng.randint(3, 10)
+        rounds.append({
+            (match, seat): "lizard" if rng.random() < invalid_rate else rng.choice(CHOICES)
+            for seat in range(players)
+        })
+    return rounds
+
+def check_equivalence(seed):
+    """涵蓋無效選擇與空回合的一致性檢查"""
+    rounds = make_rounds(5000, seed, invalid_rate=0.1) + [{}]
+    expected = [reference_winners(choices) for choices in rounds]
+    backends = [False] + ([True] if rps_resolver.numpy is not None else [])
+    for use_numpy in backends:
+        if rps_resolver.resolve_batch(rounds, use_numpy=use_numpy) != expected:
+            raise SystemExit(f"[效能測試] 批次結算結果與舊版不一致 (numpy={use_numpy})")
+    if [rps_resolver.determine_winners(choices) for choices in rounds] != expected:
+        raise SystemExit("[效能測試] determine_winners 結果與舊版不一致")
+    return len(rounds)
+
+def timed(func, repeat=3):
+    """取多次執行中最快的一次，降低 GC 與排程的干擾"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def run_once(count, seed):
+    rounds = make_rounds(count, seed)
+
+    def reference():
+        scores = {}
+        for choices in rounds:
+            for winner in reference_winners(choices):
+                scores[winner] = scores.get(winner, 0) + 1
+        return scores
+
+    def single():
+        scores = {}
+        for choices in rounds:
+            for winner in rps_resolver.determine_winners(choices):
+                scores[winner] = scores.get(winner, 0) + 1
+        return scores
+
+    def batch(use_numpy):
+        return rps_resolver.score_batch(rounds, {}, use_numpy=use_numpy)
+
+    expected, reference_time = timed(reference)
+    scores, single_time = timed(single)
+    if scores != expected:
+        raise SystemExit("[效能測試] determine_winners 的分數與舊版不一致")
+    result = {
+        "rounds": count,
+        "choices": sum(len(choices) for choices in rounds),
+        "reference_rounds_per_sec": round(count / reference_time),
+        "single_rounds_per_sec": round(count / single_time),
+    }
+
+    codes, _, offsets = rps_resolver.encode_rounds(rounds)
+    backends = [("stdlib", False)] + ([("numpy", True)] if rps_resolver.numpy is not None else [])
+    for name, use_numpy in backends:
+        scores, elapsed = timed(lambda: batch(use_numpy))
+        if scores != expected:
+            raise SystemExit(f"[效能測試] {name} 批次結算的分數與舊版不一致")
+        # 已編碼的緩衝區只計算贏家旗標（同時代管多場對戰時直接保存編碼後的選擇）
+        _, kernel = timed(lambda: rps_resolver.winner_flags(codes, offsets, use_numpy))
+        result[f"{name}_batch_rounds_per_sec"] = round(count / elapsed)
+        result[f"{name}_encoded_rounds_per_sec"] = round(count / kernel)
+        result[f"{name}_speedup"] = round(reference_time / elapsed, 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="石頭剪刀布批次結算效能測試")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    checked = check_equivalence(args.seed)
+    print(f"[效能測試] 一致性檢查通過（{checked} 個回合）", file=sys.stderr)
+
+    runs = []
+    for count in args.rounds:
+        result = run_once(count, args.seed)
+        print(f"[效能測試] {count} 回合: 舊版 {result['reference_rounds_per_sec']} 回合/秒，"
+              f"單回合 {result['single_rounds_per_sec']} 回合/秒，"
+              f"批次 {result['stdlib_batch_rounds_per_sec']} 回合/秒 ({result['stdlib_speedup']}x)，"
+              f"已編碼 {result['stdlib_encoded_rounds_per_sec']} 回合/秒", file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "rps_resolver",
+        "numpy": rps_resolver.numpy is not None,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+石頭剪刀布回合延遲測試
+在同一個行程中啟動 RockPaperScissorsServer，由多個機器人玩家以隨機的思考時間出拳，
+比較實測回合時間（new_round 到 round_result）與所有玩家思考時間的最大值、總和（JSON）
+
+用法:
+    python3 benchmarks/bench_rps_rounds.py --players 3 5 10 --rounds 5 --max-delay 0.3
+    python3 benchmarks/bench_rps_rounds.py --players 10 --stall 1 --deadline 1
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "developer", "games", "rock_paper_scissors"))
+from game_server import RockPaperScissorsServer
+
+CHOICES = ("rock", "paper", "scissors")
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bot(port, name, delays, stalled, records):
+    """機器人玩家：每回合等待指定的思考時間後出拳"""
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(json.dumps({"type": "join", "name": name}).encode())
+    decoder = json.JSONDecoder()
+    buffer = ""
+    round_started = {}
+    rng = random.Random(name)
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        buffer += data.decode()
+        while True:
+            buffer = buffer.lstrip()
+            try:
+                message, index = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            buffer = buffer[index:]
+            if message["type"] == "new_round":
+                round_num = message["round"]
+                round_started[round_num] = time.perf_counter()
+                if not stalled:
+                    timer = threading.Timer(delays[round_num - 1], sock.sendall, args=(json.dumps({
+                        "type": "choice", "choice": rng.choice(CHOICES), "round": round_num
+                    }).encode(),))
+                    timer.daemon = True
+                    timer.start()
+            elif message["type"] == "round_result":
+                round_num = message["round"]
+                records.append((name, round_num, time.perf_counter() - round_started[round_num]))
+                if not stalled:
+                    sock.sendall(json.dumps({"type": "ready"}).encode())
+            elif message["type"] == "game_over":
+                sock.close()
+                return
+    sock.close()
+
+def run_once(players, rounds, max_delay, stall, deadline, seed):
+    """以指定人數進行一場遊戲並回傳統計"""
+    rng = random.Random(seed)
+    # delays[玩家][回合]
+    delays = [[rng.uniform(0, max_delay) for _ in range(rounds)] for _ in range(players)]
+    stalled = set(range(players - stall, players))
+
+    port = free_port()
+    config = {"total_rounds": rounds, "round_timeout": deadline, "result_timeout": 5, "start_delay": 0}
+    server = RockPaperScissorsServer(port, max_players=players, min_players=players, config=config)
+    server_thread = threading.Thread(target=server.start)
+    server_thread.daemon = True
+    server_thread.start()
+    time.sleep(0.2)
+
+    records = []
+    bots = [threading.Thread(target=bot, args=(port, f"bot{i}", delays[i], i in stalled, records))
+            for i in range(players)]
+    for thread in bots:
+        thread.start()
+    for thread in bots:
+        thread.join()
+    server_thread.join(timeout=10)
+
+    measured = []
+    expected_max = []
+    expected_sum = []
+    for round_num in range(1, rounds + 1):
+        latencies = [latency for _, r, latency in records if r == round_num]
+        if not latencies:
+            continue
+        measured.append(sum(latencies) / len(latencies))
+        think = [delays[i][round_num - 1] for i in range(players) if i not in stalled]
+        bound = deadline if stalled else max(think)
+        expected_max.append(bound)
+        expected_sum.append(sum(think) + deadline * len(stalled))
+
+    def mean_ms(values):
+        return round(sum(values) / len(values) * 1000, 2) if values else None
+
+    return {
+        "players": players,
+        "stalled_players": stall,
+        "rounds": len(measured),
+        "round_latency_ms": mean_ms(measured),
+        "max_think_time_ms": mean_ms(expected_max),
+        "sum_think_time_ms": mean_ms(expected_sum),
+        "overhead_ms": mean_ms([m - e for m, e in zip(measured, expected_max)]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="石頭剪刀布回合延遲測試")
+    parser.add_argument("--players", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-delay", type=float, default=0.3, help="機器人思考時間上限（秒）")
+    parser.add_argument("--stall", type=int, default=0, help="不出拳的玩家數")
+    parser.add_argument("--deadline", type=float, default=2.0, help="每回合出拳時限（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for players in args.players:
+        # 遊戲伺服器的輸出導向 stderr，stdout 只輸出 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_once(players, args.rounds, args.max_delay, min(args.stall, players - 1),
+                              args.deadline, args.seed)
+        print(f"[效能測試] {players} 位玩家: 回合 {result['round_latency_ms']} ms，"
+              f"思考時間最大值 {result['max_think_time_ms']} ms，總和 {result['sum_think_time_ms']} ms",
+              file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "rps_rounds",
+        "max_delay_sec": args.max_delay,
+        "deadline_sec": args.deadline,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+觀戰轉播效能測試
+在獨立行程中啟動 server/spectator_relay.py 的轉播站，以一條發布連線依固定頻率送出狀態更新，
+分別讓 1、100、1000 位觀眾觀看（其中一部分為從不讀取的慢速觀眾），輸出（JSON）：
+    - 發布端每則更新的送出成本（與觀眾人數無關）
+    - 正常觀眾收到更新的延遲 p50 / p99
+    - 慢速觀眾被合併略過的更新數，以及最後是否仍收到最新狀態
+慢速觀眾從不讀取，每輪送給一位觀眾的資料量至少為 MAX_PENDING 的 COALESCE_FACTOR 倍
+（超過轉播站的緩衝與兩端的核心緩衝），慢速觀眾沒有觸發合併或最後沒有收到最新狀態時視為失敗
+
+用法:
+    python3 benchmarks/bench_spectators.py --viewers 1 100 1000
+    python3 benchmarks/bench_spectators.py --viewers 500 --slow 0.2 --rate 100 --updates 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "server"))
+from spectator_relay import MAX_PENDING, SpectatorRelay
+
+# 每輪送給一位觀眾的資料量至少為 MAX_PENDING 的幾倍（未指定 --size 時依此決定每則更新的大小）
+COALESCE_FACTOR = 16
+# 慢速觀眾的接收緩衝（核心會調整為允許的最小值）
+SLOW_RCVBUF = 4096
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+class Viewers:
+    """以單一 selector 讀取所有正常觀眾，記錄每則更新的收到時間"""
+
+    def __init__(self, port, room_id, token, count, slow):
+        self.selector = selectors.DefaultSelector()
+        self.latencies = []
+        self.received = 0
+        self.ended = 0
+        self.slow = []
+        self.slow_rcvbuf = None  # 核心實際使用的慢速觀眾接收緩衝
+        self.buffers = {}
+        for i in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if i < slow:
+                # 慢速觀眾：接收緩衝盡量小且從不讀取，直到發布結束
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_RCVBUF)
+                self.slow_rcvbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            sock.connect(("127.0.0.1", port))
+            sock.sendall(json.dumps({"type": "watch", "room_id": room_id, "token": token}).encode() + b"\n")
+            if i < slow:
+                self.slow.append(sock)
+                continue
+            sock.setblocking(False)
+            self.buffers[sock] = b""
+            self.selector.register(sock, selectors.EVENT_READ)
+
+    def run(self):
+        """讀取到所有正常觀眾都收到 spectate_end 並斷線為止"""
+        while self.buffers:
+            for key, _ in self.selector.select(timeout=1):
+                sock = key.fileobj
+                try:
+                    data = sock.recv(65536)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b""
+                now = time.monotonic()
+                if not data:
+                    self.selector.unregister(sock)
+                    sock.close()
+                    del self.buffers[sock]
+                    continue
+                *lines, self.buffers[sock] = (self.buffers[sock] + data).split(b"\n")
+                for line in lines:
+                    message = json.loads(line)
+                    if message["type"] == "state":
+                        self.latencies.append(now - message["sent"])
+                        self.received += 1
+                    elif message["type"] == "spectate_end":
+                        self.ended += 1
+
+    def drain_slow(self, updates):
+        """讀完慢速觀眾的資料，回傳 (每位收到的更新數, 最後收到最新狀態的人數)"""
+        counts = []
+        final = 0
+        for sock in self.slow:
+            buffer = bytearray()
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+            sock.close()
+            seqs = [message["seq"] for message in map(json.loads, bytes(buffer).split(b"\n")[:-1])
+                    if message["type"] == "state"]
+            counts.append(len(seqs))
+            final += bool(seqs) and seqs[-1] == updates - 1
+        return counts, final
+
+def relay_process(port, pipe):
+    """轉播站在獨立行程執行，避免與發布端、觀眾共用 GIL"""
+    # 轉播站的輸出導向 stderr，stdout 只輸出 JSON
+    sys.stdout = sys.stderr
+    relay = SpectatorRelay("127.0.0.1", port)
+    relay.start()
+    pipe.send(relay.register_room("bench", "bench"))
+    while pipe.recv() == "stats":
+        pipe.send(relay.stats())
+
+def viewers_process(port, token, count, slow, updates, pipe):
+    group = Viewers(port, "bench", token, count, slow)
+    pipe.send("ready")
+    group.run()
+    counts, final = group.drain_slow(updates)
+    pipe.send({
+        "latencies": group.latencies,
+        "received": group.received,
+        "ended": group.ended,
+        "slow_counts": counts,
+        "slow_final": final,
+        "slow_rcvbuf": group.slow_rcvbuf,
+    })
+
+def run_once(viewers, slow_ratio, updates, rate, size):
+    port = free_port()
+    relay_pipe, child = multiprocessing.Pipe()
+    relay = multiprocessing.Process(target=relay_process, args=(port, child))
+    relay.start()
+    publish_token, watch_token = relay_pipe.recv()
+
+    slow = int(viewers * slow_ratio)
+    viewer_pipe, child = multiprocessing.Pipe()
+    viewer = multiprocessing.Process(target=viewers_process, args=(port, watch_token, viewers, slow, updates, child))
+    viewer.start()
+    viewer_pipe.recv()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        relay_pipe.send("stats")
+        if relay_pipe.recv()["viewers"] >= viewers:
+            break
+        time.sleep(0.01)
+
+    # 發布端與遊戲伺服器的 SpectatorFeed 相同：非阻塞連線，每則更新只送出一次
+    publisher = socket.create_connection(("127.0.0.1", port))
+    publisher.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    publisher.sendall(json.dumps({"type": "publish", "room_id": "bench", "token": publish_token}).encode() + b"\n")
+    publisher.setblocking(False)
+    padding = "x" * size
+    pending = bytearray()
+    publish_cost = []
+    started = time.monotonic()
+    for seq in range(updates):
+        delay = started + seq / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        begin = time.monotonic()
+        pending += json.dumps({"type": "state", "seq": seq, "sent": begin, "pad": padding}).encode() + b"\n"
+        try:
+            del pending[:publisher.send(pending)]
+        except BlockingIOError:
+            pass
+        publish_cost.append(time.monotonic() - begin)
+    publisher.setblocking(True)
+    publisher.sendall(pending)
+    publisher.close()
+    elapsed = time.monotonic() - started
+
+    result = viewer_pipe.recv()
+    viewer.join()
+    relay_pipe.send("stats")
+    stats = relay_pipe.recv()
+    relay_pipe.send("stop")
+    relay.join()
+
+    normal = viewers - slow
+    latencies = sorted(result["latencies"])
+    counts = result["slow_counts"]
+    publish_cost.sort()
+    return {
+        "viewers": viewers,
+        "slow_viewers": slow,
+        "updates": updates,
+        "update_bytes": len(json.dumps({"type": "state", "seq": 0, "sent": 0.0, "pad": padding})) + 1,
+        "publish_duration_sec": round(elapsed, 3),
+        "publish_cost_us": {
+            "mean": round(sum(publish_cost) / len(publish_cost) * 1e6, 2),
+            "p99": round(percentile(publish_cost, 0.99) * 1e6, 2),
+        },
+        "fanout_latency_ms": {
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        } if latencies else None,
+        "delivered_ratio": round(result["received"] / (normal * updates), 4) if normal else None,
+        "ended_viewers": result["ended"],
+        "bytes_per_viewer": updates * (len(json.dumps({"type": "state", "seq": 0, "sent": 0.0, "pad": padding})) + 1),
+        "slow_rcvbuf": result["slow_rcvbuf"],
+        "slow_updates_received": {"min": min(counts), "max": max(counts)} if counts else None,
+        "slow_final_state": result["slow_final"],
+        "coalesced": stats["coalesced"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="觀戰轉播效能測試")
+    parser.add_argument("--viewers", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--slow", type=float, default=0.1, help="慢速觀眾比例")
+    parser.add_argument("--updates", type=int, default=250, help="每輪發布的更新數")
+    parser.add_argument("--rate", type=float, default=50, help="每秒發布的更新數")
+    parser.add_argument("--size", type=int,
+                        help=f"每則更新的填充位元組數（預設讓每輪的資料量為 MAX_PENDING 的 {COALESCE_FACTOR} 倍）")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    size = args.size or max(2000, COALESCE_FACTOR * MAX_PENDING // args.updates)
+    runs = []
+    for viewers in args.viewers:
+        result = run_once(viewers, args.slow, args.updates, args.rate, size)
+        latency = result["fanout_latency_ms"] or {}
+        print(f"[效能測試] {viewers} 位觀眾（慢速 {result['slow_viewers']}）: "
+              f"發布成本平均 {result['publish_cost_us']['mean']} us，"
+              f"延遲 p50 {latency.get('p50')} ms / p99 {latency.get('p99')} ms，"
+              f"合併 {result['coalesced']} 則，慢速觀眾最後收到最新狀態 "
+              f"{result['slow_final_state']}/{result['slow_viewers']}", file=sys.stderr)
+        if result["slow_viewers"]:
+            if not result["coalesced"]:
+                raise AssertionError(f"{viewers} 位觀眾: 慢速觀眾沒有觸發合併（每位 {result['bytes_per_viewer']} bytes，"
+                                     f"接收緩衝 {result['slow_rcvbuf']} bytes），請加大 --size 或 --updates")
+            if result["slow_final_state"] != result["slow_viewers"]:
+                raise AssertionError(f"{viewers} 位觀眾: 只有 {result['slow_final_state']} 位慢速觀眾收到最新狀態")
+        runs.append(result)
+
+    report = {
+        "benchmark": "spectators",
+        "max_pending_bytes": MAX_PENDING,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
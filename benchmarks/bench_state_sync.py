@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+遊戲狀態差異同步效能測試
+先由 bench_replay 的機器人各打一場內建遊戲並寫下對戰紀錄，取出伺服器送給第一位玩家的狀態訊息
+（井字遊戲的 board_update、石頭剪刀布的 new_round / round_result），
+再依各遊戲 broadcast_state 的狀態以 state_sync.py 同步（客戶端每次都確認），比較每次狀態更新的（JSON）：
+    - 完整訊息的位元組數（JSON 與 game_codec 二進位）
+    - 差異同步後的位元組數（JSON 與二進位，含 keyframe；內建遊戲的客戶端使用二進位），以及客戶端送回的確認；
+      與 broadcast_state 相同，狀態太小（空的差異加上其他欄位與確認就不比完整訊息小）時不同步、直接送完整訊息，
+      差異加上確認不比完整訊息小時也改送完整訊息（都不需確認），並分別記錄次數
+    - 單則 state_delta 的二進位位元組數
+    - 伺服器計算差異的時間
+人數多的石頭剪刀布每回合三種都會出現、分數不變，另以 --rps-sim-players 人隨機出拳模擬分數會改變的對戰；
+並以隨機落子模擬 --board-size 的大棋盤井字遊戲，觀察狀態越大差異同步省下越多
+
+用法:
+    python3 benchmarks/bench_state_sync.py --rps-players 10 --board-size 15
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_replay import GAMES, MATCHES, record_matches
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "developer", "template"))
+from game_runtime import read_replay, REPLAY_SEND
+from game_codec import load_codec
+from state_sync import STATE_MESSAGES as SYNC_MESSAGES, StateSync, StateView
+sys.path.append(os.path.join(GAMES, "rock_paper_scissors"))
+import rps_resolver
+
+def board_state(message):
+    return {"cells": list(message["cells"]), "size": message["size"], "current_player": message["current_player"]}, None
+
+def score_state(message):
+    scores = message["scores"]
+    state = {"names": [entry["name"] for entry in scores], "scores": [entry["score"] for entry in scores]}
+    return state, ("scores",)
+
+# 各遊戲以 broadcast_state 送出的訊息 -> (狀態, replaces)
+STATE_MESSAGES = {
+    "board_update": board_state,
+    "new_round": score_state,
+    "round_result": score_state,
+}
+
+def first_player_messages(path):
+    """對戰紀錄中伺服器送給第一位玩家的訊息"""
+    sent = [(index, payload) for _, kind, index, payload in read_replay(path) if kind == REPLAY_SEND]
+    first = min(index for index, _ in sent)
+    return [json.loads(payload) for index, payload in sent if index == first]
+
+def simulate(messages, codec, binary):
+    """一位同步的客戶端（JSON 或二進位）收到的位元組數
+
+    狀態太小或差異加上確認不比完整訊息小時，與 broadcast_state 相同改送完整訊息
+    """
+    def encode(message):
+        data = codec.encode(message) if binary and codec else None
+        if data is None:
+            # 與 EventGameServer.encode 相同，狀態訊息以不含空白的 JSON 送出
+            separators = (",", ":") if message["type"] in SYNC_MESSAGES else None
+            data = json.dumps(message, separators=separators).encode("utf-8")
+        return data
+
+    sync = StateSync()
+    view = StateView()
+    totals = {"bytes": 0, "ack_bytes": 0, "keyframes": 0, "deltas": 0, "delta_bytes": 0,
+              "fallbacks": 0, "unsynced": 0}
+    elapsed = 0.0
+    for message in messages:
+        build = STATE_MESSAGES.get(message["type"])
+        if not build:
+            continue
+        state, replaces = build(message)
+        start = time.perf_counter()
+        sync.update(state)
+        update = sync.message_for(view.version)
+        elapsed += time.perf_counter() - start
+
+        rest = None
+        if replaces is not None:
+            rest = {key: value for key, value in message.items() if key not in replaces}
+            if len(rest) <= 1:
+                rest = None
+        full = encode(message)
+        ack_size = len(json.dumps({"type": "ack", "version": sync.version}))
+        empty = {"type": "state_delta", "version": sync.version, "behind": 1, "slots": [], "values": []}
+        if len(encode(empty)) + (len(encode(rest)) if rest else 0) + ack_size >= len(full):
+            totals["bytes"] += len(full)
+            totals["unsynced"] += 1
+            continue
+        sent = [encode(update)] if update else []
+        if rest:
+            sent.append(encode(rest))
+        if update and update["type"] == "state_delta" and sum(map(len, sent)) + ack_size >= len(full):
+            sent = [full]
+            totals["fallbacks"] += 1
+            update = None
+        totals["bytes"] += sum(map(len, sent))
+        if update:
+            if update["type"] == "state_keyframe":
+                totals["keyframes"] += 1
+            else:
+                totals["deltas"] += 1
+                totals["delta_bytes"] += len(encode(update))
+            reply = view.apply(update)
+            if view.state != sync.fields:
+                raise AssertionError("同步後的狀態不一致")
+            totals["ack_bytes"] += len(json.dumps(reply).encode("utf-8"))
+    return totals, elapsed
+
+def measure(name, messages, codec):
+    updates = sum(1 for message in messages if message["type"] in STATE_MESSAGES)
+    full_json = sum(len(json.dumps(message).encode("utf-8")) for message in messages
+                    if message["type"] in STATE_MESSAGES)
+    full_binary = sum(len((codec.encode(message) if codec else None) or json.dumps(message).encode("utf-8"))
+                      for message in messages if message["type"] in STATE_MESSAGES)
+    json_totals, _ = simulate(messages, codec, binary=False)
+    binary_totals, elapsed = simulate(messages, codec, binary=True)
+    return {
+        "game": name,
+        "state_updates": updates,
+        "full_json_bytes": round(full_json / updates, 1),
+        "full_binary_bytes": round(full_binary / updates, 1),
+        "sync_json_bytes": round(json_totals["bytes"] / updates, 1),
+        "sync_binary_bytes": round(binary_totals["bytes"] / updates, 1),
+        "ack_json_bytes": round(json_totals["ack_bytes"] / updates, 1),
+        "ack_binary_bytes": round(binary_totals["ack_bytes"] / updates, 1),
+        "json_unsynced": json_totals["unsynced"],
+        "binary_unsynced": binary_totals["unsynced"],
+        "json_fallbacks": json_totals["fallbacks"],
+        "binary_fallbacks": binary_totals["fallbacks"],
+        "keyframes": binary_totals["keyframes"],
+        "delta_binary_bytes": round(binary_totals["delta_bytes"] / binary_totals["deltas"], 1)
+                              if binary_totals["deltas"] else None,
+        # 與同一種編碼的完整訊息相比（含確認），不大於 1 表示差異同步沒有多送
+        "json_bytes_ratio": round((json_totals["bytes"] + json_totals["ack_bytes"]) / full_json, 3),
+        "binary_bytes_ratio": round((binary_totals["bytes"] + binary_totals["ack_bytes"]) / full_binary, 3),
+        "diff_us": round(elapsed / updates * 1e6, 3),
+    }
+
+def random_rps_messages(players, rounds, seed):
+    """以 rps_resolver 結算隨機出拳的回合，分數會改變（人數多時三種都出現，多半平手、分數不變）"""
+    rng = random.Random(seed)
+    names = [f"player-{i}" for i in range(players)]
+    scores = [0] * players
+    messages = []
+    for round_num in range(1, rounds + 1):
+        table = [{"name": name, "score": score} for name, score in zip(names, scores)]
+        messages.append({"type": "new_round", "round": round_num, "total_rounds": rounds,
+                         "deadline": 30.0, "scores": table})
+        choices = {i: rng.choice(rps_resolver.NAMES) for i in range(players)}
+        winners = sorted(rps_resolver.determine_winners(choices))
+        for winner in winners:
+            scores[winner] += 1
+        messages.append({"type": "round_result", "round": round_num,
+                         "choices": {names[i]: choice for i, choice in choices.items()},
+                         "winners": [names[i] for i in winners], "defaulted": [],
+                         "scores": [{"name": name, "score": score} for name, score in zip(names, scores)]})
+    return messages
+
+def random_board_messages(size, seed):
+    """大棋盤隨機落子直到填滿，每步一則 board_update"""
+    rng = random.Random(seed)
+    cells = ["."] * (size * size)
+    order = list(range(size * size))
+    rng.shuffle(order)
+    messages = []
+    for turn, cell in enumerate(order):
+        messages.append({"type": "board_update", "cells": "".join(cells), "size": size, "current_player": turn % 2})
+        cells[cell] = "XO"[turn % 2]
+    return messages
+
+def main():
+    parser = argparse.ArgumentParser(description="遊戲狀態差異同步效能測試")
+    parser.add_argument("--rps-players", type=int, default=10, help="石頭剪刀布的機器人人數")
+    parser.add_argument("--board-size", type=int, default=15, help="模擬的大棋盤邊長")
+    parser.add_argument("--rps-sim-players", type=int, default=3, help="模擬石頭剪刀布（分數會改變）的人數")
+    parser.add_argument("--rps-rounds", type=int, default=30, help="模擬石頭剪刀布的回合數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    games = []
+    with tempfile.TemporaryDirectory(prefix="gamestore-sync-bench-") as replay_dir:
+        with contextlib.redirect_stdout(sys.stderr):
+            paths = record_matches(replay_dir, args.rps_players, args.seed)
+        for (game, *_), path in zip(MATCHES, paths):
+            messages = first_player_messages(path)
+            if any(message["type"] in STATE_MESSAGES for message in messages):
+                games.append(measure(game, messages, load_codec(os.path.join(GAMES, game))))
+    games.append(measure(f"rock_paper_scissors_{args.rps_sim_players}p_simulated",
+                         random_rps_messages(args.rps_sim_players, args.rps_rounds, args.seed),
+                         load_codec(os.path.join(GAMES, "rock_paper_scissors"))))
+    board = f"tictactoe_{args.board_size}x{args.board_size}"
+    games.append(measure(board, random_board_messages(args.board_size, args.seed),
+                         load_codec(os.path.join(GAMES, "tictactoe"))))
+    for result in games:
+        print(f"[效能測試] {result['game']}: JSON {result['full_json_bytes']} -> {result['sync_json_bytes']} "
+              f"+ 確認 {result['ack_json_bytes']}，二進位 {result['full_binary_bytes']} -> "
+              f"{result['sync_binary_bytes']} + 確認 {result['ack_binary_bytes']} bytes/狀態更新，"
+              f"state_delta {result['delta_binary_bytes']} bytes，"
+              f"狀態太小不同步 {result['json_unsynced']} (JSON) / {result['binary_unsynced']} (二進位) 次，"
+              f"改送完整訊息 {result['json_fallbacks']} (JSON) / {result['binary_fallbacks']} (二進位) 次，"
+              f"差異計算 {result['diff_us']} µs", file=sys.stderr)
+
+    report = {
+        "benchmark": "state_sync",
+        "rps_players": args.rps_players,
+        "board_size": args.board_size,
+        "games": games,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
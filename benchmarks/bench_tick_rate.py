@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+即時遊戲 tick 排程效能測試
+以拔河（developer/games/tug_of_war，TickGameServer）在本機啟動伺服器，
+由另一個行程的機器人玩家持續送出輸入（每位玩家每秒 --input-rate 次，標記為最後收到的 tick + 1），
+依序測試每個 --tick-rates，輸出（JSON）：
+    - 實際維持的 ticks/秒與目標頻率
+    - 每個 tick 開始時間相對排定時間的延遲（p50 / p99 / 最大）與 on_tick 執行時間
+    - overrun、跳過的 tick、晚到與丟棄的輸入數
+--work-us 在每個 tick 額外執行一段固定的運算，模擬較重的遊戲邏輯
+
+用法:
+    python3 benchmarks/bench_tick_rate.py --players 10 --tick-rates 20 60 120 --duration 5
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from bench_replay import GAMES
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "developer"))
+from replay_match import free_port, load_server_class
+
+def drive_bots(port, players, input_rate, seed):
+    """機器人玩家：遊戲開始後每位玩家每秒送出 input_rate 次拉動，直到伺服器關閉連線"""
+    rng = random.Random(seed)
+    selector = selectors.DefaultSelector()
+    bots = []
+    for i in range(players):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(json.dumps({"type": "join", "name": f"bot-{i}"}).encode())
+        sock.setblocking(False)
+        bot = {"sock": sock, "buffer": "", "tick": None, "next": 0.0}
+        selector.register(sock, selectors.EVENT_READ, bot)
+        bots.append(bot)
+    decoder = json.JSONDecoder()
+    interval = 1.0 / input_rate
+    while bots:
+        now = time.monotonic()
+        for bot in bots:
+            if bot["tick"] is not None and bot["next"] <= now:
+                try:
+                    bot["sock"].sendall(json.dumps({"type": "input", "tick": bot["tick"] + 1,
+                                                    "action": "pull"}).encode())
+                except OSError:
+                    pass
+                bot["next"] += interval
+        waiting = [bot["next"] for bot in bots if bot["tick"] is not None]
+        timeout = max(0.0, min(waiting) - time.monotonic()) if waiting else None
+        for key, _ in selector.select(timeout):
+            bot = key.data
+            try:
+                data = bot["sock"].recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                selector.unregister(bot["sock"])
+                bot["sock"].close()
+                bots.remove(bot)
+                continue
+            buffer = bot["buffer"] + data.decode()
+            while True:
+                buffer = buffer.lstrip()
+                try:
+                    message, index = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    break
+                buffer = buffer[index:]
+                if message.get("type") == "rope":
+                    if bot["tick"] is None:
+                        # 各玩家錯開第一次輸入的時間
+                        bot["next"] = time.monotonic() + rng.random() * interval
+                    bot["tick"] = message["tick"]
+            bot["buffer"] = buffer
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+
+def run_rate(server_class, tick_rate, args):
+    config = {"tick_rate": tick_rate, "rope_length": 1e9, "time_limit": args.duration, "start_delay": 0}
+    server = server_class(free_port(), args.players, args.players, config=config)
+    server.host = "127.0.0.1"
+    lateness = []
+    durations = []
+    on_tick = server.on_tick
+    work = args.work_us / 1e6
+
+    def measured(tick, inputs):
+        started = time.monotonic()
+        lateness.append(started - (server.tick_origin + tick * server.tick_interval))
+        if work:
+            deadline = started + work
+            while time.monotonic() < deadline:
+                pass
+        on_tick(tick, inputs)
+        durations.append(time.monotonic() - started)
+    server.on_tick = measured
+
+    server.listen()
+    # 機器人在另一個行程執行，不與伺服器爭用 GIL
+    bots = multiprocessing.Process(target=drive_bots, args=(server.port, args.players, args.input_rate, args.seed))
+    bots.start()
+    server_thread = threading.Thread(target=server.run)
+    server_thread.start()
+    server_thread.join()
+    bots.join(timeout=10)
+    if bots.is_alive():
+        bots.terminate()
+
+    stats = server.tick_stats
+    elapsed = server.tick * server.tick_interval + lateness[-1]
+    return {
+        "tick_rate": tick_rate,
+        "ticks": stats["ticks"],
+        "ticks_per_sec": round(stats["ticks"] / elapsed, 2),
+        "lateness_ms": {
+            "p50": percentile(lateness, 0.5),
+            "p99": percentile(lateness, 0.99),
+            "max": percentile(lateness, 1.0),
+        },
+        "tick_ms": {
+            "p50": percentile(durations, 0.5),
+            "p99": percentile(durations, 0.99),
+            "max": percentile(durations, 1.0),
+        },
+        "overruns": stats["overruns"],
+        "skipped_ticks": stats["skipped_ticks"],
+        "inputs": sum(server.pulls.values()),
+        "late_inputs": stats["late_inputs"],
+        "dropped_inputs": stats["dropped_inputs"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="即時遊戲 tick 排程效能測試")
+    parser.add_argument("--players", type=int, default=10, help="機器人玩家數")
+    parser.add_argument("--tick-rates", type=int, nargs="+", default=[20, 60, 120])
+    parser.add_argument("--duration", type=float, default=5.0, help="每個頻率的遊戲時間（秒）")
+    parser.add_argument("--input-rate", type=float, default=10.0, help="每位玩家每秒送出的輸入數")
+    parser.add_argument("--work-us", type=float, default=0.0, help="每個 tick 額外的運算時間（微秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    server_class = load_server_class(os.path.join(GAMES, "tug_of_war"), "TugOfWarServer")
+    results = []
+    for tick_rate in args.tick_rates:
+        # 遊戲伺服器的輸出導向 stderr，stdout 只輸出 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_rate(server_class, tick_rate, args)
+        results.append(result)
+        print(f"[效能測試] {tick_rate} Hz: {result['ticks_per_sec']} ticks/秒，"
+              f"延遲 p99 {result['lateness_ms']['p99']} ms，overrun {result['overruns']}，"
+              f"跳過 {result['skipped_ticks']}，晚到輸入 {result['late_inputs']}", file=sys.stderr)
+
+    report = {
+        "benchmark": "tick_rate",
+        "players": args.players,
+        "duration_sec": args.duration,
+        "input_rate": args.input_rate,
+        "work_us": args.work_us,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
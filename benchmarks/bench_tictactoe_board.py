@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+井字遊戲棋盤引擎效能測試
+以固定亂數種子進行隨機對局，比較位元棋盤（board.Board）與二維串列逐格掃描的
+每秒落子數，並確認兩者判定的勝負結果一致（JSON）
+
+用法:
+    python3 benchmarks/bench_tictactoe_board.py
+    python3 benchmarks/bench_tictactoe_board.py --sizes 3x3 7x4 15x5 --games 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "developer", "games", "tictactoe"))
+from board import Board, SYMBOLS
+
+class ListBoard:
+    """舊版做法：二維串列，每次落子後掃描整個棋盤找連線"""
+
+    def __init__(self, size, k):
+        self.size = size
+        self.k = k
+        self.board = [[' '] * size for _ in range(size)]
+
+    def play(self, player, row, col):
+        if not (0 <= row < self.size and 0 <= col < self.size and self.board[row][col] == ' '):
+            raise ValueError("該位置已被佔用或超出範圍")
+        self.board[row][col] = SYMBOLS[player]
+        if self.check_winner():
+            return "win"
+        if all(cell != ' ' for line in self.board for cell in line):
+            return "draw"
+        return None
+
+    def check_winner(self):
+        size, k, board = self.size, self.k, self.board
+        for row in range(size):
+            for col in range(size):
+                symbol = board[row][col]
+                if symbol == ' ':
+                    continue
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + dr * (k - 1), col + dc * (k - 1)
+                    if not (0 <= end_row < size and 0 <= end_col < size):
+                        continue
+                    if all(board[row + dr * step][col + dc * step] == symbol for step in range(k)):
+                        return symbol
+        return None
+
+def make_games(size, games, seed):
+    """預先產生每局的落子順序，兩種實作使用相同的輸入"""
+    rng = random.Random(seed)
+    cells = [(row, col) for row in range(size) for col in range(size)]
+    orders = []
+    for _ in range(games):
+        order = list(cells)
+        rng.shuffle(order)
+        orders.append(order)
+    return orders
+
+def play_all(factory, orders):
+    """依序下完每一局，回傳 (總落子數, 每局結果, 秒數)"""
+    moves = 0
+    results = []
+    start = time.perf_counter()
+    for order in orders:
+        board = factory()
+        player = 0
+        result = None
+        for row, col in order:
+            moves += 1
+            result = board.play(player, row, col)
+            if result:
+                break
+            player = 1 - player
+        results.append((result, player if result == "win" else -1, moves))
+    return moves, results, time.perf_counter() - start
+
+def run_once(size, k, games, seed):
+    orders = make_games(size, games, seed)
+    bit_moves, bit_results, bit_time = play_all(lambda: Board(size, k), orders)
+    list_moves, list_results, list_time = play_all(lambda: ListBoard(size, k), orders)
+    if bit_results != list_results:
+        raise SystemExit(f"[效能測試] {size}x{k} 的位元棋盤與串列棋盤結果不一致")
+
+    bit_rate = bit_moves / bit_time
+    list_rate = list_moves / list_time
+    return {
+        "size": size,
+        "win_length": k,
+        "games": games,
+        "moves": bit_moves,
+        "bitboard_moves_per_sec": round(bit_rate),
+        "list_moves_per_sec": round(list_rate),
+        "speedup": round(bit_rate / list_rate, 2),
+    }
+
+def parse_size(value):
+    size, _, k = value.partition("x")
+    return int(size), int(k or size)
+
+def main():
+    parser = argparse.ArgumentParser(description="井字遊戲棋盤引擎效能測試")
+    parser.add_argument("--sizes", nargs="+", default=["3x3", "7x4", "15x5"],
+                        help="棋盤大小與連線長度，格式為 NxK")
+    parser.add_argument("--games", type=int, default=2000, help="每種大小的對局數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for value in args.sizes:
+        size, k = parse_size(value)
+        # 大棋盤的串列掃描很慢，依格數減少對局數
+        games = max(10, args.games * 9 // (size * size))
+        result = run_once(size, k, games, args.seed)
+        print(f"[效能測試] {size}×{size} 連 {k}: 位元棋盤 {result['bitboard_moves_per_sec']} 步/秒，"
+              f"串列掃描 {result['list_moves_per_sec']} 步/秒 ({result['speedup']}x)", file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "tictactoe_board",
+        "seed": args.seed,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
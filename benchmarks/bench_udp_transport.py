@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+遊戲訊息 UDP 與 TCP 傳輸的延遲比較
+以拔河（developer/games/tug_of_war，udp = True）在本機啟動伺服器，機器人玩家經由本機的封包遺失模擬器連線：
+    - TCP 代理：每段資料以 --loss 的機率「遺失」，遺失的資料要等 --rto-ms 的重傳時間，
+      之後的資料也要排在它後面依序送達（模擬 TCP 的 head-of-line blocking）
+    - UDP 代理：每個 datagram 以 --loss 的機率直接丟棄
+兩者另外都加上 --delay-ms 的單向延遲。機器人以 game_udp.GameTransport 連線，UDP 模式下改走 UDP，
+狀態確認以不可靠訊息送出，拉動仍是可靠訊息（UDP 建立後才加入遊戲；狀態很小時伺服器改送完整的 rope 訊息）。依序測試每個 --loss，輸出（JSON）：
+    - 每個 tick 的狀態從伺服器送出到客戶端套用的延遲（p50 / p90 / p99 / 最大）
+    - 客戶端收到的 tick 比例（UDP 遺失的狀態不重送，由下一個 tick 的差異取代）
+    - 伺服器收到的拉動數、晚到與丟棄的輸入數
+
+用法:
+    python3 benchmarks/bench_udp_transport.py --players 4 --loss 0 0.01 0.05 --duration 5
+"""
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from bench_replay import GAMES
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "developer"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "developer", "template"))
+from replay_match import free_port, load_server_class
+from game_udp import GameTransport
+from state_sync import STATE_MESSAGES, StateView
+
+class LossyProxy:
+    """本機的封包遺失模擬器：轉送 TCP 與 UDP 到遊戲伺服器，依設定遺失與延遲"""
+    def __init__(self, server_port, loss, delay, rto, seed):
+        self.server_port = server_port
+        self.loss = loss
+        self.delay = delay
+        self.rto = rto
+        self.rng = random.Random(seed)
+        self.selector = selectors.DefaultSelector()
+        self.pending = []  # [(送達時間, 序號, 函式, 參數)]
+        self.seq = itertools.count()
+        self.tcp_listener = socket.create_server(("127.0.0.1", 0))
+        self.tcp_listener.setblocking(False)
+        self.selector.register(self.tcp_listener, selectors.EVENT_READ, ("accept",))
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.bind(("127.0.0.1", 0))
+        self.udp_socket.setblocking(False)
+        self.selector.register(self.udp_socket, selectors.EVENT_READ, ("udp_client",))
+        self.upstreams = {}  # {客戶端 UDP 位址: 連到伺服器的 UDP socket}
+        self.last_delivery = {}  # {TCP 目的 socket: 最後一段資料的送達時間}
+        self.stop = threading.Event()
+
+    @property
+    def tcp_address(self):
+        return self.tcp_listener.getsockname()
+
+    @property
+    def udp_address(self):
+        return self.udp_socket.getsockname()
+
+    def schedule(self, when, action, *args):
+        heapq.heappush(self.pending, (when, next(self.seq), action, args))
+
+    def forward_tcp(self, data, destination):
+        now = time.monotonic()
+        when = now + self.delay
+        if self.rng.random() < self.loss:
+            when += self.rto
+        # TCP 依序交付：排在前一段資料之後
+        when = max(when, self.last_delivery.get(destination, 0.0))
+        self.last_delivery[destination] = when
+        self.schedule(when, self.deliver_tcp, destination, data)
+
+    def deliver_tcp(self, destination, data):
+        try:
+            if data:
+                destination.sendall(data)
+            else:
+                destination.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def forward_udp(self, data, sock, address=None):
+        if self.rng.random() < self.loss:
+            return
+        self.schedule(time.monotonic() + self.delay, self.deliver_udp, sock, data, address)
+
+    def deliver_udp(self, sock, data, address):
+        try:
+            if address:
+                sock.sendto(data, address)
+            else:
+                sock.send(data)
+        except OSError:
+            pass
+
+    def accept(self):
+        client, _ = self.tcp_listener.accept()
+        server = socket.create_connection(("127.0.0.1", self.server_port))
+        for sock in (client, server):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.selector.register(client, selectors.EVENT_READ, ("tcp", server))
+        self.selector.register(server, selectors.EVENT_READ, ("tcp", client))
+
+    def run(self):
+        while not self.stop.is_set():
+            timeout = 0.05
+            if self.pending:
+                timeout = min(timeout, max(0.0, self.pending[0][0] - time.monotonic()))
+            for key, _ in self.selector.select(timeout):
+                role = key.data[0]
+                if role == "accept":
+                    self.accept()
+                elif role == "tcp":
+                    try:
+                        data = key.fileobj.recv(65536)
+                    except OSError:
+                        data = b""
+                    if not data:
+                        self.selector.unregister(key.fileobj)
+                    # 空資料代表對方關閉，同樣排在已轉送的資料之後
+                    self.forward_tcp(data, key.data[1])
+                elif role == "udp_client":
+                    self.read_udp_clients()
+                else:
+                    self.read_udp_server(key.fileobj, key.data[1])
+            now = time.monotonic()
+            while self.pending and self.pending[0][0] <= now:
+                _, _, action, args = heapq.heappop(self.pending)
+                action(*args)
+
+    def read_udp_clients(self):
+        while True:
+            try:
+                data, address = self.udp_socket.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            upstream = self.upstreams.get(address)
+            if upstream is None:
+                # 每位客戶端一個上游 socket，伺服器看到的位址才能區分玩家
+                upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                upstream.connect(("127.0.0.1", self.server_port))
+                upstream.setblocking(False)
+                self.upstreams[address] = upstream
+                self.selector.register(upstream, selectors.EVENT_READ, ("udp_server", address))
+            self.forward_udp(data, upstream)
+
+    def read_udp_server(self, upstream, address):
+        while True:
+            try:
+                data = upstream.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            self.forward_udp(data, self.udp_socket, address)
+
+def run_bot(index, proxy, use_udp, input_rate, seed, received):
+    """一位機器人：每秒 input_rate 次拉動，記下每個 tick 的狀態套用時間"""
+    rng = random.Random(seed + index)
+    sock = socket.create_connection(proxy.tcp_address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    transport = GameTransport(sock, udp_address=proxy.udp_address)
+    if use_udp:
+        transport.request_udp()
+        # 等 UDP 建立後才加入，只量測切換完成後的延遲
+        while not (transport.established and transport.bound or transport.closed):
+            transport.poll(0.1)
+    transport.send({"type": "sync"})
+    transport.send({"type": "join", "name": f"bot-{index}"})
+    view = StateView()
+    interval = 1.0 / input_rate
+    next_input = None
+    tick = None
+    arrivals = {}
+    while True:
+        timeout = None if next_input is None else max(0.0, next_input - time.monotonic())
+        message = transport.receive(timeout)
+        if message is None:
+            if transport.closed:
+                break
+            transport.send({"type": "input", "tick": tick + 1, "action": "pull"})
+            next_input += interval
+            continue
+        if message["type"] == "game_over":
+            break
+        if message["type"] == "rope":
+            # 差異加上確認不比完整的狀態小時，伺服器改送完整的 rope 訊息
+            tick = message["tick"]
+        elif message["type"] in STATE_MESSAGES:
+            reply = view.apply(message)
+            transport.send(reply, reliable=reply["type"] != "ack")
+            if reply["type"] != "ack":
+                continue
+            tick = view.state["tick"]
+        else:
+            continue
+        arrivals.setdefault(tick, time.monotonic())
+        if next_input is None:
+            # 各玩家錯開第一次輸入的時間
+            next_input = time.monotonic() + rng.random() * interval
+    transport.close()
+    received.append(arrivals)
+
+def drive_bots(server_port, args, use_udp, loss, results):
+    """在另一個行程執行代理與機器人，回傳每位機器人收到各 tick 的時間"""
+    proxy = LossyProxy(server_port, loss, args.delay_ms / 1000, args.rto_ms / 1000, args.seed)
+    proxy_thread = threading.Thread(target=proxy.run, daemon=True)
+    proxy_thread.start()
+    received = []
+    bots = [threading.Thread(target=run_bot, args=(i, proxy, use_udp, args.input_rate, args.seed, received))
+            for i in range(args.players)]
+    for bot in bots:
+        bot.start()
+    for bot in bots:
+        bot.join()
+    proxy.stop.set()
+    results.put(received)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+
+def run_transport(server_class, use_udp, loss, args):
+    config = {"tick_rate": args.tick_rate, "rope_length": 1e9, "time_limit": args.duration, "start_delay": 0}
+    server = server_class(free_port(), args.players, args.players, config=config)
+    server.host = "127.0.0.1"
+    sent_at = {}
+    on_tick = server.on_tick
+
+    def measured(tick, inputs):
+        # 狀態在 on_tick 中廣播
+        sent_at[tick] = time.monotonic()
+        on_tick(tick, inputs)
+    server.on_tick = measured
+
+    server.listen()
+    results = multiprocessing.Queue()
+    bots = multiprocessing.Process(target=drive_bots, args=(server.port, args, use_udp, loss, results))
+    bots.start()
+    server_thread = threading.Thread(target=server.run)
+    server_thread.start()
+    server_thread.join()
+    received = results.get(timeout=30)
+    bots.join(timeout=10)
+    if bots.is_alive():
+        bots.terminate()
+
+    # time.monotonic() 在同一台機器的行程之間共用
+    latencies = [when - sent_at[tick] for arrivals in received for tick, when in arrivals.items() if tick in sent_at]
+    stats = server.tick_stats
+    return {
+        "transport": "udp" if use_udp else "tcp",
+        "loss": loss,
+        "state_latency_ms": {
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": percentile(latencies, 1.0),
+        },
+        "delivered_ratio": round(len(latencies) / (len(sent_at) * args.players), 4),
+        "inputs": sum(server.pulls.values()),
+        "late_inputs": stats["late_inputs"],
+        "dropped_inputs": stats["dropped_inputs"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="遊戲訊息 UDP 與 TCP 傳輸的延遲比較")
+    parser.add_argument("--players", type=int, default=4, help="機器人玩家數")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.01, 0.05], help="封包遺失率")
+    parser.add_argument("--delay-ms", type=float, default=10.0, help="單向延遲（毫秒）")
+    parser.add_argument("--rto-ms", type=float, default=200.0, help="TCP 遺失資料的重傳時間（毫秒）")
+    parser.add_argument("--tick-rate", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5.0, help="每次測試的遊戲時間（秒）")
+    parser.add_argument("--input-rate", type=float, default=10.0, help="每位玩家每秒送出的輸入數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    server_class = load_server_class(os.path.join(GAMES, "tug_of_war"), "TugOfWarServer")
+    results = []
+    for loss in args.loss:
+        for use_udp in (False, True):
+            # 遊戲伺服器的輸出導向 stderr，stdout 只輸出 JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                result = run_transport(server_class, use_udp, loss, args)
+            results.append(result)
+            latency = result["state_latency_ms"]
+            print(f"[效能測試] {result['transport'].upper()} 遺失率 {loss:.0%}: 狀態延遲 p50 {latency['p50']} ms，"
+                  f"p99 {latency['p99']} ms，最大 {latency['max']} ms，收到 {result['delivered_ratio']:.1%} 的 tick，"
+                  f"晚到輸入 {result['late_inputs']}", file=sys.stderr)
+
+    report = {
+        "benchmark": "udp_transport",
+        "players": args.players,
+        "tick_rate": args.tick_rate,
+        "duration_sec": args.duration,
+        "delay_ms": args.delay_ms,
+        "rto_ms": args.rto_ms,
+        "input_rate": args.input_rate,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+大廳與開發者伺服器訊息編碼效能測試
+以 server/wire_codec.py 的 MessageStream 編碼再解碼各種訊息，比較原本的格式（ASCII JSON）、
+精簡編碼（UTF-8、最短分隔符號）以及精簡編碼加上 zlib / lzma 壓縮，輸出（JSON）：
+    - 每種訊息在線路上的位元組數與相對原本格式的比例
+    - 每則訊息的編碼與解碼時間（微秒）
+
+訊息內容取自 developer/games/ 的內建遊戲：遊戲列表、遊戲詳細資訊（含中文說明與評論）、
+下載回應與上傳請求（整個遊戲目錄的原始碼）以及房間更新廣播
+
+用法:
+    python3 benchmarks/bench_wire_codec.py --games 50 --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "server"))
+from wire_codec import COMPRESS_THRESHOLD, MessageStream
+
+GAMES_DIR = os.path.join(ROOT, "developer", "games")
+
+MODES = {
+    "legacy": None,
+    "compact": {"framing": "frame", "compact": True, "compression": None},
+    "compact_zlib": {"framing": "frame", "compact": True, "compression": "zlib"},
+    "compact_lzma": {"framing": "frame", "compact": True, "compression": "lzma"},
+}
+
+class LoopbackSocket:
+    """把送出的資料原封不動讓 recv 讀回"""
+    def __init__(self):
+        self.data = b""
+
+    def sendall(self, data):
+        self.data = data
+
+    def recv(self, size):
+        data, self.data = self.data, b""
+        return data
+
+def read_game_files(game_dir):
+    files = []
+    for root, dirs, filenames in os.walk(game_dir):
+        dirs[:] = [d for d in dirs if not d.startswith("__")]
+        for filename in sorted(filenames):
+            with open(os.path.join(root, filename), encoding="utf-8") as f:
+                files.append({"name": os.path.relpath(os.path.join(root, filename), game_dir),
+                              "content": f.read()})
+    return files
+
+def build_messages(game_count):
+    """依內建遊戲建立各種訊息"""
+    games = []
+    for name in sorted(os.listdir(GAMES_DIR)):
+        with open(os.path.join(GAMES_DIR, name, "game_config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        games.append((name, config))
+
+    listing = []
+    for i in range(game_count):
+        name, config = games[i % len(games)]
+        listing.append({
+            "id": i + 1,
+            "name": f"{config.get('game_name', name)}-{i}",
+            "developer": "開發者小明",
+            "version": config.get("version", "1.0.0"),
+            "description": config.get("description", ""),
+            "type": config.get("game_type", "cli"),
+            "min_players": config.get("min_players", 2),
+            "max_players": config.get("max_players", 2),
+            "avg_rating": 4.2,
+            "rating_count": 17,
+        })
+    detail = dict(listing[0], ratings=[
+        {"player": f"玩家{i}", "rating": 1 + i % 5, "comment": "很好玩的遊戲，推薦給朋友一起玩！",
+         "created_at": "2026-10-19 12:00:00"} for i in range(20)])
+
+    name, config = games[-1]
+    files = read_game_files(os.path.join(GAMES_DIR, name))
+    room = {
+        "room_id": 42, "game_id": 1, "game_name": config.get("game_name", name),
+        "host": "玩家甲", "players": [{"id": 1, "username": "玩家甲"}, {"id": 2, "username": "玩家乙"}],
+        "status": "waiting", "max_players": 2, "visibility": "public",
+    }
+    return {
+        "list_games": {"success": True, "games": listing},
+        "get_game_detail": {"success": True, "game": detail},
+        "download_game": {"success": True, "game_info": listing[-1], "files": files},
+        "upload_game": {"type": "upload_game", "game_config": config, "files": files},
+        "room_update": {"type": "room_update", "room": room},
+    }
+
+def measure(message, settings, repeat):
+    sender = MessageStream(LoopbackSocket())
+    receiver = MessageStream(sender.sock)
+    if settings:
+        sender.configure(dict(settings, threshold=COMPRESS_THRESHOLD))
+        receiver.configure(dict(settings, threshold=COMPRESS_THRESHOLD))
+
+    encoded = sender.encode(message)
+    sender.sock.sendall(encoded)
+    if receiver.receive_message() != message:
+        raise SystemExit("[效能測試] 解碼結果與原始訊息不一致")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        data = sender.encode(message)
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        sender.sock.sendall(data)
+        receiver.receive_message()
+    decode_time = time.perf_counter() - start
+    return {
+        "bytes": len(encoded),
+        "encode_us": round(encode_time / repeat * 1e6, 2),
+        "decode_us": round(decode_time / repeat * 1e6, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="大廳與開發者伺服器訊息編碼效能測試")
+    parser.add_argument("--games", type=int, default=50, help="遊戲列表中的遊戲數")
+    parser.add_argument("--repeat", type=int, default=200, help="每種組合的重複次數")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    messages = {}
+    for msg_type, message in build_messages(args.games).items():
+        results = {mode: measure(message, settings, args.repeat) for mode, settings in MODES.items()}
+        legacy_bytes = results["legacy"]["bytes"]
+        for result in results.values():
+            result["ratio"] = round(result["bytes"] / legacy_bytes, 3)
+        messages[msg_type] = results
+        print(f"[效能測試] {msg_type}: 原本 {legacy_bytes} bytes，" +
+              "，".join(f"{mode} {r['bytes']} bytes ({r['ratio']}) 編碼 {r['encode_us']} us"
+                       for mode, r in results.items() if mode != "legacy"), file=sys.stderr)
+
+    report = {
+        "benchmark": "wire_codec",
+        "compress_threshold": COMPRESS_THRESHOLD,
+        "repeat": args.repeat,
+        "messages": messages,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,14 @@ import socket
 import json
 import os
 import sys
+from wire_codec import MessageStream, hello_message
 
 class DeveloperClient:
     def __init__(self, server_host='localhost', server_port=6001):
         self.server_host = server_host
         self.server_port = server_port
         self.socket = None
+        self.stream = None
         self.developer = None
         
     def connect(self):
@@ -20,30 +22,29 @@ class DeveloperClient:
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.server_host, self.server_port))
+            self.stream = MessageStream(self.socket)
+            self.negotiate()
             return True
         except Exception as e:
             print(f"❌ 連線失敗: {e}")
             return False
     
+    def negotiate(self):
+        """協商訊息壓縮與精簡編碼（舊版伺服器不支援時沿用原本的格式）"""
+        self.stream.send_message(hello_message())
+        response = self.stream.receive_message()
+        if response and response.get("success"):
+            self.stream.configure(response)
+    
     def send_message(self, message):
         """發送訊息給伺服器"""
         try:
-            # 發送數據
-            data_to_send = json.dumps(message).encode('utf-8')
-            self.socket.sendall(data_to_send)
-            
+            self.stream.send_message(message)
             # 接收回應（支援大數據）
-            chunks = []
-            while True:
-                chunk = self.socket.recv(65536).decode('utf-8')
-                if not chunk:
-                    break
-                chunks.append(chunk)
-                try:
-                    response = json.loads(''.join(chunks))
-                    return response
-                except json.JSONDecodeError:
-                    continue
+            response = self.stream.receive_message()
+            if response is not None:
+                return response
+            return {"success": False, "message": "連線中斷"}
         except Exception as e:
             print(f"❌ 通訊錯誤: {e}")
             return {"success": False, "message": str(e)}
@@ -2,21 +2,27 @@
 """
 猜數字對戰遊戲客戶端 (GUI)
 """
+import os
 import socket
 import json
 import sys
 import tkinter as tk
 from tkinter import messagebox, ttk
 import threading
+from game_codec import MessageReader, load_codec
 
 class NumberGuessClient:
-    def __init__(self, host, port):
+    def __init__(self, host, port, player_name=None):
         self.host = host
         self.port = port
+        self.player_name = player_name  # 大廳帳號，用於記錄對戰結果
         self.socket = None
         self.player_id = None
         self.my_number = None
         self.guesses = 0
+        # 伺服器訊息依 game_config.json 的 message_schema 可能以二進位編碼
+        self.codec = load_codec()
+        self.reader = MessageReader(self.codec)
         
         # GUI 元件
         self.root = tk.Tk()
@@ -107,9 +113,16 @@ class NumberGuessClient:
                 self.root.destroy()
                 return
 
-            # 接收連線確認
-            data = self.socket.recv(4096).decode()
-            message = json.loads(data)
+            if self.codec:
+                self.socket.sendall(json.dumps(self.codec.request()).encode())
+            if self.player_name:
+                self.socket.sendall(json.dumps({"type": "join", "name": self.player_name,
+                                               "token": os.environ.get("GAMESTORE_JOIN_TOKEN")}).encode())
+
+            # 接收連線確認（後續訊息可能一起到達，剩餘資料留在 reader 給 handle_messages）
+            message = self.reader.receive(self.socket)
+            if message is None:
+                raise ConnectionError("連線中斷")
             if message["type"] == "connected":
                 self.player_id = message["player_id"]
                 self.info_label.config(text=f"你是玩家 {self.player_id + 1}", fg="#27ae60")
@@ -163,74 +176,60 @@ class NumberGuessClient:
         
     def handle_messages(self):
         """處理來自伺服器的訊息"""
-        buffer = ""
-        decoder = json.JSONDecoder()
         while True:
             try:
-                data = self.socket.recv(4096).decode()
-                if not data:
+                # 連線確認時一起收到的資料已在 reader 中
+                message = self.reader.receive(self.socket)
+                if message is None:
                     break
-                    
-                buffer += data
-                
-                while buffer:
-                    try:
-                        buffer = buffer.lstrip()
-                        if not buffer:
-                            break
-                        message, index = decoder.raw_decode(buffer)
-                        buffer = buffer[index:]
                 
-                        if message["type"] == "set_number":
-                            # 已在 GUI 初始化時處理
-                            pass
-                            
-                        elif message["type"] == "start_guessing":
-                            self.root.after(0, lambda: self.guess_frame.pack(pady=20, before=self.status_label))
-                            self.root.after(0, lambda: self.status_label.config(
-                                text="遊戲開始！輪流猜測對手的數字", fg="#2ecc71"))
-                            
-                        elif message["type"] == "your_turn":
-                            self.guesses = message["guesses"]
-                            self.root.after(0, lambda: self.guesses_label.config(
-                                text=f"猜測次數: {self.guesses}"))
-                            self.root.after(0, lambda: self.status_label.config(
-                                text="輪到你了！請猜測對手的數字", fg="#3498db"))
-                            self.root.after(0, lambda: self.guess_button.config(state=tk.NORMAL))
-                            
-                        elif message["type"] == "wait":
-                            self.root.after(0, lambda: self.status_label.config(
-                                text=message["message"], fg="#95a5a6"))
-                            
-                        elif message["type"] == "hint":
-                            hint = message["hint"]
-                            msg = message["message"]
-                            self.root.after(0, lambda: self.add_history(f"  → {msg}"))
-                            
-                        elif message["type"] == "game_over":
-                            winner = message["winner"]
-                            numbers = message["target_numbers"]
-                            guesses = message["guesses"]
-                            
-                            if winner == self.player_id:
-                                result = "🎉 你贏了！🎉"
-                                color = "#27ae60"
-                            else:
-                                result = "😢 你輸了！"
-                                color = "#e74c3c"
-                            
-                            details = f"\n玩家1的數字: {numbers[0]}, 猜了 {guesses[0]} 次\n"
-                            details += f"玩家2的數字: {numbers[1]}, 猜了 {guesses[1]} 次"
-                            
-                            self.root.after(0, lambda: self.status_label.config(
-                                text=result, fg=color))
-                            self.root.after(0, lambda: messagebox.showinfo(
-                                "遊戲結束", result + details))
-                            self.root.after(0, lambda: self.guess_button.config(state=tk.DISABLED))
-                            return
-                            
-                    except json.JSONDecodeError:
-                        break
+                if message["type"] == "set_number":
+                    # 已在 GUI 初始化時處理
+                    pass
+                    
+                elif message["type"] == "start_guessing":
+                    self.root.after(0, lambda: self.guess_frame.pack(pady=20, before=self.status_label))
+                    self.root.after(0, lambda: self.status_label.config(
+                        text="遊戲開始！輪流猜測對手的數字", fg="#2ecc71"))
+                    
+                elif message["type"] == "your_turn":
+                    self.guesses = message["guesses"]
+                    self.root.after(0, lambda: self.guesses_label.config(
+                        text=f"猜測次數: {self.guesses}"))
+                    self.root.after(0, lambda: self.status_label.config(
+                        text="輪到你了！請猜測對手的數字", fg="#3498db"))
+                    self.root.after(0, lambda: self.guess_button.config(state=tk.NORMAL))
+                    
+                elif message["type"] == "wait":
+                    self.root.after(0, lambda: self.status_label.config(
+                        text=message["message"], fg="#95a5a6"))
+                    
+                elif message["type"] == "hint":
+                    hint = message["hint"]
+                    msg = message["message"]
+                    self.root.after(0, lambda: self.add_history(f"  → {msg}"))
+                    
+                elif message["type"] == "game_over":
+                    winner = message["winner"]
+                    numbers = message["target_numbers"]
+                    guesses = message["guesses"]
+                    
+                    if winner == self.player_id:
+                        result = "🎉 你贏了！🎉"
+                        color = "#27ae60"
+                    else:
+                        result = "😢 你輸了！"
+                        color = "#e74c3c"
+                    
+                    details = f"\n玩家1的數字: {numbers[0]}, 猜了 {guesses[0]} 次\n"
+                    details += f"玩家2的數字: {numbers[1]}, 猜了 {guesses[1]} 次"
+                    
+                    self.root.after(0, lambda: self.status_label.config(
+                        text=result, fg=color))
+                    self.root.after(0, lambda: messagebox.showinfo(
+                        "遊戲結束", result + details))
+                    self.root.after(0, lambda: self.guess_button.config(state=tk.DISABLED))
+                    return
                     
             except Exception as e:
                 print(f"[錯誤] {e}")
@@ -258,9 +257,10 @@ if __name__ == "__main__":
     else:
         host = "localhost"
         port = 5002
+    player_name = sys.argv[3] if len(sys.argv) > 3 else None
     
     print(f"[DEBUG] 啟動GUI客戶端，連線到 {host}:{port}")
-    client = NumberGuessClient(host, port)
+    client = NumberGuessClient(host, port, player_name)
     try:
         client.run()
     except KeyboardInterrupt:
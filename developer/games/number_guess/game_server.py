@@ -3,182 +3,128 @@
 猜數字對戰遊戲伺服器 (GUI 雙人遊戲)
 每位玩家設定一個 1-100 的數字，然後互相猜對方的數字
 """
-import socket
-import json
 import sys
+from game_runtime import EventGameServer
+
+SETUP_TIMEOUT = 120  # 設定數字的時限（秒）
+TURN_TIMEOUT = 120  # 每次猜測的時限（秒），逾時判負
+
+class NumberGuessServer(EventGameServer):
+    log_name = "猜數字對戰伺服器"
 
-class NumberGuessServer:
     def __init__(self, port):
-        self.port = port
-        self.clients = []
-        self.buffers = []
+        super().__init__(port, min_players=2, max_players=2)
         self.player_numbers = [None, None]  # 每位玩家設定的數字
         self.player_guesses = [0, 0]  # 每位玩家的猜測次數
-        self.server_socket = None
-        
-    def start(self):
-        """啟動遊戲伺服器"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind(('0.0.0.0', self.port))
-        self.server_socket.listen(2)
-        print(f"[猜數字對戰伺服器] 在埠口 {self.port} 上啟動")
-        
-        # 等待兩位玩家連線
-        connected_count = 0
-        while connected_count < 2:
-            try:
-                client_socket, addr = self.server_socket.accept()
-                self.clients.append(client_socket)
-                self.buffers.append("")
-                print(f"[猜數字對戰伺服器] 玩家 {connected_count+1} 已連線")
-                
-                try:
-                    client_socket.sendall(json.dumps({
-                        "type": "connected",
-                        "player_id": connected_count
-                    }).encode())
-                    connected_count += 1
-                except socket.error:
-                    print(f"[猜數字對戰伺服器] 玩家連線中斷")
-                    self.clients.remove(client_socket)
-                    self.buffers.pop()
-                    client_socket.close()
-            except Exception as e:
-                print(f"[猜數字對戰伺服器] 接受連線錯誤: {e}")
-        
-        print("[猜數字對戰伺服器] 遊戲開始！")
-        self.run_game()
-
-    def recv_json(self, player_index):
-        """接收並解析 JSON 訊息"""
-        decoder = json.JSONDecoder()
-        while True:
-            buffer = self.buffers[player_index]
-            buffer = buffer.lstrip()
-            if buffer:
-                try:
-                    obj, index = decoder.raw_decode(buffer)
-                    self.buffers[player_index] = buffer[index:]
-                    return obj
-                except json.JSONDecodeError:
-                    pass
-            
-            try:
-                data = self.clients[player_index].recv(4096).decode()
-                if not data:
-                    return None
-                self.buffers[player_index] += data
-            except Exception as e:
-                print(f"[錯誤] 接收資料失敗: {e}")
-                return None
-        
-    def run_game(self):
-        """執行遊戲邏輯"""
-        # 階段1：等待雙方設定數字
-        print("[猜數字對戰伺服器] 等待玩家設定數字...")
-        for i in range(2):
-            self.clients[i].sendall(json.dumps({
-                "type": "set_number",
-                "message": "請設定你的數字 (1-100)"
-            }).encode())
-            
-            message = self.recv_json(i)
-            if not message:
-                print(f"[猜數字對戰伺服器] 玩家 {i+1} 斷開連線")
+        self.guessing = False
+        self.current_player = 0
+        self.timer = None
+
+    def on_start(self):
+        # 階段1：雙方同時設定數字
+        self.log("等待玩家設定數字...")
+        self.broadcast({
+            "type": "set_number",
+            "message": "請設定你的數字 (1-100)"
+        })
+        self.timer = self.call_later(SETUP_TIMEOUT, self.handle_setup_timeout)
+
+    def on_message(self, player, message):
+        msg_type = message.get("type")
+        index = player.player_id
+
+        if msg_type == "number_set" and not self.guessing:
+            if self.player_numbers[index] is not None or not isinstance(message.get("number"), int):
+                return
+            self.player_numbers[index] = message["number"]
+            self.log(f"玩家 {index+1} 已設定數字")
+            if None not in self.player_numbers:
+                self.start_guessing()
+
+        elif msg_type == "guess" and self.guessing and index == self.current_player:
+            guess = message.get("number")
+            if not isinstance(guess, int):
+                return
+            self.player_guesses[index] += 1
+            target = self.player_numbers[1 - index]
+
+            if guess == target:
+                # 猜中了！
+                self.end_game(index, "win")
                 return
-                
-            if message["type"] == "number_set":
-                self.player_numbers[i] = message["number"]
-                print(f"[猜數字對戰伺服器] 玩家 {i+1} 已設定數字")
-        
-        # 階段2：開始猜測
-        print("[猜數字對戰伺服器] 開始猜測階段！")
+            elif guess < target:
+                self.send(player, {
+                    "type": "hint",
+                    "hint": "too_low",
+                    "message": "太小了！"
+                })
+            else:
+                self.send(player, {
+                    "type": "hint",
+                    "hint": "too_high",
+                    "message": "太大了！"
+                })
+
+            # 切換玩家
+            self.current_player = 1 - index
+            self.next_turn()
+
+    def start_guessing(self):
+        """階段2：開始猜測"""
+        self.timer.cancel()
+        self.guessing = True
+        self.log("開始猜測階段！")
         self.broadcast({
             "type": "start_guessing",
             "message": "雙方已設定完成，開始猜測！"
         })
-        
-        game_over = False
-        current_player = 0
-        
-        while not game_over:
-            # 通知當前玩家輪到他猜
-            self.clients[current_player].sendall(json.dumps({
-                "type": "your_turn",
-                "guesses": self.player_guesses[current_player]
-            }).encode())
-            
-            # 通知另一位玩家等待
-            other_player = 1 - current_player
-            self.clients[other_player].sendall(json.dumps({
-                "type": "wait",
-                "message": "等待對手猜測..."
-            }).encode())
-            
-            try:
-                # 接收猜測
-                message = self.recv_json(current_player)
-                if not message:
-                    print(f"[猜數字對戰伺服器] 玩家 {current_player} 斷開連線")
-                    break
-                
-                if message["type"] == "guess":
-                    guess = message["number"]
-                    self.player_guesses[current_player] += 1
-                    target = self.player_numbers[other_player]
-                    
-                    if guess == target:
-                        # 猜中了！
-                        self.broadcast({
-                            "type": "game_over",
-                            "winner": current_player,
-                            "target_numbers": self.player_numbers,
-                            "guesses": self.player_guesses
-                        })
-                        game_over = True
-                    elif guess < target:
-                        self.clients[current_player].sendall(json.dumps({
-                            "type": "hint",
-                            "hint": "too_low",
-                            "message": "太小了！"
-                        }).encode())
-                    else:
-                        self.clients[current_player].sendall(json.dumps({
-                            "type": "hint",
-                            "hint": "too_high",
-                            "message": "太大了！"
-                        }).encode())
-                    
-                    # 切換玩家
-                    if not game_over:
-                        current_player = 1 - current_player
-                        
-            except Exception as e:
-                print(f"[錯誤] {e}")
-                game_over = True
-        
-        print("[猜數字對戰伺服器] 遊戲結束")
-        self.close()
-        
-    def broadcast(self, message):
-        """廣播訊息給所有玩家"""
-        data = json.dumps(message).encode()
-        for client in self.clients:
-            try:
-                client.sendall(data)
-            except:
-                pass
-                
-    def close(self):
-        """關閉伺服器"""
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-        if self.server_socket:
-            self.server_socket.close()
+        self.next_turn()
+
+    def next_turn(self):
+        """通知當前玩家輪到他猜，另一位玩家等待"""
+        current = self.players[self.current_player]
+        other = self.players[1 - self.current_player]
+        self.send(current, {
+            "type": "your_turn",
+            "guesses": self.player_guesses[self.current_player]
+        })
+        self.send(other, {
+            "type": "wait",
+            "message": "等待對手猜測..."
+        })
+        if self.timer:
+            self.timer.cancel()
+        self.timer = self.call_later(TURN_TIMEOUT, self.handle_turn_timeout, self.current_player)
+
+    def handle_setup_timeout(self):
+        missing = [i for i, number in enumerate(self.player_numbers) if number is None]
+        self.log(f"玩家 {', '.join(str(i+1) for i in missing)} 未在時限內設定數字")
+        # 只有一方未設定時另一方獲勝，雙方都未設定則無人獲勝
+        self.end_game(1 - missing[0] if len(missing) == 1 else -1, "timeout")
+
+    def handle_turn_timeout(self, player_index):
+        if self.guessing and player_index == self.current_player:
+            self.log(f"玩家 {player_index+1} 猜測逾時")
+            self.end_game(1 - player_index, "timeout")
+
+    def on_disconnect(self, player):
+        if self.started:
+            self.log(f"玩家 {player.player_id+1} 斷開連線")
+            self.end_game(1 - player.player_id, "disconnect")
+
+    def end_game(self, winner, reason):
+        if self.timer:
+            self.timer.cancel()
+        self.broadcast({
+            "type": "game_over",
+            "winner": winner,
+            "reason": reason,
+            "target_numbers": self.player_numbers,
+            "guesses": self.player_guesses
+        })
+        self.log("遊戲結束")
+        self.report_result([winner] if winner >= 0 else [], reason=reason)
+        self.finish()
 
 if __name__ == "__main__":
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5002
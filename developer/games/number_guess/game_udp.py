@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+遊戲訊息的 UDP 傳輸（選用）
+TCP 遺失一個封包時，之後所有資料都要等重傳完成（head-of-line blocking），即時遊戲會明顯卡頓。
+伺服器設定 udp = True 時，客戶端可在 TCP 連線上送出 {"type": "udp"}，伺服器回覆
+{"type": "udp", "port": 埠號, "token": 權杖}；客戶端以 UDP 送出帶有權杖的 HELLO，
+伺服器收到後先在 TCP 上送出 {"type": "udp_bound"}，之後該玩家的訊息都改走 UDP。
+
+每個 datagram 一則訊息，內容與 TCP 上相同（JSON 或 game_codec 的二進位訊框），前面加上 5 bytes 標頭：
+    1 byte 種類（UNRELIABLE / RELIABLE / ACK / HELLO） + 2 bytes 序號 + 2 bytes 可靠序號
+    UNRELIABLE  遺失不重送，比最後收到的不可靠封包舊的直接丟棄（用於 state_sync 的狀態更新，遺失後下一則差異會補上）
+    RELIABLE    接收端逐則回覆 ACK，傳送端依估計的 RTT 重送直到確認，接收端依可靠序號按順序交付
+超過 MAX_DATAGRAM 的訊息改走 TCP（與 UDP 訊息之間不保證順序）；可靠訊息 GIVE_UP 秒仍未確認時，
+伺服器放棄 UDP 並把尚未確認的訊息改由 TCP 送出。TCP 連線仍用來偵測斷線
+
+本檔案需與 game_runtime.py 一起放在遊戲目錄中上傳，修改後請執行 make sync-runtime
+"""
+import collections
+import json
+import selectors
+import socket
+import struct
+import threading
+import time
+
+from game_codec import BINARY_FLAG, MessageReader
+
+HEADER = struct.Struct("!BHH")
+UNRELIABLE, RELIABLE, ACK, HELLO = range(1, 5)
+SEQ_MASK = 0xFFFF
+MAX_DATAGRAM = 1200  # 不超過常見的 MTU，避免 IP 分段
+MIN_RTO = 0.02
+MAX_RTO = 1.0
+INITIAL_RTO = 0.2
+GIVE_UP = 10.0  # 可靠訊息多久未確認視為 UDP 不通
+REORDER_WINDOW = 1024  # 最多暫存幾則提早到達的可靠訊息
+HELLO_RSEQ = 0
+
+def newer(a, b):
+    """序號 a 是否比 b 新（16 位元循環）"""
+    return 0 < ((a - b) & SEQ_MASK) < 0x8000
+
+class Endpoint:
+    """一端的 UDP 可靠度狀態（伺服器每位玩家一個，客戶端一個），不負責實際收送"""
+    def __init__(self):
+        self.seq = 0
+        self.rseq = 0
+        self.unacked = {}  # {可靠序號: [datagram, 上次送出時間, 第一次送出時間, 重送次數]}
+        self.srtt = None
+        self.rto = INITIAL_RTO
+        self.last_unreliable = None
+        self.expected = 0  # 下一個要交付的可靠序號
+        self.early = {}  # 提早到達的可靠訊息 {可靠序號: 內容}
+        self.stats = {"sent": 0, "resent": 0, "received": 0, "stale": 0, "duplicates": 0}
+
+    def pack(self, payload, reliable=True, kind=None):
+        """包成 datagram；可靠訊息會記錄下來等待確認"""
+        seq = self.seq
+        self.seq = (seq + 1) & SEQ_MASK
+        self.stats["sent"] += 1
+        if not reliable and kind is None:
+            return HEADER.pack(UNRELIABLE, seq, 0) + payload
+        rseq = self.rseq
+        self.rseq = (rseq + 1) & SEQ_MASK
+        datagram = HEADER.pack(kind or RELIABLE, seq, rseq) + payload
+        now = time.monotonic()
+        self.unacked[rseq] = [datagram, now, now, 0]
+        return datagram
+
+    def receive(self, datagram):
+        """處理收到的 datagram，回傳 (可交付的內容, 要回覆的 datagram)"""
+        if len(datagram) < HEADER.size:
+            return [], []
+        kind, seq, rseq = HEADER.unpack_from(datagram)
+        payload = datagram[HEADER.size:]
+        if kind == ACK:
+            entry = self.unacked.pop(rseq, None)
+            if entry and not entry[3]:
+                # 只以沒有重送過的封包估計 RTT
+                sample = time.monotonic() - entry[1]
+                self.srtt = sample if self.srtt is None else self.srtt * 0.875 + sample * 0.125
+                self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt * 2))
+            return [], []
+        self.stats["received"] += 1
+        if kind == UNRELIABLE:
+            if self.last_unreliable is not None and not newer(seq, self.last_unreliable):
+                self.stats["stale"] += 1
+                return [], []
+            self.last_unreliable = seq
+            return [payload], []
+        if kind not in (RELIABLE, HELLO):
+            return [], []
+
+        replies = [HEADER.pack(ACK, 0, rseq)]
+        if kind == HELLO:
+            # 權杖已由呼叫端檢查，不交付
+            payload = None
+        if rseq == self.expected:
+            delivered = [payload] if payload is not None else []
+            self.expected = (self.expected + 1) & SEQ_MASK
+            while self.expected in self.early:
+                early = self.early.pop(self.expected)
+                if early is not None:
+                    delivered.append(early)
+                self.expected = (self.expected + 1) & SEQ_MASK
+            return delivered, replies
+        if newer(rseq, self.expected) and len(self.early) < REORDER_WINDOW:
+            self.early.setdefault(rseq, payload)
+        else:
+            self.stats["duplicates"] += 1
+        return [], replies
+
+    def resend_interval(self, entry):
+        return min(MAX_RTO, self.rto * (2 ** entry[3]))
+
+    def due_resends(self, now):
+        """到期需要重送的 datagram"""
+        due = []
+        for entry in self.unacked.values():
+            if now - entry[1] >= self.resend_interval(entry):
+                entry[1] = now
+                entry[3] += 1
+                due.append(entry[0])
+        self.stats["resent"] += len(due)
+        return due
+
+    def next_resend(self):
+        """下一次需要重送的時間（沒有未確認的訊息時為 None）"""
+        if not self.unacked:
+            return None
+        return min(entry[1] + self.resend_interval(entry) for entry in self.unacked.values())
+
+    def expired(self, now):
+        return any(now - entry[2] > GIVE_UP for entry in self.unacked.values())
+
+    def pending_payloads(self):
+        """尚未確認的可靠訊息內容（依可靠序號排列）"""
+        entries = sorted(self.unacked.items(), key=lambda item: (item[0] - self.rseq) & SEQ_MASK)
+        return [entry[0][HEADER.size:] for _, entry in entries if entry[0][0] == RELIABLE]
+
+class GameTransport:
+    """客戶端：遊戲伺服器的 TCP 連線加上選用的 UDP 通道
+
+    send(訊息, reliable) 在 UDP 建立後改走 UDP（預設可靠），receive() 依序回傳兩條連線收到的訊息。
+    UDP 訊息要等 TCP 上的 udp_bound 之後才交付，確保切換前後的順序。send 可以在其他執行緒呼叫
+    """
+    def __init__(self, sock, codec=None, udp_address=None):
+        self.sock = sock
+        self.codec = codec
+        self.reader = MessageReader(codec)
+        self.udp_address = udp_address  # 預設為 TCP 對端的位址與伺服器回覆的埠號
+        self.udp = None
+        self.endpoint = None
+        self.established = False  # 伺服器已確認 HELLO，可以改用 UDP 送出
+        self.bound = False  # 已收到 udp_bound
+        self.held = []  # udp_bound 之前收到的 UDP 訊息
+        self.queue = collections.deque()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(sock, selectors.EVENT_READ)
+        self.closed = False
+        self.lock = threading.Lock()  # 保護 endpoint 與 TCP 的寫入
+
+    def request_udp(self):
+        """請求改用 UDP（不支援的伺服器會忽略）"""
+        self.send_tcp({"type": "udp"})
+
+    def send_tcp(self, message):
+        with self.lock:
+            self.sock.sendall(json.dumps(message).encode())
+
+    def send(self, message, reliable=True):
+        if not self.established:
+            self.send_tcp(message)
+            return
+        payload = json.dumps(message).encode()
+        if len(payload) + HEADER.size > MAX_DATAGRAM:
+            self.send_tcp(message)
+            return
+        with self.lock:
+            self.send_datagram(self.endpoint.pack(payload, reliable))
+
+    def send_datagram(self, datagram):
+        try:
+            self.udp.send(datagram)
+        except OSError:
+            # 緩衝區已滿或暫時無法送達：不可靠訊息直接遺失，可靠訊息之後重送
+            pass
+
+    def open_udp(self, message):
+        address = self.udp_address or (self.sock.getpeername()[0], message["port"])
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.connect(address)
+        self.udp.setblocking(False)
+        self.selector.register(self.udp, selectors.EVENT_READ)
+        self.endpoint = Endpoint()
+        # HELLO 是第一則可靠訊息（可靠序號 HELLO_RSEQ）
+        self.send_datagram(self.endpoint.pack(message["token"].encode(), kind=HELLO))
+
+    def decode(self, payload):
+        if payload[:1] and payload[0] & BINARY_FLAG and self.codec:
+            return self.codec.decode(payload)[0]
+        return json.loads(payload)
+
+    def handle_tcp_message(self, message):
+        kind = message.get("type")
+        if kind == "udp" and "port" in message and self.udp is None:
+            self.open_udp(message)
+        elif kind == "udp_bound":
+            self.bound = True
+            self.queue.extend(self.held)
+            self.held = []
+        else:
+            self.queue.append(message)
+
+    def read_tcp(self):
+        try:
+            data = self.sock.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.closed = True
+            return
+        self.reader.feed(data)
+        while True:
+            message = self.reader.next_message()
+            if message is None:
+                break
+            self.handle_tcp_message(message)
+
+    def read_udp(self):
+        while True:
+            try:
+                datagram = self.udp.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # 連線被拒（ICMP）：伺服器未開 UDP，繼續使用 TCP
+                return
+            with self.lock:
+                payloads, replies = self.endpoint.receive(datagram)
+                for reply in replies:
+                    self.send_datagram(reply)
+                if not self.established and HELLO_RSEQ not in self.endpoint.unacked:
+                    self.established = True
+            for payload in payloads:
+                message = self.decode(payload)
+                if self.bound:
+                    self.queue.append(message)
+                else:
+                    self.held.append(message)
+
+    def poll(self, timeout):
+        """等待並處理 timeout 秒內收到的資料與到期的重送"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.endpoint:
+                with self.lock:
+                    resend_at = self.endpoint.next_resend()
+                if resend_at is not None:
+                    resend_wait = max(0.0, resend_at - time.monotonic())
+                    wait = resend_wait if wait is None else min(wait, resend_wait)
+            events = self.selector.select(wait)
+            if self.endpoint:
+                with self.lock:
+                    for datagram in self.endpoint.due_resends(time.monotonic()):
+                        self.send_datagram(datagram)
+            for key, _ in events:
+                if key.fileobj is self.sock:
+                    self.read_tcp()
+                else:
+                    self.read_udp()
+            if events or self.closed or (deadline is not None and time.monotonic() >= deadline):
+                return
+
+    def receive(self, timeout=None):
+        """下一則訊息；連線中斷時回傳 None，逾時回傳 None 且 closed 為 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.queue:
+            if self.closed:
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            self.poll(remaining)
+        return self.queue.popleft()
+
+    def close(self):
+        self.selector.close()
+        if self.udp:
+            self.udp.close()
+        self.sock.close()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+遊戲狀態的差異同步
+伺服器以 StateSync 保存有版本號的遊戲狀態（欄位為數值、字串或由這些值組成的串列，串列的每個元素各佔一格），
+每次狀態改變版本號加 1。客戶端送出 {"type": "sync"} 後，伺服器改以下列訊息取代完整的狀態：
+    {"type": "state_keyframe", "version": v, "fields": [欄位], "lengths": [串列長度，非串列為 -1], "values": [每一格的值]}
+    {"type": "state_delta", "version": v, "behind": v - 基準版本, "slots": [改變的格子], "values": [新的值]}
+差異以客戶端最後確認（{"type": "ack", "version": v}）的版本為基準，確認之前送出的差異都是相對同一個基準的累積差異，
+任何一則都能單獨套用。客戶端沒有基準版本時再送一次 sync，伺服器會立即送出完整的 keyframe；
+欄位或串列長度改變、確認的版本過舊，以及每 KEYFRAME_INTERVAL 個版本也會送出 keyframe。
+game_runtime 的 broadcast_state 在狀態太小（空的差異加上確認就不比完整的訊息小）時不使用差異同步，
+客戶端會直接收到完整的訊息，因此客戶端需同時處理兩種訊息
+
+本檔案需與 game_runtime.py 一起放在遊戲目錄中上傳，修改後請執行 make sync-runtime
+"""
+
+# 每隔多少個版本送出一次 keyframe（也是伺服器保留的歷史版本數）
+KEYFRAME_INTERVAL = 32
+
+STATE_MESSAGES = ("state_keyframe", "state_delta")
+
+def flatten(fields):
+    """{欄位: 值} -> (欄位配置, 每一格的值)"""
+    layout = []
+    values = []
+    for name, value in fields.items():
+        if type(value) is list:
+            layout.append((name, len(value)))
+            values.extend(value)
+        else:
+            layout.append((name, -1))
+            values.append(value)
+    return tuple(layout), tuple(values)
+
+def unflatten(layout, values):
+    state = {}
+    offset = 0
+    for name, length in layout:
+        if length < 0:
+            state[name] = values[offset]
+            offset += 1
+        else:
+            state[name] = list(values[offset:offset + length])
+            offset += length
+    return state
+
+def same(a, b):
+    # 1、1.0 與 True 相等但 JSON 不同，型別也要相同
+    return a == b and type(a) is type(b)
+
+class StateSync:
+    """伺服器端：有版本號的遊戲狀態"""
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.version = 0
+        self.fields = {}
+        self.layout = ()
+        self.values = ()
+        self.history = {}  # {版本: (欄位配置, 每一格的值)}
+
+    def update(self, fields):
+        """合併新的欄位值，狀態有改變時版本號加 1，回傳目前的版本"""
+        merged = dict(self.fields, **fields)
+        layout, values = flatten(merged)
+        if self.version and layout == self.layout and all(map(same, values, self.values)):
+            return self.version
+        self.fields = merged
+        self.layout = layout
+        self.values = values
+        self.version += 1
+        self.history[self.version] = (layout, values)
+        self.history.pop(self.version - self.keyframe_interval, None)
+        return self.version
+
+    def keyframe(self):
+        return {
+            "type": "state_keyframe",
+            "version": self.version,
+            "fields": [name for name, _ in self.layout],
+            "lengths": [length for _, length in self.layout],
+            "values": list(self.values),
+        }
+
+    def message_for(self, acked):
+        """相對客戶端已確認版本的更新訊息（已是最新版本時回傳 None）"""
+        if not self.version or acked == self.version:
+            return None
+        base = self.history.get(acked)
+        if base is None or base[0] != self.layout or self.version % self.keyframe_interval == 0:
+            return self.keyframe()
+        old_values = base[1]
+        slots = [i for i, value in enumerate(self.values) if not same(value, old_values[i])]
+        return {
+            "type": "state_delta",
+            "version": self.version,
+            "behind": self.version - acked,
+            "slots": slots,
+            "values": [self.values[i] for i in slots],
+        }
+
+class StateView:
+    """客戶端：套用伺服器送來的 keyframe 與差異"""
+    def __init__(self):
+        self.version = None
+        self.layout = ()
+        self.history = {}  # {版本: 每一格的值}（伺服器可能以任何尚未確認的版本為基準）
+
+    def apply(self, message):
+        """套用一則狀態訊息，回傳要送回伺服器的訊息（ack，或缺少基準版本時的 sync）"""
+        version = message["version"]
+        if message["type"] == "state_keyframe":
+            layout = tuple(zip(message["fields"], message["lengths"]))
+            if layout != self.layout:
+                # 欄位配置改變後舊版本無法再作為基準
+                self.layout = layout
+                self.history = {}
+            self.history[version] = list(message["values"])
+        else:
+            base = self.history.get(version - message["behind"])
+            if base is None:
+                return {"type": "sync"}
+            values = list(base)
+            for slot, value in zip(message["slots"], message["values"]):
+                values[slot] = value
+            self.history[version] = values
+        self.version = version
+        # 伺服器只會以已確認的版本為基準，更舊的版本不再需要
+        for old in [v for v in self.history if v < version - KEYFRAME_INTERVAL]:
+            del self.history[old]
+        return {"type": "ack", "version": version}
+
+    @property
+    def state(self):
+        """目前的狀態 {欄位: 值}"""
+        if self.version is None:
+            return {}
+        return unflatten(self.layout, self.history[self.version])
@@ -2,9 +2,12 @@
 """
 石頭剪刀布多人遊戲客戶端 (CLI)
 """
+import os
 import socket
 import json
 import sys
+from game_codec import MessageReader, load_codec
+from state_sync import STATE_MESSAGES, StateView
 
 class RockPaperScissorsClient:
     def __init__(self, host, port, player_name):
@@ -13,6 +16,11 @@ class RockPaperScissorsClient:
         self.player_name = player_name
         self.socket = None
         self.player_id = None
+        # 每回合的分數與結果以 game_config.json 的 message_schema 二進位編碼
+        self.codec = load_codec()
+        self.reader = MessageReader(self.codec)
+        # 分數以差異同步，new_round 與 round_result 不再附上所有人的分數
+        self.view = StateView()
         
     def connect(self):
         """連線到遊戲伺服器"""
@@ -31,16 +39,21 @@ class RockPaperScissorsClient:
                 print("❌ 無法連線到遊戲伺服器 (重試次數過多)")
                 return False
             
+            if self.codec:
+                # 舊版伺服器在加入前會忽略此請求，繼續以 JSON 送出
+                self.socket.send(json.dumps(self.codec.request()).encode())
+            self.socket.send(json.dumps({"type": "sync"}).encode())
+            
             # 發送加入請求
             self.socket.send(json.dumps({
                 "type": "join",
-                "name": self.player_name
+                "name": self.player_name,
+                "token": os.environ.get("GAMESTORE_JOIN_TOKEN")
             }).encode())
             
             # 接收連線確認
-            data = self.socket.recv(4096).decode()
-            message = json.loads(data)
-            if message["type"] == "connected":
+            message = self.receive_message()
+            if message and message["type"] == "connected":
                 self.player_id = message["player_id"]
                 self.player_name = message["name"]
                 print(f"\n{'='*50}")
@@ -53,6 +66,22 @@ class RockPaperScissorsClient:
             print(f"❌ 連線錯誤: {e}")
             return False
             
+    def receive_message(self):
+        """接收一個完整的訊息（JSON 或二進位，多個訊息黏在一起時保留剩餘資料）"""
+        while True:
+            message = self.reader.receive(self.socket)
+            if not message or message["type"] not in STATE_MESSAGES:
+                return message
+            # 狀態更新：套用後回覆確認，缺少基準版本時伺服器會重送完整狀態
+            self.socket.send(json.dumps(self.view.apply(message)).encode())
+
+    def current_scores(self, message):
+        """訊息附上的分數，同步的客戶端改由已同步的狀態取得"""
+        if "scores" in message:
+            return message["scores"]
+        state = self.view.state
+        return [{"name": name, "score": score} for name, score in zip(state.get("names", []), state.get("scores", []))]
+            
     def display_choices_table(self, choices):
         """顯示所有玩家的選擇"""
         print("\n本回合選擇：")
@@ -84,11 +113,9 @@ class RockPaperScissorsClient:
         
         while not game_over:
             try:
-                data = self.socket.recv(4096).decode()
-                if not data:
+                message = self.receive_message()
+                if not message:
                     break
-                    
-                message = json.loads(data)
                 
                 if message["type"] == "player_update":
                     player_count = message["player_count"]
@@ -105,9 +132,11 @@ class RockPaperScissorsClient:
                     print(f"{'='*50}")
                     
                     if round_num > 1:
-                        self.display_scores(message["scores"])
+                        self.display_scores(self.current_scores(message))
                     
                     # 讓玩家選擇
+                    if message.get("deadline"):
+                        print(f"\n請在 {message['deadline']:g} 秒內出拳，逾時沿用上一回合的選擇")
                     print("\n請選擇你的出拳：")
                     print("  1. ✊ 石頭 (Rock)")
                     print("  2. ✋ 布 (Paper)")
@@ -124,7 +153,8 @@ class RockPaperScissorsClient:
                     # 發送選擇
                     self.socket.send(json.dumps({
                         "type": "choice",
-                        "choice": choice
+                        "choice": choice,
+                        "round": round_num
                     }).encode())
                     
                     print(f"\n你選擇了: {choice}")
@@ -140,6 +170,8 @@ class RockPaperScissorsClient:
                     print(f"{'='*50}")
                     
                     self.display_choices_table(choices)
+                    if message.get("defaulted"):
+                        print(f"(逾時未出拳: {', '.join(message['defaulted'])})")
                     
                     if winners:
                         print(f"\n🎉 本回合贏家: {', '.join(winners)}")
@@ -148,7 +180,10 @@ class RockPaperScissorsClient:
                     else:
                         print("\n🤝 本回合平局！")
                     
-                    self.display_scores(message["scores"])
+                    self.display_scores(self.current_scores(message))
+                    
+                    # 通知伺服器已看完結果，全員就緒即進入下一回合
+                    self.socket.send(json.dumps({"type": "ready"}).encode())
                     
                 elif message["type"] == "game_over":
                     winners = message["winners"]
@@ -1,241 +1,196 @@
 #!/usr/bin/env python3
 """
 石頭剪刀布多人遊戲伺服器 (支援3-10人)
+所有玩家同時出拳，回合在全員出拳或時限到時立即結算；
+全員看完結果（送出 ready）或等待時間到就進入下一回合
+
+game_config.json 中可設定：
+    total_rounds     回合數（預設 5）
+    round_timeout    每回合出拳時限，秒（預設 30）
+    result_timeout   回合結果最長顯示時間，秒（預設 3）
+    start_delay      達到最少人數後等待其他玩家的時間，秒（預設 5）
 """
-import socket
-import json
+import os
 import sys
-import time
-
-class RockPaperScissorsServer:
-    def __init__(self, port, max_players=10, min_players=3):
-        self.port = port
-        self.max_players = max_players
-        self.min_players = min_players
-        self.clients = []
-        self.player_names = []
-        self.server_socket = None
+import rps_resolver
+from game_runtime import EventGameServer, load_game_config
+
+VALID_CHOICES = ("rock", "paper", "scissors")
+DEFAULT_CHOICE = "rock"
+
+class RockPaperScissorsServer(EventGameServer):
+    log_name = "石頭剪刀布伺服器"
+    require_join = True
+
+    def __init__(self, port, max_players=10, min_players=3, config=None):
+        config = config if config is not None else load_game_config(os.path.dirname(os.path.abspath(__file__)))
+        # 30 秒內人數不足則關閉
+        super().__init__(port, min_players=min_players, max_players=max_players,
+                         start_delay=float(config.get("start_delay", 5)), join_timeout=30)
+        self.total_rounds = int(config.get("total_rounds", 5))
+        self.round_timeout = float(config.get("round_timeout", 30))
+        self.result_timeout = float(config.get("result_timeout", 3))
+        self.round_num = 0
         self.choices = {}  # {player_id: choice}
+        self.last_choices = {}  # {player_id: 上一回合的選擇}
         self.scores = {}   # {player_id: score}
-        
-    def start(self):
-        """啟動遊戲伺服器"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind(('0.0.0.0', self.port))
-        self.server_socket.listen(self.max_players)
-        print(f"[石頭剪刀布伺服器] 在埠口 {self.port} 上啟動")
-        print(f"[石頭剪刀布伺服器] 等待 {self.min_players}-{self.max_players} 位玩家...")
-        
-        # 設定超時，等待玩家連線
-        self.server_socket.settimeout(30)
-        
-        try:
-            # 至少需要 min_players 位玩家
-            while len(self.clients) < self.max_players:
-                try:
-                    client_socket, addr = self.server_socket.accept()
-                    
-                    # 簡單的握手檢查
-                    client_socket.settimeout(2.0)
-                    try:
-                        # 接收玩家名稱
-                        data = client_socket.recv(4096).decode()
-                        if not data:
-                            client_socket.close()
-                            continue
-                    except socket.error:
-                        print(f"[石頭剪刀布伺服器] 忽略不穩定的連線: {addr}")
-                        client_socket.close()
-                        continue
-                    
-                    client_socket.settimeout(None)
-                    
-                    try:
-                        message = json.loads(data)
-                    except:
-                        print(f"[石頭剪刀布伺服器] 無效的 JSON 數據")
-                        client_socket.close()
-                        continue
-                    
-                    if message["type"] == "join":
-                        player_name = message.get("name", f"Player{len(self.clients)+1}")
-                        player_id = len(self.clients)
-                        
-                        self.clients.append(client_socket)
-                        self.player_names.append(player_name)
-                        self.scores[player_id] = 0
-                        
-                        print(f"[石頭剪刀布伺服器] {player_name} (玩家 {player_id+1}) 已連線")
-                        
-                        client_socket.send(json.dumps({
-                            "type": "connected",
-                            "player_id": player_id,
-                            "name": player_name
-                        }).encode())
-                        
-                        # 廣播當前玩家列表
-                        self.broadcast({
-                            "type": "player_update",
-                            "player_count": len(self.clients),
-                            "players": self.player_names,
-                            "min_players": self.min_players
-                        })
-                        
-                        # 如果達到最少人數，可以開始遊戲
-                        if len(self.clients) >= self.min_players:
-                            print(f"[石頭剪刀布伺服器] 已達到最少人數 ({self.min_players})，5秒後開始遊戲...")
-                            time.sleep(5)
-                            break
-                            
-                except socket.timeout:
-                    if len(self.clients) >= self.min_players:
-                        print(f"[石頭剪刀布伺服器] 等待超時，以 {len(self.clients)} 位玩家開始遊戲")
-                        break
-                    else:
-                        print(f"[石頭剪刀布伺服器] 等待超時但玩家不足 ({len(self.clients)}/{self.min_players})")
-                        self.close()
-                        return
-        finally:
-            self.server_socket.settimeout(None)
-        
-        if len(self.clients) >= self.min_players:
-            print(f"[石頭剪刀布伺服器] 遊戲開始！共 {len(self.clients)} 位玩家")
-            self.run_game()
-        else:
-            print("[石頭剪刀布伺服器] 玩家人數不足，無法開始遊戲")
-            self.close()
-        
+        self.round_timer = None
+        self.result_timer = None
+        self.ready = set()  # 已看完回合結果的玩家
+
+    def on_player_join(self, player):
+        self.scores[player.player_id] = 0
+        self.send(player, {
+            "type": "connected",
+            "player_id": player.player_id,
+            "name": player.name
+        })
+        self.broadcast_player_update()
+
+    def broadcast_player_update(self):
+        """廣播當前玩家列表"""
+        self.broadcast({
+            "type": "player_update",
+            "player_count": len(self.players),
+            "players": [p.name for p in self.players],
+            "min_players": self.min_players
+        })
+
+    def score_list(self):
+        return [{"name": p.name, "score": self.scores[p.player_id]} for p in self.players]
+
+    def score_state(self):
+        """同步的狀態：依座位排列的名稱與分數（每回合通常只有一兩個分數改變）"""
+        return {"names": [p.name for p in self.players], "scores": [self.scores[p.player_id] for p in self.players]}
+
+    def on_start(self):
+        self.start_round()
+
+    def start_round(self):
+        """通知所有玩家開始新回合"""
+        if self.result_timer:
+            self.result_timer.cancel()
+            self.result_timer = None
+        self.round_num += 1
+        self.choices = {}
+        self.log(f"第 {self.round_num}/{self.total_rounds} 回合開始")
+        self.broadcast_state({
+            "type": "new_round",
+            "round": self.round_num,
+            "total_rounds": self.total_rounds,
+            "deadline": self.round_timeout,
+            "scores": self.score_list()
+        }, self.score_state(), replaces=("scores",))
+        self.round_timer = self.call_later(self.round_timeout, self.resolve_round)
+        # 所有人都已離線時直接結算
+        self.check_round_complete()
+
+    def on_message(self, player, message):
+        if message.get("type") == "ready":
+            self.ready.add(player.player_id)
+            self.check_all_ready()
+            return
+        if message.get("type") != "choice" or not self.round_timer:
+            return
+        if player.player_id in self.choices:
+            return
+        # 逾時後才送達的選擇不計入下一回合
+        if message.get("round", self.round_num) != self.round_num:
+            return
+        choice = message.get("choice")
+        if choice not in VALID_CHOICES:
+            self.log(f"[錯誤] {player.name} 的選擇無效: {choice}")
+            choice = DEFAULT_CHOICE
+        self.choices[player.player_id] = choice
+        self.log(f"{player.name} 選擇了 {choice}")
+        self.check_round_complete()
+
+    def on_disconnect(self, player):
+        if not self.started:
+            self.scores.pop(player.player_id, None)
+            self.broadcast_player_update()
+            return
+        if not self.active_players():
+            self.finish()
+            return
+        self.check_round_complete()
+        self.check_all_ready()
+
+    def check_round_complete(self):
+        """所有在線玩家都出拳後立即結算"""
+        if self.round_timer and all(p.player_id in self.choices for p in self.active_players()):
+            self.resolve_round()
+
     def determine_winners(self, choices):
         """判定每回合的贏家"""
-        # 統計每種選擇的數量
-        rock_count = sum(1 for c in choices.values() if c == "rock")
-        paper_count = sum(1 for c in choices.values() if c == "paper")
-        scissors_count = sum(1 for c in choices.values() if c == "scissors")
-        
-        # 如果三種都有或只有一種，則平局
-        choices_types = (rock_count > 0) + (paper_count > 0) + (scissors_count > 0)
-        if choices_types != 2:
-            return []  # 平局
-        
-        # 判定贏家
-        winners = []
-        if rock_count > 0 and scissors_count > 0 and paper_count == 0:
-            # 石頭贏剪刀
-            winners = [pid for pid, choice in choices.items() if choice == "rock"]
-        elif paper_count > 0 and rock_count > 0 and scissors_count == 0:
-            # 布贏石頭
-            winners = [pid for pid, choice in choices.items() if choice == "paper"]
-        elif scissors_count > 0 and paper_count > 0 and rock_count == 0:
-            # 剪刀贏布
-            winners = [pid for pid, choice in choices.items() if choice == "scissors"]
-        
-        return winners
-        
-    def run_game(self):
-        """執行遊戲邏輯"""
-        total_rounds = 5
-        
-        for round_num in range(1, total_rounds + 1):
-            print(f"\n[石頭剪刀布伺服器] 第 {round_num}/{total_rounds} 回合開始")
-            
-            # 通知所有玩家開始新回合
-            self.broadcast({
-                "type": "new_round",
-                "round": round_num,
-                "total_rounds": total_rounds,
-                "scores": [{"name": self.player_names[i], "score": self.scores[i]} 
-                          for i in range(len(self.clients))]
-            })
-            
-            # 收集所有玩家的選擇
-            self.choices = {}
-            for player_id in range(len(self.clients)):
-                try:
-                    data = self.clients[player_id].recv(4096).decode()
-                    if not data:
-                        raise ConnectionError("連線中斷")
-                    
-                    try:
-                        message = json.loads(data)
-                    except json.JSONDecodeError:
-                        print(f"[錯誤] JSON 解析失敗: {data}")
-                        self.choices[player_id] = "rock"
-                        continue
-                    
-                    if message["type"] == "choice":
-                        self.choices[player_id] = message["choice"]
-                        print(f"[石頭剪刀布伺服器] {self.player_names[player_id]} 選擇了 {message['choice']}")
-                except Exception as e:
-                    print(f"[錯誤] 玩家 {player_id} 斷線: {e}")
-                    self.choices[player_id] = "rock"  # 預設選擇
-            
-            # 判定贏家
-            winners = self.determine_winners(self.choices)
-            
-            # 更新分數
-            for winner_id in winners:
-                self.scores[winner_id] += 1
-            
-            # 準備回合結果
-            round_result = {
-                "type": "round_result",
-                "round": round_num,
-                "choices": {self.player_names[pid]: choice 
-                           for pid, choice in self.choices.items()},
-                "winners": [self.player_names[wid] for wid in winners],
-                "scores": [{"name": self.player_names[i], "score": self.scores[i]} 
-                          for i in range(len(self.clients))]
-            }
-            
-            # 廣播回合結果
-            self.broadcast(round_result)
-            
-            # 等待下一回合
-            if round_num < total_rounds:
-                time.sleep(3)
-        
-        # 遊戲結束，判定最終贏家
+        return rps_resolver.determine_winners(choices)
+
+    def resolve_round(self):
+        """結算回合"""
+        if not self.round_timer:
+            return
+        self.round_timer.cancel()
+        self.round_timer = None
+
+        # 逾時或斷線的玩家沿用上一回合的選擇（第一回合為石頭），結果可重現
+        defaulted = []
+        for player in self.players:
+            if player.player_id not in self.choices:
+                self.choices[player.player_id] = self.last_choices.get(player.player_id, DEFAULT_CHOICE)
+                defaulted.append(player.name)
+        self.last_choices = dict(self.choices)
+
+        names = {p.player_id: p.name for p in self.players}
+        # 依座位排序，同時送達的選擇不論處理順序結果都相同（重播時可逐位元比對）
+        winners = sorted(self.determine_winners(self.choices))
+
+        # 更新分數
+        for winner_id in winners:
+            self.scores[winner_id] += 1
+
+        # 廣播回合結果
+        self.broadcast_state({
+            "type": "round_result",
+            "round": self.round_num,
+            "choices": {names[pid]: choice for pid, choice in sorted(self.choices.items())},
+            "winners": [names[wid] for wid in winners],
+            "defaulted": defaulted,
+            "scores": self.score_list()
+        }, self.score_state(), replaces=("scores",))
+
+        # 全員看完結果或等待時間到才進入下一回合
+        if self.round_num < self.total_rounds:
+            self.ready = set()
+            self.result_timer = self.call_later(self.result_timeout, self.start_round)
+        else:
+            self.end_game()
+
+    def check_all_ready(self):
+        if self.result_timer and all(p.player_id in self.ready for p in self.active_players()):
+            self.start_round()
+
+    def end_game(self):
+        """遊戲結束，判定最終贏家"""
         max_score = max(self.scores.values())
-        final_winners = [i for i, score in self.scores.items() if score == max_score]
-        
+        winner_ids = [p.player_id for p in self.players if self.scores[p.player_id] == max_score]
+        final_winners = [p.name for p in self.players if p.player_id in winner_ids]
+
         self.broadcast({
             "type": "game_over",
-            "winners": [self.player_names[wid] for wid in final_winners],
-            "final_scores": [{"name": self.player_names[i], "score": self.scores[i]} 
-                           for i in range(len(self.clients))]
+            "winners": final_winners,
+            "final_scores": self.score_list()
         })
-        
-        print(f"\n[石頭剪刀布伺服器] 遊戲結束！")
-        print(f"最終贏家: {', '.join([self.player_names[wid] for wid in final_winners])}")
-        
-        time.sleep(2)
-        self.close()
-        
-    def broadcast(self, message):
-        """廣播訊息給所有玩家"""
-        data = json.dumps(message).encode()
-        for client in self.clients:
-            try:
-                client.send(data)
-            except:
-                pass
-                
-    def close(self):
-        """關閉伺服器"""
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-        if self.server_socket:
-            self.server_socket.close()
+
+        self.log("遊戲結束！")
+        print(f"最終贏家: {', '.join(final_winners)}")
+        self.report_result(winner_ids, scores=self.scores)
+        self.finish()
 
 if __name__ == "__main__":
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5003
     min_players = int(sys.argv[2]) if len(sys.argv) > 2 else 3
     max_players = int(sys.argv[3]) if len(sys.argv) > 3 else 10
-    
+
     server = RockPaperScissorsServer(port, max_players, min_players)
     try:
         server.start()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+石頭剪刀布回合結算
+選擇編碼為小整數（石頭 0、布 1、剪刀 2、無效 3），回合中出現過的選擇集合查表即可得知獲勝的選擇
+
+resolve_batch 可一次結算多場對戰的大量回合：所有回合的選擇串接成一個 bytes 緩衝區，
+編碼、查表與 bytes.translate 都以內建迭代器在 C 層完成；有安裝 NumPy 時改以 reduceat 向量化計算
+"""
+from collections import defaultdict
+from itertools import accumulate, chain, combinations, compress
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ROCK, PAPER, SCISSORS, UNKNOWN = 0, 1, 2, 3
+NAMES = ("rock", "paper", "scissors")
+CODES = defaultdict(lambda: UNKNOWN, ((name, code) for code, name in enumerate(NAMES)))
+NO_WINNER = 255
+
+# 出現過的選擇集合 -> 獲勝的選擇；三種都有或只有一種為平局，無效選擇不影響勝負
+BEATS = {ROCK: SCISSORS, PAPER: ROCK, SCISSORS: PAPER}
+WINNING_BY_SET = {}
+for _size in range(5):
+    for _present in combinations((ROCK, PAPER, SCISSORS, UNKNOWN), _size):
+        _valid = set(_present) - {UNKNOWN}
+        _winner = NO_WINNER
+        if len(_valid) == 2:
+            _winner = next(code for code in _valid if BEATS[code] in _valid)
+        WINNING_BY_SET[frozenset(_present)] = _winner
+
+# bytes.translate 用的對照表：獲勝的選擇轉為 1，其餘為 0
+FLAG_TABLES = {winner: bytes(code == winner for code in range(256)) for winner in set(WINNING_BY_SET.values())}
+
+# 位元遮罩版本的對照表（NumPy 使用）
+WINNING = [NO_WINNER] * 16
+for _present, _winner in WINNING_BY_SET.items():
+    WINNING[sum(1 << code for code in _present)] = _winner
+
+# 回合數少於此值時 NumPy 的轉換成本高於內建迭代器
+NUMPY_MIN_ROUNDS = 256
+
+def determine_winners(choices):
+    """判定單一回合的贏家 player_id 列表"""
+    winner = WINNING_BY_SET[frozenset(map(CODES.__getitem__, choices.values()))]
+    if winner == NO_WINNER:
+        return []
+    name = NAMES[winner]
+    return [pid for pid, choice in choices.items() if choice == name]
+
+def encode_rounds(rounds):
+    """將多個回合 [{player_id: choice}, ...] 串接為 (codes, players, offsets)
+
+    offsets[i] 到 offsets[i + 1] 為第 i 回合在 codes / players 中的範圍
+    """
+    codes = bytes(map(CODES.__getitem__, chain.from_iterable(map(dict.values, rounds))))
+    players = list(chain.from_iterable(rounds))
+    offsets = [0]
+    offsets.extend(accumulate(map(len, rounds)))
+    return codes, players, offsets
+
+def winner_flags(codes, offsets, use_numpy=None):
+    """批次計算每個選擇是否獲勝，回傳與 codes 等長的 bytes（贏家為 1）"""
+    if use_numpy is None:
+        use_numpy = numpy is not None and len(offsets) > NUMPY_MIN_ROUNDS
+    if use_numpy:
+        return _winner_flags_numpy(codes, offsets)
+    segments = list(map(codes.__getitem__, map(slice, offsets, offsets[1:])))
+    winners = map(WINNING_BY_SET.__getitem__, map(frozenset, segments))
+    return b"".join(map(bytes.translate, segments, map(FLAG_TABLES.__getitem__, winners)))
+
+def _winner_flags_numpy(codes, offsets):
+    codes = numpy.frombuffer(codes, dtype=numpy.uint8)
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    lengths = numpy.diff(offsets)
+    masks = numpy.zeros(len(lengths), dtype=numpy.uint8)
+    # reduceat 遇到空區段會取錯值，只對有選擇的回合計算
+    nonempty = lengths > 0
+    if codes.size:
+        bits = numpy.left_shift(numpy.uint8(1), codes)
+        masks[nonempty] = numpy.bitwise_or.reduceat(bits, offsets[:-1][nonempty])
+    winners = numpy.array(WINNING, dtype=numpy.uint8)[masks]
+    return (codes == numpy.repeat(winners, lengths)).astype(numpy.uint8).tobytes()
+
+def resolve_batch(rounds, use_numpy=None):
+    """一次結算多個回合，回傳每回合的贏家列表（與 determine_winners 結果相同）"""
+    codes, players, offsets = encode_rounds(rounds)
+    flags = winner_flags(codes, offsets, use_numpy)
+    return [list(compress(players[start:end], flags[start:end])) if flags.find(1, start, end) >= 0 else []
+            for start, end in zip(offsets, offsets[1:])]
+
+def score_batch(rounds, scores, use_numpy=None):
+    """一次結算多個回合，只將分數累加到 scores（不建立每回合的贏家列表）
+
+    不同對戰的玩家可用 (match_id, player_id) 當作鍵
+    """
+    codes, players, offsets = encode_rounds(rounds)
+    for player in compress(players, winner_flags(codes, offsets, use_numpy)):
+        scores[player] = scores.get(player, 0) + 1
+    return scores
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+井字遊戲棋盤引擎
+以兩個整數的位元表示雙方棋子（第 row * size + col 個位元代表一格），
+所有連線的位元遮罩在第一次使用時預先計算並依 (size, k) 快取；
+落子後只檢查經過該格的連線，勝負與平手判定都是常數時間
+
+支援 N×N 棋盤、連成 k 子獲勝的變體（例如 15×15 五子棋）
+"""
+
+SYMBOLS = "XO"
+EMPTY = "."
+
+_MASK_CACHE = {}
+
+def line_masks(size, k):
+    """回傳 (每一格經過的連線遮罩, 全滿遮罩)"""
+    key = (size, k)
+    if key not in _MASK_CACHE:
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                # 橫、直、右下斜、左下斜
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + dr * (k - 1), col + dc * (k - 1)
+                    if not (0 <= end_row < size and 0 <= end_col < size):
+                        continue
+                    mask = 0
+                    for step in range(k):
+                        mask |= 1 << ((row + dr * step) * size + col + dc * step)
+                    lines.append(mask)
+        by_cell = [tuple(m for m in lines if m >> cell & 1) for cell in range(size * size)]
+        _MASK_CACHE[key] = (by_cell, (1 << size * size) - 1)
+    return _MASK_CACHE[key]
+
+class Board:
+    """N×N、連成 k 子獲勝的棋盤"""
+    __slots__ = ("size", "k", "bits", "moves", "cell_masks", "full_mask")
+
+    def __init__(self, size=3, k=None):
+        k = k or size
+        if not 1 <= k <= size:
+            raise ValueError("連線長度必須介於 1 與棋盤大小之間")
+        self.size = size
+        self.k = k
+        self.bits = [0, 0]  # 玩家 0 (X)、玩家 1 (O)
+        self.moves = 0
+        self.cell_masks, self.full_mask = line_masks(size, k)
+
+    def is_empty(self, row, col):
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            return False
+        return not ((self.bits[0] | self.bits[1]) >> (row * self.size + col) & 1)
+
+    def play(self, player, row, col):
+        """落子，回傳 "win"、"draw" 或 None；位置不合法時丟出 ValueError"""
+        if not self.is_empty(row, col):
+            raise ValueError("該位置已被佔用或超出範圍")
+        cell = row * self.size + col
+        bits = self.bits[player] | (1 << cell)
+        self.bits[player] = bits
+        self.moves += 1
+
+        for mask in self.cell_masks[cell]:
+            if bits & mask == mask:
+                return "win"
+        if (self.bits[0] | self.bits[1]) == self.full_mask:
+            return "draw"
+        return None
+
+    def cells(self):
+        """精簡的棋盤字串，由左上到右下逐格以 X / O / . 表示"""
+        x, o = self.bits
+        return "".join(
+            SYMBOLS[0] if x >> cell & 1 else SYMBOLS[1] if o >> cell & 1 else EMPTY
+            for cell in range(self.size * self.size)
+        )
@@ -2,50 +2,52 @@
 """
 井字遊戲客戶端 (CLI)
 """
+import os
 import socket
 import json
 import sys
+from game_codec import MessageReader, load_codec
+from state_sync import STATE_MESSAGES, StateView
 
 class TicTacToeClient:
-    def __init__(self, host, port):
+    def __init__(self, host, port, player_name=None):
         self.host = host
         self.port = port
+        self.player_name = player_name  # 大廳帳號，用於記錄對戰結果
         self.socket = None
         self.player_id = None
         self.symbol = None
+        self.size = 3
+        self.win_length = 3
+        # 伺服器的棋盤更新以 game_config.json 的 message_schema 二進位編碼
+        self.codec = load_codec()
+        self.reader = MessageReader(self.codec)
+        # 棋盤以差異同步，只收到改變的格子
+        self.view = StateView()
         
     def receive_message(self):
-        """接收並解析 JSON 訊息"""
-        chunks = []
-        self.socket.settimeout(30.0)  # 設置 30 秒超時
+        """接收並解析一則訊息（多個訊息黏在一起時保留剩餘資料給下一次讀取）"""
+        # 回合逾時由伺服器判定，這裡不需設定接收超時
+        self.socket.settimeout(None)
         while True:
             try:
-                chunk = self.socket.recv(4096).decode('utf-8')
+                message = self.reader.next_message()
+                if message is not None and message["type"] in STATE_MESSAGES:
+                    reply = self.view.apply(message)
+                    self.socket.sendall(json.dumps(reply).encode())
+                    if reply["type"] != "ack":
+                        continue
+                    state = self.view.state
+                    return {"type": "board_update", "cells": "".join(state["cells"]),
+                            "size": state["size"], "current_player": state["current_player"]}
+                if message is not None:
+                    return message
+                chunk = self.socket.recv(4096)
                 if not chunk:
                     print("[DEBUG] 收到空數據，連線關閉")
                     return None
-                print(f"[DEBUG] 收到數據塊 ({len(chunk)} bytes): {chunk[:100]}...")
-                chunks.append(chunk)
-                full_data = ''.join(chunks)
-                # 嘗試解析，如果成功返回第一個完整的 JSON 對象
-                try:
-                    message = json.loads(full_data)
-                    return message
-                except json.JSONDecodeError as e:
-                    # 如果是 Extra data 錯誤，說明收到多個 JSON，取第一個
-                    if "Extra data" in str(e):
-                        # 找到第一個完整 JSON 的結束位置
-                        try:
-                            decoder = json.JSONDecoder()
-                            message, idx = decoder.raw_decode(full_data)
-                            return message
-                        except:
-                            continue
-                    # 否則繼續接收
-                    continue
-            except socket.timeout:
-                print("❌ 接收超時")
-                return None
+                print(f"[DEBUG] 收到數據塊 ({len(chunk)} bytes): {chunk[:100]!r}...")
+                self.reader.feed(chunk)
             except Exception as e:
                 print(f"❌ 接收錯誤: {e}")
                 return None
@@ -72,26 +74,40 @@ class TicTacToeClient:
             print("❌ 無法連線到遊戲伺服器 (重試次數過多)")
             return False
         
+        if self.codec:
+            # 舊版伺服器會忽略此請求，繼續以 JSON 送出
+            self.socket.sendall(json.dumps(self.codec.request()).encode())
+        self.socket.sendall(json.dumps({"type": "sync"}).encode())
+        if self.player_name:
+            self.socket.sendall(json.dumps({"type": "join", "name": self.player_name,
+                                           "token": os.environ.get("GAMESTORE_JOIN_TOKEN")}).encode())
+        
         # 接收連線確認
         message = self.receive_message()
         print(f"[DEBUG] 收到連線確認: {message}")
         if message["type"] == "connected":
             self.player_id = message["player_id"]
             self.symbol = message["symbol"]
+            self.size = message.get("size", 3)
+            self.win_length = message.get("win_length", self.size)
             print(f"\n========== 井字遊戲 ==========")
             print(f"你是玩家 {self.player_id + 1}，你的符號是 '{self.symbol}'")
+            if self.size != 3:
+                print(f"{self.size}×{self.size} 棋盤，連成 {self.win_length} 子獲勝")
             print(f"=============================\n")
             return True
         return False
         
-    def display_board(self, board):
-        """顯示棋盤"""
+    def display_board(self, cells, size):
+        """顯示棋盤（cells 為逐格的 X / O / . 字串）"""
+        separator = "    +" + "---+" * size
         print("\n  當前棋盤：")
-        print("     0   1   2")
-        print("   +---+---+---+")
-        for i, row in enumerate(board):
-            print(f" {i} | {row[0]} | {row[1]} | {row[2]} |")
-            print("   +---+---+---+")
+        print("    " + "".join(f"{col:^4}" for col in range(size)))
+        print(separator)
+        for row in range(size):
+            line = cells[row * size:(row + 1) * size].replace(".", " ")
+            print(f" {row:>2} | " + " | ".join(line) + " |")
+            print(separator)
         print()
         
     def play(self):
@@ -106,18 +122,17 @@ class TicTacToeClient:
                 break
             
             if message["type"] == "board_update":
-                board = message["board"]
                 current_player = message["current_player"]
                 
-                self.display_board(board)
+                self.display_board(message["cells"], message["size"])
                 
                 if current_player == self.player_id:
                     # 輪到我下棋
                     while True:
                         try:
                             print(f"輪到你了！({self.symbol})")
-                            row = int(input("請輸入行號 (0-2): "))
-                            col = int(input("請輸入列號 (0-2): "))
+                            row = int(input(f"請輸入行號 (0-{self.size - 1}): "))
+                            col = int(input(f"請輸入列號 (0-{self.size - 1}): "))
                             
                             # 發送移動
                             self.socket.sendall(json.dumps({
@@ -156,10 +171,12 @@ class TicTacToeClient:
                 
     def handle_game_over(self, message):
         """處理遊戲結束"""
-        self.display_board(message["board"])
+        self.display_board(message["cells"], message["size"])
         
         if message["reason"] == "draw":
             print("\n========== 平局！ ==========\n")
+        elif message["reason"] in ("timeout", "disconnect") and message["winner"] == self.player_id:
+            print("\n🎉 ========== 對手逾時或離線，你贏了！ ========== 🎉\n")
         else:
             winner_id = message["winner"]
             if winner_id == self.player_id:
@@ -179,8 +196,9 @@ if __name__ == "__main__":
     else:
         host = "localhost"
         port = 5001
+    player_name = sys.argv[3] if len(sys.argv) > 3 else None
     
-    client = TicTacToeClient(host, port)
+    client = TicTacToeClient(host, port, player_name)
     try:
         if client.connect():
             client.play()
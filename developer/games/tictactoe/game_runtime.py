@@ -0,0 +1,1076 @@
+#!/usr/bin/env python3
+"""
+遊戲伺服器執行環境
+以 selectors 實作的單執行緒事件迴圈：所有玩家的連線都設為非阻塞，
+每位玩家有各自的接收/傳送緩衝區，任何一位玩家卡住都不會擋住其他人
+
+遊戲只需繼承 EventGameServer 並實作以下掛勾：
+    on_player_join(player)         玩家加入（遊戲開始前）
+    on_start()                     人數到齊，遊戲開始
+    on_message(player, message)    收到玩家的一個完整 JSON 訊息
+    on_disconnect(player)          玩家斷線
+回合計時使用 call_later(秒數, 函式, *參數)，回傳的計時器可用 cancel() 取消；
+遊戲結束時先以 report_result(贏家座位列表) 回報結果，再呼叫 finish()，伺服器會送完所有待送資料後關閉
+
+即時遊戲改為繼承 TickGameServer，以固定頻率呼叫 on_tick(tick, 輸入)（見 TickGameServer 的說明）
+
+由大廳啟動時（環境變數 GAMESTORE_RESULT_ADDR），report_result 會把結果送回大廳記入排行榜。
+玩家以名稱對應到大廳帳號：客戶端連線後送出 {"type": "join", "name": 大廳帳號, "token": 加入權杖}
+（require_join 為 False 的遊戲也一樣，大廳會把帳號當作第 3 個參數、
+加入權杖以環境變數 GAMESTORE_JOIN_TOKEN 傳給遊戲客戶端）。
+第一次提供名稱時依 GAMESTORE_RESULT_PLAYERS（{帳號: 玩家 ID}）找出玩家 ID，
+加入權杖驗證通過（以 GAMESTORE_RESULT_TOKEN 為金鑰的 HMAC(房間 ID:玩家 ID)）才記下該連線的玩家 ID，
+冒用別人帳號名稱的連線不會計入結果；每個 ID 只對應一條連線，之後改名不影響；回報結果時以玩家 ID 指明玩家
+
+由大廳啟動且大廳開放觀戰時（環境變數 GAMESTORE_SPECTATOR_RELAY），broadcast 的訊息
+會另外經由一條連線送到觀戰轉播站，由轉播站轉送給觀眾；只送給單一玩家的 send 不會公開
+
+遊戲目錄的 game_config.json 宣告 message_schema 時（格式見 game_codec.py），
+送出 {"type": "codec", "schema": ...} 的客戶端會以二進位格式收到 schema 中的訊息，其餘客戶端與觀眾仍收到 JSON
+
+重複整個遊戲狀態的訊息（例如棋盤）改用 broadcast_state(訊息, 狀態)：狀態記入 self.state（state_sync.py），
+送出 {"type": "sync"} 的客戶端只收到相對已確認版本的差異，其餘客戶端與觀眾仍收到完整的訊息；
+狀態太小、差異同步省不下流量時（見 broadcast_state 的說明），同步的客戶端也收到完整的訊息
+
+即時遊戲可設定類別屬性 udp = True：客戶端以 game_udp.GameTransport 連線並送出 {"type": "udp"} 後，
+該玩家的訊息改走 UDP（格式見 game_udp.py）。send / broadcast 預設為可靠訊息（reliable=False 時遺失不重送），
+broadcast_state 的狀態差異一律以不可靠訊息送出；UDP 的訊息不寫入對戰紀錄
+
+設定環境變數 GAMESTORE_REPLAY_DIR 時，伺服器會在該目錄寫入附加式的二進位對戰紀錄
+（連線、收到的原始資料、送出的訊息、斷線），可用 developer/replay_match.py 重播
+
+本檔案與 game_codec.py、state_sync.py、game_udp.py 需與 game_server.py 放在同一個遊戲目錄中上傳，
+修改後請執行 make sync-runtime 同步到各個內建遊戲
+"""
+import codecs
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import os
+import secrets
+import selectors
+import socket
+import struct
+import sys
+import time
+
+from game_codec import load_codec
+from state_sync import STATE_MESSAGES, StateSync
+from game_udp import Endpoint, HEADER, HELLO, MAX_DATAGRAM
+
+# 單一玩家未解析資料的上限，超過視為異常連線
+MAX_BUFFER_SIZE = 1024 * 1024
+
+# 對戰紀錄格式：檔頭之後每筆為 (開始後秒數, 種類, 連線編號, 資料長度) + 資料
+REPLAY_MAGIC = b"GSREPLAY1\n"
+REPLAY_RECORD = struct.Struct("<dBHI")
+REPLAY_META, REPLAY_CONNECT, REPLAY_RECV, REPLAY_SEND, REPLAY_DISCONNECT = range(5)
+REPLAY_NO_INDEX = 0xFFFF
+
+def load_game_config(game_dir=None):
+    """讀取遊戲目錄中的 game_config.json（讀取失敗時回傳空字典）"""
+    path = os.path.join(game_dir or os.getcwd(), "game_config.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_roster():
+    """讀取大廳傳入的房間玩家 GAMESTORE_RESULT_PLAYERS（{帳號: 玩家 ID}，未設定或格式錯誤時為空）"""
+    try:
+        roster = json.loads(os.environ.get("GAMESTORE_RESULT_PLAYERS") or "{}")
+    except ValueError:
+        return {}
+    if not isinstance(roster, dict):
+        return {}
+    return {name: player_id for name, player_id in roster.items() if type(player_id) is int}
+
+def join_token(match_token, room_id, player_id):
+    """大廳發給玩家的加入權杖（與 server/match_results.py 的 join_token 相同）"""
+    payload = f"{room_id}:{player_id}".encode()
+    return hmac.new(match_token.encode(), payload, hashlib.sha256).hexdigest()
+
+class ReplayLog:
+    """附加寫入的二進位對戰紀錄（寫入緩衝，結束時才落盤）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab", buffering=256 * 1024)
+        if self.file.tell() == 0:
+            self.file.write(REPLAY_MAGIC)
+        self.started = time.monotonic()
+
+    def write(self, kind, index, payload=b""):
+        self.file.write(REPLAY_RECORD.pack(time.monotonic() - self.started, kind,
+                                           REPLAY_NO_INDEX if index is None else index, len(payload)))
+        self.file.write(payload)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_replay(path):
+    """逐筆讀出對戰紀錄，產生 (秒數, 種類, 連線編號, 資料)"""
+    with open(path, "rb") as f:
+        if f.read(len(REPLAY_MAGIC)) != REPLAY_MAGIC:
+            raise ValueError(f"不是對戰紀錄檔: {path}")
+        while True:
+            header = f.read(REPLAY_RECORD.size)
+            if len(header) < REPLAY_RECORD.size:
+                return
+            when, kind, index, length = REPLAY_RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                # 伺服器異常結束時最後一筆可能不完整
+                return
+            yield when, kind, None if index == REPLAY_NO_INDEX else index, payload
+
+class SpectatorFeed:
+    """送往觀戰轉播站的連線：每則公開訊息只寫入一次，與觀眾人數無關"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.outbox = bytearray()
+
+class Timer:
+    """call_later 回傳的計時器"""
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Player:
+    """一位連線中的玩家"""
+    def __init__(self, sock, address, index=None):
+        self.sock = sock
+        self.address = address
+        self.index = index  # 連線順序編號（對戰紀錄使用）
+        self.player_id = None  # 加入後分配的座位編號（0 起算）
+        self.name = None
+        self.named = False  # 名稱是否由客戶端提供
+        self.account_id = None  # 對應到的大廳玩家 ID（回報結果使用）
+        self.joined = False
+        self.connected = True
+        self.closing = False
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.outbox = bytearray()
+        self.binary = False  # 是否以二進位格式接收 message_schema 中的訊息
+        self.inputs = {}  # TickGameServer：{tick: [尚未處理的輸入]}
+        self.udp = None  # UDP 通道的 game_udp.Endpoint（未使用 UDP 時為 None）
+        self.udp_address = None
+        self.udp_timer = None  # 可靠訊息的重送計時器
+        self.synced = False  # 是否以差異接收 broadcast_state 的狀態
+        self.acked = None  # 客戶端已確認的狀態版本
+
+class EventGameServer:
+    """非阻塞的多人遊戲伺服器基底類別
+
+    min_players / max_players：人數達到 max_players 立即開始；
+    達到 min_players 後再等 start_delay 秒，期間有人加入則重新計時。
+    由大廳啟動時，環境變數 GAMESTORE_EXPECTED_PLAYERS 為房間人數，該房間的玩家到齊就立即開始。
+    join_timeout 秒內未達 min_players 時關閉伺服器（None 表示不限時）。
+    require_join 為 True 時，玩家需先送出 {"type": "join", "name": ...} 才算加入
+    """
+    log_name = "遊戲伺服器"
+    require_join = False
+    udp = False
+
+    def __init__(self, port, min_players=2, max_players=2, host='0.0.0.0',
+                 start_delay=0.0, join_timeout=None):
+        self.port = port
+        self.host = host
+        self.min_players = min_players
+        self.max_players = max_players
+        self.start_delay = start_delay
+        self.join_timeout = join_timeout
+        expected = int(os.environ.get("GAMESTORE_EXPECTED_PLAYERS") or 0)
+        self.expected_players = max(min_players, min(expected, max_players)) if expected else None
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = None
+        self.connections = []  # 所有連線（含尚未加入的）
+        self.players = []  # 已加入的玩家，依座位編號排序
+        self.started = False
+        self.finished = False
+        self.timers = []  # [(when, seq, Timer)]
+        self.timer_seq = itertools.count()
+        self.start_timer = None
+        self.close_deadline = None
+        self.connection_seq = itertools.count()
+        self.replay_dir = os.environ.get("GAMESTORE_REPLAY_DIR")
+        self.replay = None
+        self.spectator_relay = os.environ.get("GAMESTORE_SPECTATOR_RELAY")
+        self.spectator_feed = None
+        self.result_addr = os.environ.get("GAMESTORE_RESULT_ADDR")
+        self.result_reported = False
+        self.roster = load_roster()  # {大廳帳號: 玩家 ID}
+        self.codec = load_codec(self.game_dir())
+        self.state = StateSync()
+        self.state_message = None  # 最後一則 broadcast_state 的 (訊息, 其他欄位)
+        self.udp_socket = None
+        self.udp_peers = {}  # {UDP 位址: 玩家}
+        self.udp_tokens = {}  # {權杖: 尚未建立 UDP 的玩家}
+
+    # ---------- 遊戲掛勾 ----------
+
+    def on_player_join(self, player):
+        """玩家加入（預設送出 connected 訊息）"""
+        self.send(player, {"type": "connected", "player_id": player.player_id})
+
+    def on_start(self):
+        """遊戲開始"""
+
+    def on_message(self, player, message):
+        """收到玩家訊息"""
+
+    def on_disconnect(self, player):
+        """玩家斷線（預設遊戲進行中有人斷線就結束遊戲）"""
+        if self.started:
+            self.finish()
+
+    # ---------- 公開介面 ----------
+
+    def log(self, text):
+        print(f"[{self.log_name}] {text}")
+
+    def call_later(self, delay, callback, *args):
+        """delay 秒後在事件迴圈中呼叫 callback(*args)"""
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_at(self, when, callback, *args):
+        """在 time.monotonic() 到達 when 時呼叫 callback(*args)"""
+        timer = Timer(when, callback, args)
+        heapq.heappush(self.timers, (timer.when, next(self.timer_seq), timer))
+        return timer
+
+    def send(self, player, message, reliable=True):
+        """將訊息放入玩家的傳送緩衝區並盡量立即送出（reliable 只影響使用 UDP 的玩家）"""
+        if not player.connected or player.closing:
+            return
+        self.send_data(player, self.encode(message, player.binary), reliable)
+
+    def encode(self, message, binary=False):
+        """以 JSON 或 message_schema 的二進位格式編碼（schema 中沒有的訊息仍為 JSON）"""
+        data = self.codec.encode(message) if binary else None
+        if data is None:
+            # 狀態訊息通常只有幾個格子，省去 JSON 的空白，格式本身的位元組才不會比完整的訊息多
+            separators = (",", ":") if message.get("type") in STATE_MESSAGES else None
+            data = json.dumps(message, separators=separators).encode("utf-8")
+        return data
+
+    def send_data(self, player, data, reliable=True):
+        """送出已編碼的訊息；使用 UDP 的玩家以 datagram 送出，過大的訊息仍走 TCP"""
+        if player.udp and len(data) + HEADER.size <= MAX_DATAGRAM:
+            self.send_datagram(player, player.udp.pack(data, reliable))
+            if reliable:
+                self.schedule_resend(player)
+            return
+        if self.replay:
+            self.replay.write(REPLAY_SEND, player.index, data)
+        player.outbox += data
+        self.flush(player)
+
+    def broadcast(self, message, exclude=None, reliable=True):
+        """廣播訊息給所有已加入的玩家（同時公開給觀眾）"""
+        data = json.dumps(message).encode("utf-8")
+        self.publish_data(data)
+        binary = None  # 第一位使用二進位格式的玩家需要時才編碼，所有人共用
+        for player in self.players:
+            if player is exclude or not player.connected or player.closing:
+                continue
+            payload = data
+            if player.binary:
+                if binary is None:
+                    binary = self.codec.encode(message) or data
+                payload = binary
+            self.send_data(player, payload, reliable)
+
+    def broadcast_state(self, message, state, replaces=None):
+        """廣播包含遊戲狀態的訊息
+
+        state 為訊息中狀態部分的 {欄位: 值}（串列的每個元素分開比較），記入 self.state；
+        replaces 為訊息中可由狀態還原的欄位（預設為全部）。要求同步的玩家收到狀態的差異（UDP 上為不可靠訊息），
+        訊息去掉 replaces 後若還有其他欄位再另外送出；其餘玩家與觀眾收到完整的訊息。
+        狀態太小時（沒有任何格子改變的差異加上其他欄位與客戶端的確認，編碼後就不比完整的訊息小，例如 3x3 的井字遊戲），
+        同步的玩家也只收到完整的訊息，不送 keyframe、也不需確認；
+        差異（加上其他欄位與確認）不比完整的訊息小時也改送完整的訊息，之後的差異仍以玩家最後確認的版本為基準
+        """
+        self.state.update(state)
+        data = json.dumps(message).encode("utf-8")
+        self.publish_data(data)
+        if replaces is None:
+            rest = None
+        else:
+            rest = {key: value for key, value in message.items() if key not in replaces}
+            if len(rest) <= 1:
+                rest = None
+        self.state_message = (message, rest)
+        payloads = {}  # {(已確認版本, 是否二進位): [(資料, 是否可靠)]}，確認到同一版本的玩家共用
+        for player in self.players:
+            if not player.connected or player.closing:
+                continue
+            if not player.synced:
+                self.send_data(player, data)
+                continue
+            key = (player.acked, player.binary)
+            if key not in payloads:
+                payloads[key] = self.state_payloads(message, rest, player.acked, player.binary, data)
+            for payload, reliable in payloads[key]:
+                self.send_data(player, payload, reliable)
+
+    def state_payloads(self, message, rest, acked, binary, data=None):
+        """同步的玩家（已確認 acked 版本、是否二進位）這次要收到的 [(資料, 是否可靠)]"""
+        full = self.encode(message, binary) if binary or data is None else data
+        # 完整的訊息帶有其他欄位時需可靠送達
+        fallback = [(full, rest is not None)]
+        if self.state_too_small(full, rest, binary):
+            return fallback
+        # 遺失的差異由之後以已確認版本為基準的差異補上，不需重送
+        update = self.state.message_for(acked)
+        sent = [(self.encode(update, binary), False)] if update else []
+        if rest:
+            sent.append((self.encode(rest, binary), True))
+        # keyframe 是之後差異的基準，一律送出
+        if (update and update["type"] == "state_delta"
+                and sum(len(payload) for payload, _ in sent) + self.ack_size() >= len(full)):
+            return fallback
+        return sent
+
+    def state_too_small(self, full, rest, binary):
+        """沒有任何格子改變的差異加上其他欄位與確認就不比完整的訊息小：差異同步不可能省下流量"""
+        empty = {"type": "state_delta", "version": self.state.version, "behind": 1, "slots": [], "values": []}
+        size = len(self.encode(empty, binary)) + self.ack_size()
+        if rest:
+            size += len(self.encode(rest, binary))
+        return size >= len(full)
+
+    def state_message_too_small(self, player):
+        """最後一則 broadcast_state 對這位玩家是否太小而不使用差異同步（此時不需要 keyframe）"""
+        if not self.state_message:
+            return False
+        message, rest = self.state_message
+        return self.state_too_small(self.encode(message, player.binary), rest, player.binary)
+
+    def ack_size(self):
+        # 差異需要客戶端送回確認，完整的訊息不需要，比較大小時一併計入
+        return len(json.dumps({"type": "ack", "version": self.state.version}))
+
+    def publish(self, message):
+        """只送給觀眾的訊息"""
+        self.publish_data(json.dumps(message).encode("utf-8"))
+
+    def report_result(self, winners, scores=None, reason=None):
+        """回報對戰結果給大廳（每場只回報一次）
+
+        winners 為贏家的座位編號列表，空列表或全員皆為贏家時視為平手；
+        scores 為 {座位編號: 分數}（可省略）
+        """
+        if self.result_reported:
+            return
+        self.result_reported = True
+        winners = set(winners)
+        draw = not winners or all(p.player_id in winners for p in self.players)
+        players = []
+        for player in self.players:
+            result = "draw" if draw else "win" if player.player_id in winners else "loss"
+            entry = {"seat": player.player_id, "name": player.name, "result": result}
+            if player.account_id is not None:
+                entry["player_id"] = player.account_id
+            if scores and player.player_id in scores:
+                entry["score"] = scores[player.player_id]
+            players.append(entry)
+        self.send_result({
+            "type": "report_match_result",
+            "room_id": int(os.environ.get("GAMESTORE_RESULT_ROOM", "0")),
+            "token": os.environ.get("GAMESTORE_RESULT_TOKEN"),
+            "players": players,
+            "reason": reason
+        })
+
+    def active_players(self):
+        """仍在線上的玩家"""
+        return [p for p in self.players if p.connected]
+
+    def finish(self, linger=5.0):
+        """結束遊戲：送完待送資料後關閉所有連線"""
+        if self.finished:
+            return
+        self.finished = True
+        self.close_deadline = time.monotonic() + linger
+        if self.replay:
+            # 大廳可能在遊戲結束後直接終止行程，先把紀錄寫入磁碟
+            self.replay.flush()
+        # 觀眾不需要等玩家斷線，遊戲結束就停止轉播
+        self.close_spectator_feed(flush=True)
+        for player in list(self.connections):
+            self.begin_close(player)
+
+    def start(self):
+        """啟動伺服器並執行事件迴圈直到遊戲結束"""
+        self.listen()
+        self.run()
+
+    def listen(self):
+        """開始監聽並寫入對戰紀錄的檔頭（start 的前半段）"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(max(self.max_players, 8))
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        if self.udp:
+            # UDP 使用與 TCP 相同的埠號
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.bind((self.host, self.server_socket.getsockname()[1]))
+            self.udp_socket.setblocking(False)
+            self.selector.register(self.udp_socket, selectors.EVENT_READ)
+        self.log(f"在埠口 {self.port} 上啟動，等待 {self.min_players}-{self.max_players} 位玩家...")
+        self.open_replay(self.replay_dir)
+        self.open_spectator_feed(self.spectator_relay)
+
+        if self.join_timeout:
+            self.call_later(self.join_timeout, self.handle_join_timeout)
+
+    def run(self):
+        """事件迴圈"""
+        while self.connections or not self.finished:
+            if self.finished and time.monotonic() >= self.close_deadline:
+                break
+            events = self.selector.select(self.next_timeout())
+            for key, mask in events:
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                    continue
+                if key.fileobj is self.udp_socket:
+                    self.read_datagrams()
+                    continue
+                if key.data is self.spectator_feed:
+                    self.handle_feed_event(mask)
+                    continue
+                player = key.data
+                if mask & selectors.EVENT_WRITE:
+                    self.flush(player)
+                if mask & selectors.EVENT_READ and player.connected:
+                    self.read(player)
+            self.run_timers()
+        self.close()
+
+    def close(self):
+        """關閉伺服器"""
+        for player in list(self.connections):
+            self.drop(player)
+        self.close_spectator_feed(flush=True)
+        if self.server_socket:
+            try:
+                self.selector.unregister(self.server_socket)
+            except (KeyError, ValueError):
+                pass
+            self.server_socket.close()
+            self.server_socket = None
+        if self.udp_socket:
+            try:
+                self.selector.unregister(self.udp_socket)
+            except (KeyError, ValueError):
+                pass
+            self.udp_socket.close()
+            self.udp_socket = None
+        self.selector.close()
+        if self.replay:
+            self.replay.close()
+            self.replay = None
+
+    def game_dir(self):
+        """遊戲伺服器類別所在的目錄"""
+        module = sys.modules.get(type(self).__module__)
+        return os.path.dirname(os.path.abspath(module.__file__)) if module else os.getcwd()
+
+    def open_replay(self, replay_dir):
+        """開始寫入對戰紀錄，第一筆記錄重播時建立伺服器所需的資訊"""
+        if not replay_dir:
+            return
+        os.makedirs(replay_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.port}-{os.getpid()}.replay"
+        self.replay = ReplayLog(os.path.join(replay_dir, name))
+        meta = {
+            "server": type(self).__name__,
+            "game_dir": self.game_dir(),
+            "min_players": self.min_players,
+            "max_players": self.max_players,
+            "expected_players": self.expected_players,
+            "created": time.time(),
+        }
+        self.replay.write(REPLAY_META, None, json.dumps(meta).encode("utf-8"))
+        self.log(f"對戰紀錄寫入 {self.replay.path}")
+
+    def open_spectator_feed(self, relay):
+        """連線到觀戰轉播站（連不上時只記錄，不影響遊戲）"""
+        if not relay:
+            return
+        try:
+            host, port = relay.rsplit(":", 1)
+            sock = socket.create_connection((host, int(port)), timeout=2)
+            sock.sendall(json.dumps({
+                "type": "publish",
+                "room_id": int(os.environ.get("GAMESTORE_SPECTATOR_ROOM", "0")),
+                "token": os.environ.get("GAMESTORE_SPECTATOR_TOKEN")
+            }).encode("utf-8") + b"\n")
+        except (OSError, ValueError) as e:
+            self.log(f"無法連線到觀戰轉播站 {relay}: {e}")
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.spectator_feed = SpectatorFeed(sock)
+        self.selector.register(sock, selectors.EVENT_READ, self.spectator_feed)
+
+    def send_result(self, message):
+        """送出結果並等待大廳確認（遊戲已結束，短暫阻塞不影響玩家）"""
+        if not self.result_addr:
+            return
+        try:
+            host, port = self.result_addr.rsplit(":", 1)
+            with socket.create_connection((host, int(port)), timeout=2) as sock:
+                sock.sendall(json.dumps(message).encode("utf-8"))
+                response = json.loads(sock.recv(65536).decode("utf-8"))
+        except (OSError, ValueError) as e:
+            self.log(f"無法回報對戰結果到大廳 {self.result_addr}: {e}")
+            return
+        if not response.get("success"):
+            self.log(f"大廳拒絕對戰結果: {response.get('message')}")
+
+    # ---------- 內部實作 ----------
+
+    def publish_data(self, data):
+        feed = self.spectator_feed
+        if not feed:
+            return
+        feed.outbox += data + b"\n"
+        if len(feed.outbox) > MAX_BUFFER_SIZE:
+            self.log("觀戰轉播站來不及接收，停止轉播")
+            self.close_spectator_feed()
+            return
+        self.flush_feed()
+
+    def flush_feed(self):
+        feed = self.spectator_feed
+        if feed.outbox:
+            try:
+                sent = feed.sock.send(feed.outbox)
+                del feed.outbox[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.close_spectator_feed()
+                return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if feed.outbox else 0)
+        self.selector.modify(feed.sock, events, feed)
+
+    def handle_feed_event(self, mask):
+        if mask & selectors.EVENT_WRITE:
+            self.flush_feed()
+        if mask & selectors.EVENT_READ and self.spectator_feed:
+            try:
+                data = self.spectator_feed.sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self.close_spectator_feed()
+
+    def close_spectator_feed(self, flush=False):
+        feed = self.spectator_feed
+        if not feed:
+            return
+        self.spectator_feed = None
+        try:
+            self.selector.unregister(feed.sock)
+        except (KeyError, ValueError):
+            pass
+        if flush and feed.outbox:
+            # 遊戲結束時把最後的狀態送完（最多等 1 秒）
+            try:
+                feed.sock.settimeout(1.0)
+                feed.sock.sendall(feed.outbox)
+            except OSError:
+                pass
+        feed.sock.close()
+
+    def next_timeout(self):
+        """距離下一個計時器的秒數"""
+        if self.finished:
+            return 0.1
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        if not self.timers:
+            return None
+        return max(0.0, self.timers[0][0] - time.monotonic())
+
+    def run_timers(self):
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now and not self.finished:
+            _, _, timer = heapq.heappop(self.timers)
+            if not timer.cancelled:
+                timer.callback(*timer.args)
+
+    def accept(self):
+        try:
+            sock, address = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        if self.started or self.finished:
+            # 遊戲已開始，拒絕新連線
+            sock.close()
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        player = Player(sock, address, next(self.connection_seq))
+        if self.replay:
+            self.replay.write(REPLAY_CONNECT, player.index)
+        self.connections.append(player)
+        self.selector.register(sock, selectors.EVENT_READ, player)
+        if not self.require_join:
+            self.join(player)
+
+    def join(self, player, name=None, token=None):
+        """玩家入座：使用最小的空座位編號"""
+        if len(self.players) >= self.max_players:
+            self.begin_close(player)
+            return
+        taken = {p.player_id for p in self.players}
+        player.player_id = next(i for i in range(self.max_players) if i not in taken)
+        player.name = name or f"Player{player.player_id + 1}"
+        player.named = bool(name)
+        if name:
+            self.bind_account(player, name, token)
+        player.joined = True
+        self.players.append(player)
+        self.players.sort(key=lambda p: p.player_id)
+        self.log(f"{player.name} (玩家 {player.player_id + 1}) 已連線 ({player.address[0]})")
+        self.on_player_join(player)
+        self.check_start()
+
+    def bind_account(self, player, name, token):
+        """加入權杖驗證通過時記下連線的玩家 ID（已被其他連線對應的 ID 不重複使用）"""
+        account_id = self.roster.get(name) if isinstance(name, str) else None
+        match_token = os.environ.get("GAMESTORE_RESULT_TOKEN")
+        if account_id is None or not match_token:
+            return
+        if not isinstance(token, str) or not token.isascii():
+            self.log(f"{name} 未出示有效的加入權杖，不計入對戰結果")
+            return
+        expected = join_token(match_token, os.environ.get("GAMESTORE_RESULT_ROOM", "0"), account_id)
+        if not hmac.compare_digest(token.encode(), expected.encode()):
+            self.log(f"{name} 的加入權杖不符，不計入對戰結果")
+            return
+        if any(p.account_id == account_id for p in self.connections):
+            return
+        player.account_id = account_id
+
+    def check_start(self):
+        """依人數決定是否開始遊戲"""
+        if self.started or self.finished:
+            return
+        if self.start_timer:
+            self.start_timer.cancel()
+            self.start_timer = None
+        if len(self.players) >= (self.expected_players or self.max_players):
+            self.begin_game()
+        elif len(self.players) >= self.min_players:
+            if self.start_delay > 0:
+                self.log(f"已達到最少人數 ({self.min_players})，{self.start_delay:g} 秒後開始遊戲...")
+                self.start_timer = self.call_later(self.start_delay, self.begin_game)
+            else:
+                self.begin_game()
+
+    def begin_game(self):
+        if self.started or len(self.players) < self.min_players:
+            return
+        self.started = True
+        self.log(f"遊戲開始！共 {len(self.players)} 位玩家")
+        self.on_start()
+
+    def handle_join_timeout(self):
+        if self.started:
+            return
+        if len(self.players) >= self.min_players:
+            self.begin_game()
+            return
+        self.log(f"等待超時但玩家不足 ({len(self.players)}/{self.min_players})")
+        self.finish(linger=1.0)
+
+    def read(self, player):
+        try:
+            data = player.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.lose(player)
+            return
+        if self.replay:
+            self.replay.write(REPLAY_RECV, player.index, data)
+        if player.closing:
+            # 關閉中只需把資料讀掉，等對方關閉連線
+            return
+
+        player.buffer += player.decoder.decode(data)
+        if len(player.buffer) > MAX_BUFFER_SIZE:
+            self.log(f"玩家 {player.address[0]} 傳送過多未完成的資料，中斷連線")
+            self.lose(player)
+            return
+
+        decoder = json.JSONDecoder()
+        while player.connected and not player.closing:
+            buffer = player.buffer.lstrip()
+            if not buffer:
+                player.buffer = ""
+                break
+            try:
+                message, index = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                player.buffer = buffer
+                break
+            player.buffer = buffer[index:]
+            self.dispatch(player, message)
+
+    def dispatch(self, player, message):
+        if not isinstance(message, dict):
+            return
+        if message.get("type") == "codec":
+            # schema 與伺服器相同才改用二進位格式，否則繼續送 JSON
+            player.binary = bool(self.codec) and message.get("schema") == self.codec.schema_id
+            return
+        if message.get("type") == "udp":
+            # 伺服器開放 UDP 時發給權杖，客戶端以 UDP 送出 HELLO 後改走 UDP
+            if self.udp_socket and player.udp is None:
+                token = secrets.token_hex(16)
+                self.udp_tokens[token] = player
+                self.send(player, {"type": "udp", "port": self.udp_socket.getsockname()[1], "token": token})
+            return
+        if message.get("type") == "sync":
+            # 開始（或重新）以差異接收狀態，先送出目前狀態的 keyframe 作為基準（狀態太小不使用差異同步時不送）
+            player.synced = True
+            player.acked = None
+            if self.state.version and not self.state_message_too_small(player):
+                self.send(player, self.state.keyframe())
+            return
+        if message.get("type") == "ack":
+            version = message.get("version")
+            if (type(version) is int and version <= self.state.version
+                    and (player.acked is None or version > player.acked)):
+                player.acked = version
+            return
+        if message.get("type") == "join":
+            if not player.joined:
+                if not self.started:
+                    self.join(player, message.get("name"), message.get("token"))
+            elif not self.require_join and isinstance(message.get("name"), str) and not player.named:
+                # 自動入座的玩家補上名稱（可能在遊戲開始後才送達）
+                player.name = message["name"]
+                player.named = True
+                self.bind_account(player, player.name, message.get("token"))
+            return
+        if not player.joined:
+            return
+        self.on_message(player, message)
+
+    def read_datagrams(self):
+        while True:
+            try:
+                datagram, address = self.udp_socket.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            player = self.udp_peers.get(address) or self.bind_udp(datagram, address)
+            if player is None:
+                continue
+            payloads, replies = player.udp.receive(datagram)
+            for reply in replies:
+                self.send_datagram(player, reply)
+            if player.closing:
+                # 可靠訊息都確認後才關閉 TCP
+                self.flush(player)
+                continue
+            for payload in payloads:
+                if not player.connected or player.closing:
+                    break
+                try:
+                    message = json.loads(payload)
+                except ValueError:
+                    continue
+                self.dispatch(player, message)
+
+    def bind_udp(self, datagram, address):
+        """HELLO 帶有效的權杖時記下玩家的 UDP 位址，回傳該玩家"""
+        if len(datagram) < HEADER.size or datagram[0] != HELLO:
+            return None
+        try:
+            token = datagram[HEADER.size:].decode("ascii")
+        except UnicodeDecodeError:
+            return None
+        player = self.udp_tokens.pop(token, None)
+        if player is None or not player.connected or player.closing:
+            return None
+        # udp_bound 仍走 TCP：客戶端收到後才交付 UDP 上的訊息，切換前後的順序不變
+        self.send(player, {"type": "udp_bound"})
+        player.udp = Endpoint()
+        player.udp_address = address
+        self.udp_peers[address] = player
+        self.log(f"{player.name or player.address[0]} 改用 UDP ({address[0]}:{address[1]})")
+        return player
+
+    def send_datagram(self, player, datagram):
+        try:
+            self.udp_socket.sendto(datagram, player.udp_address)
+        except OSError:
+            # 緩衝區已滿：不可靠訊息直接遺失，可靠訊息之後重送
+            pass
+
+    def schedule_resend(self, player):
+        when = player.udp.next_resend()
+        if when is None or (player.udp_timer and player.udp_timer.when <= when):
+            return
+        if player.udp_timer:
+            player.udp_timer.cancel()
+        player.udp_timer = self.call_at(when, self.resend_udp, player)
+
+    def resend_udp(self, player):
+        player.udp_timer = None
+        if not player.udp:
+            return
+        now = time.monotonic()
+        if player.udp.expired(now):
+            # UDP 不通（例如被防火牆擋下）：尚未確認的訊息改由 TCP 送出，之後都走 TCP
+            pending = player.udp.pending_payloads()
+            self.detach_udp(player)
+            self.log(f"{player.name} 的 UDP 沒有回應，改用 TCP")
+            for payload in pending:
+                self.send_data(player, payload)
+            return
+        for datagram in player.udp.due_resends(now):
+            self.send_datagram(player, datagram)
+        self.schedule_resend(player)
+
+    def detach_udp(self, player):
+        if player.udp_timer:
+            player.udp_timer.cancel()
+            player.udp_timer = None
+        self.udp_peers.pop(player.udp_address, None)
+        player.udp = None
+        player.udp_address = None
+        for token in [token for token, waiting in self.udp_tokens.items() if waiting is player]:
+            del self.udp_tokens[token]
+
+    def flush(self, player):
+        """送出傳送緩衝區中的資料，送不完時等待可寫事件"""
+        if not player.connected:
+            return
+        if player.outbox:
+            try:
+                sent = player.sock.send(player.outbox)
+                del player.outbox[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.lose(player)
+                return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if player.outbox else 0)
+        try:
+            self.selector.modify(player.sock, events, player)
+        except (KeyError, ValueError):
+            return
+        if player.closing and not player.outbox and not (player.udp and player.udp.unacked):
+            # 資料（包括 UDP 的可靠訊息）送完後半關閉，讓客戶端讀完再由對方關閉
+            try:
+                player.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                self.drop(player)
+
+    def begin_close(self, player):
+        if player.closing:
+            return
+        player.closing = True
+        self.flush(player)
+
+    def lose(self, player):
+        """連線中斷"""
+        if self.replay and player.connected:
+            self.replay.write(REPLAY_DISCONNECT, player.index)
+        was_joined = player.joined
+        self.drop(player)
+        if not was_joined or self.finished:
+            return
+        self.log(f"{player.name} 已斷線")
+        if not self.started:
+            # 遊戲開始前離開，讓出座位
+            self.players.remove(player)
+            player.joined = False
+        self.on_disconnect(player)
+        if not self.started:
+            self.check_start()
+
+    def drop(self, player):
+        if not player.connected:
+            return
+        player.connected = False
+        self.detach_udp(player)
+        try:
+            self.selector.unregister(player.sock)
+        except (KeyError, ValueError):
+            pass
+        player.sock.close()
+        if player in self.connections:
+            self.connections.remove(player)
+
+class TickGameServer(EventGameServer):
+    """固定時間步長的即時遊戲伺服器
+
+    遊戲開始後每 1 / tick_rate 秒呼叫一次 on_tick(tick, inputs)，tick 由 1 起算。
+    第 n 個 tick 排在「開始時間 + n 個間隔」（time.monotonic），不因回呼的執行時間累積誤差；
+    落後時連續補跑，落後超過 max_catch_up 個 tick 則跳過多出的 tick（記入 skipped_ticks）。
+
+    玩家以 {"type": "input", "tick": n, ...} 送出輸入，n 為客戶端最後收到的 tick + 1（省略時為下一個 tick），
+    輸入依 tick 暫存在各玩家的緩衝區，到該 tick 時以 inputs = {玩家: [輸入訊息]}（依收到順序）交給 on_tick：
+        晚到 max_late_ticks 個 tick 以內的輸入改在下一個 tick 套用，訊息加上 "late": 晚到的 tick 數；
+        晚到更多、超前 max_ahead_ticks 以上，或同一位玩家同一個 tick 超過 max_inputs_per_tick 則的輸入丟棄。
+    on_tick 執行超過一個間隔記為 overrun，每秒最多寫一次日誌；統計在 self.tick_stats，伺服器關閉時寫入日誌。
+    輸入落在哪個 tick 取決於送達時間，重播（replay_match.py）的輸出不一定與原本逐位元相同
+    """
+    tick_rate = 20
+    max_late_ticks = 3
+    max_ahead_ticks = 10
+    max_inputs_per_tick = 4
+    max_catch_up = 5
+
+    def __init__(self, port, tick_rate=None, **kwargs):
+        super().__init__(port, **kwargs)
+        if tick_rate:
+            self.tick_rate = tick_rate
+        self.tick_interval = 1.0 / self.tick_rate
+        self.tick = 0  # 最後執行完的 tick
+        self.tick_origin = None
+        self.tick_timer = None
+        self.tick_stats = {
+            "ticks": 0,
+            "overruns": 0,
+            "skipped_ticks": 0,
+            "late_inputs": 0,
+            "dropped_inputs": 0,
+            "max_tick_ms": 0.0,
+        }
+        self.logged_overruns = 0
+        self.overrun_logged_at = 0.0
+        self.tick_summary_logged = False
+
+    # ---------- 遊戲掛勾 ----------
+
+    def on_tick(self, tick, inputs):
+        """每個 tick 呼叫一次，inputs 為 {玩家: [該 tick 的輸入訊息]}"""
+
+    # ---------- 排程 ----------
+
+    def begin_game(self):
+        started = self.started
+        super().begin_game()
+        if self.started and not started and not self.finished:
+            self.tick_origin = time.monotonic()
+            self.schedule_tick()
+
+    def schedule_tick(self):
+        self.tick_timer = self.call_at(self.tick_origin + (self.tick + 1) * self.tick_interval, self.run_ticks)
+
+    def run_ticks(self):
+        now = time.monotonic()
+        # 計時器不會早於排定的時間觸發，至少執行一個 tick
+        due = max(self.tick + 1, int((now - self.tick_origin) / self.tick_interval))
+        behind = due - self.tick
+        if behind > self.max_catch_up:
+            # 跳過的 tick 的輸入會在下一個執行的 tick 一起處理
+            self.tick_stats["skipped_ticks"] += behind - self.max_catch_up
+            self.tick = due - self.max_catch_up
+        stats = self.tick_stats
+        while self.tick < due and not self.finished:
+            self.tick += 1
+            started = time.monotonic()
+            self.on_tick(self.tick, self.collect_inputs(self.tick))
+            elapsed = time.monotonic() - started
+            stats["ticks"] += 1
+            stats["max_tick_ms"] = max(stats["max_tick_ms"], round(elapsed * 1000, 3))
+            if elapsed > self.tick_interval:
+                stats["overruns"] += 1
+        self.log_overruns()
+        if not self.finished:
+            self.schedule_tick()
+
+    def log_overruns(self):
+        stats = self.tick_stats
+        if stats["overruns"] == self.logged_overruns:
+            return
+        now = time.monotonic()
+        if now - self.overrun_logged_at < 1.0:
+            return
+        self.log(f"tick 執行超過 {self.tick_interval * 1000:.1f} ms: 新增 {stats['overruns'] - self.logged_overruns} 次"
+                 f"（最長 {stats['max_tick_ms']} ms，累計跳過 {stats['skipped_ticks']} 個 tick）")
+        self.logged_overruns = stats["overruns"]
+        self.overrun_logged_at = now
+
+    def close(self):
+        if self.tick_origin is not None and not self.tick_summary_logged:
+            self.tick_summary_logged = True
+            self.log(f"tick 統計（{self.tick_rate} Hz）: {self.tick_stats}")
+        super().close()
+
+    # ---------- 輸入 ----------
+
+    def dispatch(self, player, message):
+        if isinstance(message, dict) and message.get("type") == "input":
+            if player.joined and self.started and not self.finished:
+                self.buffer_input(player, message)
+            return
+        super().dispatch(player, message)
+
+    def buffer_input(self, player, message):
+        stats = self.tick_stats
+        target = self.tick + 1
+        tick = message.get("tick")
+        if type(tick) is not int:
+            tick = target
+        elif tick < target:
+            late = target - tick
+            if late > self.max_late_ticks:
+                stats["dropped_inputs"] += 1
+                return
+            stats["late_inputs"] += 1
+            message["late"] = late
+            tick = target
+        elif tick > target + self.max_ahead_ticks:
+            stats["dropped_inputs"] += 1
+            return
+        queue = player.inputs.setdefault(tick, [])
+        if len(queue) >= self.max_inputs_per_tick:
+            stats["dropped_inputs"] += 1
+            return
+        queue.append(message)
+
+    def collect_inputs(self, tick):
+        """取出各玩家到這個 tick 為止的輸入"""
+        inputs = {}
+        for player in self.players:
+            if not player.inputs:
+                continue
+            due = sorted(t for t in player.inputs if t <= tick)
+            if due:
+                inputs[player] = [message for t in due for message in player.inputs.pop(t)]
+        return inputs
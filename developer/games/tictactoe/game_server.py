@@ -1,185 +1,104 @@
 #!/usr/bin/env python3
 """
 井字遊戲伺服器 (CLI 雙人遊戲)
+棋盤大小與連線長度可在 game_config.json 設定（board_size / win_length，預設 3×3 連 3）
 """
-import socket
-import threading
-import json
+import os
 import sys
+from board import Board, SYMBOLS
+from game_runtime import EventGameServer, load_game_config
 
-class TicTacToeServer:
-    def __init__(self, port):
-        self.port = port
-        self.clients = []
-        self.board = [[' ' for _ in range(3)] for _ in range(3)]
+# 每一步的思考時間上限（秒），逾時判負
+TURN_TIMEOUT = 120
+
+class TicTacToeServer(EventGameServer):
+    log_name = "井字遊戲伺服器"
+
+    def __init__(self, port, config=None):
+        super().__init__(port, min_players=2, max_players=2)
+        config = config if config is not None else load_game_config(os.path.dirname(os.path.abspath(__file__)))
+        self.board = Board(int(config.get("board_size", 3)), int(config.get("win_length", 3)))
         self.current_player = 0
-        self.symbols = ['X', 'O']
-        self.server_socket = None
-        
-    def start(self):
-        """啟動遊戲伺服器"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind(('0.0.0.0', self.port))
-        self.server_socket.listen(2)
-        print(f"[井字遊戲伺服器] 在埠口 {self.port} 上啟動")
-        
-        # 等待兩位玩家連線
-        connected_count = 0
-        while connected_count < 2:
-            try:
-                client_socket, addr = self.server_socket.accept()
-                
-                # 簡單的握手檢查，防止端口掃描或健康檢查導致的誤判
-                # 這裡我們設定一個短暫的 timeout，讀取客戶端的第一個訊息
-                # 如果客戶端連線後立即斷開（如 wait_for_port），這裡會拋出異常
-                client_socket.settimeout(2.0)
-                try:
-                    # 這裡不讀取任何資料，只是確認連線是否穩定
-                    # 實際遊戲協議中，伺服器是先發送 connected 訊息
-                    pass
-                except socket.error:
-                    print(f"[井字遊戲伺服器] 忽略不穩定的連線: {addr}")
-                    client_socket.close()
-                    continue
-                
-                client_socket.settimeout(None) # 恢復阻塞模式
-                
-                self.clients.append(client_socket)
-                print(f"[井字遊戲伺服器] 玩家 {connected_count+1} ({self.symbols[connected_count]}) 已連線")
-                
-                try:
-                    client_socket.sendall(json.dumps({
-                        "type": "connected",
-                        "player_id": connected_count,
-                        "symbol": self.symbols[connected_count]
-                    }).encode())
-                    connected_count += 1
-                except socket.error as e:
-                    print(f"[井字遊戲伺服器] 發送歡迎訊息失敗: {e}")
-                    self.clients.remove(client_socket)
-                    client_socket.close()
-                    
-            except Exception as e:
-                print(f"[井字遊戲伺服器] 接受連線錯誤: {e}")
+        self.symbols = SYMBOLS
+        self.turn_timer = None
+
+    def on_player_join(self, player):
+        self.send(player, {
+            "type": "connected",
+            "player_id": player.player_id,
+            "symbol": self.symbols[player.player_id],
+            "size": self.board.size,
+            "win_length": self.board.k
+        })
+
+    def on_start(self):
+        self.next_turn()
+
+    def next_turn(self):
+        """廣播當前棋盤狀態並開始計時"""
+        cells = self.board.cells()
+        # 要求同步的客戶端只收到改變的格子與目前的玩家
+        self.broadcast_state({
+            "type": "board_update",
+            "cells": cells,
+            "size": self.board.size,
+            "current_player": self.current_player
+        }, {"cells": list(cells), "size": self.board.size, "current_player": self.current_player})
+        if self.turn_timer:
+            self.turn_timer.cancel()
+        self.turn_timer = self.call_later(TURN_TIMEOUT, self.handle_turn_timeout, self.current_player)
+
+    def on_message(self, player, message):
+        if message.get("type") != "move" or player.player_id != self.current_player:
+            return
 
-        print("[井字遊戲伺服器] 遊戲開始！")
-        self.run_game()
-        
-    def check_winner(self):
-        """檢查是否有贏家"""
-        # 檢查行
-        for row in self.board:
-            if row[0] == row[1] == row[2] != ' ':
-                return row[0]
-        
-        # 檢查列
-        for col in range(3):
-            if self.board[0][col] == self.board[1][col] == self.board[2][col] != ' ':
-                return self.board[0][col]
-        
-        # 檢查對角線
-        if self.board[0][0] == self.board[1][1] == self.board[2][2] != ' ':
-            return self.board[0][0]
-        if self.board[0][2] == self.board[1][1] == self.board[2][0] != ' ':
-            return self.board[0][2]
-        
-        return None
-        
-    def is_board_full(self):
-        """檢查棋盤是否已滿"""
-        for row in self.board:
-            if ' ' in row:
-                return False
-        return True
-        
-    def run_game(self):
-        """執行遊戲邏輯"""
-        game_over = False
-        
-        while not game_over:
-            # 廣播當前棋盤狀態
-            print(f"[DEBUG] 廣播棋盤狀態，當前玩家: {self.current_player}")
-            self.broadcast({
-                "type": "board_update",
-                "board": self.board,
-                "current_player": self.current_player
+        try:
+            row, col = int(message["row"]), int(message["col"])
+        except (KeyError, TypeError, ValueError):
+            row, col = -1, -1
+
+        try:
+            result = self.board.play(self.current_player, row, col)
+        except ValueError as e:
+            # 非法移動，要求重新下棋
+            self.send(player, {
+                "type": "invalid_move",
+                "message": str(e)
             })
-            
-            # 等待當前玩家下棋
-            try:
-                print(f"[DEBUG] 等待玩家 {self.current_player} 下棋...")
-                data = self.clients[self.current_player].recv(4096).decode()
-                if not data:
-                    print(f"[DEBUG] 玩家 {self.current_player} 斷開連線")
-                    break
-                    
-                print(f"[DEBUG] 收到玩家 {self.current_player} 的數據: {data[:100]}...")
-                try:
-                    move = json.loads(data)
-                except json.JSONDecodeError:
-                    print(f"[錯誤] JSON 解析失敗: {data}")
-                    continue
-                
-                if move["type"] == "move":
-                    row, col = move["row"], move["col"]
-                    
-                    # 驗證移動是否合法
-                    if 0 <= row < 3 and 0 <= col < 3 and self.board[row][col] == ' ':
-                        self.board[row][col] = self.symbols[self.current_player]
-                        
-                        # 檢查遊戲結束條件
-                        winner = self.check_winner()
-                        if winner:
-                            self.broadcast({
-                                "type": "game_over",
-                                "winner": self.symbols.index(winner),
-                                "board": self.board,
-                                "reason": "win"
-                            })
-                            game_over = True
-                        elif self.is_board_full():
-                            self.broadcast({
-                                "type": "game_over",
-                                "winner": -1,
-                                "board": self.board,
-                                "reason": "draw"
-                            })
-                            game_over = True
-                        else:
-                            # 切換玩家
-                            self.current_player = 1 - self.current_player
-                    else:
-                        # 非法移動，要求重新下棋
-                        self.clients[self.current_player].sendall(json.dumps({
-                            "type": "invalid_move",
-                            "message": "該位置已被佔用或超出範圍"
-                        }).encode())
-            except Exception as e:
-                print(f"[錯誤] {e}")
-                game_over = True
-        
-        print("[井字遊戲伺服器] 遊戲結束")
-        self.close()
-        
-    def broadcast(self, message):
-        """廣播訊息給所有玩家"""
-        data = json.dumps(message).encode()
-        for client in self.clients:
-            try:
-                client.sendall(data)
-            except:
-                pass
-                
-    def close(self):
-        """關閉伺服器"""
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-        if self.server_socket:
-            self.server_socket.close()
+            return
+
+        # 檢查遊戲結束條件
+        if result == "win":
+            self.end_game(self.current_player, "win")
+        elif result == "draw":
+            self.end_game(-1, "draw")
+        else:
+            # 切換玩家
+            self.current_player = 1 - self.current_player
+            self.next_turn()
+
+    def handle_turn_timeout(self, player_id):
+        if player_id == self.current_player:
+            self.log(f"玩家 {player_id + 1} 思考逾時")
+            self.end_game(1 - player_id, "timeout")
+
+    def on_disconnect(self, player):
+        if self.started:
+            self.end_game(1 - player.player_id, "disconnect")
+
+    def end_game(self, winner, reason):
+        if self.turn_timer:
+            self.turn_timer.cancel()
+        self.broadcast({
+            "type": "game_over",
+            "winner": winner,
+            "cells": self.board.cells(),
+            "size": self.board.size,
+            "reason": reason
+        })
+        self.log("遊戲結束")
+        self.report_result([winner] if winner >= 0 else [], reason=reason)
+        self.finish()
 
 if __name__ == "__main__":
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5001
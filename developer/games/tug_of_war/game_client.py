@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+拔河多人即時遊戲客戶端 (CLI)
+按 Enter 拉一下繩子；輸入在背景執行緒讀取，畫面隨伺服器每個 tick 的狀態更新
+連線後改用 UDP（game_udp.py）：拉動是可靠訊息，狀態確認遺失也無妨，以不可靠訊息送出
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from game_codec import load_codec
+from game_udp import GameTransport
+from state_sync import STATE_MESSAGES, StateView
+
+ROPE_WIDTH = 30  # 繩子每一側顯示的字元數
+REDRAW_INTERVAL = 0.2  # 畫面最多每 0.2 秒更新一次
+
+class TugOfWarClient:
+    def __init__(self, host, port, player_name, udp_address=None):
+        self.host = host
+        self.port = port
+        self.player_name = player_name
+        self.socket = None
+        self.transport = None
+        self.udp_address = udp_address  # 預設為伺服器的位址
+        self.player_id = None
+        self.team = None
+        self.rope_length = 30.0
+        self.tick = 0  # 最後收到的 tick，輸入標記為下一個 tick
+        self.last_draw = 0.0
+        self.codec = load_codec()
+        # 繩子的位置每個 tick 以差異同步
+        self.view = StateView()
+
+    def send_message(self, message, reliable=True):
+        self.transport.send(message, reliable)
+
+    def connect(self):
+        """連線到遊戲伺服器"""
+        for i in range(5):
+            try:
+                self.socket = socket.create_connection((self.host, self.port))
+                break
+            except ConnectionRefusedError:
+                print(f"[DEBUG] 連線被拒 (嘗試 {i+1}/5)，等待 1 秒後重試...")
+                time.sleep(1)
+        else:
+            print("❌ 無法連線到遊戲伺服器 (重試次數過多)")
+            return False
+
+        self.transport = GameTransport(self.socket, self.codec, self.udp_address)
+        self.transport.request_udp()
+        if self.codec:
+            self.send_message(self.codec.request())
+        self.send_message({"type": "sync"})
+        self.send_message({"type": "join", "name": self.player_name,
+                           "token": os.environ.get("GAMESTORE_JOIN_TOKEN")})
+
+        message = self.receive_message()
+        if message and message["type"] == "connected":
+            self.player_id = message["player_id"]
+            self.team = message["team"]
+            self.rope_length = message["rope_length"]
+            side = "左" if self.team == "left" else "右"
+            print(f"\n{'='*50}")
+            print(f"🪢 拔河大賽 🪢")
+            print(f"{'='*50}")
+            print(f"歡迎！{message['name']}，你在{side}隊")
+            print(f"遊戲開始後一直按 Enter 把繩子往{side}邊拉！")
+            print(f"{'='*50}\n")
+            return True
+        return False
+
+    def receive_message(self):
+        """接收一則訊息，狀態更新套用後以 rope 訊息回傳"""
+        while True:
+            message = self.transport.receive()
+            if not message or message["type"] not in STATE_MESSAGES:
+                return message
+            reply = self.view.apply(message)
+            # 確認遺失時下一次確認會補上；要求 keyframe 的 sync 則需送達
+            self.send_message(reply, reliable=reply["type"] != "ack")
+            if reply["type"] == "ack":
+                return dict(self.view.state, type="rope")
+
+    def read_input(self):
+        """背景執行緒：每按一次 Enter 送出一次拉動"""
+        for _ in sys.stdin:
+            try:
+                self.send_message({"type": "input", "tick": self.tick + 1, "action": "pull"})
+            except OSError:
+                return
+
+    def draw_rope(self, message, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_draw < REDRAW_INTERVAL:
+            return
+        self.last_draw = now
+        # 繩子中心（|）依位置左右移動
+        offset = round(message["position"] / self.rope_length * ROPE_WIDTH)
+        offset = max(-ROPE_WIDTH, min(ROPE_WIDTH, offset))
+        rope = ["="] * (ROPE_WIDTH * 2 + 1)
+        rope[ROPE_WIDTH + offset] = "|"
+        print(f"左隊 [{''.join(rope)}] 右隊  剩餘 {message['remaining']:>2} 秒")
+
+    def play(self):
+        threading.Thread(target=self.read_input, daemon=True).start()
+        while True:
+            message = self.receive_message()
+            if not message:
+                print("❌ 連線斷開")
+                return
+            if message["type"] == "rope":
+                self.tick = message["tick"]
+                self.draw_rope(message)
+            elif message["type"] == "game_over":
+                self.handle_game_over(message)
+                return
+
+    def handle_game_over(self, message):
+        self.draw_rope(dict(message, remaining=0), force=True)
+        print(f"\n{'='*50}")
+        if message["winner"] is None:
+            print("🤝 平手！")
+        elif message["winner"] == self.team:
+            print("🎉 你的隊伍贏了！")
+        else:
+            print("😢 你的隊伍輸了！")
+        print("\n拉動次數：")
+        for entry in sorted(message["pulls"], key=lambda x: x["pulls"], reverse=True):
+            side = "左" if entry["team"] == "left" else "右"
+            print(f"  {entry['name']} ({side}隊): {entry['pulls']}")
+        print(f"{'='*50}\n")
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+        elif self.socket:
+            self.socket.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        host = sys.argv[1]
+        port = int(sys.argv[2])
+        player_name = sys.argv[3]
+    elif len(sys.argv) > 2:
+        host = sys.argv[1]
+        port = int(sys.argv[2])
+        player_name = input("請輸入你的名字: ").strip() or f"Player{port%100}"
+    else:
+        host = "localhost"
+        port = 5004
+        player_name = input("請輸入你的名字: ").strip() or f"Player{port%100}"
+
+    client = TugOfWarClient(host, port, player_name)
+    try:
+        if client.connect():
+            client.play()
+    except KeyboardInterrupt:
+        print("\n[拔河客戶端] 正在離開...")
+    finally:
+        client.close()
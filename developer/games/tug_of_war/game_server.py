@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+拔河多人即時遊戲伺服器 (支援2-10人)
+以 TickGameServer 每秒 tick_rate 次結算：座位編號偶數為左隊、奇數為右隊，
+玩家每按一次 Enter 送出一次拉動，每個 tick 依兩隊的拉動次數（除以隊伍人數）移動繩子，
+繩子被拉過 rope_length 或時間到時結束，時間到時繩子偏向的一方獲勝
+客戶端可改用 UDP（game_udp.py），繩子的狀態以不可靠訊息送出，遺失時由下一個 tick 的差異補上
+
+game_config.json 中可設定：
+    tick_rate        每秒 tick 數（預設 20）
+    rope_length      獲勝需要拉動的距離（預設 30）
+    time_limit       遊戲時間，秒（預設 60）
+    start_delay      達到最少人數後等待其他玩家的時間，秒（預設 5）
+"""
+import os
+import sys
+from game_runtime import TickGameServer, load_game_config
+
+TEAMS = ("left", "right")
+
+class TugOfWarServer(TickGameServer):
+    log_name = "拔河伺服器"
+    require_join = True
+    udp = True
+
+    def __init__(self, port, max_players=10, min_players=2, config=None):
+        config = config if config is not None else load_game_config(os.path.dirname(os.path.abspath(__file__)))
+        # 30 秒內人數不足則關閉
+        super().__init__(port, tick_rate=int(config.get("tick_rate", 20)),
+                         min_players=min_players, max_players=max_players,
+                         start_delay=float(config.get("start_delay", 5)), join_timeout=30)
+        self.rope_length = float(config.get("rope_length", 30))
+        self.time_limit = float(config.get("time_limit", 60))
+        self.total_ticks = int(self.time_limit * self.tick_rate)
+        self.position = 0.0  # 負數偏向左隊，正數偏向右隊
+        self.pulls = {}  # {player_id: 累計拉動次數}
+
+    def team(self, player):
+        return TEAMS[player.player_id % 2]
+
+    def on_player_join(self, player):
+        self.pulls[player.player_id] = 0
+        self.send(player, {
+            "type": "connected",
+            "player_id": player.player_id,
+            "name": player.name,
+            "team": self.team(player),
+            "tick_rate": self.tick_rate,
+            "rope_length": self.rope_length
+        })
+
+    def on_start(self):
+        self.broadcast_rope()
+
+    def on_tick(self, tick, inputs):
+        strength = {team: 0 for team in TEAMS}
+        for player, messages in inputs.items():
+            pulls = sum(1 for message in messages if message.get("action") == "pull")
+            self.pulls[player.player_id] += pulls
+            strength[self.team(player)] += pulls
+        if strength["left"] or strength["right"]:
+            sizes = {team: sum(1 for p in self.players if self.team(p) == team) for team in TEAMS}
+            self.position += strength["right"] / max(sizes["right"], 1) - strength["left"] / max(sizes["left"], 1)
+        self.broadcast_rope()
+
+        if abs(self.position) >= self.rope_length:
+            self.end_game("pulled")
+        elif tick >= self.total_ticks:
+            self.end_game("timeout")
+
+    def on_disconnect(self, player):
+        if not self.started:
+            self.pulls.pop(player.player_id, None)
+            return
+        # 有一隊全員離線時另一隊獲勝
+        for team in TEAMS:
+            if not any(self.team(p) == team for p in self.active_players()):
+                self.end_game("disconnect", winner=TEAMS[1 - TEAMS.index(team)] if self.active_players() else None)
+                return
+
+    def broadcast_rope(self):
+        remaining = max(0, self.total_ticks - self.tick) // self.tick_rate
+        pulls = [self.pulls[p.player_id] for p in self.players]
+        # 每個 tick 廣播一次，要求同步的客戶端只收到改變的欄位
+        self.broadcast_state({
+            "type": "rope",
+            "tick": self.tick,
+            "position": round(self.position, 2),
+            "remaining": remaining,
+            "pulls": pulls
+        }, {"tick": self.tick, "position": round(self.position, 2), "remaining": remaining, "pulls": pulls})
+
+    def end_game(self, reason, winner=None):
+        if self.finished:
+            return
+        if reason != "disconnect":
+            winner = "right" if self.position > 0 else "left" if self.position < 0 else None
+        winner_ids = [p.player_id for p in self.players if self.team(p) == winner]
+        self.broadcast({
+            "type": "game_over",
+            "winner": winner,
+            "reason": reason,
+            "position": round(self.position, 2),
+            "pulls": [{"name": p.name, "team": self.team(p), "pulls": self.pulls[p.player_id]} for p in self.players]
+        })
+        self.log(f"遊戲結束！獲勝隊伍: {winner or '平手'}")
+        self.report_result(winner_ids, scores=dict(self.pulls), reason=reason)
+        self.finish()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5004
+    min_players = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    max_players = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    server = TugOfWarServer(port, max_players, min_players)
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        print("\n[拔河伺服器] 正在關閉...")
+    finally:
+        server.close()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+對戰紀錄重播工具
+讀取遊戲伺服器在 GAMESTORE_REPLAY_DIR 寫下的對戰紀錄，於本行程中啟動同一個遊戲伺服器，
+依紀錄建立連線並送出玩家當時送出的原始資料，最後比對伺服器送出的訊息是否與紀錄完全相同
+
+--speed 0（預設）為全速重播：每次送出玩家資料前，只等待紀錄中在它之前的伺服器訊息都已收到，
+可當作遊戲伺服器的固定輸入效能回歸測試；--speed 1 依紀錄的時間間隔重播，2 為兩倍速，以此類推。
+由計時器觸發的事件（例如回合逾時）在任何速度下都依實際時間發生
+
+用法:
+    python3 developer/replay_match.py replays/20250101-120000-7000-1234.replay
+    python3 developer/replay_match.py replays/*.replay --repeat 5 --output replay.json
+    python3 developer/replay_match.py match.replay --speed 1 --game-dir developer/games/tictactoe
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "template"))
+from game_runtime import (read_replay, REPLAY_META, REPLAY_CONNECT, REPLAY_RECV,
+                          REPLAY_SEND, REPLAY_DISCONNECT)
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def load_replay(path):
+    """回傳 (meta, 其餘紀錄)"""
+    records = list(read_replay(path))
+    if not records or records[0][1] != REPLAY_META:
+        raise ValueError(f"對戰紀錄缺少伺服器資訊: {path}")
+    return json.loads(records[0][3]), records[1:]
+
+def load_server_class(game_dir, name):
+    """從遊戲目錄載入 game_server.py 中的伺服器類別"""
+    if game_dir not in sys.path:
+        # 遊戲的輔助模組（例如 board.py）與 game_server.py 放在同一個目錄
+        sys.path.insert(0, game_dir)
+    module_name = "replay_" + os.path.basename(os.path.normpath(game_dir))
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(game_dir, "game_server.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+class Connection:
+    """重播中的一位玩家連線，背景執行緒持續接收伺服器送出的資料"""
+
+    def __init__(self, port, condition):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.condition = condition
+        self.received = bytearray()
+        self.thread = threading.Thread(target=self.receive)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def receive(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                data = b""
+            with self.condition:
+                if not data:
+                    self.condition.notify_all()
+                    return
+                self.received += data
+                self.condition.notify_all()
+
+    def send(self, data):
+        # 伺服器可能已關閉連線（紀錄中結束後才送達的資料），忽略錯誤
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            pass
+
+    def close_write(self):
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+def replay(path, game_dir=None, speed=0.0, slack=5.0, record_dir=None):
+    """重播一個對戰紀錄並回傳統計（record_dir 不為 None 時重播本身也寫入新的紀錄）"""
+    meta, records = load_replay(path)
+    server_class = load_server_class(game_dir or meta["game_dir"], meta["server"])
+
+    port = free_port()
+    server = server_class(port)
+    server.host = "127.0.0.1"
+    server.min_players = meta["min_players"]
+    server.max_players = meta["max_players"]
+    server.expected_players = meta["expected_players"]
+    server.replay_dir = record_dir
+    # 重播不回報結果也不轉播
+    server.result_addr = None
+    server.spectator_relay = None
+    server.listen()
+    server_thread = threading.Thread(target=server.run)
+    server_thread.daemon = True
+    server_thread.start()
+
+    condition = threading.Condition()
+    connections = {}
+    expected = {}  # {連線編號: 紀錄中到目前為止送給該連線的資料}
+    latencies = []
+    stalls = 0
+    inputs = outputs = 0
+    last_input = None  # (紀錄時間, 重播時間, 當時已預期的輸出量)
+
+    def caught_up():
+        return all(len(connections[index].received) >= len(data)
+                   for index, data in expected.items() if index in connections)
+
+    started = time.monotonic()
+    for when, kind, index, payload in records:
+        if kind == REPLAY_SEND:
+            expected.setdefault(index, bytearray()).extend(payload)
+            outputs += 1
+            continue
+
+        if speed > 0:
+            delay = started + when / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        # 紀錄中這筆輸入之前的伺服器訊息都收到後才送出（計時器觸發的訊息需等待實際時間）
+        gap = when - last_input[0] if last_input else when
+        with condition:
+            if not condition.wait_for(caught_up, timeout=gap + slack):
+                stalls += 1
+        now = time.monotonic()
+        pending = sum(len(data) for data in expected.values())
+        if last_input and speed == 0 and pending > last_input[2]:
+            latencies.append(now - last_input[1])
+
+        if kind == REPLAY_CONNECT:
+            connections[index] = Connection(port, condition)
+        elif kind == REPLAY_RECV and index in connections:
+            connections[index].send(payload)
+            inputs += 1
+            last_input = (when, time.monotonic(), pending)
+        elif kind == REPLAY_DISCONNECT and index in connections:
+            connections[index].close_write()
+
+    with condition:
+        if not condition.wait_for(caught_up, timeout=slack + (records[-1][0] - last_input[0] if last_input else 0)):
+            stalls += 1
+    server_thread.join(timeout=slack + 10)
+    elapsed = time.monotonic() - started
+    for connection in connections.values():
+        connection.close_write()
+        connection.thread.join(timeout=1)
+        connection.sock.close()
+
+    mismatched = sorted(index for index, data in expected.items()
+                        if index not in connections or bytes(connections[index].received) != bytes(data))
+    latencies.sort()
+    return {
+        "log": path,
+        "server": meta["server"],
+        "speed": speed or "max",
+        "connections": len(connections),
+        "inputs": inputs,
+        "outputs": outputs,
+        "bytes_out": sum(len(data) for data in expected.values()),
+        "recorded_duration_sec": round(records[-1][0], 3) if records else 0,
+        "replay_duration_sec": round(elapsed, 3),
+        "response_latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        } if latencies else None,
+        "stalls": stalls,
+        "server_finished": not server_thread.is_alive(),
+        "mismatched_connections": mismatched,
+        "identical": not mismatched,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="對戰紀錄重播工具")
+    parser.add_argument("logs", nargs="+", help="對戰紀錄檔")
+    parser.add_argument("--game-dir", help="遊戲目錄（預設使用紀錄中的目錄）")
+    parser.add_argument("--speed", type=float, default=0.0, help="0 為全速，1 為原速，2 為兩倍速")
+    parser.add_argument("--repeat", type=int, default=1, help="每個紀錄重播次數")
+    parser.add_argument("--record", help="重播時將新的對戰紀錄寫入此目錄")
+    parser.add_argument("--output", help="輸出 JSON 檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    runs = []
+    for path in args.logs:
+        for _ in range(args.repeat):
+            # 遊戲伺服器的輸出導向 stderr，stdout 只輸出 JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                result = replay(path, args.game_dir, args.speed, record_dir=args.record)
+            status = "一致" if result["identical"] else f"不一致 (連線 {result['mismatched_connections']})"
+            print(f"[重播] {os.path.basename(path)} ({result['server']}): {result['inputs']} 筆輸入，"
+                  f"{result['outputs']} 筆輸出，{result['replay_duration_sec']} 秒，{status}", file=sys.stderr)
+            runs.append(result)
+
+    output = json.dumps({"benchmark": "replay", "runs": runs}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(0 if all(run["identical"] for run in runs) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,41 @@
 遊戲客戶端模板
 這個檔案是遊戲開發者需要實作的客戶端邏輯
 """
+import os
 import socket
 import json
 import sys
+from game_codec import MessageReader, load_codec
+from state_sync import STATE_MESSAGES, StateView
 
 class GameClient:
-    def __init__(self, host, port):
+    def __init__(self, host, port, player_name=None):
         self.host = host
         self.port = port
+        self.player_name = player_name  # 大廳帳號（大廳以第 3 個參數傳入），用於記錄對戰結果
         self.socket = None
         self.player_id = None
+        # game_config.json 宣告 message_schema 時，伺服器改以二進位格式送出這些訊息
+        self.codec = load_codec()
+        self.reader = MessageReader(self.codec)
+        # 伺服器以 broadcast_state 送出的狀態，在 self.view.state 中保持最新
+        self.view = StateView()
         
     def connect(self):
         """連線到遊戲伺服器"""
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.connect((self.host, self.port))
+        if self.codec:
+            self.send_message(self.codec.request())
+        self.send_message({"type": "sync"})
+        if self.player_name:
+            # 大廳以環境變數 GAMESTORE_JOIN_TOKEN 傳入加入權杖，遊戲伺服器驗證後才計入對戰結果
+            self.send_message({"type": "join", "name": self.player_name,
+                               "token": os.environ.get("GAMESTORE_JOIN_TOKEN")})
         
         # 接收連線確認
-        data = self.socket.recv(4096).decode()
-        message = json.loads(data)
-        if message["type"] == "connected":
+        message = self.receive_message()
+        if message and message["type"] == "connected":
             self.player_id = message["player_id"]
             print(f"[遊戲客戶端] 成功連線！你是玩家 {self.player_id}")
             return True
@@ -37,10 +52,20 @@ class GameClient:
             return False
             
     def receive_message(self):
-        """接收來自伺服器的訊息"""
+        """接收來自伺服器的訊息（JSON 或二進位，連線中斷時回傳 None）
+
+        狀態更新（state_keyframe / state_delta）套用到 self.view 並回覆確認後，
+        以 {"type": "state", "state": 目前狀態} 回傳
+        """
         try:
-            data = self.socket.recv(4096).decode()
-            return json.loads(data)
+            while True:
+                message = self.reader.receive(self.socket)
+                if not message or message["type"] not in STATE_MESSAGES:
+                    return message
+                reply = self.view.apply(message)
+                self.send_message(reply)
+                if reply["type"] == "ack":
+                    return {"type": "state", "state": self.view.state}
         except:
             return None
             
@@ -60,8 +85,9 @@ if __name__ == "__main__":
     else:
         host = "localhost"
         port = 5000
+    player_name = sys.argv[3] if len(sys.argv) > 3 else None
     
-    client = GameClient(host, port)
+    client = GameClient(host, port, player_name)
     try:
         if client.connect():
             client.play()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+遊戲訊息的二進位編碼（選用）
+在 game_config.json 的 message_schema 宣告伺服器高頻率送出的訊息格式，例如：
+    "message_schema": {
+        "board_update": [["cells", "str"], ["size", "u8"], ["current_player", "u8"]]
+    }
+欄位型別：
+    u8 u16 u32 i8 i16 i32 i64 f32 f64 bool    固定長度的數值（big-endian）
+    str                                       UTF-8 字串（長度 + 內容）
+    uint int                                  變動長度整數（小於 128 的值只佔 1 byte，int 以 zigzag 編碼負數）
+    scalar                                    任意 null / bool / 整數 / 浮點數 / 字串（1 byte 型別 + 值）
+    {"list": 型別}                            串列（數量 + 元素）
+    {"records": [[欄位, 型別], ...]}          字典組成的串列
+    {"map": [鍵型別, 值型別]}                 字典
+    {"enum": [值, ...]}                       固定選項，以 1 byte 編號送出
+    {"optional": 型別}                        可為 null（1 byte 旗標 + 值）
+長度與數量小於 255 時為 1 byte，否則為 0xFF 加上 2 bytes。
+state_sync.py 的 state_keyframe 與 state_delta 一律包含在 schema 中（見 STATE_SCHEMA），遊戲不需宣告
+
+客戶端連線後送出 {"type": "codec", "schema": schema_id}，schema_id 與伺服器相同時，
+伺服器之後以二進位訊框送出 schema 中的訊息：
+    1 byte（0x80 | 訊息編號） + 2 bytes 內容長度 + 各欄位依序編碼
+訊息的欄位與 schema 不完全相符（多出或缺少欄位、型別或範圍不符）時仍以 JSON 送出，
+未送出 codec 請求的舊版客戶端與觀眾一律收到 JSON。客戶端送給伺服器的訊息維持 JSON
+
+本檔案需與 game_runtime.py 一起放在遊戲目錄中上傳，修改後請執行 make sync-runtime
+"""
+import hashlib
+import json
+import os
+import struct
+
+SCALARS = {
+    "u8": ("B", int), "u16": ("H", int), "u32": ("I", int),
+    "i8": ("b", int), "i16": ("h", int), "i32": ("i", int), "i64": ("q", int),
+    "f32": ("f", float), "f64": ("d", float), "bool": ("?", bool),
+}
+COUNT = struct.Struct("!H")
+LONG_COUNT = 0xFF
+FRAME_HEADER = struct.Struct("!BH")
+BINARY_FLAG = 0x80
+MAX_MESSAGE_TYPES = 0x7F
+MAX_PAYLOAD = 0xFFFF
+DOUBLE = struct.Struct("!d")
+
+# state_sync.py 的狀態訊息
+STATE_SCHEMA = {
+    "state_keyframe": [["version", "uint"], ["fields", {"list": "str"}], ["lengths", {"list": "int"}],
+                       ["values", {"list": "scalar"}]],
+    "state_delta": [["version", "uint"], ["behind", "uint"], ["slots", {"list": "uint"}],
+                    ["values", {"list": "scalar"}]],
+}
+
+# scalar 的型別標記
+NULL, FALSE, TRUE, INT, FLOAT, STR = range(6)
+
+def pack_count(count, out):
+    if count < LONG_COUNT:
+        out.append(count)
+    else:
+        out.append(LONG_COUNT)
+        out += COUNT.pack(count)
+
+def unpack_count(data, offset):
+    count = data[offset]
+    if count < LONG_COUNT:
+        return count, offset + 1
+    return COUNT.unpack_from(data, offset + 1)[0], offset + 1 + COUNT.size
+
+def pack_uint(value, out):
+    if value < 0:
+        raise ValueError("需要非負整數")
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def unpack_uint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def pack_int(value, out):
+    pack_uint(value << 1 if value >= 0 else (-value << 1) - 1, out)
+
+def unpack_int(data, offset):
+    value, offset = unpack_uint(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+def pack_scalar(value, out):
+    kind = type(value)
+    if kind is int:
+        out.append(INT)
+        pack_int(value, out)
+    elif kind is str:
+        raw = value.encode("utf-8")
+        out.append(STR)
+        pack_count(len(raw), out)
+        out += raw
+    elif value is None:
+        out.append(NULL)
+    elif kind is bool:
+        out.append(TRUE if value else FALSE)
+    elif kind is float:
+        out.append(FLOAT)
+        out += DOUBLE.pack(value)
+    else:
+        raise TypeError("需要 null / bool / 整數 / 浮點數 / 字串")
+
+def unpack_scalar(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == INT:
+        return unpack_int(data, offset)
+    if tag == STR:
+        length, offset = unpack_count(data, offset)
+        return data[offset:offset + length].decode("utf-8"), offset + length
+    if tag == FLOAT:
+        return DOUBLE.unpack_from(data, offset)[0], offset + DOUBLE.size
+    if tag == NULL:
+        return None, offset
+    if tag in (FALSE, TRUE):
+        return tag == TRUE, offset
+    raise ValueError(f"未知的 scalar 型別 {tag}")
+
+def compile_kind(kind):
+    """回傳 (encode(value, out), decode(data, offset) -> (value, offset))，值不符時 encode 拋出例外"""
+    if isinstance(kind, str) and kind in SCALARS:
+        fmt, expected = SCALARS[kind]
+        packer = struct.Struct("!" + fmt)
+        pack, unpack_from, size = packer.pack, packer.unpack_from, packer.size
+        def encode(value, out):
+            if type(value) is not expected:
+                raise TypeError(f"需要 {kind}")
+            out += pack(value)
+        def decode(data, offset):
+            return unpack_from(data, offset)[0], offset + size
+        return encode, decode
+
+    if kind == "str":
+        def encode(value, out):
+            if type(value) is not str:
+                raise TypeError("需要 str")
+            raw = value.encode("utf-8")
+            pack_count(len(raw), out)
+            out += raw
+        def decode(data, offset):
+            length, offset = unpack_count(data, offset)
+            return data[offset:offset + length].decode("utf-8"), offset + length
+        return encode, decode
+
+    if kind in ("uint", "int"):
+        pack, unpack = (pack_uint, unpack_uint) if kind == "uint" else (pack_int, unpack_int)
+        def encode(value, out):
+            if type(value) is not int:
+                raise TypeError(f"需要 {kind}")
+            pack(value, out)
+        return encode, unpack
+
+    if kind == "scalar":
+        return pack_scalar, unpack_scalar
+
+    if not isinstance(kind, dict) or len(kind) != 1:
+        raise ValueError(f"未知的欄位型別: {kind!r}")
+    (name, argument), = kind.items()
+
+    if name == "list":
+        encode_item, decode_item = compile_kind(argument)
+        def encode(value, out):
+            if type(value) is not list:
+                raise TypeError("需要 list")
+            pack_count(len(value), out)
+            for item in value:
+                encode_item(item, out)
+        def decode(data, offset):
+            count, offset = unpack_count(data, offset)
+            items = []
+            for _ in range(count):
+                item, offset = decode_item(data, offset)
+                items.append(item)
+            return items, offset
+        return encode, decode
+
+    if name == "records":
+        return compile_kind({"list": {"fields": argument}})
+
+    if name == "fields":
+        return compile_fields(argument)
+
+    if name == "map":
+        key_kind, value_kind = argument
+        encode_key, decode_key = compile_kind(key_kind)
+        encode_value, decode_value = compile_kind(value_kind)
+        def encode(value, out):
+            if type(value) is not dict:
+                raise TypeError("需要 dict")
+            pack_count(len(value), out)
+            for key, item in value.items():
+                encode_key(key, out)
+                encode_value(item, out)
+        def decode(data, offset):
+            count, offset = unpack_count(data, offset)
+            result = {}
+            for _ in range(count):
+                key, offset = decode_key(data, offset)
+                result[key], offset = decode_value(data, offset)
+            return result, offset
+        return encode, decode
+
+    if name == "enum":
+        values = list(argument)
+        indexes = {value: i for i, value in enumerate(values)}
+        def encode(value, out):
+            out.append(indexes[value])
+        def decode(data, offset):
+            return values[data[offset]], offset + 1
+        return encode, decode
+
+    if name == "optional":
+        encode_item, decode_item = compile_kind(argument)
+        def encode(value, out):
+            if value is None:
+                out += b"\x00"
+            else:
+                out += b"\x01"
+                encode_item(value, out)
+        def decode(data, offset):
+            if not data[offset]:
+                return None, offset + 1
+            return decode_item(data, offset + 1)
+        return encode, decode
+
+    raise ValueError(f"未知的欄位型別: {kind!r}")
+
+def compile_scalar_run(run):
+    """連續的數值欄位合併成一次 struct 打包"""
+    names = [name for name, _ in run]
+    expected = [SCALARS[kind][1] for _, kind in run]
+    packer = struct.Struct("!" + "".join(SCALARS[kind][0] for _, kind in run))
+    pack, unpack_from, size = packer.pack, packer.unpack_from, packer.size
+    if len(run) == 1:
+        name, kind = names[0], expected[0]
+        def encode(value, out):
+            item = value[name]
+            if type(item) is not kind:
+                raise TypeError("欄位型別不符")
+            out += pack(item)
+        def decode(data, offset, result):
+            result[name] = unpack_from(data, offset)[0]
+            return offset + size
+        return encode, decode
+
+    checks = list(zip(names, expected))
+    def encode(value, out):
+        values = []
+        for name, kind in checks:
+            item = value[name]
+            if type(item) is not kind:
+                raise TypeError("欄位型別不符")
+            values.append(item)
+        out += pack(*values)
+    def decode(data, offset, result):
+        result.update(zip(names, unpack_from(data, offset)))
+        return offset + size
+    return encode, decode
+
+def compile_field(name, kind):
+    if kind == "str":
+        # 最常見的欄位，省去一層函式呼叫
+        def encode(value, out):
+            item = value[name]
+            if type(item) is not str:
+                raise TypeError("需要 str")
+            raw = item.encode("utf-8")
+            pack_count(len(raw), out)
+            out += raw
+        def decode(data, offset, result):
+            length = data[offset]
+            offset += 1
+            if length == LONG_COUNT:
+                (length,) = COUNT.unpack_from(data, offset)
+                offset += COUNT.size
+            end = offset + length
+            result[name] = data[offset:end].decode("utf-8")
+            return end
+        return encode, decode
+
+    encode_value, decode_value = compile_kind(kind)
+    def encode(value, out):
+        encode_value(value[name], out)
+    def decode(data, offset, result):
+        result[name], offset = decode_value(data, offset)
+        return offset
+    return encode, decode
+
+def compile_fields(fields):
+    """一組具名欄位（訊息本身或 records 的元素）"""
+    steps = []
+    run = []
+    for name, kind in fields:
+        if isinstance(kind, str) and kind in SCALARS:
+            run.append((name, kind))
+            continue
+        if run:
+            steps.append(compile_scalar_run(run))
+            run = []
+        steps.append(compile_field(name, kind))
+    if run:
+        steps.append(compile_scalar_run(run))
+    encoders = [encode for encode, _ in steps]
+    decoders = [decode for _, decode in steps]
+    count = len(fields)
+
+    def encode(value, out):
+        # 多出的欄位無法以 schema 表示（訊息本身的 type 另外以訊息編號送出）
+        if type(value) is not dict or len(value) - ("type" in value) != count:
+            raise ValueError("欄位與 schema 不符")
+        for step in encoders:
+            step(value, out)
+
+    def decode(data, offset, result=None):
+        result = {} if result is None else result
+        for step in decoders:
+            offset = step(data, offset, result)
+        return result, offset
+
+    return encode, decode
+
+class GameCodec:
+    """依 message_schema 編解碼訊息"""
+    def __init__(self, schema):
+        schema = dict(STATE_SCHEMA, **schema)
+        self.schema = schema
+        # schema 內容相同的伺服器與客戶端 ID 相同
+        self.schema_id = hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.types = sorted(schema)
+        if len(self.types) > MAX_MESSAGE_TYPES:
+            raise ValueError(f"message_schema 最多 {MAX_MESSAGE_TYPES} 種訊息")
+        self.encoders = {}
+        self.decoders = []
+        for index, name in enumerate(self.types):
+            encode, decode = compile_fields(schema[name])
+            self.encoders[name] = (index, encode)
+            self.decoders.append((name, decode))
+
+    def encode(self, message):
+        """編碼成二進位訊框；訊息不在 schema 中或與 schema 不符時回傳 None（改送 JSON）"""
+        entry = self.encoders.get(message.get("type"))
+        if not entry:
+            return None
+        out = bytearray(FRAME_HEADER.size)
+        try:
+            entry[1](message, out)
+        except (KeyError, TypeError, ValueError, IndexError, struct.error, OverflowError):
+            return None
+        length = len(out) - FRAME_HEADER.size
+        if length > MAX_PAYLOAD:
+            return None
+        FRAME_HEADER.pack_into(out, 0, BINARY_FLAG | entry[0], length)
+        return bytes(out)
+
+    def decode(self, data, offset=0):
+        """解碼 data[offset:] 開頭的一個完整訊框，回傳 (訊息, 結束位置)"""
+        marker, length = FRAME_HEADER.unpack_from(data, offset)
+        name, decode = self.decoders[marker & MAX_MESSAGE_TYPES]
+        start = offset + FRAME_HEADER.size
+        message, end = decode(data, start, {"type": name})
+        if end != start + length:
+            raise ValueError(f"訊息 {name} 的長度不符")
+        return message, end
+
+    def request(self):
+        """客戶端要求以二進位格式接收的訊息"""
+        return {"type": "codec", "schema": self.schema_id}
+
+def load_codec(game_dir=None):
+    """依遊戲目錄中 game_config.json 的 message_schema 建立 GameCodec（未宣告時回傳 None）"""
+    path = os.path.join(game_dir or os.getcwd(), "game_config.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            schema = json.load(f).get("message_schema")
+    except (OSError, ValueError):
+        return None
+    return GameCodec(schema) if schema else None
+
+class MessageReader:
+    """客戶端：從連線收到的位元組中依序解析 JSON 與二進位訊息"""
+    def __init__(self, codec=None):
+        self.codec = codec
+        self.buffer = bytearray()
+        self.decoder = json.JSONDecoder()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_message(self):
+        """取出一則完整的訊息，資料不足時回傳 None"""
+        start = 0
+        while start < len(self.buffer) and self.buffer[start] in b" \t\r\n":
+            start += 1
+        if start:
+            del self.buffer[:start]
+        if not self.buffer:
+            return None
+
+        if self.buffer[0] & BINARY_FLAG:
+            if self.codec is None:
+                raise ValueError("收到二進位訊息但沒有 message_schema")
+            if len(self.buffer) < FRAME_HEADER.size:
+                return None
+            _, length = FRAME_HEADER.unpack_from(self.buffer)
+            if len(self.buffer) < FRAME_HEADER.size + length:
+                return None
+            message, end = self.codec.decode(self.buffer)
+            del self.buffer[:end]
+            return message
+
+        # JSON 之後可能緊接著二進位訊框，以 surrogateescape 保留無法解碼的位元組
+        text = bytes(self.buffer).decode("utf-8", "surrogateescape")
+        try:
+            message, end = self.decoder.raw_decode(text)
+        except json.JSONDecodeError:
+            return None
+        del self.buffer[:len(text[:end].encode("utf-8", "surrogateescape"))]
+        return message
+
+    def receive(self, sock):
+        """讀取下一則訊息，連線中斷時回傳 None"""
+        while True:
+            message = self.next_message()
+            if message is not None:
+                return message
+            data = sock.recv(65536)
+            if not data:
+                return None
+            self.feed(data)
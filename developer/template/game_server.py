@@ -2,85 +2,45 @@
 """
 遊戲伺服器模板
 這個檔案是遊戲開發者需要實作的伺服器端邏輯
+連線、緩衝與計時由 game_runtime.EventGameServer 處理，只需實作各個掛勾
+即時遊戲改為繼承 game_runtime.TickGameServer，在 on_tick(tick, inputs) 中以固定頻率推進遊戲
+（範例見 developer/games/tug_of_war/game_server.py），需要低延遲時可設定 udp = True 改走 UDP（見 game_udp.py）
 """
-import socket
-import threading
-import json
 import sys
+from game_runtime import EventGameServer
+
+class GameServer(EventGameServer):
+    log_name = "遊戲伺服器"
 
-class GameServer:
     def __init__(self, port, max_players=2):
-        self.port = port
-        self.max_players = max_players
-        self.clients = []
-        self.game_started = False
-        self.server_socket = None
-        
-    def start(self):
-        """啟動遊戲伺服器"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind(('0.0.0.0', self.port))
-        self.server_socket.listen(self.max_players)
-        print(f"[遊戲伺服器] 在埠口 {self.port} 上啟動，等待玩家連線...")
-        
-        while len(self.clients) < self.max_players:
-            client_socket, addr = self.server_socket.accept()
-            self.clients.append(client_socket)
-            print(f"[遊戲伺服器] 玩家 {len(self.clients)} 已連線 ({addr})")
-            client_socket.send(json.dumps({"type": "connected", "player_id": len(self.clients)}).encode())
-        
-        print(f"[遊戲伺服器] 所有玩家已就緒，遊戲開始！")
-        self.game_started = True
-        self.run_game()
-        
-    def run_game(self):
-        """執行遊戲邏輯 - 需要被子類別覆寫"""
-        raise NotImplementedError("子類別必須實作 run_game 方法")
-        
-    def broadcast(self, message):
-        """廣播訊息給所有玩家"""
-        data = json.dumps(message).encode()
-        for client in self.clients:
-            try:
-                client.send(data)
-            except:
-                pass
-                
-    def send_to_player(self, player_id, message):
-        """發送訊息給特定玩家"""
-        if 0 <= player_id < len(self.clients):
-            try:
-                self.clients[player_id].send(json.dumps(message).encode())
-            except:
-                pass
-                
-    def receive_from_player(self, player_id):
-        """接收來自特定玩家的訊息"""
-        if 0 <= player_id < len(self.clients):
-            try:
-                data = self.clients[player_id].recv(4096).decode()
-                return json.loads(data)
-            except:
-                return None
-        return None
-        
-    def close(self):
-        """關閉伺服器"""
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-        if self.server_socket:
-            self.server_socket.close()
+        super().__init__(port, min_players=max_players, max_players=max_players)
+
+    def on_player_join(self, player):
+        """玩家加入"""
+        self.send(player, {"type": "connected", "player_id": player.player_id + 1})
+
+    def on_start(self):
+        """所有玩家已就緒 - 需要被子類別覆寫"""
+        raise NotImplementedError("子類別必須實作 on_start 方法")
+
+    def on_message(self, player, message):
+        """收到玩家訊息 - 需要被子類別覆寫"""
+        raise NotImplementedError("子類別必須實作 on_message 方法")
+
+    def on_disconnect(self, player):
+        """玩家斷線，預設結束遊戲"""
+        if self.started:
+            self.broadcast({"type": "game_over", "reason": "disconnect"})
+            # 回報結果：留在場上的玩家獲勝
+            self.report_result([p.player_id for p in self.active_players()], reason="disconnect")
+            self.finish()
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         port = int(sys.argv[1])
     else:
         port = 5000
-    
+
     server = GameServer(port)
     try:
         server.start()
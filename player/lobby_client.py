@@ -7,29 +7,64 @@ import socket
 import json
 import os
 import sys
+import shutil
 import subprocess
+import threading
+import hashlib
 import time
 import errno
 import select
+from wire_codec import MessageStream, hello_message
+from package_fetch import PackageDownloader, DownloadError
+
+# 只讀取資料的請求：重新連線後可以自動重送。其他請求（建立/加入房間、配對、評分等）
+# 可能在斷線前已經被伺服器處理，重送會重複執行，改由使用者確認後自行重試
+RETRY_SAFE_MESSAGES = {
+    "list_games",
+    "get_game_detail",
+    "get_ratings",
+    "list_rooms",
+    "get_room_status",
+    "get_queue_status",
+    "get_leaderboard",
+    "get_my_rank",
+    "get_server_stats",
+}
 
 class LobbyClient:
     def __init__(self, server_host='localhost', server_port=6002):
         self.server_host = server_host
         self.server_port = server_port
         self.socket = None
+        self.stream = None
         self.player = None
         self.downloads_dir = "downloads"
         self.current_room = None
+        self.session_token = None
+        self.match_server_info = None  # 配對成功時的遊戲伺服器資訊
+        # 房間遊戲檔案的背景準備：{"room_id", "package_id", "thread", "status", "message"}
+        self.preparation = None
+        # 背景準備完成時寫入，喚醒 room_menu 的 select
+        self.wake_read, self.wake_write = os.pipe()
         
     def connect(self):
         """連線到大廳伺服器"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.server_host, self.server_port))
+            self.stream = MessageStream(self.socket)
+            self.negotiate()
             return True
         except Exception as e:
             print(f"❌ 連線失敗: {e}")
             return False
+    
+    def negotiate(self):
+        """協商訊息壓縮與精簡編碼（舊版伺服器不支援時沿用原本的格式）"""
+        self.stream.send_message(hello_message())
+        response = self.stream.receive_message()
+        if response and response.get("success"):
+            self.stream.configure(response)
 
     def wait_for_port(self, host, port, timeout=5.0, interval=0.25):
         """等待遊戲伺服器埠口開啟，避免客戶端過早連線"""
@@ -54,49 +89,79 @@ class LobbyClient:
         #     time.sleep(interval)
         # return False
     
-    def send_message(self, message):
+    def send_message(self, message, retry=True):
         """發送訊息給伺服器"""
+        error = "連線中斷"
         try:
-            # 發送數據
-            data_to_send = json.dumps(message).encode('utf-8')
-            self.socket.sendall(data_to_send)
+            self.stream.send_message(message)
             
             # 接收回應
             while True:
                 response = self.receive_one_json()
                 if not response:
-                    return {"success": False, "message": "連線中斷"}
+                    break
                 
                 # 檢查是否為事件通知
-                if response.get("type") in ["room_update", "game_started"]:
+                if response.get("type") in ["room_update", "game_started", "match_found"]:
                     self.handle_event(response)
                     continue
                 
                 return response
         except Exception as e:
             print(f"❌ 通訊錯誤: {e}")
-            return {"success": False, "message": str(e)}
+            error = str(e)
+        
+        # 連線中斷時以工作階段權杖重新連線，成功後只重送唯讀的請求
+        if retry and self.resume_session():
+            if message.get("type") in RETRY_SAFE_MESSAGES:
+                return self.send_message(message, retry=False)
+            return {"success": False, "message": "連線曾中斷，已重新連線，請確認操作是否已完成後再試"}
+        return {"success": False, "message": error}
+    
+    def resume_session(self):
+        """連線中斷後以工作階段權杖接回原本的線上狀態與房間"""
+        if not self.session_token:
+            return False
+        
+        print("\n⚠️  與伺服器的連線中斷，正在重新連線...")
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+        
+        for attempt in range(3):
+            if self.connect():
+                break
+            time.sleep(1 + attempt)
+        else:
+            return False
+        
+        response = self.send_message({
+            "type": "resume",
+            "session_token": self.session_token
+        }, retry=False)
+        
+        if not response["success"]:
+            print(f"❌ 重新連線失敗: {response['message']}")
+            self.session_token = None
+            return False
+        
+        self.current_room = response.get("room")
+        print("✅ 已重新連線")
+        return True
 
     def receive_one_json(self):
         """接收一個完整的 JSON 物件"""
-        chunks = []
-        while True:
-            try:
-                chunk = self.socket.recv(65536).decode('utf-8')
-                if not chunk:
-                    return None
-                chunks.append(chunk)
-                try:
-                    return json.loads(''.join(chunks))
-                except json.JSONDecodeError:
-                    continue
-            except Exception:
-                return None
+        try:
+            return self.stream.receive_message()
+        except Exception:
+            return None
 
     def handle_event(self, event):
         """處理伺服器推送的事件"""
         if event["type"] == "room_update":
-            self.current_room = event["room"]
+            # 房間停留太久被伺服器回收時狀態為 expired
+            self.current_room = event["room"] if event["room"]["status"] != "expired" else None
             # 若在 send_message 等待過程中收到更新，簡單提示即可
             # 實際 UI 更新由 room_menu 的 select 迴圈處理
             pass
@@ -104,6 +169,11 @@ class LobbyClient:
         elif event["type"] == "game_started":
             # 這裡通常不會觸發，因為 game_started 主要在 room_menu 等待時收到
             pass
+        
+        elif event["type"] == "match_found":
+            # 取消配對的同時配對成功，由 quick_match 接手
+            self.current_room = event["room"]
+            self.match_server_info = event.get("server_info")
     
     def register(self):
         """註冊玩家帳號"""
@@ -146,6 +216,7 @@ class LobbyClient:
         
         if response["success"]:
             self.player = response["player"]
+            self.session_token = response.get("session_token")
             # 建立玩家的下載目錄
             self.downloads_dir = f"downloads/{self.player['username']}"
             os.makedirs(self.downloads_dir, exist_ok=True)
@@ -234,7 +305,29 @@ class LobbyClient:
                 print(f"  {rating['date']}")
         else:
             print("\n尚無評論")
-    
+
+        self.show_leaderboard(game_info["id"])
+
+    def show_leaderboard(self, game_id):
+        """顯示遊戲排行榜與自己的名次"""
+        response = self.send_message({"type": "get_leaderboard", "game_id": game_id, "limit": 10})
+        if not response["success"]:
+            return
+
+        print(f"\n排行榜（共 {response['total']} 位玩家）：")
+        if not response["leaderboard"]:
+            print("  尚無對戰紀錄")
+            return
+        for entry in response["leaderboard"]:
+            print(f"  {entry['rank']:>3}. {entry['username']:<16} 積分 {entry['rating']:>5}  "
+                  f"{entry['wins']} 勝 {entry['losses']} 敗 {entry['draws']} 和")
+
+        mine = self.send_message({"type": "get_my_rank", "game_id": game_id})
+        if mine["success"] and mine["standing"]:
+            standing = mine["standing"]
+            print(f"\n  你的名次: 第 {standing['rank']} 名，積分 {standing['rating']} "
+                  f"({standing['wins']} 勝 {standing['losses']} 敗 {standing['draws']} 和)")
+
     def download_game(self):
         """下載遊戲"""
         print("\n========== 下載遊戲 ==========")
@@ -266,32 +359,166 @@ class LobbyClient:
                 return
         
         print(f"\n正在下載 {game['name']}...")
+        game_info = self.fetch_game(game["id"], game["name"])
+        if not game_info:
+            return
+        
+        game_dir = os.path.join(self.downloads_dir, game_info['name'])
+        print(f"✅ 下載完成！遊戲已儲存至 {game_dir}")
+        print(f"   版本: {game_info['version']}")
+    
+    def fetch_game(self, game_id, game_name):
+        """下載遊戲到 downloads/<遊戲名稱>，成功時回傳 game_info
+        
+        伺服器支援分段下載時以多條連線平行下載並驗證每個片段，中斷後下次會從 .part 檔案接續；
+        否則以 download_game 一次取得所有檔案
+        """
+        part_path = os.path.join(self.downloads_dir, f"{game_name}.part")
         response = self.send_message({
-            "type": "download_game",
-            "game_id": game["id"]
+            "type": "get_package_manifest",
+            "game_id": game_id,
+            "resume": os.path.exists(part_path)
         })
+        if not response["success"]:
+            return self.fetch_game_legacy(game_id)
         
+        game_info = response["game_info"]
+        package = response["package"]
+        try:
+            downloader = self.install_package(response, part_path)
+        except (OSError, DownloadError) as e:
+            print(f"❌ 下載失敗: {e}")
+            print("   已下載的部分會保留，下次下載時從中斷處繼續")
+            return None
+        except KeyboardInterrupt:
+            print("\n⚠️  下載中斷，下次下載時從中斷處繼續")
+            return None
+        if len(package["pieces"]) > 1:
+            print(f"   共 {package['size']} bytes，本次下載 {downloader.fetched_bytes} bytes")
+        return game_info
+    
+    def install_package(self, response, part_path):
+        """依 get_package_manifest 的回應下載套件，解開到暫存目錄後再取代 downloads/<遊戲名稱>"""
+        game_dir = os.path.join(self.downloads_dir, response["game_info"]["name"])
+        os.makedirs(self.downloads_dir, exist_ok=True)
+        downloader = PackageDownloader(self.server_host, self.server_port, response["package"],
+                                       response["token"], part_path)
+        downloader.download()
+        staging_dir = game_dir + ".new"
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        downloader.extract(staging_dir)
+        # 解開完成才換上新版本，下載途中啟動遊戲不會讀到一半的檔案
+        old_dir = game_dir + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(game_dir):
+            os.rename(game_dir, old_dir)
+        os.rename(staging_dir, game_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return downloader
+    
+    def package_installed(self, game_dir, package):
+        """本機的遊戲檔案是否與套件清單完全相同（逐一比對 SHA-256）"""
+        for entry in package["files"]:
+            try:
+                with open(os.path.join(game_dir, entry["name"]), "rb") as f:
+                    content = f.read()
+            except OSError:
+                return False
+            if len(content) != entry["size"] or hashlib.sha256(content).hexdigest() != entry["sha256"]:
+                return False
+        return True
+    
+    def start_room_preparation(self):
+        """在背景下載或驗證房間需要的遊戲版本，完成後由 room_menu 回報準備好"""
+        room = self.current_room
+        game_dir = os.path.join(self.downloads_dir, room["game_name"])
+        part_path = game_dir + ".part"
+        local_version = None
+        try:
+            with open(os.path.join(game_dir, "game_config.json"), 'r', encoding='utf-8') as f:
+                local_version = json.load(f).get("version")
+        except (OSError, ValueError):
+            pass
+        
+        # 本機已是相同版本（只需驗證）或接續先前的下載時不重複記錄下載
+        response = self.send_message({
+            "type": "get_package_manifest",
+            "game_id": room["game_id"],
+            "version": room["version"],
+            "resume": local_version == room["version"] or os.path.exists(part_path)
+        })
         if not response["success"]:
-            print(f"❌ {response['message']}")
+            print(f"\n❌ 無法取得遊戲檔案清單: {response['message']}")
+            self.preparation = {"room_id": room["room_id"], "package_id": room["package_id"],
+                                "thread": None, "status": "failed", "message": response["message"]}
             return
         
-        # 儲存遊戲檔案
+        preparation = {"room_id": room["room_id"], "package_id": response["package"]["package_id"],
+                       "thread": None, "status": "preparing", "message": ""}
+        preparation["thread"] = threading.Thread(target=self.prepare_package,
+                                                 args=(preparation, response, part_path), daemon=True)
+        self.preparation = preparation
+        preparation["thread"].start()
+    
+    def prepare_package(self, preparation, response, part_path):
+        """背景執行緒：驗證本機檔案，不符時下載（不使用大廳連線，也不讀取輸入）"""
         game_info = response["game_info"]
-        files = response["files"]
+        try:
+            if not self.package_installed(os.path.join(self.downloads_dir, game_info["name"]),
+                                          response["package"]):
+                print(f"\n⏳ 正在背景下載《{game_info['name']}》{game_info['version']}...")
+                self.install_package(response, part_path)
+            preparation["status"] = "ready"
+        except (OSError, DownloadError) as e:
+            preparation["status"] = "failed"
+            preparation["message"] = str(e)
+        os.write(self.wake_write, b"!")
+    
+    def finish_room_preparation(self):
+        """背景準備結束：成功時向大廳回報準備好"""
+        os.read(self.wake_read, 4096)
+        preparation = self.preparation
+        if not preparation or preparation["status"] == "preparing" or not self.current_room \
+                or preparation["room_id"] != self.current_room["room_id"]:
+            return
+        if preparation["status"] == "failed":
+            print(f"\n❌ 遊戲檔案準備失敗: {preparation['message']}")
+            print("   已下載的部分會保留，輸入 r 重試")
+            return
+        
+        response = self.send_message({
+            "type": "set_ready",
+            "ready": True,
+            "package_id": preparation["package_id"]
+        })
+        if response["success"]:
+            self.current_room = response["room"]
+            print(f"\n✅ 遊戲《{self.current_room['game_name']}》已準備好")
+        else:
+            print(f"\n❌ {response['message']}")
+    
+    def fetch_game_legacy(self, game_id):
+        """以單一回應下載整個遊戲（舊版伺服器）"""
+        response = self.send_message({
+            "type": "download_game",
+            "game_id": game_id
+        })
+        
+        if not response["success"]:
+            print(f"❌ 下載失敗: {response['message']}")
+            return None
         
-        # 建立遊戲目錄
+        # 儲存遊戲檔案
+        game_info = response["game_info"]
         game_dir = os.path.join(self.downloads_dir, game_info['name'])
         os.makedirs(game_dir, exist_ok=True)
         
-        # 寫入檔案
-        for file_info in files:
+        for file_info in response["files"]:
             file_path = os.path.join(game_dir, file_info["name"])
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(file_info["content"])
-        
-        print(f"✅ 下載完成！遊戲已儲存至 {game_dir}")
-        print(f"   版本: {game_info['version']}")
+        return game_info
     
     def check_and_download_game(self, game_name, game_id, server_version):
         """檢查並下載/更新遊戲"""
@@ -327,26 +554,9 @@ class LobbyClient:
         
         # 下載遊戲
         print(f"\n正在下載 {game_name}...")
-        response = self.send_message({
-            "type": "download_game",
-            "game_id": game_id
-        })
-        
-        if not response["success"]:
-            print(f"❌ 下載失敗: {response['message']}")
+        if not self.fetch_game(game_id, game_name):
             return False
         
-        # 儲存遊戲檔案
-        game_info = response["game_info"]
-        files = response["files"]
-        os.makedirs(game_dir, exist_ok=True)
-        
-        for file_info in files:
-            file_path = os.path.join(game_dir, file_info["name"])
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(file_info["content"])
-        
         print(f"✅ 下載完成！")
         return True
 
@@ -395,6 +605,92 @@ class LobbyClient:
         # 進入房間等待畫面
         self.room_menu()
     
+    def measure_latency(self):
+        """量測到大廳的往返延遲（毫秒）"""
+        started = time.perf_counter()
+        response = self.send_message({"type": "list_rooms"})
+        if not response["success"]:
+            return None
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    def quick_match(self):
+        """快速配對"""
+        print("\n========== 快速配對 ==========")
+        
+        games = self.list_games()
+        if not games:
+            return
+        
+        try:
+            choice = int(input("\n請選擇要配對的遊戲 (輸入編號, 0返回): "))
+            if choice == 0:
+                return
+            if 1 <= choice <= len(games):
+                game = games[choice - 1]
+            else:
+                print("❌ 無效的選擇")
+                return
+        except ValueError:
+            print("❌ 請輸入有效的數字")
+            return
+        
+        # 檢查並下載遊戲
+        if not self.check_and_download_game(game['name'], game['id'], game['version']):
+            return
+        
+        response = self.send_message({
+            "type": "queue_for_game",
+            "game_id": game["id"],
+            "latency_ms": self.measure_latency()
+        })
+        
+        if not response["success"]:
+            print(f"❌ {response['message']}")
+            return
+        
+        self.current_room = None
+        self.match_server_info = None
+        print(f"\n⏳ 正在配對《{game['name']}》... (輸入 1 取消配對)")
+        
+        while not self.current_room:
+            try:
+                # 緩衝區已有資料時不等待，避免已收到的推送卡在緩衝區
+                rlist, _, _ = select.select([self.socket, sys.stdin], [], [], 0 if self.stream.pending() else None)
+            except ValueError:
+                return
+            
+            if self.stream.pending() or self.socket in rlist:
+                msg = self.receive_one_json()
+                if not msg:
+                    if not self.resume_session():
+                        print("\n❌ 與伺服器斷線")
+                        return
+                    # 斷線期間可能已配對成功
+                    if self.current_room:
+                        status = self.send_message({"type": "get_room_status"})
+                        if status["success"]:
+                            self.current_room = status["room"]
+                            self.match_server_info = status.get("server_info")
+                    continue
+                if msg.get("type") == "match_found":
+                    self.current_room = msg["room"]
+                    self.match_server_info = msg.get("server_info")
+            
+            if sys.stdin in rlist and not self.current_room:
+                line = sys.stdin.readline().strip()
+                if line == '1':
+                    response = self.send_message({"type": "cancel_queue"})
+                    if response["success"]:
+                        print("✅ 已取消配對")
+                        return
+        
+        print(f"\n✅ 配對成功！玩家: {'/'.join(self.current_room['players'])}")
+        if self.match_server_info:
+            self.launch_game_client(self.match_server_info)
+        else:
+            # 遊戲伺服器啟動失敗，進入房間由房主手動開始
+            self.room_menu()
+    
     def list_rooms(self):
         """列出所有房間"""
         print("\n========== 遊戲房間列表 ==========")
@@ -455,11 +751,14 @@ class LobbyClient:
         # 為了簡化，我們假設房間資訊中包含了足夠的資訊，或者我們再發一次請求獲取遊戲詳情
         # 但為了效率，我們可以直接嘗試下載，如果版本一致，check_and_download_game 會處理
         
-        # 獲取遊戲詳情以得到版本號
-        game_detail = self.send_message({
-            "type": "get_game_detail",
-            "game_id": self.current_room["game_id"]
-        })
+        # 大廳提供房間的套件資訊時，由 room_menu 在背景下載或驗證
+        game_detail = {"success": False}
+        if not self.current_room.get("package_id"):
+            # 獲取遊戲詳情以得到版本號
+            game_detail = self.send_message({
+                "type": "get_game_detail",
+                "game_id": self.current_room["game_id"]
+            })
         
         if game_detail["success"]:
             game_info = game_detail["game"]
@@ -478,6 +777,8 @@ class LobbyClient:
     
     def room_menu(self):
         """房間選單"""
+        if self.current_room.get("package_id"):
+            self.start_room_preparation()
         self.print_room_status()
         
         while self.current_room:
@@ -489,19 +790,38 @@ class LobbyClient:
             
             # 使用 select 監聽 socket 和 stdin
             try:
-                rlist, _, _ = select.select([self.socket, sys.stdin], [], [])
+                # 緩衝區已有資料時不等待，避免已收到的推送卡在緩衝區
+                rlist, _, _ = select.select([self.socket, sys.stdin, self.wake_read], [], [],
+                                            0 if self.stream.pending() else None)
             except ValueError:
                 break
             
-            if self.socket in rlist:
+            if self.wake_read in rlist:
+                self.finish_room_preparation()
+            
+            if self.stream.pending() or self.socket in rlist:
                 # 收到伺服器訊息
                 msg = self.receive_one_json()
                 if not msg:
+                    if self.resume_session():
+                        # 斷線期間房主已開始遊戲
+                        if self.current_room and self.current_room.get("status") == "playing":
+                            status = self.send_message({"type": "get_room_status"})
+                            if status["success"] and status.get("server_info"):
+                                self.launch_game_client(status["server_info"])
+                                break
+                        self.print_room_status()
+                        continue
                     print("\n❌ 與伺服器斷線")
                     self.current_room = None
                     break
                 
                 if msg.get("type") == "room_update":
+                    if msg["room"]["status"] == "expired":
+                        print("\n⌛ 房間閒置過久，已被伺服器關閉")
+                        self.current_room = None
+                        self.preparation = None
+                        break
                     self.current_room = msg["room"]
                     self.print_room_status()
                 elif msg.get("type") == "game_started":
@@ -513,11 +833,16 @@ class LobbyClient:
                 # 使用者輸入
                 line = sys.stdin.readline().strip()
                 
+                if line == 'r' and self.preparation and self.preparation["status"] == "failed":
+                    self.start_room_preparation()
+                    continue
+                
                 if is_host:
                     if can_start:
                         if line == '1':
-                            self.start_game()
-                            break
+                            if self.start_game():
+                                break
+                            self.print_room_status()
                         elif line == '2':
                             self.leave_room()
                             break
@@ -533,10 +858,17 @@ class LobbyClient:
     def print_room_status(self):
         if not self.current_room:
             return
+        players = self.current_room['players']
+        if self.current_room.get("package_id"):
+            # 標示每位玩家是否已備妥遊戲檔案
+            ready = self.current_room.get("ready", [])
+            players = [f"{name}{'✅' if name in ready else '⏳'}" for name in players]
         print(f"\n{'='*50}")
         print(f"  房間: {self.current_room['game_name']} (ID: {self.current_room['room_id']})")
-        print(f"  玩家: {'/'.join(self.current_room['players'])} ({self.current_room['player_count']}/{self.current_room['max_players']})")
+        print(f"  玩家: {'/'.join(players)} ({self.current_room['player_count']}/{self.current_room['max_players']})")
         print(f"  房主: {self.current_room['host']}")
+        if self.current_room.get("version"):
+            print(f"  版本: {self.current_room['version']}")
         print(f"{'='*50}")
         
         is_host = self.current_room['host'] == self.player['username']
@@ -554,12 +886,23 @@ class LobbyClient:
             print("  (等待房主開始遊戲...)")
     
     def start_game(self):
-        """開始遊戲（房主）"""
+        """開始遊戲（房主），成功時回傳 True"""
+        # 有玩家仍在下載遊戲時，由房主決定是否等待（伺服器不會阻擋開始）
+        status = self.send_message({"type": "get_room_status"})
+        if status["success"] and status["room"].get("package_id"):
+            room = status["room"]
+            not_ready = [name for name in room["players"] if name not in room.get("ready", [])]
+            if not_ready:
+                print(f"\n⚠️  尚未準備好的玩家: {', '.join(not_ready)}")
+                force = input("仍要開始遊戲？ (y/n): ").strip().lower()
+                if force != 'y':
+                    return False
+        
         response = self.send_message({"type": "start_game"})
         
         if not response["success"]:
             print(f"❌ {response['message']}")
-            return
+            return False
         
         server_info = response["server_info"]
         print(f"\n✅ 遊戲伺服器已啟動！")
@@ -567,6 +910,7 @@ class LobbyClient:
         print(f"   遊戲類型: {server_info['game_type'].upper()}")
         
         self.launch_game_client(server_info)
+        return True
     
     def launch_game_client(self, server_info):
         """啟動遊戲客戶端"""
@@ -577,6 +921,12 @@ class LobbyClient:
         game_dir = os.path.abspath(os.path.join(self.downloads_dir, game_name))
         print(f"[DEBUG] 遊戲目錄: {game_dir}")
         
+        # 房主在背景下載完成前就開始遊戲時，等待下載結束
+        thread = self.preparation["thread"] if self.preparation else None
+        if thread and thread.is_alive():
+            print(f"⏳ 等待《{game_name}》下載完成...")
+            thread.join()
+        
         # 檢查遊戲是否已下載
         if not os.path.exists(game_dir):
             print(f"❌ 尚未下載遊戲《{game_name}》")
@@ -608,13 +958,19 @@ class LobbyClient:
 
         try:
             # 啟動遊戲客戶端
-            cmd = [sys.executable, client_file, game_host, str(server_info['port'])]
+            # 第 3 個參數為大廳帳號，遊戲伺服器以此回報對戰結果
+            cmd = [sys.executable, client_file, game_host, str(server_info['port']), self.player['username']]
             print(f"[DEBUG] 執行指令: {' '.join(cmd)}")
             print(f"[DEBUG] 工作目錄: {game_dir}")
             
+            # 加入權杖只屬於本人，以環境變數傳入（不出現在指令列），遊戲伺服器驗證後才計入對戰結果
+            env = dict(os.environ)
+            if server_info.get("join_token"):
+                env["GAMESTORE_JOIN_TOKEN"] = server_info["join_token"]
             process = subprocess.run(
                 cmd,
                 cwd=game_dir,
+                env=env,
                 capture_output=False,
                 text=True
             )
@@ -635,6 +991,97 @@ class LobbyClient:
         if response["success"]:
             print("✅ 已離開房間")
         self.current_room = None
+        self.preparation = None
+    
+    def watch_match(self):
+        """觀看進行中的對戰（經由大廳的觀戰轉播站）"""
+        print("\n========== 觀戰 ==========")
+        
+        response = self.send_message({"type": "list_rooms", "status": "playing"})
+        if not response["success"]:
+            print(f"❌ {response['message']}")
+            return
+        
+        rooms = response["rooms"]
+        if not rooms:
+            print("目前沒有進行中的對戰")
+            return
+        
+        print("\n進行中的對戰：")
+        for i, room in enumerate(rooms, 1):
+            print(f"  {i}. 【{room['game_name']}】 房間 {room['room_id']}: {' vs '.join(room['players'])}")
+        
+        try:
+            choice = int(input("\n請選擇要觀看的對戰 (輸入編號, 0返回): "))
+            if choice == 0:
+                return
+            if not 1 <= choice <= len(rooms):
+                print("❌ 無效的選擇")
+                return
+        except ValueError:
+            print("❌ 請輸入有效的數字")
+            return
+        
+        room_id = rooms[choice - 1]["room_id"]
+        response = self.send_message({"type": "watch_room", "room_id": room_id})
+        if not response["success"]:
+            print(f"❌ {response['message']}")
+            return
+        
+        relay = response["relay"]
+        try:
+            sock = socket.create_connection((relay["host"], relay["port"]), timeout=5)
+            sock.settimeout(None)
+            sock.sendall(json.dumps({
+                "type": "watch",
+                "room_id": room_id,
+                "token": response["watch_token"]
+            }).encode('utf-8') + b"\n")
+        except OSError as e:
+            print(f"❌ 無法連線到觀戰轉播站: {e}")
+            return
+        
+        print("(按 Ctrl+C 離開觀戰)")
+        buffer = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip() and not self.show_spectator_update(json.loads(line)):
+                        return
+        except KeyboardInterrupt:
+            print("\n已離開觀戰")
+        finally:
+            sock.close()
+    
+    def show_spectator_update(self, update):
+        """顯示一則轉播的更新，回傳 False 表示轉播結束"""
+        msg_type = update.get("type")
+        if msg_type == "spectate_start":
+            print(f"\n📺 正在觀看房間 {update['room_id']}《{update['game_name']}》"
+                  f"（目前 {update['viewers']} 位觀眾）")
+        elif msg_type == "spectate_end":
+            print("\n📺 對戰結束，轉播已停止")
+            return False
+        elif msg_type == "spectate_error":
+            print(f"❌ {update['message']}")
+            return False
+        elif "cells" in update and "size" in update:
+            # 棋盤類遊戲（例如井字遊戲）直接畫出棋盤
+            size = update["size"]
+            print(f"\n[{msg_type}]")
+            for row in range(size):
+                print("   " + " ".join(update["cells"][row * size:(row + 1) * size]))
+            if "current_player" in update:
+                print(f"   輪到玩家 {update['current_player'] + 1}")
+        else:
+            details = {k: v for k, v in update.items() if k != "type"}
+            print(f"[{msg_type}] {json.dumps(details, ensure_ascii=False)}")
+        return True
     
     def add_rating(self):
         """為遊戲評分"""
@@ -693,12 +1140,14 @@ class LobbyClient:
             print("  3. 下載遊戲")
             print("  4. 建立房間")
             print("  5. 加入房間")
-            print("  6. 遊戲評分")
-            print("  7. 登出")
-            print("  8. 離開")
+            print("  6. 快速配對")
+            print("  7. 觀戰")
+            print("  8. 遊戲評分")
+            print("  9. 登出")
+            print("  0. 離開")
             print("="*50)
             
-            choice = input("\n請選擇功能 (1-8): ").strip()
+            choice = input("\n請選擇功能 (0-9): ").strip()
             
             if choice == '1':
                 self.list_games()
@@ -711,12 +1160,17 @@ class LobbyClient:
             elif choice == '5':
                 self.join_room()
             elif choice == '6':
-                self.add_rating()
+                self.quick_match()
             elif choice == '7':
+                self.watch_match()
+            elif choice == '8':
+                self.add_rating()
+            elif choice == '9':
                 self.player = None
+                self.session_token = None
                 print("✅ 已登出")
                 break
-            elif choice == '8':
+            elif choice == '0':
                 print("👋 再見！")
                 return False
             else:
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+遊戲套件的分段下載（客戶端）
+以 get_package_manifest 取得檔案與片段清單後，開多條連線平行以 fetch_package_range 下載片段，
+每個片段以 SHA-256 驗證後寫入 downloads/<遊戲>.part，已完成的片段記錄在 <遊戲>.part.json。
+連線中斷時自動重連；程式結束或重新啟動後再次下載同一個套件，只會下載尚未完成的片段。
+全部完成後依清單切成各個檔案並逐一驗證雜湊
+"""
+import base64
+import hashlib
+import json
+import os
+import queue
+import socket
+import threading
+
+from wire_codec import MessageStream, hello_message
+
+# 平行下載的連線數
+DEFAULT_CONNECTIONS = 4
+# 單一片段失敗（連線中斷或雜湊不符）的重試次數
+PIECE_RETRIES = 3
+
+class DownloadError(Exception):
+    pass
+
+class PackageDownloader:
+    """下載一個遊戲套件到指定目錄"""
+    def __init__(self, host, port, package, token, part_path, connections=DEFAULT_CONNECTIONS):
+        self.host = host
+        self.port = port
+        self.package = package
+        self.token = token
+        self.part_path = part_path
+        self.state_path = part_path + ".json"
+        self.connections = max(1, connections)
+        self.done = set()
+        self.lock = threading.Lock()
+        self.part_file = None
+        self.fetched_bytes = 0
+        self.error = None
+
+    # ---------- .part 檔案 ----------
+
+    def load_state(self):
+        """讀取先前中斷的進度（套件不同時從頭開始）"""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("package_id") == self.package["package_id"] and os.path.exists(self.part_path):
+            self.done = set(state.get("done", []))
+
+    def save_state(self):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"package_id": self.package["package_id"], "done": sorted(self.done)}, f)
+        os.replace(temp_path, self.state_path)
+
+    def write_piece(self, index, data):
+        with self.lock:
+            self.part_file.seek(index * self.package["piece_size"])
+            self.part_file.write(data)
+            self.part_file.flush()
+            self.done.add(index)
+            self.fetched_bytes += len(data)
+            self.save_state()
+
+    # ---------- 下載 ----------
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=30)
+        stream = MessageStream(sock)
+        stream.send_message(hello_message())
+        response = stream.receive_message()
+        if response and response.get("success"):
+            stream.configure(response)
+        return stream
+
+    def fetch_piece(self, stream, index):
+        """下載並驗證一個片段，回傳資料"""
+        piece_size = self.package["piece_size"]
+        offset = index * piece_size
+        length = min(piece_size, self.package["size"] - offset)
+        stream.send_message({"type": "fetch_package_range", "token": self.token,
+                             "offset": offset, "length": length})
+        response = stream.receive_message()
+        if response is None:
+            raise OSError("連線中斷")
+        if not response.get("success"):
+            if response.get("error") in ("rate_limited", "busy"):
+                raise OSError(response["message"])
+            raise DownloadError(response.get("message", "下載失敗"))
+        data = base64.b64decode(response["data"])
+        if len(data) != length or hashlib.sha256(data).hexdigest() != self.package["pieces"][index]:
+            raise ValueError(f"片段 {index} 驗證失敗")
+        return data
+
+    def worker(self, pieces):
+        stream = None
+        try:
+            while self.error is None:
+                try:
+                    index, attempt = pieces.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    if stream is None:
+                        stream = self.connect()
+                    self.write_piece(index, self.fetch_piece(stream, index))
+                except (OSError, ValueError) as e:
+                    # 重新連線後再試，重試次數用完就放棄這次下載（已完成的片段留在 .part）
+                    if stream is not None:
+                        stream.close()
+                        stream = None
+                    if attempt + 1 >= PIECE_RETRIES:
+                        self.error = DownloadError(f"片段 {index} 下載失敗: {e}")
+                        return
+                    pieces.put((index, attempt + 1))
+                except DownloadError as e:
+                    self.error = e
+                    return
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def download(self):
+        """下載所有未完成的片段，回傳套件內容所在的 .part 路徑"""
+        self.load_state()
+        mode = "r+b" if self.done else "w+b"
+        self.part_file = open(self.part_path, mode)
+        try:
+            self.part_file.truncate(self.package["size"])
+            pieces = queue.Queue()
+            for index in range(len(self.package["pieces"])):
+                if index not in self.done:
+                    pieces.put((index, 0))
+            threads = [threading.Thread(target=self.worker, args=(pieces,), daemon=True)
+                       for _ in range(min(self.connections, pieces.qsize()))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.part_file.close()
+        if self.error:
+            raise self.error
+        return self.part_path
+
+    def extract(self, game_dir):
+        """把下載完成的套件切成各個檔案並驗證雜湊，完成後刪除 .part"""
+        with open(self.part_path, "rb") as f:
+            for entry in self.package["files"]:
+                f.seek(entry["offset"])
+                content = f.read(entry["size"])
+                if hashlib.sha256(content).hexdigest() != entry["sha256"]:
+                    raise DownloadError(f"檔案 {entry['name']} 驗證失敗")
+                path = os.path.normpath(os.path.join(game_dir, entry["name"]))
+                if not path.startswith(os.path.normpath(game_dir) + os.sep):
+                    raise DownloadError(f"無效的檔案路徑: {entry['name']}")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as out:
+                    out.write(content)
+        os.remove(self.part_path)
+        os.remove(self.state_path)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+遊戲檔案的去重儲存
+上傳的每個檔案依內容的 SHA-256 存成一個 blob，同樣內容的檔案在所有遊戲與版本之間只存一份：
+    uploaded_games/.store/blobs/ab/abcdef...           blob（唯讀）
+    uploaded_games/.store/manifests/<遊戲>/<版本>.json  清單 {"files": {相對路徑: 雜湊}}
+    uploaded_games/<遊戲>/<版本>/...                   以硬連結指向 blob 的版本目錄
+
+版本目錄仍是一般的目錄，遊戲伺服器以它為工作目錄啟動、大廳從它讀取下載的檔案，
+但相同內容的檔案是同一個 inode，不佔額外的磁碟空間與分頁快取。
+blob 的參考次數由所有清單計算，刪除版本後以 gc 清除沒有清單參考的 blob。
+不支援硬連結的檔案系統改為複製檔案（仍會去重 blob，但版本目錄各自佔用空間）
+
+舊版直接寫入的版本目錄以 migrate 就地轉換：檔案移入 blob 後換成硬連結，最後寫入清單
+
+用法:
+    python3 server/blob_store.py [migrate|gc|stats] [uploaded_games 目錄]
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from collections import Counter
+
+STORE_DIR = ".store"
+# 不列入清單的檔案（執行遊戲時產生的快取）
+IGNORED_DIRS = ("__pycache__",)
+IGNORED_SUFFIXES = (".pyc",)
+
+def check_name(name):
+    """遊戲名稱與版本只能是單一路徑元件"""
+    if not isinstance(name, str) or not name or name.startswith(".") or "/" in name or "\\" in name:
+        raise ValueError(f"無效的名稱: {name!r}")
+    return name
+
+def check_path(path):
+    """檔案路徑必須是版本目錄內的相對路徑"""
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"無效的檔案路徑: {path!r}")
+    normalized = os.path.normpath(path)
+    if os.path.isabs(normalized) or normalized == ".." or normalized.startswith(".." + os.sep):
+        raise ValueError(f"無效的檔案路徑: {path!r}")
+    return normalized
+
+def is_ignored(relative_path):
+    parts = relative_path.split(os.sep)
+    return any(part in IGNORED_DIRS for part in parts) or relative_path.endswith(IGNORED_SUFFIXES)
+
+class BlobStore:
+    """以內容雜湊去重的遊戲檔案儲存"""
+    def __init__(self, root="uploaded_games"):
+        self.root = root
+        self.blob_dir = os.path.join(root, STORE_DIR, "blobs")
+        self.manifest_dir = os.path.join(root, STORE_DIR, "manifests")
+        self.lock = threading.RLock()
+        self.refs = None  # Counter {雜湊: 參考次數}，第一次需要時由清單計算
+
+    # ---------- 路徑 ----------
+
+    def version_dir(self, game_name, version):
+        return os.path.join(self.root, check_name(game_name), check_name(version))
+
+    def manifest_path(self, game_name, version):
+        return os.path.join(self.manifest_dir, check_name(game_name), check_name(version) + ".json")
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    # ---------- blob ----------
+
+    def put(self, content):
+        """存入一個 blob，回傳內容雜湊（已存在則不重複寫入）"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, path)
+        return digest
+
+    def read(self, digest):
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def link(self, digest, target):
+        """在 target 建立指向 blob 的硬連結（不支援時改為複製），已存在的檔案會被取代"""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.tmp{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.link(self.blob_path(digest), temp_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), temp_path)
+        os.replace(temp_path, target)
+
+    # ---------- 清單 ----------
+
+    def load_manifest(self, game_name, version):
+        """回傳 {相對路徑: 雜湊}，版本不存在或尚未轉換時回傳 None"""
+        try:
+            with open(self.manifest_path(game_name, version), "r", encoding="utf-8") as f:
+                return json.load(f)["files"]
+        except FileNotFoundError:
+            return None
+
+    def save_manifest(self, game_name, version, files):
+        path = self.manifest_path(game_name, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp{os.getpid()}"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"game": game_name, "version": version, "files": files}, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def manifests(self):
+        """列出所有清單的 (遊戲, 版本)"""
+        if not os.path.isdir(self.manifest_dir):
+            return
+        for game_name in sorted(os.listdir(self.manifest_dir)):
+            game_path = os.path.join(self.manifest_dir, game_name)
+            for filename in sorted(os.listdir(game_path)):
+                if filename.endswith(".json"):
+                    yield game_name, filename[:-len(".json")]
+
+    def reference_counts(self):
+        if self.refs is None:
+            refs = Counter()
+            for game_name, version in self.manifests():
+                refs.update((self.load_manifest(game_name, version) or {}).values())
+            self.refs = refs
+        return self.refs
+
+    # ---------- 版本 ----------
+
+    def write_version(self, game_name, version, files):
+        """寫入一個版本，files 為 [(相對路徑, bytes)]，回傳版本目錄
+
+        先在暫存目錄建立硬連結，完成後再換成正式的版本目錄；重複上傳同一版本會取代舊的內容
+        """
+        with self.lock:
+            # 在鎖內寫入 blob，避免 gc 在建立連結前就把它當成未使用而刪除
+            entries = {}
+            for path, content in files:
+                entries[check_path(path)] = self.put(content)
+            refs = self.reference_counts()
+            game_dir = self.version_dir(game_name, version)
+            temp_dir = f"{game_dir}.tmp{os.getpid()}"
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            os.makedirs(temp_dir)
+            for path, digest in entries.items():
+                self.link(digest, os.path.join(temp_dir, path))
+
+            old_files = self.load_manifest(game_name, version)
+            old_dir = None
+            if os.path.exists(game_dir):
+                old_dir = f"{game_dir}.old{os.getpid()}"
+                os.rename(game_dir, old_dir)
+            os.rename(temp_dir, game_dir)
+            self.save_manifest(game_name, version, entries)
+            if old_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+
+            refs.update(entries.values())
+            if old_files:
+                refs.subtract(old_files.values())
+        return game_dir
+
+    def remove_version(self, game_name, version):
+        """刪除一個版本的目錄與清單（blob 留待 gc 清除）"""
+        with self.lock:
+            old_files = self.load_manifest(game_name, version)
+            if old_files is not None:
+                os.remove(self.manifest_path(game_name, version))
+                if self.refs is not None:
+                    self.refs.subtract(old_files.values())
+            shutil.rmtree(self.version_dir(game_name, version), ignore_errors=True)
+
+    def migrate(self):
+        """把沒有清單的舊版本目錄就地轉換為指向 blob 的硬連結，回傳轉換的版本數"""
+        migrated = 0
+        if not os.path.isdir(self.root):
+            return migrated
+        for game_name in sorted(os.listdir(self.root)):
+            game_path = os.path.join(self.root, game_name)
+            if game_name.startswith(".") or not os.path.isdir(game_path):
+                continue
+            for version in sorted(os.listdir(game_path)):
+                version_path = os.path.join(game_path, version)
+                if version.startswith(".") or ".tmp" in version or ".old" in version or not os.path.isdir(version_path):
+                    continue
+                with self.lock:
+                    if self.load_manifest(game_name, version) is not None:
+                        continue
+                    entries = {}
+                    for root, dirs, filenames in os.walk(version_path):
+                        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+                        for filename in filenames:
+                            file_path = os.path.join(root, filename)
+                            relative_path = os.path.relpath(file_path, version_path)
+                            if is_ignored(relative_path) or os.path.islink(file_path):
+                                continue
+                            with open(file_path, "rb") as f:
+                                digest = self.put(f.read())
+                            self.link(digest, file_path)
+                            entries[relative_path] = digest
+                    self.save_manifest(game_name, version, entries)
+                    if self.refs is not None:
+                        self.refs.update(entries.values())
+                migrated += 1
+                print(f"[檔案儲存] 已轉換 {game_name} {version} ({len(entries)} 個檔案)")
+        return migrated
+
+    def gc(self):
+        """刪除沒有任何清單參考的 blob，回傳 (刪除的 blob 數, 釋放的位元組數)"""
+        removed = freed = 0
+        if not os.path.isdir(self.blob_dir):
+            return removed, freed
+        with self.lock:
+            self.refs = None
+            refs = self.reference_counts()
+            for prefix in os.listdir(self.blob_dir):
+                prefix_dir = os.path.join(self.blob_dir, prefix)
+                for filename in os.listdir(prefix_dir):
+                    if refs[filename] > 0 and ".tmp" not in filename:
+                        continue
+                    path = os.path.join(prefix_dir, filename)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+            self.refs = +refs  # 去掉參考次數為 0 的項目
+        if removed:
+            print(f"[檔案儲存] 已清除 {removed} 個未使用的 blob ({freed} bytes)")
+        return removed, freed
+
+    def maintain(self):
+        """啟動時轉換舊版本目錄並清除未使用的 blob"""
+        try:
+            self.migrate()
+            self.gc()
+        except Exception as e:
+            print(f"[檔案儲存] 維護失敗: {e}")
+
+    def stats(self):
+        """回傳 blob 數、實際佔用與所有版本合計的位元組數"""
+        with self.lock:
+            refs = self.reference_counts()
+            sizes = {}
+            logical = 0
+            versions = 0
+            for game_name, version in self.manifests():
+                versions += 1
+                for digest in (self.load_manifest(game_name, version) or {}).values():
+                    if digest not in sizes:
+                        sizes[digest] = os.path.getsize(self.blob_path(digest))
+                    logical += sizes[digest]
+            return {
+                "versions": versions,
+                "blobs": sum(1 for count in refs.values() if count > 0),
+                "stored_bytes": sum(sizes.values()),
+                "logical_bytes": logical,
+            }
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    store = BlobStore(sys.argv[2] if len(sys.argv) > 2 else "uploaded_games")
+    if command == "migrate":
+        print(f"[檔案儲存] 共轉換 {store.migrate()} 個版本")
+    elif command == "gc":
+        removed, freed = store.gc()
+        print(f"[檔案儲存] 共清除 {removed} 個 blob ({freed} bytes)")
+    elif command == "stats":
+        print(json.dumps(store.stats(), indent=2, ensure_ascii=False))
+    else:
+        print("用法: python3 server/blob_store.py [migrate|gc|stats] [uploaded_games 目錄]")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+密碼雜湊工作池
+在獨立的行程池中計算 / 驗證密碼雜湊，避免慢速 KDF 佔用連線處理執行緒；
+排隊數超過上限時直接拒絕請求（admission control），並提供排隊統計
+"""
+import os
+import sys
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from database import PBKDF2_ITERATIONS, PBKDF2_PREFIX, hash_password, verify_password
+
+# 帳號不存在時用來驗證的雜湊：與真正的帳號花費相同的 PBKDF2 計算，回應時間不會透露帳號是否存在
+DUMMY_PASSWORD_HASH = f"{PBKDF2_PREFIX}${PBKDF2_ITERATIONS}${'0' * 32}${'0' * 64}"
+
+def _timed_job(func, args):
+    """在工作行程中執行並回傳 (結果, 開始時間, 結束時間)"""
+    started_at = time.time()
+    result = func(*args)
+    return result, started_at, time.time()
+
+def _noop():
+    return None
+
+class CredentialPool:
+    """有界的密碼雜湊行程池"""
+    BUSY_MESSAGE = "伺服器忙碌中，請稍後再試"
+    ERROR_MESSAGE = "伺服器錯誤，請稍後再試"
+
+    def __init__(self, workers=None, max_pending=None, timeout=10.0):
+        default_workers = min(4, os.cpu_count() or 1)
+        self.workers = workers or int(os.environ.get("GAMESTORE_HASH_WORKERS", default_workers))
+        self.max_pending = max_pending or int(
+            os.environ.get("GAMESTORE_HASH_MAX_PENDING", self.workers * 16))
+        self.timeout = timeout
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_service = 0.0
+
+    def get_executor(self):
+        """延遲建立行程池（使用 spawn，避免在多執行緒行程中 fork）"""
+        with self.lock:
+            if self.executor is None:
+                context = multiprocessing.get_context("spawn")
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self.executor
+
+    def warm_up(self):
+        """預先啟動所有工作行程，避免重啟後第一波登入承擔啟動成本"""
+        executor = self.get_executor()
+        futures = [executor.submit(_noop) for _ in range(self.workers)]
+        for future in futures:
+            try:
+                future.result(timeout=self.timeout)
+            except Exception as e:
+                print(f"[密碼工作池] 預熱失敗: {e}")
+                return
+
+    def submit(self, func, *args):
+        """提交工作並等待結果，回傳 (是否成功, 結果或錯誤訊息)"""
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return False, self.BUSY_MESSAGE
+            self.pending += 1
+            self.submitted += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        submitted_at = time.time()
+        future = None
+        try:
+            future = self.get_executor().submit(_timed_job, func, args)
+            result, started_at, finished_at = future.result(timeout=self.timeout)
+        except FuturesTimeout:
+            future.cancel()
+            with self.lock:
+                self.timeouts += 1
+            return False, self.BUSY_MESSAGE
+        except BrokenProcessPool as e:
+            print(f"[密碼工作池] 工作行程異常，重新建立: {e}")
+            with self.lock:
+                self.errors += 1
+                self.executor = None
+            return False, self.BUSY_MESSAGE
+        except Exception as e:
+            # 例外內容只記錄在伺服器，不回傳給客戶端
+            print(f"[密碼工作池] 處理失敗: {e}")
+            with self.lock:
+                self.errors += 1
+            return False, self.ERROR_MESSAGE
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+        wait = max(0.0, started_at - submitted_at)
+        with self.lock:
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_service += finished_at - started_at
+        return True, result
+
+    def hash(self, password):
+        """計算密碼雜湊"""
+        return self.submit(hash_password, password)
+
+    def verify(self, password, password_hash):
+        """驗證密碼，成功時結果為 True / False"""
+        return self.submit(verify_password, password, password_hash)
+
+    def verify_unknown(self, password):
+        """帳號不存在時以固定的雜湊驗證（結果一律為不符），讓回應時間與帳號存在時相同"""
+        ok, message = self.verify(password, DUMMY_PASSWORD_HASH)
+        return (True, False) if ok else (False, message)
+
+    def stats(self):
+        """排隊與處理統計"""
+        with self.lock:
+            completed = self.completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "avg_wait_ms": round(self.total_wait / completed * 1000, 3),
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "avg_service_ms": round(self.total_service / completed * 1000, 3),
+            }
+
+    def shutdown(self):
+        """關閉行程池"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False)
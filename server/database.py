@@ -7,119 +7,239 @@ import sqlite3
 import json
 import hashlib
 import os
+import hmac
+import threading
 from datetime import datetime
 
+# 密碼雜湊參數（PBKDF2-SHA256），可用環境變數調整迭代次數
+PBKDF2_ITERATIONS = int(os.environ.get("GAMESTORE_PBKDF2_ITERATIONS", "100000"))
+PBKDF2_PREFIX = "pbkdf2_sha256"
+
+def hash_password(password, iterations=None):
+    """以 PBKDF2 計算密碼雜湊，格式為 pbkdf2_sha256$迭代次數$salt$hash"""
+    iterations = iterations or PBKDF2_ITERATIONS
+    salt = os.urandom(16).hex()
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations)
+    return f"{PBKDF2_PREFIX}${iterations}${salt}${digest.hex()}"
+
+def verify_password(password, password_hash):
+    """驗證密碼，同時支援舊版的 SHA-256 雜湊"""
+    if password_hash.startswith(PBKDF2_PREFIX + "$"):
+        try:
+            _, iterations, salt, expected = password_hash.split("$")
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), int(iterations))
+        except ValueError:
+            return False
+        return hmac.compare_digest(digest.hex(), expected)
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, password_hash)
+
+def needs_rehash(password_hash):
+    """檢查雜湊是否為舊格式或迭代次數過低"""
+    if not password_hash.startswith(PBKDF2_PREFIX + "$"):
+        return True
+    try:
+        return int(password_hash.split("$")[1]) < PBKDF2_ITERATIONS
+    except (IndexError, ValueError):
+        return True
+
+# 資料庫結構遷移：MIGRATIONS[i] 把結構從版本 i 升級到 i + 1，目前版本記錄在 PRAGMA user_version
+# 修改結構時在最後新增一項（不要修改已發布的項目），每個語句都必須可以重複執行
+MIGRATIONS = [
+    # 版本 1：帳號、遊戲、版本、評分與下載記錄
+    [
+        # 開發者帳號表
+        '''
+        CREATE TABLE IF NOT EXISTS developers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # 玩家帳號表
+        '''
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # 遊戲表
+        '''
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_name TEXT UNIQUE NOT NULL,
+            developer_id INTEGER NOT NULL,
+            current_version TEXT NOT NULL,
+            description TEXT,
+            game_type TEXT,
+            min_players INTEGER,
+            max_players INTEGER,
+            server_port INTEGER,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (developer_id) REFERENCES developers(id)
+        )
+        ''',
+        # 遊戲版本表
+        '''
+        CREATE TABLE IF NOT EXISTS game_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id INTEGER NOT NULL,
+            version TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (game_id) REFERENCES games(id),
+            UNIQUE(game_id, version)
+        )
+        ''',
+        # 遊戲評分表
+        '''
+        CREATE TABLE IF NOT EXISTS game_ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id INTEGER NOT NULL,
+            player_id INTEGER NOT NULL,
+            rating INTEGER CHECK(rating >= 1 AND rating <= 5),
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (game_id) REFERENCES games(id),
+            FOREIGN KEY (player_id) REFERENCES players(id),
+            UNIQUE(game_id, player_id)
+        )
+        ''',
+        # 玩家下載記錄表
+        '''
+        CREATE TABLE IF NOT EXISTS download_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_id INTEGER NOT NULL,
+            game_id INTEGER NOT NULL,
+            version TEXT NOT NULL,
+            download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (player_id) REFERENCES players(id),
+            FOREIGN KEY (game_id) REFERENCES games(id)
+        )
+        ''',
+    ],
+    # 版本 2：對戰結果與排行榜
+    [
+        # 對戰結果表（由大廳批次寫入）
+        '''
+        CREATE TABLE IF NOT EXISTS match_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            match_id TEXT NOT NULL,
+            game_id INTEGER NOT NULL,
+            player_id INTEGER NOT NULL,
+            result TEXT CHECK(result IN ('win', 'loss', 'draw')),
+            score INTEGER,
+            rating_after REAL,
+            reason TEXT,
+            room_id INTEGER,
+            finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (game_id) REFERENCES games(id),
+            FOREIGN KEY (player_id) REFERENCES players(id)
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_match_results_player
+        ON match_results (player_id, game_id, finished_at)
+        ''',
+        # 玩家在各遊戲的積分與勝負場數（排行榜，隨對戰結果一起更新）
+        '''
+        CREATE TABLE IF NOT EXISTS player_stats (
+            game_id INTEGER NOT NULL,
+            player_id INTEGER NOT NULL,
+            rating REAL NOT NULL,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            draws INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (game_id, player_id),
+            FOREIGN KEY (game_id) REFERENCES games(id),
+            FOREIGN KEY (player_id) REFERENCES players(id)
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_player_stats_rating
+        ON player_stats (game_id, rating DESC)
+        ''',
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
 class Database:
     def __init__(self, db_path="database/gamestore.db"):
         self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.init_database()
+        # 資料表在第一次取得連線時才檢查與建立（ensure_schema）
+        self.schema_ready = False
+        self.schema_lock = threading.Lock()
     
     def get_connection(self):
         """獲取資料庫連線"""
+        if not self.schema_ready:
+            self.ensure_schema()
         return sqlite3.connect(self.db_path)
     
+    def ensure_schema(self):
+        """確認資料庫結構為最新版本
+        
+        一般情況只讀取一次 PRAGMA user_version；版本較舊時以 BEGIN EXCLUSIVE 鎖定資料庫後
+        重新檢查版本並執行尚未套用的遷移，同時啟動的大廳與開發者伺服器因此只會有一個執行遷移
+        """
+        with self.schema_lock:
+            if self.schema_ready:
+                return
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < SCHEMA_VERSION:
+                    conn.execute("BEGIN EXCLUSIVE")
+                    try:
+                        version = self.migrate(conn)
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                elif version > SCHEMA_VERSION:
+                    print(f"[資料庫] 資料庫結構版本 {version} 比程式支援的 {SCHEMA_VERSION} 新")
+            finally:
+                conn.close()
+            self.schema_ready = True
+    
+    def migrate(self, conn):
+        """在交易中執行尚未套用的遷移，回傳遷移後的版本"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return version  # 已由其他行程完成
+        for statements in MIGRATIONS[version:]:
+            for statement in statements:
+                conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        print(f"[資料庫] 資料庫結構已從版本 {version} 更新至 {SCHEMA_VERSION}")
+        return SCHEMA_VERSION
+    
     def init_database(self):
         """初始化資料庫表格"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 開發者帳號表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS developers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 玩家帳號表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS players (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 遊戲表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS games (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                game_name TEXT UNIQUE NOT NULL,
-                developer_id INTEGER NOT NULL,
-                current_version TEXT NOT NULL,
-                description TEXT,
-                game_type TEXT,
-                min_players INTEGER,
-                max_players INTEGER,
-                server_port INTEGER,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (developer_id) REFERENCES developers(id)
-            )
-        ''')
-        
-        # 遊戲版本表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS game_versions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                game_id INTEGER NOT NULL,
-                version TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (game_id) REFERENCES games(id),
-                UNIQUE(game_id, version)
-            )
-        ''')
-        
-        # 遊戲評分表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS game_ratings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                game_id INTEGER NOT NULL,
-                player_id INTEGER NOT NULL,
-                rating INTEGER CHECK(rating >= 1 AND rating <= 5),
-                comment TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (game_id) REFERENCES games(id),
-                FOREIGN KEY (player_id) REFERENCES players(id),
-                UNIQUE(game_id, player_id)
-            )
-        ''')
-        
-        # 玩家下載記錄表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS download_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                player_id INTEGER NOT NULL,
-                game_id INTEGER NOT NULL,
-                version TEXT NOT NULL,
-                download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (player_id) REFERENCES players(id),
-                FOREIGN KEY (game_id) REFERENCES games(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        self.ensure_schema()
         print("[資料庫] 初始化完成")
     
     def hash_password(self, password):
         """密碼雜湊"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        return hash_password(password)
     
     # ===== 開發者相關操作 =====
     
-    def register_developer(self, username, password):
-        """註冊開發者帳號"""
+    def register_developer(self, username, password, password_hash=None):
+        """註冊開發者帳號（password_hash 可由呼叫端預先計算）"""
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            password_hash = self.hash_password(password)
+            password_hash = password_hash or self.hash_password(password)
             cursor.execute(
                 "INSERT INTO developers (username, password_hash) VALUES (?, ?)",
                 (username, password_hash)
@@ -133,28 +253,41 @@ class Database:
     
     def login_developer(self, username, password):
         """開發者登入"""
+        result = self.get_developer_auth(username)
+        if result and verify_password(password, result[2]):
+            return True, {"id": result[0], "username": result[1]}
+        return False, "帳號或密碼錯誤"
+    
+    def get_developer_auth(self, username):
+        """獲取開發者的 (id, username, password_hash)，用於在其他執行環境驗證密碼"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        password_hash = self.hash_password(password)
         cursor.execute(
-            "SELECT id, username FROM developers WHERE username = ? AND password_hash = ?",
-            (username, password_hash)
+            "SELECT id, username, password_hash FROM developers WHERE username = ?",
+            (username,)
         )
         result = cursor.fetchone()
         conn.close()
-        
-        if result:
-            return True, {"id": result[0], "username": result[1]}
-        return False, "帳號或密碼錯誤"
+        return result
+    
+    def update_developer_password_hash(self, developer_id, password_hash):
+        """更新開發者密碼雜湊（舊格式升級用）"""
+        conn = self.get_connection()
+        try:
+            conn.execute("UPDATE developers SET password_hash = ? WHERE id = ?",
+                         (password_hash, developer_id))
+            conn.commit()
+        finally:
+            conn.close()
     
     # ===== 玩家相關操作 =====
     
-    def register_player(self, username, password):
-        """註冊玩家帳號"""
+    def register_player(self, username, password, password_hash=None):
+        """註冊玩家帳號（password_hash 可由呼叫端預先計算）"""
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            password_hash = self.hash_password(password)
+            password_hash = password_hash or self.hash_password(password)
             cursor.execute(
                 "INSERT INTO players (username, password_hash) VALUES (?, ?)",
                 (username, password_hash)
@@ -168,19 +301,32 @@ class Database:
     
     def login_player(self, username, password):
         """玩家登入"""
+        result = self.get_player_auth(username)
+        if result and verify_password(password, result[2]):
+            return True, {"id": result[0], "username": result[1]}
+        return False, "帳號或密碼錯誤"
+    
+    def get_player_auth(self, username):
+        """獲取玩家的 (id, username, password_hash)，用於在其他執行環境驗證密碼"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        password_hash = self.hash_password(password)
         cursor.execute(
-            "SELECT id, username FROM players WHERE username = ? AND password_hash = ?",
-            (username, password_hash)
+            "SELECT id, username, password_hash FROM players WHERE username = ?",
+            (username,)
         )
         result = cursor.fetchone()
         conn.close()
-        
-        if result:
-            return True, {"id": result[0], "username": result[1]}
-        return False, "帳號或密碼錯誤"
+        return result
+    
+    def update_player_password_hash(self, player_id, password_hash):
+        """更新玩家密碼雜湊（舊格式升級用）"""
+        conn = self.get_connection()
+        try:
+            conn.execute("UPDATE players SET password_hash = ? WHERE id = ?",
+                         (password_hash, player_id))
+            conn.commit()
+        finally:
+            conn.close()
     
     # ===== 遊戲相關操作 =====
     
@@ -364,6 +510,16 @@ class Database:
             }
         return None
     
+    def has_game_version(self, game_id, version):
+        """檢查遊戲是否發布過該版本"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM game_versions WHERE game_id = ? AND version = ?", (game_id, version))
+        row = cursor.fetchone()
+        conn.close()
+        return row is not None
+    
     def get_developer_games(self, developer_id):
         """獲取開發者的所有遊戲"""
         conn = self.get_connection()
@@ -480,6 +636,71 @@ class Database:
         conn.close()
         return downloads
 
+    # ===== 對戰結果相關操作 =====
+    
+    def save_match_results(self, results, standings):
+        """以一個交易寫入一批對戰結果與更新後的戰績
+        
+        results: [(match_id, game_id, player_id, result, score, rating_after, reason, room_id)]
+        standings: [(game_id, player_id, rating, wins, losses, draws)]
+        """
+        conn = self.get_connection()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO match_results
+                        (match_id, game_id, player_id, result, score, rating_after, reason, room_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', results)
+                conn.executemany('''
+                    INSERT OR REPLACE INTO player_stats
+                        (game_id, player_id, rating, wins, losses, draws, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', standings)
+        finally:
+            conn.close()
+    
+    def get_player_standings(self):
+        """所有玩家在各遊戲的戰績（大廳啟動時載入排行榜）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.game_id, s.player_id, p.username, s.rating, s.wins, s.losses, s.draws
+            FROM player_stats s
+            JOIN players p ON s.player_id = p.id
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def get_player_match_results(self, player_id, game_id=None, limit=20):
+        """玩家最近的對戰結果"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT m.match_id, g.game_name, m.result, m.score, m.rating_after, m.reason, m.finished_at
+            FROM match_results m
+            JOIN games g ON m.game_id = g.id
+            WHERE m.player_id = ? AND (? IS NULL OR m.game_id = ?)
+            ORDER BY m.finished_at DESC, m.id DESC
+            LIMIT ?
+        ''', (player_id, game_id, game_id, limit))
+        
+        results = []
+        for row in cursor.fetchall():
+            results.append({
+                "match_id": row[0],
+                "game_name": row[1],
+                "result": row[2],
+                "score": row[3],
+                "rating": round(row[4]) if row[4] is not None else None,
+                "reason": row[5],
+                "finished_at": row[6]
+            })
+        
+        conn.close()
+        return results
+
 if __name__ == "__main__":
     # 測試資料庫
     db = Database()
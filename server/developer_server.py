@@ -7,16 +7,20 @@ import socket
 import threading
 import json
 import os
-import shutil
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from database import Database
+from database import Database, needs_rehash
+from credential_pool import CredentialPool
+from wire_codec import MessageStream, negotiate
+from blob_store import BlobStore
 
 class DeveloperServer:
     def __init__(self, host='0.0.0.0', port=6001):
         self.host = host
         self.port = port
         self.db = Database()
+        self.credentials = CredentialPool()
+        self.blobs = BlobStore("uploaded_games")
         self.server_socket = None
         self.running = False
         
@@ -29,6 +33,9 @@ class DeveloperServer:
         self.running = True
         
         print(f"[開發者伺服器] 在 {self.host}:{self.port} 上啟動")
+        threading.Thread(target=self.credentials.warm_up, daemon=True).start()
+        # 轉換舊版的遊戲目錄並清除未使用的 blob
+        threading.Thread(target=self.blobs.maintain, daemon=True).start()
         
         while self.running:
             try:
@@ -41,40 +48,22 @@ class DeveloperServer:
                 if self.running:
                     print(f"[開發者伺服器] 錯誤: {e}")
     
-    def receive_full_message(self, client_socket):
-        """接收完整的 JSON 訊息（支援大數據）"""
-        chunks = []
-        while True:
-            try:
-                chunk = client_socket.recv(65536).decode('utf-8')
-                if not chunk:
-                    break
-                chunks.append(chunk)
-                # 嘗試解析 JSON，如果成功則接收完成
-                try:
-                    full_data = ''.join(chunks)
-                    message = json.loads(full_data)
-                    return message
-                except json.JSONDecodeError:
-                    # JSON 未完整，繼續接收
-                    continue
-            except Exception as e:
-                break
-        return None
-    
     def handle_client(self, client_socket, addr):
         """處理客戶端請求"""
         developer_id = None
+        stream = MessageStream(client_socket)
         
         try:
             while True:
-                message = self.receive_full_message(client_socket)
+                message = stream.receive_message()
                 if not message:
                     break
                 
                 msg_type = message.get("type")
                 
-                if msg_type == "register":
+                if msg_type == "hello":
+                    response = negotiate(message)
+                elif msg_type == "register":
                     response = self.handle_register(message)
                 elif msg_type == "login":
                     response = self.handle_login(message)
@@ -93,7 +82,9 @@ class DeveloperServer:
                 else:
                     response = {"success": False, "message": "未知的請求類型"}
                 
-                client_socket.send(json.dumps(response).encode('utf-8'))
+                stream.send_message(response)
+                if msg_type == "hello":
+                    stream.configure(response)
                 
         except Exception as e:
             print(f"[開發者伺服器] 處理客戶端 {addr} 時發生錯誤: {e}")
@@ -109,7 +100,11 @@ class DeveloperServer:
         if not username or not password:
             return {"success": False, "message": "帳號或密碼不能為空"}
         
-        success, msg = self.db.register_developer(username, password)
+        ok, password_hash = self.credentials.hash(password)
+        if not ok:
+            return {"success": False, "message": password_hash}
+        
+        success, msg = self.db.register_developer(username, password, password_hash=password_hash)
         return {"success": success, "message": msg}
     
     def handle_login(self, message):
@@ -120,11 +115,24 @@ class DeveloperServer:
         if not username or not password:
             return {"success": False, "message": "帳號或密碼不能為空"}
         
-        success, result = self.db.login_developer(username, password)
-        if success:
-            return {"success": True, "developer": result}
-        else:
-            return {"success": False, "message": result}
+        auth = self.db.get_developer_auth(username)
+        if not auth:
+            ok, matched = self.credentials.verify_unknown(password)
+            return {"success": False, "message": matched if not ok else "帳號或密碼錯誤"}
+        
+        developer_id, developer_name, password_hash = auth
+        ok, matched = self.credentials.verify(password, password_hash)
+        if not ok:
+            return {"success": False, "message": matched}
+        if not matched:
+            return {"success": False, "message": "帳號或密碼錯誤"}
+        
+        # 舊格式雜湊在登入成功時升級
+        if needs_rehash(password_hash):
+            ok, new_hash = self.credentials.hash(password)
+            if ok:
+                self.db.update_developer_password_hash(developer_id, new_hash)
+        return {"success": True, "developer": {"id": developer_id, "username": developer_name}}
     
     def handle_upload_game(self, message, developer_id):
         """處理遊戲上傳"""
@@ -138,23 +146,13 @@ class DeveloperServer:
             return {"success": False, "message": "缺少遊戲配置或檔案資料"}
         
         try:
-            # 建立遊戲目錄
+            # 儲存遊戲檔案與配置檔（相同內容的檔案與其他版本共用 blob）
             game_name = game_config["game_name"]
             version = game_config["version"]
-            game_dir = f"uploaded_games/{game_name}/{version}"
-            os.makedirs(game_dir, exist_ok=True)
-            
-            # 儲存遊戲檔案
-            for file_info in files_data:
-                file_path = os.path.join(game_dir, file_info["name"])
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(file_info["content"])
-            
-            # 儲存配置檔
-            config_path = os.path.join(game_dir, "game_config.json")
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(game_config, f, indent=2, ensure_ascii=False)
+            files = [(f["name"], f["content"].encode('utf-8')) for f in files_data]
+            files.append(("game_config.json",
+                          json.dumps(game_config, indent=2, ensure_ascii=False).encode('utf-8')))
+            game_dir = self.blobs.write_version(game_name, version, files)
             
             # 將遊戲資訊寫入資料庫
             success, result = self.db.create_game(
@@ -172,8 +170,8 @@ class DeveloperServer:
             if success:
                 return {"success": True, "message": "遊戲上傳成功", "game_id": result}
             else:
-                # 刪除已建立的目錄
-                shutil.rmtree(game_dir, ignore_errors=True)
+                # 刪除已建立的版本
+                self.blobs.remove_version(game_name, version)
                 return {"success": False, "message": result}
                 
         except Exception as e:
@@ -197,17 +195,10 @@ class DeveloperServer:
             if not game_info:
                 return {"success": False, "message": "遊戲不存在"}
             
-            # 建立新版本目錄
+            # 儲存新版本（未變更的檔案沿用舊版本的 blob，不另外佔用空間）
             game_name = game_info["name"]
-            game_dir = f"uploaded_games/{game_name}/{new_version}"
-            os.makedirs(game_dir, exist_ok=True)
-            
-            # 儲存遊戲檔案
-            for file_info in files_data:
-                file_path = os.path.join(game_dir, file_info["name"])
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(file_info["content"])
+            files = [(f["name"], f["content"].encode('utf-8')) for f in files_data]
+            game_dir = self.blobs.write_version(game_name, new_version, files)
             
             # 更新資料庫
             success, msg = self.db.update_game_version(
@@ -217,8 +208,8 @@ class DeveloperServer:
             if success:
                 return {"success": True, "message": "遊戲更新成功"}
             else:
-                # 刪除已建立的目錄
-                shutil.rmtree(game_dir, ignore_errors=True)
+                # 刪除已建立的版本
+                self.blobs.remove_version(game_name, new_version)
                 return {"success": False, "message": msg}
                 
         except Exception as e:
@@ -257,6 +248,7 @@ class DeveloperServer:
         self.running = False
         if self.server_socket:
             self.server_socket.close()
+        self.credentials.shutdown()
 
 if __name__ == "__main__":
     host = sys.argv[1] if len(sys.argv) > 1 else '0.0.0.0'
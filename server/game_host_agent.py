@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+遊戲主機代理程式
+在其他機器（或本機多個實例）上執行，向大廳登錄容量並依指令啟動遊戲伺服器
+遊戲伺服器依 GAMESTORE_GAME_* 環境變數限制資源（見 process_limits.py），每 USAGE_INTERVAL 秒向大廳回報各房間的用量
+
+用法:
+    python3 server/game_host_agent.py <大廳位址> <登錄埠口> [--name N] [--capacity N]
+                                      [--advertise IP] [--ports 7000-8000]
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from lobby_state import send_frame, read_frames
+from process_limits import ProcessLimits
+
+USAGE_INTERVAL = 5  # 回報房間用量的間隔（秒）
+
+def get_local_ip():
+    """獲取本機區域網路 IP"""
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except:
+        return "127.0.0.1"
+
+class GameHostAgent:
+    def __init__(self, lobby_host, lobby_port, name=None, capacity=4, advertise_host=None,
+                 port_range=(7000, 8000), cache_dir="game_host_cache"):
+        self.lobby_host = lobby_host
+        self.lobby_port = lobby_port
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.capacity = capacity
+        self.advertise_host = advertise_host or get_local_ip()
+        self.port_range = port_range
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.rooms = {}  # {room_id: {"process", "port", "usage"}}
+        self.used_ports = set()
+        self.lock = threading.Lock()
+        self.running = True
+        self.process_limits = ProcessLimits.from_env()
+
+    def run(self):
+        """連線到大廳並處理指令，斷線後自動重連"""
+        monitor = threading.Thread(target=self.monitor_processes)
+        monitor.daemon = True
+        monitor.start()
+
+        delay = 1
+        while self.running:
+            try:
+                self.sock = socket.create_connection((self.lobby_host, self.lobby_port))
+                self.send({
+                    "type": "register_host",
+                    "name": self.name,
+                    "advertise_host": self.advertise_host,
+                    "capacity": self.capacity,
+                    "active_rooms": list(self.rooms.keys()),
+                    "secret": os.environ.get("GAMESTORE_HOST_SECRET"),
+                })
+                frames = read_frames(self.sock)
+                result = next(frames, None)
+                if not result or not result.get("success"):
+                    print(f"[遊戲主機] 登錄失敗: {result and result.get('message')}")
+                    return
+                print(f"[遊戲主機] {self.name} 已向大廳 {self.lobby_host}:{self.lobby_port} 登錄，容量 {self.capacity}")
+                delay = 1
+
+                for frame in frames:
+                    if frame.get("type") == "launch":
+                        thread = threading.Thread(target=self.handle_launch, args=(frame,))
+                        thread.daemon = True
+                        thread.start()
+                    elif frame.get("type") == "stop":
+                        self.stop_room(frame.get("room_id"))
+                print("[遊戲主機] 與大廳的連線中斷")
+            except (OSError, ValueError) as e:
+                print(f"[遊戲主機] 連線錯誤: {e}")
+            finally:
+                if self.sock:
+                    self.sock.close()
+                    self.sock = None
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def send(self, frame):
+        with self.send_lock:
+            if self.sock:
+                send_frame(self.sock, frame)
+
+    def reply(self, request, **fields):
+        try:
+            self.send(dict(fields, request_id=request["request_id"]))
+        except OSError as e:
+            print(f"[遊戲主機] 回應大廳失敗: {e}")
+
+    def get_free_port(self):
+        """獲取可用的遊戲埠口"""
+        with self.lock:
+            for port in range(*self.port_range):
+                if port not in self.used_ports:
+                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                        if s.connect_ex(('localhost', port)) != 0:
+                            self.used_ports.add(port)
+                            return port
+        return None
+
+    def handle_launch(self, request):
+        """啟動遊戲伺服器"""
+        room_id = request["room_id"]
+        game_dir = os.path.join(self.cache_dir, request["game_name"], request["version"])
+
+        if not os.path.exists(game_dir):
+            files = request.get("files")
+            if files is None:
+                self.reply(request, success=False, need_files=True)
+                return
+            # 每次安裝使用各自的暫存目錄，同一版本同時啟動多個房間時不會互相覆寫
+            os.makedirs(os.path.dirname(game_dir), exist_ok=True)
+            temp_dir = tempfile.mkdtemp(prefix=f"{request['version']}.tmp", dir=os.path.dirname(game_dir))
+            for file_info in files:
+                file_path = os.path.join(temp_dir, file_info["name"])
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(file_info["content"])
+            try:
+                os.rename(temp_dir, game_dir)
+            except OSError:
+                # 其他執行緒已建立相同版本
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        port = self.get_free_port()
+        if not port:
+            self.reply(request, success=False, message="無可用埠口")
+            return
+
+        try:
+            process = subprocess.Popen(
+                [sys.executable, request.get("server_file", "game_server.py"), str(port)],
+                cwd=game_dir,
+                env=dict(os.environ, **request.get("env", {}))
+            )
+        except Exception as e:
+            with self.lock:
+                self.used_ports.discard(port)
+            self.reply(request, success=False, message=str(e))
+            return
+
+        usage = self.process_limits.apply(process.pid, f"room-{room_id}")
+        with self.lock:
+            self.rooms[room_id] = {"process": process, "port": port, "usage": usage}
+        print(f"[遊戲主機] 房間 {room_id} 遊戲伺服器已啟動 (PID: {process.pid}, Port: {port})")
+        self.reply(request, success=True, port=port)
+
+    def stop_room(self, room_id):
+        """終止房間的遊戲伺服器"""
+        with self.lock:
+            room = self.rooms.pop(room_id, None)
+        if not room:
+            return
+        process = room["process"]
+        try:
+            process.terminate()
+            process.wait(timeout=5)
+        except Exception:
+            try:
+                process.kill()
+            except Exception:
+                pass
+        self.process_limits.release(room["usage"])
+        with self.lock:
+            self.used_ports.discard(room["port"])
+        print(f"[遊戲主機] 房間 {room_id} 遊戲伺服器已終止")
+
+    def monitor_processes(self):
+        """偵測已結束的遊戲伺服器並回報大廳，定期回報各房間的用量"""
+        last_report = time.monotonic()
+        while self.running:
+            time.sleep(1)
+            with self.lock:
+                ended = [(room_id, room) for room_id, room in self.rooms.items()
+                         if room["process"].poll() is not None]
+                for room_id, room in ended:
+                    del self.rooms[room_id]
+                    self.used_ports.discard(room["port"])
+            for room_id, room in ended:
+                self.process_limits.release(room["usage"])
+                try:
+                    self.send({"type": "room_ended", "room_id": room_id})
+                except OSError:
+                    pass
+            if time.monotonic() - last_report >= USAGE_INTERVAL:
+                last_report = time.monotonic()
+                self.report_usage()
+
+    def report_usage(self):
+        with self.lock:
+            rooms = list(self.rooms.items())
+        usage = {}
+        for room_id, room in rooms:
+            sample = room["usage"].sample()
+            if sample:
+                usage[room_id] = sample
+        try:
+            self.send({"type": "room_usage", "rooms": usage})
+        except OSError:
+            pass
+
+    def stop(self):
+        """停止代理程式並終止所有遊戲伺服器"""
+        self.running = False
+        for room_id in list(self.rooms.keys()):
+            self.stop_room(room_id)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="遊戲主機代理程式")
+    parser.add_argument("lobby_host", nargs="?", default="localhost")
+    parser.add_argument("lobby_port", nargs="?", type=int, default=6003)
+    parser.add_argument("--name")
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--advertise", help="提供給玩家連線的 IP")
+    parser.add_argument("--ports", default="7000-8000", help="遊戲伺服器埠口範圍")
+    parser.add_argument("--cache-dir", default="game_host_cache")
+    args = parser.parse_args()
+
+    low, high = (int(p) for p in args.ports.split("-"))
+    agent = GameHostAgent(args.lobby_host, args.lobby_port, args.name, args.capacity,
+                          args.advertise, (low, high), args.cache_dir)
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        print("\n[遊戲主機] 正在關閉...")
+    finally:
+        agent.stop()
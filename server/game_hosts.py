@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+遊戲主機登錄
+遠端（或本機多個）遊戲主機代理程式向大廳登錄容量，
+大廳開始遊戲時將房間放到負載最低的主機上啟動遊戲伺服器；主機定期回報各房間的 CPU 與記憶體用量
+主機會收到遊戲伺服器的環境變數（含回報結果的權杖），並決定玩家連線的位址，
+因此未設定 GAMESTORE_HOST_SECRET 時只接受本機（127.0.0.1）的代理程式登錄
+"""
+import hmac
+import os
+import socket
+import threading
+import itertools
+from lobby_state import send_frame, read_frames
+
+def read_package_files(game_dir):
+    """讀取遊戲目錄中的所有檔案"""
+    files = []
+    for root, dirs, filenames in os.walk(game_dir):
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                files.append({
+                    "name": os.path.relpath(file_path, game_dir),
+                    "content": f.read()
+                })
+    return files
+
+class GameHost:
+    """一個已登錄的遊戲主機"""
+    def __init__(self, sock, name, advertise_host, capacity):
+        self.sock = sock
+        self.name = name
+        self.advertise_host = advertise_host
+        self.capacity = capacity
+        self.rooms = set()
+        self.usage = {}  # {room_id: 最近一次回報的用量}
+        self.alive = True
+        self.send_lock = threading.Lock()
+        self.pending = {}  # {request_id: [Event, response]}
+        self.request_ids = itertools.count(1)
+
+    def load(self):
+        """負載比例"""
+        return len(self.rooms) / self.capacity if self.capacity else 1.0
+
+    def request(self, frame, timeout=15.0):
+        """送出指令並等待主機回應"""
+        request_id = next(self.request_ids)
+        waiter = [threading.Event(), None]
+        self.pending[request_id] = waiter
+        frame = dict(frame, request_id=request_id)
+        try:
+            with self.send_lock:
+                send_frame(self.sock, frame)
+            if not waiter[0].wait(timeout):
+                return {"success": False, "message": "遊戲主機回應逾時"}
+            return waiter[1]
+        except OSError as e:
+            return {"success": False, "message": f"遊戲主機連線錯誤: {e}"}
+        finally:
+            self.pending.pop(request_id, None)
+
+    def notify(self, frame):
+        """送出不需回應的指令"""
+        try:
+            with self.send_lock:
+                send_frame(self.sock, frame)
+        except OSError as e:
+            print(f"[遊戲主機登錄] 通知主機 {self.name} 失敗: {e}")
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "host": self.advertise_host,
+            "capacity": self.capacity,
+            "active_rooms": len(self.rooms),
+            "cpu_percent": round(sum(u["cpu_percent"] for u in self.usage.values()), 1),
+            "rss_mb": round(sum(u["rss_mb"] for u in self.usage.values()), 1),
+            "rooms": self.usage,
+        }
+
+class GameHostRegistry:
+    """管理遊戲主機連線並挑選負載最低的主機"""
+    def __init__(self, host='0.0.0.0', port=6003, secret=None):
+        self.host = host
+        self.port = port
+        self.secret = secret if secret is not None else os.environ.get("GAMESTORE_HOST_SECRET")
+        self.hosts = {}  # {name: GameHost}
+        self.lock = threading.Lock()
+        self.server_socket = None
+
+    def start(self):
+        """在背景執行緒接受遊戲主機連線"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        host = self.host
+        if not self.secret:
+            host = "127.0.0.1"
+            print("[遊戲主機登錄] 未設定 GAMESTORE_HOST_SECRET，只接受本機的遊戲主機")
+        self.server_socket.bind((host, self.port))
+        self.server_socket.listen(16)
+        print(f"[遊戲主機登錄] 在 {host}:{self.port} 上等待遊戲主機")
+        thread = threading.Thread(target=self.accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def check_secret(self, secret):
+        """以固定時間比較主機出示的密鑰（非字串或非 ASCII 一律不符）"""
+        if not isinstance(secret, str) or not secret.isascii():
+            return False
+        return hmac.compare_digest(secret.encode(), self.secret.encode())
+
+    def accept_loop(self):
+        while True:
+            try:
+                sock, addr = self.server_socket.accept()
+            except OSError:
+                break
+            thread = threading.Thread(target=self.handle_host, args=(sock, addr))
+            thread.daemon = True
+            thread.start()
+
+    def handle_host(self, sock, addr):
+        """處理單一遊戲主機的登錄與回應"""
+        host = None
+        try:
+            frames = read_frames(sock)
+            hello = next(frames, None)
+            if not hello or hello.get("type") != "register_host":
+                return
+            if self.secret and not self.check_secret(hello.get("secret")):
+                send_frame(sock, {"type": "register_result", "success": False, "message": "驗證失敗"})
+                return
+
+            host = GameHost(sock, hello.get("name") or f"{addr[0]}:{addr[1]}",
+                            hello.get("advertise_host") or addr[0],
+                            int(hello.get("capacity", 4)))
+            host.rooms.update(hello.get("active_rooms", []))
+            with self.lock:
+                old = self.hosts.get(host.name)
+                if old:
+                    old.alive = False
+                self.hosts[host.name] = host
+            send_frame(sock, {"type": "register_result", "success": True})
+            print(f"[遊戲主機登錄] 主機 {host.name} ({host.advertise_host}) 已登錄，容量 {host.capacity}")
+
+            for frame in frames:
+                frame_type = frame.get("type")
+                if frame_type == "room_ended":
+                    host.rooms.discard(frame.get("room_id"))
+                    # 以新的字典取代，其他執行緒讀取 to_dict 時不會遇到字典改變
+                    host.usage = {k: v for k, v in host.usage.items() if k != str(frame.get("room_id"))}
+                    print(f"[遊戲主機登錄] 主機 {host.name} 上的房間 {frame.get('room_id')} 遊戲已結束")
+                elif frame_type == "room_usage":
+                    host.usage = frame.get("rooms") or {}
+                elif "request_id" in frame:
+                    waiter = host.pending.get(frame["request_id"])
+                    if waiter:
+                        waiter[1] = frame
+                        waiter[0].set()
+        except (OSError, ValueError) as e:
+            print(f"[遊戲主機登錄] 主機連線錯誤: {e}")
+        finally:
+            if host:
+                host.alive = False
+                with self.lock:
+                    if self.hosts.get(host.name) is host:
+                        del self.hosts[host.name]
+                for waiter in list(host.pending.values()):
+                    waiter[1] = {"success": False, "message": "遊戲主機已斷線"}
+                    waiter[0].set()
+                print(f"[遊戲主機登錄] 主機 {host.name} 已斷線")
+            sock.close()
+
+    def has_hosts(self):
+        with self.lock:
+            return any(host.alive for host in self.hosts.values())
+
+    def choose_host(self, exclude=()):
+        """挑選尚有容量且負載最低的主機"""
+        with self.lock:
+            candidates = [h for h in self.hosts.values()
+                          if h.alive and h.name not in exclude and len(h.rooms) < h.capacity]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda h: (h.load(), len(h.rooms)))
+
+    def launch(self, room_id, game_info, game_dir, server_file, env=None):
+        """在遠端主機啟動遊戲伺服器，成功時回傳 (主機, 埠口)"""
+        tried = set()
+        while True:
+            host = self.choose_host(exclude=tried)
+            if not host:
+                return None
+            tried.add(host.name)
+
+            # 先預留名額，避免同時開始的房間擠到同一台主機
+            host.rooms.add(room_id)
+            command = {
+                "type": "launch",
+                "room_id": room_id,
+                "game_name": game_info["name"],
+                "version": game_info["version"],
+                "server_file": server_file,
+                "env": env or {},
+            }
+            response = host.request(command)
+            if response.get("need_files"):
+                command["files"] = read_package_files(game_dir)
+                response = host.request(command, timeout=60.0)
+
+            if response.get("success"):
+                print(f"[遊戲主機登錄] 房間 {room_id} 已在主機 {host.name} 啟動 (Port: {response['port']})")
+                return host, response["port"]
+
+            host.rooms.discard(room_id)
+            print(f"[遊戲主機登錄] 主機 {host.name} 啟動失敗: {response.get('message')}")
+
+    def stop(self, host_name, room_id):
+        """通知主機終止房間的遊戲伺服器"""
+        with self.lock:
+            host = self.hosts.get(host_name)
+        if host:
+            host.rooms.discard(room_id)
+            host.notify({"type": "stop", "room_id": room_id})
+
+    def room_ended(self, host_name, room_id):
+        """主機已回報房間的遊戲伺服器結束（主機暫時斷線時視為仍在執行）"""
+        with self.lock:
+            host = self.hosts.get(host_name)
+        return bool(host and host.alive and room_id not in host.rooms)
+
+    def stats(self):
+        with self.lock:
+            return [host.to_dict() for host in self.hosts.values() if host.alive]
+
+    def stop_registry(self):
+        if self.server_socket:
+            self.server_socket.close()
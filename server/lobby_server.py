@@ -6,12 +6,28 @@
 import socket
 import threading
 import json
+import base64
 import os
 import sys
 import subprocess
 import time
+import signal
+import tempfile
+import multiprocessing
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from database import Database
+from database import Database, needs_rehash
+from credential_pool import CredentialPool
+from session_tokens import SessionSigner
+from lobby_state import LobbyStateServer, StateClient
+from game_hosts import GameHostRegistry
+from spectator_relay import SpectatorRelay
+from match_results import MatchResultCollector
+from rate_limit import RateLimiter, build_gates, MESSAGE_GATES
+from wire_codec import MessageStream, negotiate
+from packages import PackageCache, issue_token, verify_token, MAX_RANGE
+from matchmaking import MatchmakingQueue, DEFAULT_SKILL
+from process_limits import ProcessLimits
+from timer_wheel import ExpiryService
 
 def get_local_ip():
     """獲取本機區域網路 IP"""
@@ -32,9 +48,17 @@ class Room:
         self.game_info = game_info
         self.host_player = host_player
         self.players = [host_player]
-        self.status = "waiting"  # waiting, playing, finished
+        self.package_id = None  # 房間使用的遊戲版本套件（成員據此預先下載）
+        self.ready = set()  # 已備妥遊戲檔案的玩家 ID
+        self.status = "waiting"  # waiting, playing, finished（以 LobbyServer.set_room_status 變更）
+        self.status_since = time.time()
+        self.expiry_timer = None  # 目前狀態的 TTL 計時器
+        self.check_timer = None  # 檢查遊戲伺服器是否已結束的計時器
         self.game_server_process = None
+        self.usage = None  # 本機遊戲伺服器的用量取樣（ProcessUsage）
         self.port = None  # 分配的遊戲伺服器埠口
+        self.server_host = None  # 遊戲伺服器對玩家公開的位址
+        self.game_host = None  # 遠端遊戲主機名稱（本機啟動時為 None）
         self.created_at = time.time()
         
     def add_player(self, player):
@@ -47,6 +71,7 @@ class Room:
     def remove_player(self, player_id):
         """移除玩家"""
         self.players = [p for p in self.players if p["id"] != player_id]
+        self.ready.discard(player_id)
         
     def is_full(self):
         """檢查房間是否已滿"""
@@ -56,6 +81,10 @@ class Room:
         """檢查是否可以開始遊戲"""
         return len(self.players) >= self.game_info["min_players"]
     
+    def not_ready(self):
+        """尚未備妥遊戲檔案的玩家名稱"""
+        return [p["username"] for p in self.players if p["id"] not in self.ready]
+    
     def to_dict(self):
         """轉換為字典"""
         return {
@@ -67,32 +96,75 @@ class Room:
             "player_count": len(self.players),
             "max_players": self.game_info["max_players"],
             "min_players": self.game_info["min_players"],
-            "status": self.status
+            "status": self.status,
+            "version": self.game_info["version"],
+            "package_id": self.package_id,
+            "ready": [p["username"] for p in self.players if p["id"] in self.ready]
         }
 
+# 共享狀態類訊息：多行程模式下由狀態行程處理，其餘訊息由工作行程自行處理
+STATE_MESSAGE_TYPES = {
+    "resume", "create_room", "list_rooms", "join_room", "leave_room",
+    "start_game", "set_ready", "get_room_status", "queue_for_game", "cancel_queue",
+    "get_queue_status", "watch_room", "report_match_result", "get_leaderboard",
+    "get_my_rank"
+}
+
 class LobbyServer:
-    def __init__(self, host='0.0.0.0', port=6002):
+    def __init__(self, host='0.0.0.0', port=6002, state_path=None, reuse_port=False):
         self.host = host
         self.port = port
+        # 多行程模式：房間與線上玩家狀態存放在狀態行程
+        self.state = StateClient(state_path) if state_path else None
+        self.reuse_port = reuse_port
         self.db = Database()
+        self.credentials = CredentialPool()
+        self.sessions = SessionSigner()
+        self.packages = PackageCache()  # 分段下載的套件
+        # 每條連線與每個帳號的請求限流、昂貴操作的同時執行上限
+        self.rate_limiter = RateLimiter()
+        self.admission = build_gates()
+        # 斷線後保留線上狀態與房間的寬限時間（秒）
+        self.resume_grace = float(os.environ.get("GAMESTORE_RESUME_GRACE", "30"))
         self.server_socket = None
         self.running = False
         self.rooms = {}  # {room_id: Room}
         self.next_room_id = 1
-        self.online_players = {}  # {player_id: socket}
+        self.online_players = {}  # {player_id: {"socket", "username", "session", "expire_timer"}}
         self.player_rooms = {}  # {player_id: room_id}
         self.used_ports = set()  # 已使用的遊戲埠口
         self.lock = threading.RLock()
+        self.game_hosts = None  # 遊戲主機登錄（GameHostRegistry）
+        self.spectators = None  # 觀戰轉播站（SpectatorRelay）
+        self.results = None  # 對戰結果與排行榜（MatchResultCollector）
+        self.matchmaking = MatchmakingQueue()
+        # 房間、遊戲伺服器與閒置連線的到期回收（時間輪）
+        self.expiry = ExpiryService()
+        # 本機遊戲伺服器的 rlimit、cgroup 與 CPU 親和性
+        self.process_limits = ProcessLimits.from_env()
+        # 配對 tick 間隔（秒）
+        self.match_interval = float(os.environ.get("GAMESTORE_MATCH_INTERVAL", "1"))
         
     def start(self):
         """啟動大廳伺服器"""
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            # 多個工作行程共用同一個埠口，由核心分配連線
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen(50)
         self.running = True
         
-        print(f"[大廳伺服器] 在 {self.host}:{self.port} 上啟動")
+        print(f"[大廳伺服器] 在 {self.host}:{self.port} 上啟動 (PID: {os.getpid()})")
+        threading.Thread(target=self.credentials.warm_up, daemon=True).start()
+        self.expiry.start()
+        # 多行程模式下由狀態行程負責遊戲主機登錄
+        if not self.state:
+            self.enable_game_hosts()
+            self.enable_spectator_relay()
+            self.enable_match_results()
+            self.start_matchmaking()
         
         while self.running:
             try:
@@ -105,29 +177,8 @@ class LobbyServer:
                 if self.running:
                     print(f"[大廳伺服器] 錯誤: {e}")
     
-    def receive_full_message(self, client_socket):
-        """接收完整的 JSON 訊息（支援大數據）"""
-        chunks = []
-        while True:
-            try:
-                chunk = client_socket.recv(65536).decode('utf-8')
-                if not chunk:
-                    break
-                chunks.append(chunk)
-                # 嘗試解析 JSON，如果成功則接收完成
-                try:
-                    full_data = ''.join(chunks)
-                    message = json.loads(full_data)
-                    return message
-                except json.JSONDecodeError:
-                    # JSON 未完整，繼續接收
-                    continue
-            except Exception as e:
-                break
-        return None
-    
     def broadcast_to_room(self, room_id, message, exclude_player_id=None):
-        """廣播訊息給房間內的所有玩家"""
+        """廣播訊息給房間內的所有玩家（訊息含 server_info 時，每位玩家各自收到含本人加入權杖的版本）"""
         with self.lock:
             room = self.rooms.get(room_id)
             if not room:
@@ -138,67 +189,212 @@ class LobbyServer:
                     continue
                 
                 player_info = self.online_players.get(player["id"])
-                if player_info:
+                if player_info and player_info["socket"]:
                     try:
                         sock = player_info["socket"]
-                        sock.send(json.dumps(message).encode('utf-8'))
+                        outgoing = message
+                        if message.get("server_info"):
+                            outgoing = dict(message, server_info=self.with_join_token(
+                                room, message["server_info"], player["id"]))
+                        sock.send(json.dumps(outgoing).encode('utf-8'))
                     except Exception as e:
                         print(f"[大廳伺服器] 發送廣播失敗: {e}")
 
     def handle_client(self, client_socket, addr):
         """處理客戶端請求"""
         player_id = None
+        # 協商（hello）後改以訊框收送，房間廣播也經由此物件送出
+        stream = MessageStream(client_socket)
+        conn_id = self.state.register(stream) if self.state else None
+        rate_buckets = {}  # 此連線的限流權杖桶
+        # 閒置回收：每則請求只更新時間，計時器到期時才檢查
+        activity = {"last": time.monotonic(), "player_id": None, "timer": None, "closed": False}
+        self.watch_connection(activity, client_socket, addr)
         
         try:
             while True:
-                message = self.receive_full_message(client_socket)
+                message = stream.receive_message()
                 if not message:
                     break
+                activity["last"] = time.monotonic()
                 
                 msg_type = message.get("type")
-                
-                if msg_type == "register":
-                    response = self.handle_register(message)
-                elif msg_type == "login":
-                    response = self.handle_login(message, client_socket)
-                    if response["success"]:
-                        player_id = response["player"]["id"]
-                elif msg_type == "list_games":
-                    response = self.handle_list_games()
-                elif msg_type == "get_game_detail":
-                    response = self.handle_get_game_detail(message)
-                elif msg_type == "download_game":
-                    response = self.handle_download_game(message, player_id)
-                elif msg_type == "create_room":
-                    response = self.handle_create_room(message, player_id)
-                elif msg_type == "list_rooms":
-                    response = self.handle_list_rooms()
-                elif msg_type == "join_room":
-                    response = self.handle_join_room(message, player_id)
-                elif msg_type == "leave_room":
-                    response = self.handle_leave_room(player_id)
-                elif msg_type == "start_game":
-                    response = self.handle_start_game(player_id)
-                elif msg_type == "get_room_status":
-                    response = self.handle_get_room_status(player_id)
-                elif msg_type == "add_rating":
-                    response = self.handle_add_rating(message, player_id)
-                elif msg_type == "get_ratings":
-                    response = self.handle_get_ratings(message)
+                account = self.rate_limit_account(message, player_id)
+                retry_after = self.rate_limiter.check(rate_buckets, account, msg_type)
+                if retry_after:
+                    # 延後回覆拒絕訊息：只佔住這條連線的執行緒，讓狂送請求的客戶端自然慢下來
+                    time.sleep(min(retry_after, self.rate_limiter.max_delay))
+                    response = {
+                        "success": False,
+                        "error": "rate_limited",
+                        "message": "請求過於頻繁，請稍後再試",
+                        "retry_after": round(retry_after, 2)
+                    }
+                elif msg_type == "hello":
+                    response = negotiate(message)
                 else:
-                    response = {"success": False, "message": "未知的請求類型"}
+                    response = self.admit_message(message, conn_id, stream, player_id)
                 
-                client_socket.send(json.dumps(response).encode('utf-8'))
+                if msg_type in ("login", "resume") and response["success"]:
+                    player_id = response["player"]["id"]
+                    activity["player_id"] = player_id
+                    if activity["timer"] is None:
+                        self.watch_connection(activity, client_socket, addr)
+                
+                stream.send_message(response)
+                if msg_type == "hello" and response["success"]:
+                    stream.configure(response)
                 
         except Exception as e:
             print(f"[大廳伺服器] 處理客戶端 {addr} 時發生錯誤: {e}")
         finally:
-            # 清理玩家狀態
-            if player_id:
-                self.handle_player_disconnect(player_id)
+            activity["closed"] = True
+            self.expiry.cancel(activity["timer"])
+            # 清理玩家狀態（保留寬限時間供重新連線）
+            if self.state:
+                self.state.unregister(conn_id, player_id)
+            elif player_id:
+                self.detach_player(player_id, stream)
             client_socket.close()
             print(f"[大廳伺服器] 連線關閉: {addr}")
     
+    def watch_connection(self, activity, client_socket, addr, delay=None):
+        """排定閒置連線的檢查（依是否已登入使用 idle 或 unauthenticated 的 TTL）"""
+        ttl = self.expiry.ttls.get("idle" if activity["player_id"] else "unauthenticated")
+        if not ttl:
+            activity["timer"] = None
+            return
+        if delay is None:
+            delay = max(0.0, activity["last"] + ttl - time.monotonic())
+        activity["timer"] = self.expiry.schedule(delay, self.expire_connection, activity, client_socket, addr)
+    
+    def expire_connection(self, activity, client_socket, addr):
+        """閒置計時器到期：期間有請求時順延，否則關閉連線（之後依寬限時間處理離線）"""
+        activity["timer"] = None
+        if activity["closed"]:
+            return
+        ttl = self.expiry.ttls.get("idle" if activity["player_id"] else "unauthenticated")
+        if not ttl:
+            return
+        idle = time.monotonic() - activity["last"]
+        if idle < ttl:
+            self.watch_connection(activity, client_socket, addr)
+            return
+        if activity["player_id"] and self.player_in_game(activity["player_id"]):
+            # 遊戲中玩家的大廳連線沒有請求是正常的
+            self.watch_connection(activity, client_socket, addr, delay=ttl)
+            return
+        self.expiry.record("idle_connection", f"連線 {addr[0]}:{addr[1]} 閒置 {int(idle)} 秒，已關閉")
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def player_in_game(self, player_id):
+        response = self.call_state(None, None, player_id, {"type": "get_room_status"})
+        return response.get("success") and response.get("status") == "playing"
+    
+    def rate_limit_account(self, message, player_id):
+        """限流使用的帳號（None 表示只限制連線）"""
+        if message.get("type") == "fetch_package_range":
+            # 分段下載不需登入，以權杖中的玩家限流，開多條連線也共用同一份額度
+            verified = verify_token(self.sessions, message.get("token"))
+            return verified[0] if verified else None
+        # 登入前以請求中的帳號名稱限流，避免換連線暴力嘗試密碼
+        account = player_id or message.get("username")
+        return account if isinstance(account, (int, str)) else None
+    
+    def admit_message(self, message, conn_id, client_socket, player_id):
+        """昂貴操作需先取得執行權（超過同時執行上限時排隊，佇列滿或逾時則拒絕）"""
+        gate = self.admission.get(MESSAGE_GATES.get(message.get("type")))
+        if not gate:
+            return self.handle_message(message, conn_id, client_socket, player_id)
+        if not gate.acquire():
+            return {
+                "success": False,
+                "error": "busy",
+                "message": "伺服器忙碌中，請稍後再試",
+                "retry_after": 1.0
+            }
+        try:
+            return self.handle_message(message, conn_id, client_socket, player_id)
+        finally:
+            gate.release()
+    
+    def handle_message(self, message, conn_id, client_socket, player_id):
+        """依請求類型分派"""
+        msg_type = message.get("type")
+        
+        if msg_type in STATE_MESSAGE_TYPES:
+            return self.call_state(conn_id, client_socket, player_id, message)
+        elif msg_type == "register":
+            return self.handle_register(message)
+        elif msg_type == "login":
+            return self.handle_login(message, client_socket, conn_id)
+        elif msg_type == "list_games":
+            return self.handle_list_games()
+        elif msg_type == "get_game_detail":
+            return self.handle_get_game_detail(message)
+        elif msg_type == "download_game":
+            return self.handle_download_game(message, player_id)
+        elif msg_type == "get_package_manifest":
+            return self.handle_get_package_manifest(message, player_id)
+        elif msg_type == "fetch_package_range":
+            return self.handle_fetch_package_range(message)
+        elif msg_type == "add_rating":
+            return self.handle_add_rating(message, player_id)
+        elif msg_type == "get_ratings":
+            return self.handle_get_ratings(message)
+        elif msg_type == "get_server_stats":
+            return self.handle_get_server_stats()
+        return {"success": False, "message": "未知的請求類型"}
+    
+    def call_state(self, conn_id, client_socket, player_id, message):
+        """處理共享狀態類訊息（多行程模式下轉送給狀態行程）"""
+        if self.state:
+            return self.state.call(conn_id, player_id, message)
+        return self.handle_state_message(message, player_id, client_socket)
+    
+    def handle_state_message(self, message, player_id, client_socket):
+        """處理房間與線上玩家相關的訊息"""
+        msg_type = message.get("type")
+        
+        if msg_type == "attach_player":
+            return self.attach_online_player(message["player"], client_socket)
+        elif msg_type == "state_stats":
+            return {"success": True, "stats": self.get_state_stats()}
+        elif msg_type == "resume":
+            return self.handle_resume(message, client_socket)
+        elif msg_type == "create_room":
+            return self.handle_create_room(message, player_id)
+        elif msg_type == "list_rooms":
+            return self.handle_list_rooms(message)
+        elif msg_type == "join_room":
+            return self.handle_join_room(message, player_id)
+        elif msg_type == "leave_room":
+            return self.handle_leave_room(player_id)
+        elif msg_type == "start_game":
+            return self.handle_start_game(message, player_id)
+        elif msg_type == "set_ready":
+            return self.handle_set_ready(message, player_id)
+        elif msg_type == "get_room_status":
+            return self.handle_get_room_status(player_id)
+        elif msg_type == "queue_for_game":
+            return self.handle_queue_for_game(message, player_id)
+        elif msg_type == "cancel_queue":
+            return self.handle_cancel_queue(player_id)
+        elif msg_type == "get_queue_status":
+            return self.handle_get_queue_status(player_id)
+        elif msg_type == "watch_room":
+            return self.handle_watch_room(message, player_id)
+        elif msg_type == "report_match_result":
+            return self.handle_report_match_result(message)
+        elif msg_type == "get_leaderboard":
+            return self.handle_get_leaderboard(message)
+        elif msg_type == "get_my_rank":
+            return self.handle_get_my_rank(message, player_id)
+        return {"success": False, "message": "未知的請求類型"}
+    
     def handle_register(self, message):
         """處理註冊請求"""
         username = message.get("username")
@@ -207,10 +403,15 @@ class LobbyServer:
         if not username or not password:
             return {"success": False, "message": "帳號或密碼不能為空"}
         
-        success, msg = self.db.register_player(username, password)
+        # 密碼雜湊在行程池中計算，不佔用連線處理執行緒
+        ok, password_hash = self.credentials.hash(password)
+        if not ok:
+            return {"success": False, "message": password_hash}
+        
+        success, msg = self.db.register_player(username, password, password_hash=password_hash)
         return {"success": success, "message": msg}
     
-    def handle_login(self, message, client_socket):
+    def handle_login(self, message, client_socket, conn_id=None):
         """處理登入請求"""
         username = message.get("username")
         password = message.get("password")
@@ -218,19 +419,130 @@ class LobbyServer:
         if not username or not password:
             return {"success": False, "message": "帳號或密碼不能為空"}
         
-        success, result = self.db.login_player(username, password)
+        success, result = self.verify_player(username, password)
         if success:
-            with self.lock:
-                # 防止同帳號重複登入
-                if result["id"] in self.online_players:
-                    return {"success": False, "message": "該帳號已在線上，請先登出後再登入"}
+            # 線上狀態登記在共享狀態中
+            return self.call_state(conn_id, client_socket, None, {
+                "type": "attach_player",
+                "player": result
+            })
+        else:
+            return {"success": False, "message": result}
+    
+    def attach_online_player(self, result, client_socket):
+        """登記通過驗證的玩家為線上狀態並簽發工作階段權杖"""
+        token, session_id = self.sessions.issue(result["id"])
+        with self.lock:
+            existing = self.online_players.get(result["id"])
+            # 防止同帳號重複登入（斷線等待重連中的帳號可直接以密碼接手）
+            if existing and existing["socket"]:
+                return {"success": False, "message": "該帳號已在線上，請先登出後再登入"}
+            if existing:
+                self.cancel_expire_timer(existing)
+                existing["socket"] = client_socket
+                existing["session"] = session_id
+            else:
                 self.online_players[result["id"]] = {
                     "socket": client_socket,
-                    "username": result["username"]
+                    "username": result["username"],
+                    "session": session_id,
+                    "expire_timer": None
                 }
-            return {"success": True, "player": result}
-        else:
-            return {"success": False, "message": result}
+        return {
+            "success": True,
+            "player": result,
+            "session_token": token,
+            "resume_grace": self.resume_grace
+        }
+    
+    def handle_resume(self, message, client_socket):
+        """以工作階段權杖將新連線接回原本的線上狀態與房間"""
+        verified = self.sessions.verify(message.get("session_token"))
+        if not verified:
+            return {"success": False, "message": "工作階段已失效，請重新登入"}
+        
+        player_id, session_id = verified
+        with self.lock:
+            player_info = self.online_players.get(player_id)
+            if not player_info or player_info["session"] != session_id:
+                return {"success": False, "message": "工作階段已失效，請重新登入"}
+            
+            self.cancel_expire_timer(player_info)
+            old_socket = player_info["socket"]
+            player_info["socket"] = client_socket
+            
+            response = {
+                "success": True,
+                "player": {"id": player_id, "username": player_info["username"]}
+            }
+            room = self.rooms.get(self.player_rooms.get(player_id))
+            if room:
+                response["room"] = room.to_dict()
+        
+        # 舊連線可能仍半開著，關閉它讓原本的處理執行緒結束
+        if old_socket and old_socket is not client_socket:
+            try:
+                old_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        
+        print(f"[大廳伺服器] 玩家 {player_info['username']} 已重新連線")
+        return response
+    
+    def detach_player(self, player_id, client_socket):
+        """連線中斷時保留玩家狀態，寬限時間內未重新連線才視為離線"""
+        with self.lock:
+            player_info = self.online_players.get(player_id)
+            # 已被其他連線接手時不處理
+            if not player_info or player_info["socket"] is not client_socket:
+                return
+            
+            if self.resume_grace <= 0:
+                self.handle_player_disconnect(player_id)
+                return
+            
+            player_info["socket"] = None
+            timer = threading.Timer(self.resume_grace, self.expire_detached_player,
+                                    args=(player_id, player_info["session"]))
+            timer.daemon = True
+            player_info["expire_timer"] = timer
+            timer.start()
+    
+    def expire_detached_player(self, player_id, session_id):
+        """寬限時間到期，正式處理玩家離線"""
+        with self.lock:
+            player_info = self.online_players.get(player_id)
+            if player_info and player_info["socket"] is None and player_info["session"] == session_id:
+                print(f"[大廳伺服器] 玩家 {player_info['username']} 未在寬限時間內重新連線")
+                self.handle_player_disconnect(player_id)
+    
+    def cancel_expire_timer(self, player_info):
+        """取消等待重連的計時器"""
+        timer = player_info.get("expire_timer")
+        if timer:
+            timer.cancel()
+            player_info["expire_timer"] = None
+    
+    def verify_player(self, username, password):
+        """在密碼工作池中驗證玩家密碼，回傳 (是否成功, 玩家資訊或錯誤訊息)"""
+        auth = self.db.get_player_auth(username)
+        if not auth:
+            ok, matched = self.credentials.verify_unknown(password)
+            return False, matched if not ok else "帳號或密碼錯誤"
+        
+        player_id, player_name, password_hash = auth
+        ok, matched = self.credentials.verify(password, password_hash)
+        if not ok:
+            return False, matched
+        if not matched:
+            return False, "帳號或密碼錯誤"
+        
+        # 舊格式雜湊在登入成功時升級
+        if needs_rehash(password_hash):
+            ok, new_hash = self.credentials.hash(password)
+            if ok:
+                self.db.update_player_password_hash(player_id, new_hash)
+        return True, {"id": player_id, "username": player_name}
     
     def handle_list_games(self):
         """列出所有可用遊戲"""
@@ -296,6 +608,68 @@ class LobbyServer:
         except Exception as e:
             return {"success": False, "message": f"下載失敗: {str(e)}"}
     
+    def handle_get_package_manifest(self, message, player_id):
+        """回傳遊戲套件的檔案與片段清單，以及分段下載用的權杖"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        
+        game_id = message.get("game_id")
+        if not game_id:
+            return {"success": False, "message": "缺少遊戲ID"}
+        
+        game_info = self.db.get_game_by_id(game_id)
+        if not game_info or not game_info["is_active"]:
+            return {"success": False, "message": "遊戲不存在或已下架"}
+        
+        # 房間成員下載房間建立時的版本（之後發布的新版本不影響進行中的房間）
+        version = message.get("version")
+        if version and version != game_info["version"]:
+            # 只接受這個遊戲發布過的版本（版本字串會組成檔案路徑）
+            if not isinstance(version, str) or not self.db.has_game_version(game_id, version):
+                return {"success": False, "message": "無效的版本"}
+            game_info = dict(game_info, version=version)
+        
+        game_dir = f"uploaded_games/{game_info['name']}/{game_info['version']}"
+        try:
+            package = self.packages.get(game_dir)
+        except (OSError, ValueError):
+            return {"success": False, "message": "遊戲檔案不存在"}
+        
+        # 接續先前中斷的下載時不重複記錄
+        if not message.get("resume"):
+            self.db.record_download(player_id, game_id, game_info["version"])
+        
+        return {
+            "success": True,
+            "game_info": game_info,
+            "package": package.manifest(),
+            "token": issue_token(self.sessions, player_id, game_info["name"], game_info["version"])
+        }
+    
+    def handle_fetch_package_range(self, message):
+        """以下載權杖讀取套件的一段位元組（不需登入，可在多條連線上平行請求）"""
+        verified = verify_token(self.sessions, message.get("token"))
+        if not verified:
+            return {"success": False, "message": "下載權杖無效或已過期"}
+        
+        _, game_name, version = verified
+        offset = message.get("offset")
+        length = message.get("length")
+        if not isinstance(offset, int) or not isinstance(length, int) or offset < 0 or length <= 0:
+            return {"success": False, "message": "無效的範圍"}
+        
+        try:
+            package = self.packages.get(f"uploaded_games/{game_name}/{version}")
+            data = package.read(offset, min(length, MAX_RANGE))
+        except OSError:
+            return {"success": False, "message": "遊戲檔案不存在"}
+        
+        return {
+            "success": True,
+            "offset": offset,
+            "data": base64.b64encode(data).decode("ascii")
+        }
+    
     def handle_create_room(self, message, player_id):
         """建立房間"""
         if not player_id:
@@ -308,11 +682,14 @@ class LobbyServer:
         game_info = self.db.get_game_by_id(game_id)
         if not game_info or not game_info["is_active"]:
             return {"success": False, "message": "遊戲不存在或已下架"}
+        package_id = self.get_package_id(game_info)
         
         with self.lock:
             # 檢查玩家是否已在房間中
             if player_id in self.player_rooms:
                 return {"success": False, "message": "你已經在一個房間中"}
+            if player_id in self.matchmaking.tickets:
+                return {"success": False, "message": "你正在配對佇列中，請先取消配對"}
             
             room_id = self.next_room_id
             self.next_room_id += 1
@@ -325,17 +702,27 @@ class LobbyServer:
                 "id": player_id,
                 "username": player_info["username"]
             })
+            room.package_id = package_id
             
             self.rooms[room_id] = room
             self.player_rooms[player_id] = room_id
+            self.schedule_room_expiry(room)
         
         print(f"[大廳伺服器] 房間 {room_id} 建立成功 (遊戲: {game_info['name']})")
         return {"success": True, "room": room.to_dict()}
     
-    def handle_list_rooms(self):
-        """列出所有房間"""
+    def get_package_id(self, game_info):
+        """遊戲版本的套件 ID（檔案不存在時為 None，成員改用原本的下載流程）"""
+        try:
+            return self.packages.get(f"uploaded_games/{game_info['name']}/{game_info['version']}").package_id
+        except OSError:
+            return None
+    
+    def handle_list_rooms(self, message=None):
+        """列出所有房間（預設為等待中的房間，status 為 "playing" 時列出可觀戰的房間）"""
+        status = (message or {}).get("status", "waiting")
         with self.lock:
-            rooms = [room.to_dict() for room in self.rooms.values() if room.status == "waiting"]
+            rooms = [room.to_dict() for room in self.rooms.values() if room.status == status]
         return {"success": True, "rooms": rooms}
     
     def handle_join_room(self, message, player_id):
@@ -350,6 +737,8 @@ class LobbyServer:
         with self.lock:
             if player_id in self.player_rooms:
                 return {"success": False, "message": "你已經在一個房間中"}
+            if player_id in self.matchmaking.tickets:
+                return {"success": False, "message": "你正在配對佇列中，請先取消配對"}
             
             room = self.rooms.get(room_id)
             if not room:
@@ -401,21 +790,9 @@ class LobbyServer:
             # 如果房間沒人了，刪除房間
             if len(room.players) == 0:
                 # 確保遊戲伺服器進程已終止
-                if room.game_server_process:
-                    try:
-                        print(f"[大廳伺服器] 正在終止房間 {room_id} 的遊戲伺服器 (PID: {room.game_server_process.pid})...")
-                        room.game_server_process.terminate()
-                        room.game_server_process.wait(timeout=5)
-                    except Exception as e:
-                        print(f"[大廳伺服器] 終止遊戲伺服器失敗: {e}")
-                        try:
-                            room.game_server_process.kill()
-                        except:
-                            pass
-                
-                if room.port:
-                    self.release_port(room.port)
+                self.stop_game_server(room)
                 
+                self.cancel_room_timers(room)
                 del self.rooms[room_id]
                 print(f"[大廳伺服器] 房間 {room_id} 已關閉（無玩家）")
                 return {"success": True, "message": "已離開房間"}
@@ -441,8 +818,35 @@ class LobbyServer:
         
         return {"success": True, "message": "已離開房間"}
     
-    def handle_start_game(self, player_id):
-        """開始遊戲"""
+    def handle_set_ready(self, message, player_id):
+        """回報是否已備妥房間的遊戲版本（下載並驗證完成）"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        
+        with self.lock:
+            room_id = self.player_rooms.get(player_id)
+            room = self.rooms.get(room_id)
+            if not room:
+                return {"success": False, "message": "你不在任何房間中"}
+            
+            ready = bool(message.get("ready", True))
+            if ready and message.get("package_id") != room.package_id:
+                return {"success": False, "message": "遊戲版本與房間不符"}
+            if ready == (player_id in room.ready):
+                return {"success": True, "room": room.to_dict()}
+            if ready:
+                room.ready.add(player_id)
+            else:
+                room.ready.discard(player_id)
+            
+            self.broadcast_to_room(room_id, {
+                "type": "room_update",
+                "room": room.to_dict()
+            }, exclude_player_id=player_id)
+            return {"success": True, "room": room.to_dict()}
+    
+    def handle_start_game(self, message, player_id):
+        """開始遊戲（回應附上尚未備妥遊戲檔案的成員，僅供參考）"""
         if not player_id:
             return {"success": False, "message": "請先登入"}
         
@@ -461,10 +865,23 @@ class LobbyServer:
             if not room.can_start():
                 return {"success": False, "message": f"人數不足，至少需要 {room.game_info['min_players']} 人"}
             
-            room.status = "playing"
+            # 準備狀態只供房主參考，不阻擋開始（不送 set_ready 的舊版客戶端也能開始遊戲）
+            not_ready = room.not_ready() if room.package_id else []
+            
+            self.set_room_status(room, "playing")
         
         # 啟動遊戲伺服器
         game_server_info = self.start_game_server(room)
+        if not game_server_info:
+            with self.lock:
+                if room.status == "playing":
+                    self.set_room_status(room, "waiting")
+            return {
+                "success": False,
+                "error": "busy",
+                "message": "伺服器忙碌中或無法啟動遊戲伺服器，請稍後再試",
+                "retry_after": 1.0
+            }
         
         # 廣播遊戲開始
         self.broadcast_to_room(room_id, {
@@ -472,10 +889,38 @@ class LobbyServer:
             "server_info": game_server_info
         }, exclude_player_id=player_id)
         
-        return {
+        response = {
             "success": True,
             "message": "遊戲伺服器已啟動",
-            "server_info": game_server_info
+            "server_info": self.with_join_token(room, game_server_info, player_id),
+            "not_ready": not_ready
+        }
+        if not_ready:
+            response["message"] += f"（尚未準備好的玩家: {', '.join(not_ready)}）"
+        return response
+    
+    def handle_watch_room(self, message, player_id):
+        """觀戰：回傳轉播站位址與觀眾權杖"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        if not self.spectators:
+            return {"success": False, "message": "大廳未開放觀戰"}
+        
+        room_id = message.get("room_id")
+        with self.lock:
+            room = self.rooms.get(room_id)
+            if not room or room.status != "playing":
+                return {"success": False, "message": "房間不存在或尚未開始遊戲"}
+            room_info = room.to_dict()
+        
+        token = self.spectators.watch_token(room_id)
+        if not token:
+            return {"success": False, "message": "此房間的遊戲不支援觀戰或已結束"}
+        return {
+            "success": True,
+            "room": room_info,
+            "relay": {"host": self.get_advertised_host(), "port": self.spectators.port},
+            "watch_token": token
         }
     
     def handle_get_room_status(self, player_id):
@@ -500,19 +945,166 @@ class LobbyServer:
             
             # 如果遊戲已開始，返回伺服器資訊
             if room.status == "playing":
-                host_ip = self.host
-                if host_ip == '0.0.0.0':
-                    host_ip = get_local_ip()
-                    
-                response["server_info"] = {
-                    "host": host_ip,
-                    "port": room.port if room.port else room.game_info["server_port"],
-                    "game_name": room.game_info["name"],
-                    "game_type": room.game_info["type"]
-                }
+                response["server_info"] = self.with_join_token(room, self.get_server_info(room), player_id)
             
             return response
     
+    def handle_queue_for_game(self, message, player_id):
+        """加入配對佇列"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        
+        game_id = message.get("game_id")
+        if not game_id:
+            return {"success": False, "message": "缺少遊戲ID"}
+        
+        game_info = self.db.get_game_by_id(game_id)
+        if not game_info or not game_info["is_active"]:
+            return {"success": False, "message": "遊戲不存在或已下架"}
+        
+        # 客戶端量測到大廳的往返延遲，僅用於挑選延遲相近的對手
+        try:
+            latency_ms = float(message["latency_ms"]) if message.get("latency_ms") is not None else None
+        except (TypeError, ValueError):
+            latency_ms = None
+        
+        with self.lock:
+            if player_id in self.player_rooms:
+                return {"success": False, "message": "你已經在一個房間中"}
+            
+            player_info = self.online_players.get(player_id)
+            if not player_info:
+                return {"success": False, "message": "玩家資訊不存在"}
+            
+            ticket = self.matchmaking.enqueue(
+                {"id": player_id, "username": player_info["username"]}, game_info,
+                skill=self.get_player_skill(player_id, game_id), latency_ms=latency_ms)
+            if not ticket:
+                return {"success": False, "message": "你已在配對佇列中"}
+            status = self.matchmaking.status(player_id)
+        
+        print(f"[大廳伺服器] 玩家 {player_info['username']} 加入 {game_info['name']} 配對佇列")
+        return {"success": True, "message": "已加入配對佇列", "queue": status}
+    
+    def handle_cancel_queue(self, player_id):
+        """取消配對"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        
+        with self.lock:
+            if not self.matchmaking.cancel(player_id):
+                return {"success": False, "message": "你不在配對佇列中"}
+        return {"success": True, "message": "已取消配對"}
+    
+    def handle_get_queue_status(self, player_id):
+        """查詢配對狀態"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        
+        with self.lock:
+            status = self.matchmaking.status(player_id)
+        if not status:
+            return {"success": False, "message": "你不在配對佇列中"}
+        return {"success": True, "queue": status}
+    
+    def get_player_skill(self, player_id, game_id):
+        """玩家在該遊戲的技術分（排行榜積分，沒有戰績時為預設值）"""
+        if not self.results:
+            return DEFAULT_SKILL
+        return self.results.skill(player_id, game_id)
+    
+    def handle_report_match_result(self, message):
+        """遊戲伺服器回報對戰結果（以啟動時發給該房間的權杖驗證）"""
+        if not self.results:
+            return {"success": False, "message": "大廳未開放對戰結果回報"}
+        room_id = message.get("room_id")
+        success, msg, standings = self.results.report(
+            room_id, message.get("token"), message.get("players"), message.get("reason"))
+        if success:
+            with self.lock:
+                room = self.rooms.get(room_id)
+                if room and room.status == "playing":
+                    self.set_room_status(room, "finished")
+        return {"success": success, "message": msg, "standings": standings}
+    
+    def handle_get_leaderboard(self, message):
+        """遊戲排行榜（依積分排序）"""
+        game_id = message.get("game_id")
+        if not game_id:
+            return {"success": False, "message": "缺少遊戲ID"}
+        if not self.results:
+            return {"success": False, "message": "大廳未開放排行榜"}
+        try:
+            entries, total = self.results.leaderboard(game_id, message.get("limit", 10), message.get("offset", 0))
+        except (TypeError, ValueError):
+            return {"success": False, "message": "參數錯誤"}
+        return {"success": True, "game_id": game_id, "leaderboard": entries, "total": total}
+    
+    def handle_get_my_rank(self, message, player_id):
+        """玩家在遊戲排行榜上的名次與最近的對戰結果"""
+        if not player_id:
+            return {"success": False, "message": "請先登入"}
+        game_id = message.get("game_id")
+        if not game_id:
+            return {"success": False, "message": "缺少遊戲ID"}
+        if not self.results:
+            return {"success": False, "message": "大廳未開放排行榜"}
+        standing, total = self.results.player_rank(game_id, player_id)
+        return {
+            "success": True,
+            "game_id": game_id,
+            "standing": standing,
+            "total": total,
+            "recent": self.db.get_player_match_results(player_id, game_id, limit=5)
+        }
+    
+    def start_matchmaking(self):
+        """啟動定期配對的背景執行緒"""
+        thread = threading.Thread(target=self.matchmaking_loop)
+        thread.daemon = True
+        thread.start()
+    
+    def matchmaking_loop(self):
+        while True:
+            time.sleep(self.match_interval)
+            try:
+                self.run_matchmaking()
+            except Exception as e:
+                print(f"[大廳伺服器] 配對時發生錯誤: {e}")
+    
+    def run_matchmaking(self):
+        """執行一次配對：為每組玩家建立房間並直接開始遊戲"""
+        rooms = []
+        with self.lock:
+            for game_info, tickets in self.matchmaking.tick():
+                room_id = self.next_room_id
+                self.next_room_id += 1
+                
+                players = [ticket.to_dict() for ticket in tickets]
+                room = Room(room_id, game_info["id"], game_info, players[0])
+                for player in players[1:]:
+                    room.add_player(player)
+                self.rooms[room_id] = room
+                self.set_room_status(room, "playing")
+                for player in players:
+                    self.player_rooms[player["id"]] = room_id
+                rooms.append(room)
+                print(f"[大廳伺服器] 配對成功，房間 {room_id} ({game_info['name']}): "
+                      f"{', '.join(p['username'] for p in players)}")
+        
+        for room in rooms:
+            server_info = self.start_game_server(room)
+            if not server_info:
+                # 啟動失敗時保留房間，讓房主手動開始
+                with self.lock:
+                    self.set_room_status(room, "waiting")
+            self.broadcast_to_room(room.room_id, {
+                "type": "match_found",
+                "room": room.to_dict(),
+                "server_info": server_info
+            })
+        return rooms
+    
     def get_free_port(self):
         """獲取可用的遊戲埠口"""
         # 使用 7000-8000 範圍
@@ -530,12 +1122,85 @@ class LobbyServer:
         if port in self.used_ports:
             self.used_ports.remove(port)
 
+    def get_advertised_host(self):
+        """決定回傳給客戶端的 IP（大廳綁定 0.0.0.0 時嘗試獲取真實 IP）"""
+        host_ip = self.host
+        if host_ip == '0.0.0.0':
+            host_ip = get_local_ip()
+        return host_ip
+    
+    def get_server_info(self, room):
+        """房間遊戲伺服器的連線資訊"""
+        return {
+            "host": room.server_host or self.get_advertised_host(),
+            "port": room.port if room.port else room.game_info["server_port"],
+            "game_name": room.game_info["name"],
+            "game_type": room.game_info["type"]
+        }
+    
+    def with_join_token(self, room, server_info, player_id):
+        """在 server_info 加上玩家本人的加入權杖（遊戲伺服器以此確認連線屬於該帳號才計入對戰結果）"""
+        token = self.results.join_token(room.room_id, player_id) if self.results else None
+        if not server_info or not token:
+            return server_info
+        return dict(server_info, join_token=token)
+    
+    def enable_game_hosts(self, port=None):
+        """開放遊戲主機代理程式登錄（預設埠口為大廳埠口 + 1）"""
+        port = port or int(os.environ.get("GAMESTORE_HOST_PORT", self.port + 1))
+        registry = GameHostRegistry(self.host, port)
+        try:
+            registry.start()
+        except OSError as e:
+            print(f"[大廳伺服器] 無法開放遊戲主機登錄 (埠口 {port}): {e}")
+            return
+        self.game_hosts = registry
+    
+    def enable_spectator_relay(self, port=None):
+        """開放觀戰轉播站（預設埠口為大廳埠口 + 2）"""
+        port = port or int(os.environ.get("GAMESTORE_SPECTATOR_PORT", self.port + 2))
+        relay = SpectatorRelay(self.host, port)
+        try:
+            relay.start()
+        except OSError as e:
+            print(f"[大廳伺服器] 無法開放觀戰轉播站 (埠口 {port}): {e}")
+            return
+        self.spectators = relay
+    
+    def enable_match_results(self):
+        """載入排行榜並開始批次寫入對戰結果"""
+        self.results = MatchResultCollector(self.db)
+        self.results.start()
+    
     def start_game_server(self, room):
-        """啟動遊戲伺服器"""
+        """啟動遊戲伺服器：先取得 spawn 的執行權（房主開始遊戲與快速配對共用），忙碌逾時回傳 None"""
+        gate = self.admission["spawn"]
+        if not gate.acquire():
+            print(f"[大廳伺服器] 同時啟動的遊戲伺服器過多，房間 {room.room_id} 暫不啟動")
+            return None
+        try:
+            return self.launch_game_server(room)
+        finally:
+            gate.release()
+    
+    def launch_game_server(self, room):
+        """啟動遊戲伺服器（有登錄的遊戲主機時放到負載最低的主機上）"""
         game_info = room.game_info
         game_dir = os.path.abspath(f"uploaded_games/{game_info['name']}/{game_info['version']}")
         server_file_name = game_info.get("server_file", "game_server.py")
         
+        env = self.game_server_env(room)
+        if self.game_hosts and self.game_hosts.has_hosts():
+            placed = self.game_hosts.launch(room.room_id, game_info, game_dir, server_file_name, env)
+            if placed:
+                host, port = placed
+                room.game_host = host.name
+                room.server_host = host.advertise_host
+                room.port = port
+                self.watch_game_server(room)
+                return self.get_server_info(room)
+            print("[大廳伺服器] 沒有可用的遊戲主機，改在本機啟動")
+        
         # 分配埠口
         port = self.get_free_port()
         if not port:
@@ -547,29 +1212,150 @@ class LobbyServer:
         try:
             process = subprocess.Popen(
                 [sys.executable, server_file_name, str(port)],
-                cwd=game_dir
+                cwd=game_dir,
+                env=dict(os.environ, **env)
             )
             room.game_server_process = process
+            room.usage = self.process_limits.apply(process.pid, f"room-{room.room_id}")
+            room.server_host = self.get_advertised_host()
             print(f"[大廳伺服器] 遊戲伺服器已啟動 (PID: {process.pid}, Port: {port})")
+            self.watch_game_server(room)
             
-            # 決定回傳給客戶端的 IP
-            # 如果大廳綁定 0.0.0.0，則嘗試獲取真實 IP
-            host_ip = self.host
-            if host_ip == '0.0.0.0':
-                host_ip = get_local_ip()
-            
-            return {
-                "host": host_ip,
-                "port": port,
-                "game_name": game_info["name"],
-                "game_type": game_info["type"]
-            }
+            return self.get_server_info(room)
         except Exception as e:
             print(f"[大廳伺服器] 啟動遊戲伺服器失敗: {e}")
             self.release_port(port)
             room.port = None
             return None
     
+    def set_room_status(self, room, status):
+        """變更房間狀態並依新狀態的 TTL 重新排定到期回收"""
+        room.status = status
+        room.status_since = time.time()
+        self.schedule_room_expiry(room)
+    
+    def schedule_room_expiry(self, room):
+        self.expiry.cancel(room.expiry_timer)
+        room.expiry_timer = None
+        ttl = self.expiry.ttls.get(room.status)
+        if ttl:
+            room.expiry_timer = self.expiry.schedule(ttl, self.expire_room, room, room.status)
+    
+    def cancel_room_timers(self, room):
+        self.expiry.cancel(room.expiry_timer)
+        self.expiry.cancel(room.check_timer)
+        room.expiry_timer = room.check_timer = None
+    
+    def expire_room(self, room, status):
+        """房間停在同一個狀態超過 TTL：通知成員、終止遊戲伺服器並刪除房間"""
+        with self.lock:
+            room.expiry_timer = None
+            if self.rooms.get(room.room_id) is not room or room.status != status:
+                return
+            self.broadcast_to_room(room.room_id, {
+                "type": "room_update",
+                "room": dict(room.to_dict(), status="expired")
+            })
+            # 遠端主機的埠口由主機管理
+            port = room.port if not room.game_host else None
+            self.stop_game_server(room)
+            self.cancel_room_timers(room)
+            for player in room.players:
+                self.player_rooms.pop(player["id"], None)
+            del self.rooms[room.room_id]
+        freed = f"，釋放埠口 {port}" if port else ""
+        self.expiry.record(f"room_{status}",
+                           f"房間 {room.room_id}（{room.game_info['name']}）停在 {status} 超過 "
+                           f"{int(time.time() - room.status_since)} 秒，已回收{freed}"
+                           f"（{len(room.players)} 位玩家，建立後 {int(time.time() - room.created_at)} 秒）")
+    
+    def watch_game_server(self, room):
+        """定期檢查房間的遊戲伺服器是否已結束"""
+        interval = self.expiry.ttls.get("game_check")
+        if interval:
+            self.expiry.cancel(room.check_timer)
+            room.check_timer = self.expiry.schedule(interval, self.check_game_server, room)
+    
+    def check_game_server(self, room):
+        """遊戲伺服器已結束（正常結束或當掉）時釋放埠口與行程，沒有回報結果的房間改為 finished"""
+        with self.lock:
+            room.check_timer = None
+            if self.rooms.get(room.room_id) is not room:
+                return
+            if room.game_host:
+                ended = self.game_hosts.room_ended(room.game_host, room.room_id)
+                where = f"主機 {room.game_host}"
+            elif room.game_server_process:
+                ended = room.game_server_process.poll() is not None
+                where = f"PID {room.game_server_process.pid}，埠口 {room.port}"
+            else:
+                return
+            if not ended:
+                self.watch_game_server(room)
+                return
+            self.stop_game_server(room)
+            room.game_server_process = None
+            room.port = None
+            crashed = room.status == "playing"
+            if crashed:
+                # 沒有回報結果就結束，房間改依 finished 的 TTL 回收
+                self.set_room_status(room, "finished")
+        self.expiry.record("game_server", f"房間 {room.room_id} 的遊戲伺服器已結束（{where}），已回收"
+                                          + ("，未回報結果" if crashed else ""))
+    
+    def game_server_env(self, room):
+        """傳給遊戲伺服器的環境變數"""
+        env = {
+            # 房間人數：遊戲伺服器在這麼多人連上後即可開始，不必等待計時
+            "GAMESTORE_EXPECTED_PLAYERS": str(len(room.players)),
+        }
+        if self.spectators:
+            # 遊戲伺服器可能在遠端主機上，使用大廳對外的位址
+            publish_token, _ = self.spectators.register_room(room.room_id, room.game_info["name"])
+            env.update({
+                "GAMESTORE_SPECTATOR_RELAY": f"{self.get_advertised_host()}:{self.spectators.port}",
+                "GAMESTORE_SPECTATOR_ROOM": str(room.room_id),
+                "GAMESTORE_SPECTATOR_TOKEN": publish_token,
+            })
+        if self.results:
+            token = self.results.open_match(room.room_id, room.game_id, room.players)
+            env.update({
+                "GAMESTORE_RESULT_ADDR": f"{self.get_advertised_host()}:{self.port}",
+                "GAMESTORE_RESULT_ROOM": str(room.room_id),
+                "GAMESTORE_RESULT_TOKEN": token,
+                # 回報結果時以這些玩家 ID 指明玩家（遊戲中的顯示名稱可能重複或被修改）
+                "GAMESTORE_RESULT_PLAYERS": json.dumps(self.results.match_players(room.room_id)),
+            })
+        return env
+    
+    def stop_game_server(self, room):
+        """終止房間的遊戲伺服器並釋放埠口"""
+        if self.spectators:
+            self.spectators.unregister_room(room.room_id)
+        if self.results:
+            self.results.close_match(room.room_id)
+        if room.game_host:
+            self.game_hosts.stop(room.game_host, room.room_id)
+            room.game_host = None
+            return
+        
+        if room.game_server_process:
+            try:
+                print(f"[大廳伺服器] 正在終止房間 {room.room_id} 的遊戲伺服器 (PID: {room.game_server_process.pid})...")
+                room.game_server_process.terminate()
+                room.game_server_process.wait(timeout=5)
+            except Exception as e:
+                print(f"[大廳伺服器] 終止遊戲伺服器失敗: {e}")
+                try:
+                    room.game_server_process.kill()
+                except:
+                    pass
+            self.process_limits.release(room.usage)
+            room.usage = None
+        
+        if room.port:
+            self.release_port(room.port)
+    
     def handle_add_rating(self, message, player_id):
         """處理評分"""
         if not player_id:
@@ -594,12 +1380,58 @@ class LobbyServer:
         ratings = self.db.get_game_ratings(game_id)
         return {"success": True, "ratings": ratings}
     
+    def handle_get_server_stats(self):
+        """獲取伺服器統計"""
+        if self.state:
+            response = self.state.call(None, None, {"type": "state_stats"})
+            stats = response.get("stats", {})
+        else:
+            stats = self.get_state_stats()
+        stats["worker_pid"] = os.getpid()
+        stats["credentials"] = self.credentials.stats()
+        stats["rate_limit"] = self.rate_limiter.stats()
+        stats["admission"] = {name: gate.stats() for name, gate in self.admission.items()}
+        stats["packages"] = self.packages.stats()
+        if self.state:
+            # 閒置連線由各工作行程回收
+            stats["connection_expiry"] = self.expiry.stats()
+        return {"success": True, "stats": stats}
+    
+    def get_state_stats(self):
+        """房間與線上玩家統計"""
+        with self.lock:
+            return {
+                "online_players": len(self.online_players),
+                "detached_players": sum(1 for p in self.online_players.values() if not p["socket"]),
+                "rooms": len(self.rooms),
+                "used_ports": len(self.used_ports),
+                "game_hosts": self.game_hosts.stats() if self.game_hosts else [],
+                "matchmaking": self.matchmaking.stats(),
+                "spectators": self.spectators.stats() if self.spectators else None,
+                "match_results": self.results.stats() if self.results else None,
+                "game_servers": self.game_server_usage(),
+                "process_limits": self.process_limits.to_dict(),
+                "expiry": self.expiry.stats(),
+            }
+    
+    def game_server_usage(self):
+        """本機遊戲伺服器每個房間的 CPU 與記憶體用量（遠端主機的用量在 game_hosts 中）"""
+        usage = {}
+        for room_id, room in self.rooms.items():
+            if room.usage and room.game_server_process and room.game_server_process.poll() is None:
+                sample = room.usage.sample()
+                if sample:
+                    usage[room_id] = sample
+        return usage
+    
     def handle_player_disconnect(self, player_id):
         """處理玩家斷線"""
         with self.lock:
             # 從線上列表移除
             if player_id in self.online_players:
+                self.cancel_expire_timer(self.online_players[player_id])
                 del self.online_players[player_id]
+            self.matchmaking.cancel(player_id)
             
             # 離開房間
             if player_id in self.player_rooms:
@@ -611,21 +1443,9 @@ class LobbyServer:
                     
                     if len(room.players) == 0:
                         # 確保遊戲伺服器進程已終止
-                        if room.game_server_process:
-                            try:
-                                print(f"[大廳伺服器] 正在終止房間 {room_id} 的遊戲伺服器 (PID: {room.game_server_process.pid})...")
-                                room.game_server_process.terminate()
-                                room.game_server_process.wait(timeout=5)
-                            except Exception as e:
-                                print(f"[大廳伺服器] 終止遊戲伺服器失敗: {e}")
-                                try:
-                                    room.game_server_process.kill()
-                                except:
-                                    pass
+                        self.stop_game_server(room)
                         
-                        if room.port:
-                            self.release_port(room.port)
-                            
+                        self.cancel_room_timers(room)
                         del self.rooms[room_id]
                     else:
                         if is_host:
@@ -644,14 +1464,92 @@ class LobbyServer:
         self.running = False
         if self.server_socket:
             self.server_socket.close()
+        self.credentials.shutdown()
+        if self.results:
+            # 寫入尚未落盤的對戰結果
+            self.results.flush()
 
-if __name__ == "__main__":
-    host = sys.argv[1] if len(sys.argv) > 1 else '0.0.0.0'
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 6002
-    
-    server = LobbyServer(host, port)
+def run_state_process(host, port, state_path):
+    """狀態行程：持有房間、線上玩家與埠口分配"""
+    core = LobbyServer(host, port)
+    core.expiry.start()
+    core.enable_game_hosts()
+    core.enable_spectator_relay()
+    core.enable_match_results()
+    core.start_matchmaking()
+    state_server = LobbyStateServer(core, state_path)
+    try:
+        state_server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state_server.stop()
+        core.results.flush()
+
+def run_worker_process(host, port, state_path):
+    """工作行程：以 SO_REUSEPORT 共用埠口處理連線"""
+    server = LobbyServer(host, port, state_path=state_path, reuse_port=True)
     try:
         server.start()
     except KeyboardInterrupt:
-        print("\n[大廳伺服器] 正在關閉...")
         server.stop()
+
+def run_multi_worker(host, port, workers):
+    """啟動一個狀態行程與多個大廳工作行程"""
+    state_path = os.path.join(tempfile.gettempdir(), f"gamestore-lobby-{port}.sock")
+    # 下載權杖可能由其他工作行程驗證，所有行程需使用相同的簽章金鑰
+    os.environ.setdefault("GAMESTORE_SESSION_SECRET", os.urandom(32).hex())
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    
+    processes = [multiprocessing.Process(target=run_state_process, args=(host, port, state_path))]
+    processes[0].start()
+    
+    # 等待狀態服務就緒
+    deadline = time.time() + 10
+    while not os.path.exists(state_path) and time.time() < deadline:
+        time.sleep(0.05)
+    
+    for _ in range(workers):
+        process = multiprocessing.Process(target=run_worker_process, args=(host, port, state_path))
+        process.start()
+        processes.append(process)
+    print(f"[大廳伺服器] 已啟動 {workers} 個工作行程")
+    
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, shutdown)
+    
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n[大廳伺服器] 正在關閉...")
+    finally:
+        for process in reversed(processes):
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    # --workers N：多行程模式（N 個工作行程共用同一個埠口）
+    workers = 1
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    
+    host = args[0] if len(args) > 0 else '0.0.0.0'
+    port = int(args[1]) if len(args) > 1 else 6002
+    
+    if workers > 1:
+        run_multi_worker(host, port, workers)
+    else:
+        server = LobbyServer(host, port)
+        try:
+            server.start()
+        except KeyboardInterrupt:
+            print("\n[大廳伺服器] 正在關閉...")
+            server.stop()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+大廳共享狀態服務
+多行程模式下，房間、線上玩家與埠口分配只存在於狀態行程中；
+各個大廳工作行程透過 Unix socket 轉送房間相關請求，廣播訊息再由狀態行程
+推回持有該玩家連線的工作行程
+"""
+import collections
+import json
+import os
+import queue
+import socket
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+def send_frame(sock, frame):
+    """送出一個以換行分隔的 JSON 訊框"""
+    sock.sendall(json.dumps(frame, ensure_ascii=False).encode("utf-8") + b"\n")
+
+def read_frames(sock):
+    """持續讀取以換行分隔的 JSON 訊框"""
+    buffer = b""
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return
+        buffer += data
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            if line:
+                yield json.loads(line.decode("utf-8"))
+
+# 每條玩家連線最多排隊的推送訊息數，超過表示客戶端沒有在讀取，直接關閉該連線
+OUTBOX_LIMIT = 256
+# 推送佇列中的關閉與結束標記
+CLOSE = object()
+STOP = object()
+
+class RemotePlayerSocket:
+    """代表某個工作行程上的玩家連線，提供與 socket 相同的 send / shutdown 介面"""
+    def __init__(self, channel, conn_id):
+        self.channel = channel
+        self.conn_id = conn_id
+
+    def send(self, data):
+        self.channel.push({"op": "deliver", "conn": self.conn_id, "data": data.decode("utf-8")})
+        return len(data)
+
+    sendall = send
+
+    def shutdown(self, how=None):
+        self.channel.push({"op": "close", "conn": self.conn_id})
+
+    def close(self):
+        pass
+
+class WorkerChannel:
+    """狀態行程與單一工作行程之間的連線"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.proxies = {}  # {conn_id: RemotePlayerSocket}
+        self.proxies_lock = threading.Lock()
+        self.pending = {}  # {conn_id: deque}：連線正在執行請求時，後到的請求在此排隊
+        self.pending_lock = threading.Lock()
+
+    def push(self, frame):
+        with self.send_lock:
+            try:
+                send_frame(self.sock, frame)
+            except OSError as e:
+                print(f"[大廳狀態服務] 推送至工作行程失敗: {e}")
+
+    def proxy(self, conn_id):
+        """同一個連線永遠對應同一個代理物件，讓核心可用 is 比對連線"""
+        with self.proxies_lock:
+            proxy = self.proxies.get(conn_id)
+            if proxy is None:
+                proxy = self.proxies[conn_id] = RemotePlayerSocket(self, conn_id)
+            return proxy
+
+    def release(self, conn_id):
+        with self.proxies_lock:
+            self.proxies.pop(conn_id, None)
+
+class LobbyStateServer:
+    """在 Unix socket 上提供大廳核心（LobbyServer）的房間與線上玩家狀態"""
+    def __init__(self, core, path, threads=16):
+        self.core = core
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.server_socket = None
+        self.running = False
+
+    def start(self):
+        """啟動狀態服務"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(self.path)
+        self.server_socket.listen(64)
+        self.running = True
+        print(f"[大廳狀態服務] 在 {self.path} 上啟動")
+
+        while self.running:
+            try:
+                worker_socket, _ = self.server_socket.accept()
+            except OSError:
+                break
+            channel = WorkerChannel(worker_socket)
+            thread = threading.Thread(target=self.handle_worker, args=(channel,))
+            thread.daemon = True
+            thread.start()
+
+    def handle_worker(self, channel):
+        """處理單一工作行程的請求"""
+        print("[大廳狀態服務] 工作行程已連線")
+        try:
+            for frame in read_frames(channel.sock):
+                self.dispatch(channel, frame)
+        except (OSError, ValueError) as e:
+            print(f"[大廳狀態服務] 工作行程連線錯誤: {e}")
+        finally:
+            # 工作行程結束時，其上所有玩家都視為斷線
+            with channel.proxies_lock:
+                proxies = list(channel.proxies.items())
+            with self.core.lock:
+                for conn_id, proxy in proxies:
+                    for player_id, info in list(self.core.online_players.items()):
+                        if info["socket"] is proxy:
+                            self.core.detach_player(player_id, proxy)
+            channel.sock.close()
+            print("[大廳狀態服務] 工作行程已斷線")
+
+    def dispatch(self, channel, frame):
+        """同一條連線的請求依到達順序逐一執行（例如登入後立即斷線時，detach 不會早於登入），
+        不同連線的請求仍在執行緒池中平行處理"""
+        conn_id = frame.get("conn")
+        with channel.pending_lock:
+            backlog = channel.pending.get(conn_id)
+            if backlog is not None:
+                backlog.append(frame)
+                return
+            channel.pending[conn_id] = collections.deque()
+        self.executor.submit(self.run_connection, channel, conn_id, frame)
+
+    def run_connection(self, channel, conn_id, frame):
+        """執行連線的請求，直到該連線沒有排隊的請求"""
+        while True:
+            self.handle_frame(channel, frame)
+            with channel.pending_lock:
+                backlog = channel.pending[conn_id]
+                if not backlog:
+                    del channel.pending[conn_id]
+                    return
+                frame = backlog.popleft()
+
+    def handle_frame(self, channel, frame):
+        """執行單一請求"""
+        op = frame.get("op")
+        try:
+            if op == "call":
+                proxy = channel.proxy(frame["conn"])
+                response = self.core.handle_state_message(frame["message"], frame.get("player_id"), proxy)
+                channel.push({"op": "response", "id": frame["id"], "response": response})
+            elif op == "detach":
+                proxy = channel.proxy(frame["conn"])
+                if frame.get("player_id"):
+                    self.core.detach_player(frame["player_id"], proxy)
+                channel.release(frame["conn"])
+        except Exception as e:
+            print(f"[大廳狀態服務] 處理請求時發生錯誤: {e}")
+            if op == "call":
+                channel.push({"op": "response", "id": frame["id"],
+                              "response": {"success": False, "message": f"伺服器錯誤: {e}"}})
+
+    def stop(self):
+        """停止狀態服務"""
+        self.running = False
+        if self.server_socket:
+            self.server_socket.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class ConnectionOutbox:
+    """工作行程上一條玩家連線的推送佇列
+
+    由這條連線專屬的執行緒送出（第一次推送時才建立），客戶端不讀取時只會卡住自己，
+    不會卡住接收所有狀態行程回應的 read_loop
+    """
+    def __init__(self, client_socket, limit=OUTBOX_LIMIT):
+        self.client_socket = client_socket
+        self.queue = queue.Queue(limit)
+        self.thread = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        """排入一則推送（bytes 或 CLOSE），佇列已滿時關閉連線"""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            print("[大廳伺服器] 玩家連線未讀取推送訊息，關閉連線")
+            self.shutdown()
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def stop(self):
+        """連線已結束，讓送出執行緒離開"""
+        with self.lock:
+            if self.thread is None:
+                return
+        try:
+            self.queue.put_nowait(STOP)
+        except queue.Full:
+            # 送出執行緒卡在 sendall，連線關閉後會收到錯誤而離開
+            pass
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                return
+            if item is CLOSE:
+                self.shutdown()
+                return
+            try:
+                self.client_socket.sendall(item)
+            except OSError as e:
+                print(f"[大廳伺服器] 發送廣播失敗: {e}")
+                self.shutdown()
+                return
+
+    def shutdown(self):
+        self.closed = True
+        try:
+            self.client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class StateClient:
+    """工作行程端：轉送房間請求並接收推送的廣播"""
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.send_lock = threading.Lock()
+        self.pending = {}  # {request_id: [Event, response]}
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
+        self.conn_ids = itertools.count(1)
+        self.connections = {}  # {conn_id: ConnectionOutbox}
+        self.alive = True
+        thread = threading.Thread(target=self.read_loop)
+        thread.daemon = True
+        thread.start()
+
+    def register(self, client_socket):
+        """登記一條玩家連線，回傳連線 ID"""
+        conn_id = f"{os.getpid()}-{next(self.conn_ids)}"
+        self.connections[conn_id] = ConnectionOutbox(client_socket)
+        return conn_id
+
+    def unregister(self, conn_id, player_id):
+        """連線結束，通知狀態行程"""
+        outbox = self.connections.pop(conn_id, None)
+        if outbox:
+            outbox.stop()
+        self.push({"op": "detach", "conn": conn_id, "player_id": player_id})
+
+    def push(self, frame):
+        with self.send_lock:
+            send_frame(self.sock, frame)
+
+    def call(self, conn_id, player_id, message):
+        """轉送請求並等待回應"""
+        if not self.alive:
+            return {"success": False, "message": "大廳狀態服務無法使用"}
+        request_id = next(self.request_ids)
+        waiter = [threading.Event(), None]
+        with self.pending_lock:
+            self.pending[request_id] = waiter
+        try:
+            self.push({"op": "call", "id": request_id, "conn": conn_id,
+                       "player_id": player_id, "message": message})
+            if not waiter[0].wait(self.timeout):
+                return {"success": False, "message": "大廳狀態服務逾時"}
+            return waiter[1]
+        except OSError:
+            return {"success": False, "message": "大廳狀態服務無法使用"}
+        finally:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+
+    def read_loop(self):
+        """接收回應與推送訊息"""
+        try:
+            for frame in read_frames(self.sock):
+                op = frame.get("op")
+                if op == "response":
+                    with self.pending_lock:
+                        waiter = self.pending.get(frame["id"])
+                    if waiter:
+                        waiter[1] = frame["response"]
+                        waiter[0].set()
+                elif op in ("deliver", "close"):
+                    # 交給該連線的推送佇列，這裡不能阻塞在單一客戶端上
+                    outbox = self.connections.get(frame["conn"])
+                    if outbox:
+                        outbox.put(frame["data"].encode("utf-8") if op == "deliver" else CLOSE)
+        except (OSError, ValueError) as e:
+            print(f"[大廳伺服器] 與狀態服務的連線中斷: {e}")
+        finally:
+            self.alive = False
+            with self.pending_lock:
+                for waiter in self.pending.values():
+                    waiter[1] = {"success": False, "message": "大廳狀態服務無法使用"}
+                    waiter[0].set()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+對戰結果與排行榜
+遊戲伺服器在遊戲結束時以大廳發給該房間的權杖回報結果（report_match_result），
+每位玩家以大廳分配給該房間的玩家 ID（GAMESTORE_RESULT_PLAYERS）指明，不以遊戲中的顯示名稱對應。
+玩家 ID 只有在連線出示大廳發給該玩家的加入權杖（join_token，隨 server_info 只送給本人）時才對應到連線，
+其他玩家無法冒用別人的帳號領取勝場與積分。
+大廳立即更新記憶體中的排行榜，資料庫則由背景執行緒批次寫入：
+每 GAMESTORE_RESULT_FLUSH 秒（預設 1）或累積 RESULT_BATCH_SIZE 筆時，
+以一個交易寫入 match_results 與變動過的 player_stats
+
+每個遊戲的排行榜由兩個結構組成：
+- {player_id: Standing}：玩家目前的積分與勝負場數
+- 依 (-積分, player_id) 排序的清單：以 bisect 更新與查詢名次
+讀取排行榜與名次都不需要彙總 match_results；大廳啟動時從 player_stats 載入
+"""
+import bisect
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+from matchmaking import DEFAULT_SKILL
+
+# Elo 積分的 K 值
+RATING_K = 32
+# 累積這麼多筆結果就立即寫入資料庫
+RESULT_BATCH_SIZE = 100
+# 排行榜單次最多回傳的名次數
+MAX_LEADERBOARD_LIMIT = 100
+
+RESULT_ORDER = {"loss": 0, "draw": 1, "win": 2}
+
+def rating_changes(ratings, results, k=RATING_K):
+    """多人 Elo：每位玩家與其他玩家逐一比較（勝 1、平 0.5、負 0），變動量取平均"""
+    if len(ratings) < 2:
+        return [0.0] * len(ratings)
+    changes = []
+    orders = [RESULT_ORDER[result] for result in results]
+    for i, (rating, order) in enumerate(zip(ratings, orders)):
+        total = 0.0
+        for j, (other, other_order) in enumerate(zip(ratings, orders)):
+            if i == j:
+                continue
+            actual = 1.0 if order > other_order else 0.5 if order == other_order else 0.0
+            expected = 1 / (1 + 10 ** ((other - rating) / 400))
+            total += actual - expected
+        changes.append(k * total / (len(ratings) - 1))
+    return changes
+
+def join_token(match_token, room_id, player_id):
+    """玩家加入遊戲伺服器時出示的權杖：以對戰權杖為金鑰的 HMAC(房間 ID:玩家 ID)
+    遊戲伺服器持有對戰權杖，可自行驗證（game_runtime.py 以相同方式計算）"""
+    payload = f"{room_id}:{player_id}".encode()
+    return hmac.new(match_token.encode(), payload, hashlib.sha256).hexdigest()
+
+class Standing:
+    """玩家在單一遊戲的戰績"""
+    __slots__ = ("player_id", "username", "rating", "wins", "losses", "draws")
+
+    def __init__(self, player_id, username, rating=DEFAULT_SKILL, wins=0, losses=0, draws=0):
+        self.player_id = player_id
+        self.username = username
+        self.rating = rating
+        self.wins = wins
+        self.losses = losses
+        self.draws = draws
+
+    def key(self):
+        return (-self.rating, self.player_id)
+
+    def to_dict(self, rank=None):
+        return {
+            "rank": rank,
+            "player_id": self.player_id,
+            "username": self.username,
+            "rating": round(self.rating),
+            "wins": self.wins,
+            "losses": self.losses,
+            "draws": self.draws,
+            "games": self.wins + self.losses + self.draws,
+        }
+
+class Leaderboard:
+    """單一遊戲的排行榜"""
+    def __init__(self):
+        self.standings = {}  # {player_id: Standing}
+        self.ranked = []  # [(-rating, player_id)]，名次由 1 起算
+
+    def __len__(self):
+        return len(self.ranked)
+
+    def get(self, player_id):
+        return self.standings.get(player_id)
+
+    def add(self, standing):
+        self.standings[standing.player_id] = standing
+        bisect.insort(self.ranked, standing.key())
+
+    def update(self, standing, rating, result):
+        """更新積分與勝負場數，並把玩家移到新的名次"""
+        index = bisect.bisect_left(self.ranked, standing.key())
+        del self.ranked[index]
+        standing.rating = rating
+        if result == "win":
+            standing.wins += 1
+        elif result == "loss":
+            standing.losses += 1
+        else:
+            standing.draws += 1
+        bisect.insort(self.ranked, standing.key())
+
+    def rank(self, player_id):
+        standing = self.standings.get(player_id)
+        if not standing:
+            return None
+        return bisect.bisect_left(self.ranked, standing.key()) + 1
+
+    def top(self, limit, offset=0):
+        return [self.standings[player_id].to_dict(offset + i + 1)
+                for i, (_, player_id) in enumerate(self.ranked[offset:offset + limit])]
+
+class OpenMatch:
+    """進行中、等待遊戲伺服器回報結果的對戰"""
+    __slots__ = ("room_id", "game_id", "token", "players", "started_at")
+
+    def __init__(self, room_id, game_id, players):
+        self.room_id = room_id
+        self.game_id = game_id
+        self.token = secrets.token_hex(16)
+        self.players = {p["id"]: p["username"] for p in players}
+        self.started_at = time.time()
+
+class MatchResultCollector:
+    """接收遊戲伺服器回報的結果，維護排行榜並批次寫入資料庫"""
+    def __init__(self, db, flush_interval=None, batch_size=RESULT_BATCH_SIZE):
+        self.db = db
+        self.flush_interval = flush_interval or float(os.environ.get("GAMESTORE_RESULT_FLUSH", "1"))
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.matches = {}  # {room_id: OpenMatch}
+        self.leaderboards = {}  # {game_id: Leaderboard}
+        self.pending_results = []  # 待寫入 match_results 的資料列
+        self.dirty = {}  # {(game_id, player_id): Standing}，待寫入 player_stats
+        self.reported = 0
+        self.flushes = 0
+        self.load()
+
+    def load(self):
+        """從 player_stats 載入所有遊戲的排行榜"""
+        count = 0
+        for game_id, player_id, username, rating, wins, losses, draws in self.db.get_player_standings():
+            self.board(game_id).add(Standing(player_id, username, rating, wins, losses, draws))
+            count += 1
+        print(f"[對戰結果] 已載入 {len(self.leaderboards)} 個遊戲排行榜 ({count} 筆戰績)")
+
+    def board(self, game_id):
+        board = self.leaderboards.get(game_id)
+        if board is None:
+            board = self.leaderboards[game_id] = Leaderboard()
+        return board
+
+    # ---------- 大廳使用的介面 ----------
+
+    def open_match(self, room_id, game_id, players):
+        """遊戲伺服器啟動前登記對戰，回傳回報結果用的權杖（房間玩家另以 match_players 傳給遊戲伺服器）"""
+        match = OpenMatch(room_id, game_id, players)
+        with self.lock:
+            self.matches[room_id] = match
+        return match.token
+
+    def match_players(self, room_id):
+        """{帳號: 玩家 ID}：遊戲伺服器以此把連線的玩家對應到帳號，回報時只能使用這些 ID"""
+        with self.lock:
+            match = self.matches.get(room_id)
+            return {username: player_id for player_id, username in match.players.items()} if match else {}
+
+    def join_token(self, room_id, player_id):
+        """玩家的加入權杖（只送給該玩家本人），不在對戰中時回傳 None"""
+        with self.lock:
+            match = self.matches.get(room_id)
+            if not match or player_id not in match.players:
+                return None
+            return join_token(match.token, room_id, player_id)
+
+    def close_match(self, room_id):
+        """房間關閉（未回報結果的對戰不計）"""
+        with self.lock:
+            self.matches.pop(room_id, None)
+
+    def report(self, room_id, token, players, reason=None):
+        """記錄一場對戰的結果
+
+        players 為遊戲伺服器送來的 [{"player_id", "result", "score"}]，
+        player_id 必須是大廳分配給這個房間的玩家，其他座位不列入（例如未提供帳號的舊版客戶端）
+        回傳 (是否成功, 訊息, 各玩家的新戰績)
+        """
+        with self.lock:
+            match = self.matches.get(room_id)
+            if not match or not token or not secrets.compare_digest(str(token), match.token):
+                return False, "對戰不存在或權杖錯誤", []
+            del self.matches[room_id]
+
+            entries = []
+            seen = set()
+            for player in players if isinstance(players, list) else []:
+                if not isinstance(player, dict):
+                    continue
+                player_id = player.get("player_id")
+                result = player.get("result")
+                if type(player_id) is not int or player_id not in match.players \
+                        or player_id in seen or result not in RESULT_ORDER:
+                    continue
+                seen.add(player_id)
+                score = player.get("score")
+                entries.append((player_id, match.players[player_id], result,
+                                score if isinstance(score, int) else None))
+
+            board = self.board(match.game_id)
+            standings = []
+            for player_id, username, _, _ in entries:
+                standing = board.get(player_id)
+                if not standing:
+                    standing = Standing(player_id, username)
+                    board.add(standing)
+                standings.append(standing)
+            changes = rating_changes([s.rating for s in standings], [e[2] for e in entries])
+
+            match_id = secrets.token_hex(8)
+            updated = []
+            for standing, (player_id, _, result, score), change in zip(standings, entries, changes):
+                board.update(standing, standing.rating + change, result)
+                self.dirty[(match.game_id, player_id)] = standing
+                self.pending_results.append((match_id, match.game_id, player_id, result, score,
+                                             standing.rating, reason, room_id))
+                updated.append(standing.to_dict(board.rank(player_id)))
+            self.reported += 1
+            if len(self.pending_results) >= self.batch_size:
+                self.wakeup.notify()
+
+        names = ", ".join(f"{s['username']} {s['rating']}" for s in updated)
+        print(f"[對戰結果] 房間 {room_id} 結束 ({reason or '正常結束'}): {names or '無可計分的玩家'}")
+        return True, "已記錄對戰結果", updated
+
+    def skill(self, player_id, game_id):
+        with self.lock:
+            board = self.leaderboards.get(game_id)
+            standing = board.get(player_id) if board else None
+            return round(standing.rating) if standing else DEFAULT_SKILL
+
+    def leaderboard(self, game_id, limit=10, offset=0):
+        limit = max(1, min(int(limit), MAX_LEADERBOARD_LIMIT))
+        offset = max(0, int(offset))
+        with self.lock:
+            board = self.leaderboards.get(game_id)
+            if not board:
+                return [], 0
+            return board.top(limit, offset), len(board)
+
+    def player_rank(self, game_id, player_id):
+        """回傳 (玩家戰績, 排行榜人數)，沒有戰績時戰績為 None"""
+        with self.lock:
+            board = self.leaderboards.get(game_id)
+            if not board:
+                return None, 0
+            standing = board.get(player_id)
+            return (standing.to_dict(board.rank(player_id)) if standing else None), len(board)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "open_matches": len(self.matches),
+                "reported": self.reported,
+                "pending": len(self.pending_results),
+                "flushes": self.flushes,
+                "leaderboards": len(self.leaderboards),
+            }
+
+    # ---------- 批次寫入 ----------
+
+    def start(self):
+        """在背景執行緒定期寫入資料庫"""
+        thread = threading.Thread(target=self.flush_loop)
+        thread.daemon = True
+        thread.start()
+
+    def flush_loop(self):
+        while True:
+            with self.lock:
+                if len(self.pending_results) < self.batch_size:
+                    self.wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[對戰結果] 寫入資料庫失敗: {e}")
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """把累積的結果與戰績以一個交易寫入（失敗時放回佇列下次重試）"""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending_results:
+                    return 0
+                results, self.pending_results = self.pending_results, []
+                dirty, self.dirty = self.dirty, {}
+                standings = [(game_id, s.player_id, s.rating, s.wins, s.losses, s.draws)
+                             for (game_id, _), s in dirty.items()]
+            try:
+                self.db.save_match_results(results, standings)
+            except Exception:
+                with self.lock:
+                    self.pending_results[:0] = results
+                    for key, standing in dirty.items():
+                        self.dirty.setdefault(key, standing)
+                raise
+            with self.lock:
+                self.flushes += 1
+            return len(results)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+配對佇列
+玩家以 queue_for_game 排入各遊戲的佇列，大廳定期執行 tick，
+依等待時間、技術分與延遲把玩家分批組成房間
+
+每個遊戲的佇列由兩個結構組成：
+- 依排入時間排序的 heap：tick 從等待最久的玩家開始配對
+- 依技術分排序的清單：以 bisect 找出技術分在容許範圍內的候選玩家
+取消排隊只標記票券，實際移除延到下次 tick（lazy deletion），
+讓排入、取消、取出都維持 O(log n) 的比較次數
+"""
+import bisect
+import heapq
+import itertools
+import os
+import time
+
+DEFAULT_SKILL = 1000
+
+class MatchTicket:
+    """一位排隊中的玩家"""
+    __slots__ = ("player_id", "username", "game_id", "skill", "latency_ms",
+                 "enqueued_at", "seq", "active")
+
+    def __init__(self, player_id, username, game_id, skill, latency_ms, enqueued_at, seq):
+        self.player_id = player_id
+        self.username = username
+        self.game_id = game_id
+        self.skill = skill
+        self.latency_ms = latency_ms
+        self.enqueued_at = enqueued_at
+        self.seq = seq
+        self.active = True
+
+    def to_dict(self):
+        return {"id": self.player_id, "username": self.username}
+
+class GameQueue:
+    """單一遊戲的配對佇列"""
+    def __init__(self, game_info):
+        self.game_info = game_info
+        self.by_age = []  # [(enqueued_at, seq, ticket)]
+        self.by_skill = []  # [(skill, seq, ticket)]
+        self.size = 0
+
+    def push(self, ticket):
+        heapq.heappush(self.by_age, (ticket.enqueued_at, ticket.seq, ticket))
+        bisect.insort(self.by_skill, (ticket.skill, ticket.seq, ticket))
+        self.size += 1
+
+    def discard(self, ticket):
+        """從技術分清單中移除（heap 中的項目在取出時略過）"""
+        index = bisect.bisect_left(self.by_skill, (ticket.skill, ticket.seq))
+        if index < len(self.by_skill) and self.by_skill[index][2] is ticket:
+            del self.by_skill[index]
+
+    def compact(self):
+        """清除 heap 頂端已取消或已配對的票券"""
+        while self.by_age and not self.by_age[0][2].active:
+            heapq.heappop(self.by_age)
+
+class MatchmakingQueue:
+    """依技術分與延遲分批配對的佇列
+
+    容許範圍會隨等待時間放寬：等待 t 秒的玩家接受技術分差
+    skill_window + skill_widen * t 以內、延遲差 latency_window_ms + latency_widen_ms * t 以內的對手。
+    人數湊滿 max_players 立即開房；只湊到 min_players 時，等待最久的玩家需等滿 fill_wait 秒才開房，
+    避免開出一堆人數剛好下限的房間
+    """
+    def __init__(self, clock=time.monotonic, skill_window=None, skill_widen=None,
+                 latency_window_ms=None, latency_widen_ms=None, fill_wait=None):
+        env = os.environ.get
+        self.clock = clock
+        self.skill_window = skill_window if skill_window is not None else float(env("GAMESTORE_MATCH_SKILL_WINDOW", "100"))
+        self.skill_widen = skill_widen if skill_widen is not None else float(env("GAMESTORE_MATCH_SKILL_WIDEN", "25"))
+        self.latency_window_ms = latency_window_ms if latency_window_ms is not None else float(env("GAMESTORE_MATCH_LATENCY_WINDOW", "80"))
+        self.latency_widen_ms = latency_widen_ms if latency_widen_ms is not None else float(env("GAMESTORE_MATCH_LATENCY_WIDEN", "10"))
+        self.fill_wait = fill_wait if fill_wait is not None else float(env("GAMESTORE_MATCH_FILL_WAIT", "5"))
+        self.queues = {}  # {game_id: GameQueue}
+        self.tickets = {}  # {player_id: MatchTicket}
+        self.seq = itertools.count()
+        self.matched_total = 0
+        self.wait_total = 0.0
+
+    def enqueue(self, player, game_info, skill=DEFAULT_SKILL, latency_ms=None):
+        """排入佇列，已在佇列中時回傳 None"""
+        if player["id"] in self.tickets:
+            return None
+        game_id = game_info["id"]
+        ticket = MatchTicket(player["id"], player["username"], game_id, float(skill),
+                             float(latency_ms) if latency_ms is not None else None,
+                             self.clock(), next(self.seq))
+        queue = self.queues.get(game_id)
+        if queue is None:
+            queue = self.queues[game_id] = GameQueue(game_info)
+        queue.game_info = game_info
+        queue.push(ticket)
+        self.tickets[ticket.player_id] = ticket
+        return ticket
+
+    def cancel(self, player_id):
+        """取消排隊，回傳是否原本在佇列中"""
+        ticket = self.tickets.pop(player_id, None)
+        if not ticket:
+            return False
+        self.remove(ticket)
+        return True
+
+    def remove(self, ticket):
+        ticket.active = False
+        queue = self.queues[ticket.game_id]
+        queue.discard(ticket)
+        queue.size -= 1
+
+    def status(self, player_id):
+        """排隊狀態"""
+        ticket = self.tickets.get(player_id)
+        if not ticket:
+            return None
+        queue = self.queues[ticket.game_id]
+        return {
+            "game_id": ticket.game_id,
+            "game_name": queue.game_info["name"],
+            "waiting_sec": round(self.clock() - ticket.enqueued_at, 1),
+            "queued_players": queue.size,
+        }
+
+    def compatible(self, anchor, other, skill_range, latency_range):
+        if abs(other.skill - anchor.skill) > skill_range:
+            return False
+        if anchor.latency_ms is None or other.latency_ms is None:
+            return True
+        return abs(other.latency_ms - anchor.latency_ms) <= latency_range
+
+    def tick(self):
+        """執行一次配對，回傳 [(game_info, [ticket, ...]), ...]"""
+        now = self.clock()
+        matches = []
+        for queue in list(self.queues.values()):
+            matches.extend(self.match_queue(queue, now))
+            if queue.size == 0:
+                del self.queues[queue.game_info["id"]]
+        return matches
+
+    def match_queue(self, queue, now):
+        min_players = max(1, queue.game_info["min_players"])
+        max_players = max(min_players, queue.game_info["max_players"])
+        matches = []
+        deferred = []
+
+        # 依等待時間由久到短輪流當作錨點
+        while queue.by_age and queue.size >= min_players:
+            queue.compact()
+            if not queue.by_age:
+                break
+            entry = heapq.heappop(queue.by_age)
+            anchor = entry[2]
+            waited = now - anchor.enqueued_at
+            skill_range = self.skill_window + self.skill_widen * waited
+            latency_range = self.latency_window_ms + self.latency_widen_ms * waited
+
+            # 技術分範圍內的候選人，依與錨點的分差由近到遠挑選
+            low = bisect.bisect_left(queue.by_skill, (anchor.skill - skill_range,))
+            high = bisect.bisect_right(queue.by_skill, (anchor.skill + skill_range, float("inf")))
+            candidates = [t for _, _, t in queue.by_skill[low:high]
+                          if t is not anchor and self.compatible(anchor, t, skill_range, latency_range)]
+            candidates.sort(key=lambda t: (abs(t.skill - anchor.skill), t.seq))
+            group = [anchor] + candidates[:max_players - 1]
+
+            if len(group) >= max_players or (len(group) >= min_players and waited >= self.fill_wait):
+                for ticket in group:
+                    self.tickets.pop(ticket.player_id, None)
+                    self.remove(ticket)
+                    self.matched_total += 1
+                    self.wait_total += now - ticket.enqueued_at
+                matches.append((queue.game_info, group))
+            else:
+                deferred.append(entry)
+
+        for entry in deferred:
+            if entry[2].active:
+                heapq.heappush(queue.by_age, entry)
+        return matches
+
+    def stats(self):
+        return {
+            "queued_players": len(self.tickets),
+            "queues": {str(game_id): queue.size for game_id, queue in self.queues.items()},
+            "matched_players": self.matched_total,
+            "avg_wait_sec": round(self.wait_total / self.matched_total, 2) if self.matched_total else None,
+        }
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+遊戲套件的分段下載
+一個版本的所有檔案依路徑排序後串接成一個套件，套件切成固定大小的片段，每個片段有自己的 SHA-256：
+    get_package_manifest  回傳檔案清單（位移、大小、雜湊）、片段雜湊與下載權杖
+    fetch_package_range   以下載權杖讀取套件中的一段位元組（base64）
+
+下載權杖以 HMAC 簽章並記錄玩家、遊戲與版本，客戶端可以開多條連線（不必登入）平行下載片段，
+中斷後也能以新的權杖從本機的 .part 檔案接續。版本目錄建立後不會再修改，
+因此下載途中發布新版本不影響已開始的下載
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from blob_store import is_ignored
+
+# 片段大小與單次讀取的上限（bytes），單次讀取最多一個片段
+PIECE_SIZE = int(os.environ.get("GAMESTORE_PACKAGE_PIECE", str(256 * 1024)))
+MAX_RANGE = PIECE_SIZE
+# 下載權杖的有效時間（秒）
+TOKEN_TTL = 3600
+# 每個大廳行程快取的套件數
+PACKAGE_CACHE_SIZE = 64
+
+class Package:
+    """一個版本的檔案串接而成的套件"""
+    def __init__(self, game_dir, piece_size=PIECE_SIZE):
+        self.game_dir = game_dir
+        self.piece_size = piece_size
+        self.files = []  # [{"name", "offset", "size", "sha256"}]
+        names = []
+        for root, dirs, filenames in os.walk(game_dir):
+            for filename in filenames:
+                relative_path = os.path.relpath(os.path.join(root, filename), game_dir)
+                if not is_ignored(relative_path):
+                    names.append(relative_path)
+
+        pieces = []
+        piece = hashlib.sha256()
+        piece_fill = 0
+        offset = 0
+        for name in sorted(names):
+            with open(os.path.join(game_dir, name), "rb") as f:
+                content = f.read()
+            self.files.append({"name": name.replace(os.sep, "/"), "offset": offset, "size": len(content),
+                               "sha256": hashlib.sha256(content).hexdigest()})
+            offset += len(content)
+            view = memoryview(content)
+            while view:
+                take = min(len(view), piece_size - piece_fill)
+                piece.update(view[:take])
+                piece_fill += take
+                view = view[take:]
+                if piece_fill == piece_size:
+                    pieces.append(piece.hexdigest())
+                    piece = hashlib.sha256()
+                    piece_fill = 0
+        if piece_fill:
+            pieces.append(piece.hexdigest())
+        self.size = offset
+        self.pieces = pieces
+        # 套件 ID：內容相同的套件 ID 相同，客戶端以此判斷 .part 檔案能否接續
+        self.package_id = hashlib.sha256(json.dumps([self.files, pieces, piece_size]).encode()).hexdigest()
+
+    def manifest(self):
+        return {
+            "package_id": self.package_id,
+            "size": self.size,
+            "piece_size": self.piece_size,
+            "files": self.files,
+            "pieces": self.pieces,
+        }
+
+    def read(self, offset, length):
+        """讀取套件中 [offset, offset + length) 的位元組（可跨越多個檔案）"""
+        end = min(self.size, offset + length)
+        chunks = []
+        for entry in self.files:
+            if entry["offset"] + entry["size"] <= offset or not entry["size"]:
+                continue
+            if entry["offset"] >= end:
+                break
+            start = max(offset, entry["offset"])
+            with open(os.path.join(self.game_dir, entry["name"]), "rb") as f:
+                f.seek(start - entry["offset"])
+                chunks.append(f.read(min(end, entry["offset"] + entry["size"]) - start))
+        return b"".join(chunks)
+
+class PackageCache:
+    """依版本目錄快取套件（目錄被取代時重新建立）"""
+    def __init__(self, size=PACKAGE_CACHE_SIZE):
+        self.size = size
+        self.packages = OrderedDict()  # {版本目錄: (目錄 inode, Package)}
+        self.lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, game_dir):
+        inode = os.stat(game_dir).st_ino
+        with self.lock:
+            cached = self.packages.get(game_dir)
+            if cached and cached[0] == inode:
+                self.packages.move_to_end(game_dir)
+                return cached[1]
+        package = Package(game_dir)
+        with self.lock:
+            self.builds += 1
+            self.packages[game_dir] = (inode, package)
+            self.packages.move_to_end(game_dir)
+            while len(self.packages) > self.size:
+                self.packages.popitem(last=False)
+        return package
+
+    def stats(self):
+        with self.lock:
+            return {"cached": len(self.packages), "builds": self.builds}
+
+def issue_token(signer, player_id, game_name, version, ttl=TOKEN_TTL):
+    """簽發下載權杖（使用大廳的工作階段金鑰）"""
+    payload = json.dumps([player_id, game_name, version, int(time.time()) + ttl]).encode("utf-8")
+    encoded = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+    return f"{encoded}.{signer.sign(payload)}"
+
+def verify_token(signer, token):
+    """驗證下載權杖，成功時回傳 (player_id, 遊戲名稱, 版本)，否則回傳 None"""
+    if not isinstance(token, str) or "." not in token:
+        return None
+    encoded, signature = token.rsplit(".", 1)
+    try:
+        payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    except (ValueError, TypeError):
+        return None
+    if not signer.check(payload, signature):
+        return None
+    try:
+        player_id, game_name, version, expires = json.loads(payload.decode("utf-8"))
+    except ValueError:
+        return None
+    if expires < time.time():
+        return None
+    return player_id, game_name, version
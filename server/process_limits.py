@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+遊戲伺服器行程的資源限制與用量統計
+
+遊戲伺服器執行開發者上傳的程式，一個失控的房間可能拖垮大廳與同一台主機上的其他對戰。
+大廳與遊戲主機代理程式啟動遊戲伺服器後，依下列環境變數限制該行程（未設定的項目不限制）：
+    GAMESTORE_GAME_CPU_SECONDS       CPU 時間上限，秒（RLIMIT_CPU，超過時收到 SIGXCPU，再超過 5 秒強制結束）
+    GAMESTORE_GAME_MEMORY_MB         位址空間上限，MB（RLIMIT_AS）
+    GAMESTORE_GAME_OPEN_FILES        同時開啟的檔案數上限（RLIMIT_NOFILE）
+    GAMESTORE_GAME_CPUS              可使用的 CPU 編號，例如 "2-5" 或 "0,2"（sched_setaffinity）
+    GAMESTORE_GAME_CGROUP            cgroup v2 目錄（例如 /sys/fs/cgroup/gamestore，需可寫入），每個房間建立一個子 cgroup
+    GAMESTORE_GAME_CGROUP_CPU        子 cgroup 的 CPU 配額，以 CPU 數表示（例如 0.5，寫入 cpu.max）
+    GAMESTORE_GAME_CGROUP_MEMORY_MB  子 cgroup 的記憶體上限，MB（memory.max，包含遊戲伺服器的子行程）
+
+限制在行程啟動後以 prlimit 套用而不使用 preexec_fn：大廳有多個執行緒，fork 之後執行 Python 程式碼可能死結。
+Python 直譯器啟動需要數十毫秒，限制在遊戲程式執行前就已生效。套用失敗只記錄在日誌，不影響開始遊戲
+
+用量在查詢統計時取樣：CPU 時間與 RSS 讀自 /proc/<pid>/stat 與 /proc/<pid>/statm，
+放在子 cgroup 時改讀 cpu.stat 與 memory.current（包含子行程）；CPU 使用率為與上次取樣之間的平均。
+非 Linux 平台上限制與取樣都會略過
+"""
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# RLIMIT_CPU 的硬上限比軟上限多出的秒數：先收到 SIGXCPU，仍未結束則被核心終止
+CPU_HARD_MARGIN = 5
+CGROUP_PERIOD_US = 100000
+
+def parse_cpu_list(value):
+    """解析 "2-5,7" 格式的 CPU 編號"""
+    cpus = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            low, high = (int(p) for p in part.split("-", 1))
+            cpus.update(range(low, high + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def env_number(name, convert=float):
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        print(f"[資源限制] {name} 格式錯誤，忽略: {value}")
+        return None
+
+def read_proc_usage(pid):
+    """(CPU 秒數, RSS bytes)；行程不存在時回傳 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+        with open(f"/proc/{pid}/statm") as f:
+            statm = f.read().split()
+    except OSError:
+        return None
+    # 行程名稱可能包含空白，從最後一個右括號之後開始切割；utime / stime 是第 14、15 個欄位
+    fields = stat[stat.rindex(")") + 2:].split()
+    ticks = int(fields[11]) + int(fields[12])
+    return ticks / os.sysconf("SC_CLK_TCK"), int(statm[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def read_cgroup_usage(path):
+    """子 cgroup 的 (CPU 秒數, 記憶體 bytes)；讀取失敗時回傳 None"""
+    try:
+        with open(os.path.join(path, "cpu.stat")) as f:
+            usage_us = next(int(line.split()[1]) for line in f if line.startswith("usage_usec "))
+        with open(os.path.join(path, "memory.current")) as f:
+            memory = int(f.read())
+    except (OSError, ValueError, StopIteration):
+        return None
+    return usage_us / 1e6, memory
+
+class ProcessUsage:
+    """一個遊戲伺服器行程的用量（apply 回傳，查詢統計時呼叫 sample）"""
+    def __init__(self, pid, cgroup=None):
+        self.pid = pid
+        self.cgroup = cgroup  # 子 cgroup 目錄（未使用 cgroup 時為 None）
+        self.last_time = time.monotonic()
+        self.last_cpu = 0.0
+
+    def sample(self):
+        """目前的 CPU 秒數、與上次取樣之間的 CPU 使用率（%）與 RSS；行程已結束時回傳 None"""
+        usage = None
+        if self.cgroup:
+            usage = read_cgroup_usage(self.cgroup)
+        if usage is None:
+            usage = read_proc_usage(self.pid)
+        if usage is None:
+            return None
+        cpu, rss = usage
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        percent = (cpu - self.last_cpu) / elapsed * 100 if elapsed > 0 else 0.0
+        self.last_time = now
+        self.last_cpu = cpu
+        return {
+            "pid": self.pid,
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(max(percent, 0.0), 1),
+            "rss_mb": round(rss / 1048576, 1),
+        }
+
+class ProcessLimits:
+    """套用到每個遊戲伺服器行程的限制"""
+    def __init__(self, cpu_seconds=None, memory_mb=None, open_files=None, cpus=None,
+                 cgroup=None, cgroup_cpu=None, cgroup_memory_mb=None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.open_files = open_files
+        self.cpus = cpus
+        self.cgroup = cgroup
+        self.cgroup_cpu = cgroup_cpu
+        self.cgroup_memory_mb = cgroup_memory_mb
+
+    @classmethod
+    def from_env(cls):
+        cpus = os.environ.get("GAMESTORE_GAME_CPUS", "").strip()
+        try:
+            cpus = parse_cpu_list(cpus) or None
+        except ValueError:
+            print(f"[資源限制] GAMESTORE_GAME_CPUS 格式錯誤，忽略: {cpus}")
+            cpus = None
+        return cls(
+            cpu_seconds=env_number("GAMESTORE_GAME_CPU_SECONDS", int),
+            memory_mb=env_number("GAMESTORE_GAME_MEMORY_MB", int),
+            open_files=env_number("GAMESTORE_GAME_OPEN_FILES", int),
+            cpus=cpus,
+            cgroup=os.environ.get("GAMESTORE_GAME_CGROUP", "").strip() or None,
+            cgroup_cpu=env_number("GAMESTORE_GAME_CGROUP_CPU"),
+            cgroup_memory_mb=env_number("GAMESTORE_GAME_CGROUP_MEMORY_MB", int),
+        )
+
+    def rlimits(self):
+        """[(資源, (軟上限, 硬上限))]"""
+        if resource is None:
+            return []
+        limits = []
+        if self.cpu_seconds:
+            limits.append((resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + CPU_HARD_MARGIN)))
+        if self.memory_mb:
+            size = self.memory_mb * 1048576
+            limits.append((resource.RLIMIT_AS, (size, size)))
+        if self.open_files:
+            limits.append((resource.RLIMIT_NOFILE, (self.open_files, self.open_files)))
+        return limits
+
+    def apply(self, pid, name):
+        """限制剛啟動的行程，回傳用量取樣的 ProcessUsage；name 為子 cgroup 名稱（例如 room-3）"""
+        for limit, values in self.rlimits():
+            try:
+                resource.prlimit(pid, limit, values)
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"[資源限制] 無法設定 PID {pid} 的 rlimit {limit}: {e}")
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(pid, self.cpus)
+            except OSError as e:
+                print(f"[資源限制] 無法設定 PID {pid} 的 CPU 親和性: {e}")
+        return ProcessUsage(pid, self.place_in_cgroup(pid, name) if self.cgroup else None)
+
+    def place_in_cgroup(self, pid, name):
+        """建立子 cgroup、寫入配額並移入行程；失敗時回傳 None"""
+        path = os.path.join(self.cgroup, name)
+        try:
+            if self.cgroup_cpu or self.cgroup_memory_mb:
+                # 讓子 cgroup 可以使用 cpu 與 memory 控制器（已啟用時寫入沒有影響）
+                with open(os.path.join(self.cgroup, "cgroup.subtree_control"), "w") as f:
+                    f.write("+cpu +memory")
+            os.makedirs(path, exist_ok=True)
+            if self.cgroup_cpu:
+                with open(os.path.join(path, "cpu.max"), "w") as f:
+                    f.write(f"{int(self.cgroup_cpu * CGROUP_PERIOD_US)} {CGROUP_PERIOD_US}")
+            if self.cgroup_memory_mb:
+                with open(os.path.join(path, "memory.max"), "w") as f:
+                    f.write(str(self.cgroup_memory_mb * 1048576))
+            with open(os.path.join(path, "cgroup.procs"), "w") as f:
+                f.write(str(pid))
+        except OSError as e:
+            print(f"[資源限制] 無法將 PID {pid} 放入 cgroup {path}: {e}")
+            return None
+        return path
+
+    def release(self, usage):
+        """行程結束後移除子 cgroup"""
+        if usage and usage.cgroup:
+            try:
+                os.rmdir(usage.cgroup)
+            except OSError as e:
+                print(f"[資源限制] 無法移除 cgroup {usage.cgroup}: {e}")
+
+    def to_dict(self):
+        return {
+            "cpu_seconds": self.cpu_seconds,
+            "memory_mb": self.memory_mb,
+            "open_files": self.open_files,
+            "cpus": sorted(self.cpus) if self.cpus else None,
+            "cgroup": self.cgroup,
+            "cgroup_cpu": self.cgroup_cpu,
+            "cgroup_memory_mb": self.cgroup_memory_mb,
+        }
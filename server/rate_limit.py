@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+大廳請求限流與准入控制
+
+限流：每種請求類別各有一組權杖桶（每秒補充 rate 個，最多累積 burst 個），
+每條連線一組、每個帳號一組（同一帳號開多條連線也共用額度），兩者都有權杖才處理請求，
+否則回覆 rate_limited 與建議的重試秒數。登入前以請求中的帳號名稱當作帳號，
+不需登入的分段下載以下載權杖中的玩家當作帳號。
+拒絕訊息會延後最多 MAX_REJECT_DELAY 秒才送出，狂送請求的連線因此只佔用自己的執行緒
+
+准入控制：下載遊戲、啟動遊戲伺服器等昂貴操作有全域的同時執行上限，
+超過上限的請求排隊等待（最多 queue_limit 個、等待 wait 秒），佇列已滿或等待逾時則回覆 busy。
+下載（包含每個分段）在處理請求前依請求類型（MESSAGE_GATES）取得執行權；啟動遊戲伺服器則在啟動本身取得，
+房主開始遊戲與快速配對組成的房間都受同一個上限限制
+
+限流的權杖桶與准入控制的計數都在各自的大廳行程中：以 --workers N 啟動時每個工作行程各有一份，
+限流與下載的整體實際上限是 N 倍（例如 GAMESTORE_MAX_DOWNLOADS=4、4 個工作行程時最多同時 16 個下載）。
+開始遊戲與配對只在狀態行程中執行，GAMESTORE_MAX_SPAWNS 不受工作行程數影響
+
+GAMESTORE_RATE_LIMITS 可設為 off 關閉限流，或以 JSON 覆寫個別類別，例如 {"download": [1, 3]}
+"""
+import json
+import os
+import threading
+import time
+
+# 請求類型 -> 限流類別（None 表示不限流，例如遊戲伺服器回報結果）
+MESSAGE_CLASSES = {
+    "hello": "query",
+    "register": "auth",
+    "login": "auth",
+    "resume": "auth",
+    "list_games": "query",
+    "get_game_detail": "query",
+    "get_ratings": "query",
+    "list_rooms": "query",
+    "get_room_status": "query",
+    "get_queue_status": "query",
+    "get_leaderboard": "query",
+    "get_my_rank": "query",
+    "get_server_stats": "query",
+    "download_game": "download",
+    "get_package_manifest": "download",
+    "fetch_package_range": "range",
+    "create_room": "action",
+    "join_room": "action",
+    "leave_room": "action",
+    "start_game": "action",
+    "set_ready": "action",
+    "queue_for_game": "action",
+    "cancel_queue": "action",
+    "watch_room": "action",
+    "add_rating": "action",
+    "report_match_result": None,
+}
+DEFAULT_CLASS = "default"
+
+# 請求類型 -> 處理前需取得的准入控制（build_gates 的名稱）
+MESSAGE_GATES = {
+    "download_game": "download",
+    "get_package_manifest": "download",
+    "fetch_package_range": "download",
+}
+
+# 類別 -> (每秒補充的權杖數, 最多累積的權杖數)
+DEFAULT_LIMITS = {
+    "auth": (1.0, 5),
+    "query": (10.0, 20),
+    "download": (0.5, 3),
+    "range": (50.0, 100),
+    "action": (2.0, 10),
+    "default": (20.0, 40),
+}
+
+# 被限流的請求延後回覆的上限（秒）
+MAX_REJECT_DELAY = 1.0
+
+# 帳號權杖桶超過此數量時清除已閒置到補滿的項目
+ACCOUNT_SWEEP_SIZE = 10000
+
+def load_limits():
+    """讀取 GAMESTORE_RATE_LIMITS（off 表示不限流）"""
+    value = os.environ.get("GAMESTORE_RATE_LIMITS", "").strip()
+    if value.lower() in ("off", "0", "false"):
+        return {}
+    limits = dict(DEFAULT_LIMITS)
+    if value:
+        try:
+            for name, (rate, burst) in json.loads(value).items():
+                limits[name] = (float(rate), int(burst))
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"[限流] GAMESTORE_RATE_LIMITS 格式錯誤，使用預設值: {e}")
+            return dict(DEFAULT_LIMITS)
+    return limits
+
+class TokenBucket:
+    """權杖桶"""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """取得一個權杖需要等待的秒數（0 表示目前就有）"""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class RateLimiter:
+    """依請求類別的連線與帳號限流"""
+    def __init__(self, limits=None):
+        self.limits = load_limits() if limits is None else limits
+        self.max_delay = MAX_REJECT_DELAY
+        self.accounts = {}  # {(帳號, 類別): TokenBucket}
+        self.lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return bool(self.limits)
+
+    def check(self, connection_buckets, account, msg_type):
+        """檢查並扣除權杖，回傳需要等待的秒數（0 表示放行）
+
+        connection_buckets 為該連線專用的字典（連線結束即丟棄）；account 為 None 時只限制連線
+        """
+        name = MESSAGE_CLASSES.get(msg_type, DEFAULT_CLASS)
+        limit = self.limits.get(name) if name else None
+        if not limit:
+            return 0.0
+        now = time.monotonic()
+        buckets = [connection_buckets.get(name)]
+        if buckets[0] is None:
+            buckets[0] = connection_buckets[name] = TokenBucket(limit[0], limit[1], now)
+
+        with self.lock:
+            if account is not None:
+                key = (account, name)
+                bucket = self.accounts.get(key)
+                if bucket is None:
+                    if len(self.accounts) >= ACCOUNT_SWEEP_SIZE:
+                        self.sweep(now)
+                    bucket = self.accounts[key] = TokenBucket(limit[0], limit[1], now)
+                buckets.append(bucket)
+            # 兩個桶都有權杖才扣除，避免被拒絕的請求仍消耗額度
+            wait = max(bucket.wait_time(now) for bucket in buckets)
+            if wait:
+                self.rejected += 1
+                return wait
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self.allowed += 1
+            return 0.0
+
+    def sweep(self, now):
+        """清除已補滿的帳號權杖桶（補滿後與新建立的桶相同）"""
+        for key, bucket in list(self.accounts.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.accounts[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "accounts": len(self.accounts),
+            }
+
+class ConcurrencyGate:
+    """昂貴操作的全域同時執行上限，超過時排隊等待"""
+    def __init__(self, name, limit, queue_limit=32, wait=10.0):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.wait = wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """取得執行權，佇列已滿或等待逾時回傳 False"""
+        with self.condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue_limit:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                try:
+                    admitted = self.condition.wait_for(lambda: self.active < self.limit, self.wait)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    return False
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+def build_gates():
+    """依環境變數建立各昂貴操作的准入控制（名稱 -> ConcurrencyGate）"""
+    queue_limit = int(os.environ.get("GAMESTORE_ADMISSION_QUEUE", "32"))
+    wait = float(os.environ.get("GAMESTORE_ADMISSION_WAIT", "10"))
+    return {
+        "download": ConcurrencyGate("download", int(os.environ.get("GAMESTORE_MAX_DOWNLOADS", "4")), queue_limit, wait),
+        "spawn": ConcurrencyGate("spawn", int(os.environ.get("GAMESTORE_MAX_SPAWNS", "2")), queue_limit, wait),
+    }
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+工作階段權杖
+登入時簽發 HMAC 簽章的權杖，斷線後可用 resume 訊息重新接回原本的線上狀態
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+class SessionSigner:
+    """簽發與驗證工作階段權杖"""
+    def __init__(self, secret=None, ttl=None):
+        # 多個行程共用權杖時需設定相同的 GAMESTORE_SESSION_SECRET
+        env_secret = os.environ.get("GAMESTORE_SESSION_SECRET")
+        if secret is None:
+            secret = env_secret.encode() if env_secret else os.urandom(32)
+        self.secret = secret
+        self.ttl = ttl or int(os.environ.get("GAMESTORE_SESSION_TTL", "86400"))
+
+    def sign(self, payload):
+        """計算簽章"""
+        return hmac.new(self.secret, payload, hashlib.sha256).hexdigest()
+
+    def check(self, payload, signature):
+        """比對客戶端送來的簽章（非 ASCII 字串直接視為無效，compare_digest 不接受非 ASCII 的 str）"""
+        if not isinstance(signature, str) or not signature.isascii():
+            return False
+        return hmac.compare_digest(self.sign(payload).encode("ascii"), signature.encode("ascii"))
+
+    def issue(self, player_id):
+        """簽發權杖，回傳 (權杖, 工作階段 ID)"""
+        session_id = os.urandom(8).hex()
+        expires = int(time.time()) + self.ttl
+        payload = f"{player_id}:{session_id}:{expires}".encode()
+        encoded = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+        return f"{encoded}.{self.sign(payload)}", session_id
+
+    def verify(self, token):
+        """驗證權杖，成功時回傳 (player_id, 工作階段 ID)，否則回傳 None"""
+        if not isinstance(token, str) or "." not in token:
+            return None
+        encoded, signature = token.rsplit(".", 1)
+        try:
+            payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        except (ValueError, TypeError):
+            return None
+        if not self.check(payload, signature):
+            return None
+        try:
+            player_id, session_id, expires = payload.decode().split(":")
+            if int(expires) < time.time():
+                return None
+            return int(player_id), session_id
+        except ValueError:
+            return None
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+觀戰轉播站
+遊戲伺服器以一條連線把公開的狀態更新（廣播給所有玩家的訊息）送到轉播站，每則更新只送一次；
+轉播站再轉送給該房間的所有觀眾，因此遊戲迴圈內的成本與觀眾人數無關
+
+協定為以換行分隔的 JSON：
+    遊戲伺服器 -> {"type": "publish", "room_id": ..., "token": ...}，之後每行一則更新
+    觀眾       -> {"type": "watch", "room_id": ..., "token": ...}
+    轉播站     -> {"type": "spectate_start", ...}、目前狀態、之後的更新，遊戲結束時 {"type": "spectate_end"}
+
+轉播站保留每種訊息類型的最新一則作為目前狀態，新觀眾加入時先收到這些訊息。
+慢速觀眾的傳送緩衝超過 MAX_PENDING 時不再累積中間的更新，
+等緩衝送完後直接補送目前狀態（合併），不會拖慢其他觀眾或無限制佔用記憶體
+"""
+import json
+import secrets
+import selectors
+import socket
+import threading
+
+# 單一觀眾未送出資料的上限，超過時改為合併更新
+MAX_PENDING = 64 * 1024
+# 握手訊息的長度上限
+MAX_HELLO_SIZE = 4096
+
+class RelayConnection:
+    """轉播站的一條連線（遊戲伺服器或觀眾）"""
+    __slots__ = ("sock", "room", "role", "inbox", "outbox", "lagging", "closing")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.room = None
+        self.role = None  # "publisher" / "viewer"
+        self.inbox = b""
+        self.outbox = bytearray()
+        self.lagging = False
+        self.closing = False
+
+class RelayRoom:
+    """一個可觀戰的房間"""
+    def __init__(self, room_id, game_name, publish_token, watch_token):
+        self.room_id = room_id
+        self.game_name = game_name
+        self.publish_token = publish_token
+        self.watch_token = watch_token
+        self.publisher = None
+        self.viewers = set()
+        self.latest = {}  # {訊息類型: 該類型最新一則的原始資料}，依更新時間排序
+        self.updates = 0
+        self.coalesced = 0
+
+    def snapshot(self):
+        return b"".join(self.latest.values())
+
+class SpectatorRelay:
+    """單執行緒事件迴圈的觀戰轉播站"""
+    def __init__(self, host='0.0.0.0', port=6004):
+        self.host = host
+        self.port = port
+        self.rooms = {}  # {room_id: RelayRoom}
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = None
+        self.updates = 0  # 累計轉播的更新數
+        self.coalesced = 0  # 累計因觀眾落後而略過（合併）的更新數
+
+    # ---------- 大廳使用的介面 ----------
+
+    def register_room(self, room_id, game_name):
+        """開放房間觀戰，回傳 (遊戲伺服器發布用權杖, 觀眾權杖)"""
+        room = RelayRoom(room_id, game_name, secrets.token_hex(16), secrets.token_hex(8))
+        with self.lock:
+            self.rooms[room_id] = room
+        return room.publish_token, room.watch_token
+
+    def watch_token(self, room_id):
+        with self.lock:
+            room = self.rooms.get(room_id)
+            return room.watch_token if room else None
+
+    def unregister_room(self, room_id):
+        """房間關閉（已連線的觀眾會在遊戲伺服器斷線時收到 spectate_end）"""
+        with self.lock:
+            room = self.rooms.get(room_id)
+            if room and not room.publisher:
+                del self.rooms[room_id]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "rooms": len(self.rooms),
+                "viewers": sum(len(room.viewers) for room in self.rooms.values()),
+                "updates": self.updates,
+                "coalesced": self.coalesced,
+            }
+
+    def start(self):
+        """在背景執行緒執行事件迴圈"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(128)
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        print(f"[觀戰轉播] 在 {self.host}:{self.port} 上等待遊戲伺服器與觀眾")
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    # ---------- 事件迴圈 ----------
+
+    def run(self):
+        while True:
+            for key, mask in self.selector.select():
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                    continue
+                conn = key.data
+                if mask & selectors.EVENT_WRITE:
+                    self.flush(conn)
+                if mask & selectors.EVENT_READ and conn.sock:
+                    self.read(conn)
+
+    def accept(self):
+        try:
+            sock, _ = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = RelayConnection(sock)
+        self.selector.register(sock, selectors.EVENT_READ, conn)
+
+    def read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(conn)
+            return
+        if conn.role == "viewer":
+            # 觀眾不需要再送資料，讀掉即可
+            return
+
+        conn.inbox += data
+        *lines, conn.inbox = conn.inbox.split(b"\n")
+        if conn.role is None and len(conn.inbox) > MAX_HELLO_SIZE:
+            self.drop(conn)
+            return
+        for line in lines:
+            if not line.strip():
+                continue
+            if conn.role is None:
+                self.hello(conn, line)
+            elif conn.role == "publisher":
+                self.publish(conn.room, line + b"\n")
+            if not conn.sock:
+                return
+
+    def hello(self, conn, line):
+        """處理第一則訊息，決定連線是遊戲伺服器還是觀眾"""
+        try:
+            message = json.loads(line)
+            room_id = message.get("room_id")
+        except (ValueError, AttributeError):
+            self.drop(conn)
+            return
+        with self.lock:
+            room = self.rooms.get(room_id)
+        msg_type = message.get("type")
+
+        if msg_type == "publish" and room and not room.publisher and message.get("token") == room.publish_token:
+            conn.role = "publisher"
+            conn.room = room
+            room.publisher = conn
+            print(f"[觀戰轉播] 房間 {room_id} 的遊戲伺服器已連線")
+        elif msg_type == "watch" and room and message.get("token") == room.watch_token:
+            conn.role = "viewer"
+            conn.room = room
+            # 限制核心的傳送緩衝，慢速觀眾佔用的記憶體由 MAX_PENDING 決定
+            conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_PENDING)
+            with self.lock:
+                room.viewers.add(conn)
+            self.push(conn, json.dumps({
+                "type": "spectate_start",
+                "room_id": room_id,
+                "game_name": room.game_name,
+                "viewers": len(room.viewers)
+            }).encode("utf-8") + b"\n" + room.snapshot(), force=True)
+        else:
+            self.push(conn, json.dumps({
+                "type": "spectate_error",
+                "message": "房間不存在或無法觀戰"
+            }).encode("utf-8") + b"\n", force=True)
+            self.close_after_flush(conn)
+
+    def publish(self, room, line):
+        """遊戲伺服器送來一則更新：記錄為目前狀態並轉送給所有觀眾"""
+        try:
+            msg_type = json.loads(line).get("type")
+        except (ValueError, AttributeError):
+            return
+        room.latest.pop(msg_type, None)
+        room.latest[msg_type] = line
+        room.updates += 1
+        self.updates += 1
+        for viewer in list(room.viewers):
+            self.push(viewer, line)
+
+    def push(self, conn, data, force=False):
+        """放入觀眾的傳送緩衝；落後太多時改為送完後補送目前狀態"""
+        if not force and (conn.lagging or len(conn.outbox) > MAX_PENDING):
+            conn.lagging = True
+            conn.room.coalesced += 1
+            self.coalesced += 1
+            return
+        conn.outbox += data
+        self.flush(conn)
+
+    def flush(self, conn):
+        if not conn.sock:
+            return
+        if conn.outbox:
+            try:
+                sent = conn.sock.send(conn.outbox)
+                del conn.outbox[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.drop(conn)
+                return
+        if not conn.outbox and conn.lagging and conn.room:
+            # 緩衝送完，以目前狀態取代期間略過的更新
+            conn.lagging = False
+            conn.outbox += conn.room.snapshot()
+            return self.flush(conn)
+        if not conn.outbox and conn.closing:
+            self.drop(conn)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outbox else 0)
+        try:
+            self.selector.modify(conn.sock, events, conn)
+        except (KeyError, ValueError):
+            pass
+
+    def close_after_flush(self, conn):
+        conn.closing = True
+        self.flush(conn)
+
+    def drop(self, conn):
+        if not conn.sock:
+            return
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+        conn.sock = None
+        room = conn.room
+        if not room:
+            return
+        if conn.role == "viewer":
+            with self.lock:
+                room.viewers.discard(conn)
+        elif conn.role == "publisher":
+            # 遊戲結束：通知所有觀眾並關閉房間
+            print(f"[觀戰轉播] 房間 {room.room_id} 的轉播結束 ({room.updates} 則更新，{len(room.viewers)} 位觀眾)")
+            end = json.dumps({"type": "spectate_end", "room_id": room.room_id}).encode("utf-8") + b"\n"
+            with self.lock:
+                if self.rooms.get(room.room_id) is room:
+                    del self.rooms[room.room_id]
+                viewers = list(room.viewers)
+            for viewer in viewers:
+                # 落後的觀眾先補上最後的狀態（例如 game_over）
+                data = end
+                if viewer.lagging:
+                    viewer.lagging = False
+                    data = room.snapshot() + end
+                self.push(viewer, data, force=True)
+                self.close_after_flush(viewer)
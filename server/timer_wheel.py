@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+以時間輪（hashed timing wheel）實作的到期回收
+
+大廳中停在 waiting / playing 的房間（例如遊戲伺服器當掉、所有客戶端沒有正常斷線）、
+已結束的遊戲伺服器行程與閒置的連線都需要「一段時間後檢查是否該回收」的計時器，數量與連線數同級。
+時間輪把時間切成 tick，分配到 slots 個格子：加入與取消計時器都是 O(1)，
+每經過一個 tick 只處理目前格子裡的計時器，不需要掃描所有房間。
+超過一圈（slots * tick 秒）的計時器記下剩餘圈數，每圈被看過一次；
+預設 4096 格、每格 1 秒，超過一小時的 TTL 才需要多繞幾圈。計時器最多晚一個 tick 觸發
+
+各狀態的 TTL（秒，0 表示不回收）可用 GAMESTORE_EXPIRY 以 JSON 覆寫，例如 {"waiting": 600, "idle": 0}：
+    waiting          房間停在等待中的時間
+    playing          房間停在遊戲中的時間（遊戲伺服器沒有回報結果也沒有結束）
+    finished         回報結果後房間保留的時間
+    game_check       檢查遊戲伺服器行程是否已結束的間隔
+    idle             已登入連線沒有送出任何請求的時間（遊戲中的玩家不回收）
+    unauthenticated  尚未登入的連線沒有送出任何請求的時間
+"""
+import collections
+import json
+import math
+import os
+import threading
+import time
+
+DEFAULT_TTLS = {
+    "waiting": 1800,
+    "playing": 7200,
+    "finished": 600,
+    "game_check": 30,
+    "idle": 1800,
+    "unauthenticated": 300,
+}
+
+# 統計中保留的最近回收紀錄數
+RECENT_LIMIT = 20
+
+def load_ttls():
+    """讀取 GAMESTORE_EXPIRY"""
+    ttls = dict(DEFAULT_TTLS)
+    value = os.environ.get("GAMESTORE_EXPIRY", "").strip()
+    if value:
+        try:
+            for name, ttl in json.loads(value).items():
+                ttls[name] = float(ttl)
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"[到期回收] GAMESTORE_EXPIRY 格式錯誤，使用預設值: {e}")
+            return dict(DEFAULT_TTLS)
+    return ttls
+
+class WheelTimer:
+    """schedule 回傳的計時器"""
+    __slots__ = ("callback", "args", "slot", "rounds")
+
+    def __init__(self, callback, args, slot, rounds):
+        self.callback = callback
+        self.args = args
+        self.slot = slot
+        self.rounds = rounds
+
+class TimerWheel:
+    """時間輪本身（不含執行緒與鎖，由 ExpiryService 保護）"""
+    def __init__(self, tick=1.0, slots=4096, now=None):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.origin = time.monotonic() if now is None else now
+        self.ticks = 0  # 已處理的 tick 數
+        self.count = 0
+
+    def schedule(self, delay, callback, *args, now=None):
+        now = time.monotonic() if now is None else now
+        # 到期的 tick 取整數進位，確保不會提早觸發
+        target = max(self.ticks + 1, math.ceil((now + delay - self.origin) / self.tick))
+        rounds = (target - self.ticks - 1) // len(self.slots)
+        timer = WheelTimer(callback, args, target % len(self.slots), rounds)
+        self.slots[timer.slot].add(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        slot = self.slots[timer.slot]
+        if timer in slot:
+            slot.remove(timer)
+            self.count -= 1
+
+    def advance(self, now=None):
+        """推進到 now，回傳到期的計時器"""
+        now = time.monotonic() if now is None else now
+        due = []
+        while self.origin + (self.ticks + 1) * self.tick <= now:
+            self.ticks += 1
+            slot = self.slots[self.ticks % len(self.slots)]
+            for timer in list(slot):
+                if timer.rounds:
+                    timer.rounds -= 1
+                else:
+                    slot.remove(timer)
+                    due.append(timer)
+        self.count -= len(due)
+        return due
+
+    def next_tick(self):
+        return self.origin + (self.ticks + 1) * self.tick
+
+class ExpiryService:
+    """在背景執行緒推進時間輪、執行到期的回呼，並統計回收的項目"""
+    def __init__(self, ttls=None, tick=1.0, slots=4096):
+        self.ttls = ttls if ttls is not None else load_ttls()
+        self.wheel = TimerWheel(tick, slots)
+        self.lock = threading.Lock()
+        self.reclaimed = collections.Counter()  # {種類: 回收數}
+        self.recent = collections.deque(maxlen=RECENT_LIMIT)
+        self.thread = None
+
+    def start(self):
+        if self.thread:
+            return
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def schedule(self, delay, callback, *args):
+        """delay 秒後在回收執行緒中呼叫 callback(*args)"""
+        with self.lock:
+            return self.wheel.schedule(delay, callback, *args)
+
+    def cancel(self, timer):
+        if timer:
+            with self.lock:
+                self.wheel.cancel(timer)
+
+    def run(self):
+        while True:
+            time.sleep(max(0.0, self.wheel.next_tick() - time.monotonic()))
+            with self.lock:
+                due = self.wheel.advance()
+            for timer in due:
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    print(f"[到期回收] 執行回收時發生錯誤: {e}")
+
+    def record(self, kind, detail):
+        """記錄一次回收"""
+        self.reclaimed[kind] += 1
+        self.recent.append({"kind": kind, "detail": detail, "at": round(time.time(), 3)})
+        print(f"[到期回收] {detail}")
+
+    def stats(self):
+        with self.lock:
+            timers = self.wheel.count
+        return {
+            "timers": timers,
+            "ttls": self.ttls,
+            "reclaimed": dict(self.reclaimed),
+            "recent": list(self.recent),
+        }
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+大廳與開發者伺服器的訊息編碼
+預設沿用原本的格式：連續送出的 JSON 物件（非 ASCII 字元跳脫為 \\uXXXX、預設分隔符號）
+
+客戶端連線後可先送出 hello 協商：
+    {"type": "hello", "compression": ["zlib", "lzma"], "compact": true}
+伺服器回覆選用的壓縮方式與門檻，之後雙方的訊息都改為訊框：
+    1 byte 編碼（0 未壓縮、1 zlib、2 lzma） + 4 bytes 內容長度（big-endian） + 內容
+內容為 UTF-8 JSON；compact 時不跳脫非 ASCII 字元並使用最短的分隔符號。
+內容超過門檻且壓縮後較小才壓縮。接收端以第一個位元組區分 JSON（'{'）與訊框，
+不支援 hello 的舊版伺服器回覆失敗，客戶端就繼續使用原本的格式
+
+此檔案的正本在 server/，player/ 與 developer/ 的副本以 make sync-codec 更新
+"""
+import json
+import lzma
+import os
+import struct
+import threading
+import zlib
+
+FRAME_HEADER = struct.Struct("!BI")
+RAW, ZLIB, LZMA = 0, 1, 2
+
+# 壓縮方式名稱 -> 訊框編碼
+CODEC_IDS = {"zlib": ZLIB, "lzma": LZMA}
+
+# 超過此大小（bytes）的內容才壓縮
+COMPRESS_THRESHOLD = int(os.environ.get("GAMESTORE_COMPRESS_THRESHOLD", "1024"))
+ZLIB_LEVEL = int(os.environ.get("GAMESTORE_COMPRESS_LEVEL", "1"))
+LZMA_PRESET = 1
+# 單一訊息（解壓縮後）的大小上限，避免惡意的壓縮炸彈
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+# 客戶端希望使用的壓縮方式（依偏好順序）
+CLIENT_COMPRESSION = ["zlib", "lzma"]
+
+def server_codecs():
+    """伺服器允許的壓縮方式（GAMESTORE_COMPRESSION，以逗號分隔，off 表示不壓縮）"""
+    value = os.environ.get("GAMESTORE_COMPRESSION", "zlib,lzma").strip().lower()
+    if value in ("off", "0", "false", "none", ""):
+        return []
+    return [name.strip() for name in value.split(",") if name.strip() in CODEC_IDS]
+
+def dumps(message, compact=False):
+    if compact:
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(message).encode("utf-8")
+
+def compress(codec, payload):
+    if codec == ZLIB:
+        return zlib.compress(payload, ZLIB_LEVEL)
+    return lzma.compress(payload, preset=LZMA_PRESET)
+
+def decompress(codec, data):
+    if codec == ZLIB:
+        decompressor = zlib.decompressobj()
+        payload = decompressor.decompress(data, MAX_MESSAGE_SIZE)
+        truncated = bool(decompressor.unconsumed_tail)
+    elif codec == LZMA:
+        decompressor = lzma.LZMADecompressor()
+        payload = decompressor.decompress(data, MAX_MESSAGE_SIZE)
+        truncated = not decompressor.eof
+    else:
+        raise ValueError(f"未知的訊框編碼 {codec}")
+    if truncated:
+        raise ValueError("解壓縮後的訊息過大或不完整")
+    return payload
+
+def encode_frame(payload, codec=None, threshold=COMPRESS_THRESHOLD):
+    """把一則訊息的內容包成訊框（超過門檻且壓縮後較小才壓縮）"""
+    if codec and len(payload) >= threshold:
+        compressed = compress(codec, payload)
+        if len(compressed) < len(payload):
+            return FRAME_HEADER.pack(codec, len(compressed)) + compressed
+    return FRAME_HEADER.pack(RAW, len(payload)) + payload
+
+def negotiate(message):
+    """伺服器端：依 hello 請求選擇壓縮方式，回傳回覆（送出後再以 configure 切換格式）"""
+    requested = message.get("compression")
+    allowed = server_codecs()
+    chosen = None
+    if isinstance(requested, list):
+        chosen = next((name for name in requested if name in allowed), None)
+    return {
+        "success": True,
+        "framing": "frame",
+        "compression": chosen,
+        "compact": bool(message.get("compact")),
+        "threshold": COMPRESS_THRESHOLD,
+    }
+
+def hello_message(compression=None, compact=True):
+    """客戶端：協商用的 hello 請求"""
+    return {
+        "type": "hello",
+        "compression": CLIENT_COMPRESSION if compression is None else compression,
+        "compact": compact,
+    }
+
+class MessageStream:
+    """包裝 socket，以協商後的格式收送 JSON 訊息
+
+    也提供與 socket 相同的 send / sendall / shutdown / close / fileno，
+    send 與 sendall 接受一則已編碼的 JSON 訊息（例如大廳的廣播），協商後會自動包成訊框
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.decoder = json.JSONDecoder()
+        self.send_lock = threading.Lock()
+        self.framed = False
+        self.compact = False
+        self.codec = None
+        self.threshold = COMPRESS_THRESHOLD
+
+    def configure(self, settings):
+        """套用 hello 協商的結果"""
+        self.framed = settings.get("framing") == "frame"
+        self.compact = bool(settings.get("compact"))
+        self.codec = CODEC_IDS.get(settings.get("compression"))
+        self.threshold = settings.get("threshold", COMPRESS_THRESHOLD)
+
+    @property
+    def compression(self):
+        return next((name for name, codec in CODEC_IDS.items() if codec == self.codec), None)
+
+    # ---------- 送出 ----------
+
+    def encode(self, message):
+        if not self.framed:
+            return dumps(message)
+        return encode_frame(dumps(message, self.compact), self.codec, self.threshold)
+
+    def send_message(self, message):
+        data = self.encode(message)
+        with self.send_lock:
+            self.sock.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        """送出一則已編碼（ASCII JSON）的訊息"""
+        if self.framed:
+            data = encode_frame(data, self.codec, self.threshold)
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    # ---------- 接收 ----------
+
+    def pending(self):
+        """緩衝區中是否還有未處理的資料（select 前應先檢查）"""
+        return bool(self.buffer)
+
+    def receive_message(self):
+        """接收下一則訊息，連線中斷回傳 None；格式錯誤時拋出 ValueError"""
+        while True:
+            message = self.parse()
+            if message is not None:
+                return message
+            data = self.sock.recv(65536)
+            if not data:
+                return None
+            self.buffer += data
+
+    def parse(self):
+        """從緩衝區取出一則完整的訊息，資料不足回傳 None"""
+        start = 0
+        while start < len(self.buffer) and self.buffer[start] in b" \t\r\n":
+            start += 1
+        if start:
+            del self.buffer[:start]
+        if not self.buffer:
+            return None
+
+        if self.buffer[0] == ord("{"):
+            text = bytes(self.buffer).decode("utf-8", "surrogateescape")
+            try:
+                message, end = self.decoder.raw_decode(text)
+            except json.JSONDecodeError:
+                if len(self.buffer) > MAX_MESSAGE_SIZE:
+                    raise ValueError("訊息過大")
+                return None
+            del self.buffer[:len(text[:end].encode("utf-8", "surrogateescape"))]
+            return message
+
+        if len(self.buffer) < FRAME_HEADER.size:
+            return None
+        codec, length = FRAME_HEADER.unpack_from(self.buffer)
+        if length > MAX_MESSAGE_SIZE:
+            raise ValueError("訊息過大")
+        end = FRAME_HEADER.size + length
+        if len(self.buffer) < end:
+            return None
+        payload = bytes(self.buffer[FRAME_HEADER.size:end])
+        del self.buffer[:end]
+        if codec != RAW:
+            payload = decompress(codec, payload)
+        return json.loads(payload.decode("utf-8"))
+
+    # ---------- socket 介面 ----------
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def shutdown(self, how):
+        self.sock.shutdown(how)
+
+    def close(self):
+        self.sock.close()